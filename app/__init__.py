@@ -3,10 +3,36 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_cors import CORS
 from config import config_by_name
+from app.database import DatabaseRouting, RoutingSession
+import logging
 import os
+import weakref
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
+logger = logging.getLogger(__name__)
+
+_engines = weakref.WeakSet()  # Every app's engines, so forked workers can drop the parent's connections
+
+
+def init_schema():
+    """Create missing tables and the product search index (idempotent; needs an app context)"""
+    db.create_all(bind_key=None)  # The primary only: a read replica gets its schema by replication
+    from app.search_service import ProductSearchService
+    ProductSearchService.ensure_index()
+
+
+def _dispose_engines_after_fork():
+    """
+    Runs in every child forked from a process that already built the app (gunicorn --preload).
+    Pooled connections are sockets shared with the parent: the child forgets them without
+    closing (close=False, which would also end the parent's session) and opens its own
+    """
+    for engine in list(_engines):
+        if engine.url.database in (None, '', ':memory:'):
+            continue  # The in-memory database *is* the connection; a new one would be empty
+        engine.dispose(close=False)
+
 
 def create_app(config_name=None):
     if config_name is None:
@@ -15,11 +41,25 @@ def create_app(config_name=None):
     app = Flask(__name__)
     app.config.from_object(config_by_name[config_name])
     
+    # Queued JSON logging with request ids (see structured_logging.py)
+    from app.structured_logging import StructuredLogging
+    StructuredLogging.init_app(app)
+    
     # Enable CORS for all routes
     CORS(app)
     
+    # Pool sizes, timeouts and the read replica bind from config (see database.py)
+    DatabaseRouting.configure(app)
     db.init_app(app)
     
+    # Per-request query counts, DB time and N+1 warnings (see sql_profiler.py)
+    from app.sql_profiler import QueryProfiler
+    QueryProfiler.init_app(app)
+    
+    # Prometheus metrics, served at /metrics (see metrics.py)
+    from app.metrics import Metrics
+    Metrics.init_app(app)
+    
     # Configure login manager with better session handling
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
@@ -31,7 +71,8 @@ def create_app(config_name=None):
     @app.before_request
     def make_session_permanent():
         from flask import session
-        session.permanent = True
+        if not session.permanent:  # Assigning marks the session modified, re-signing the cookie on every response
+            session.permanent = True
     
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
@@ -60,12 +101,24 @@ def create_app(config_name=None):
         app.register_blueprint(emergency_migration.bp)  # EMERGENCY: Database migration from browser
         app.register_blueprint(admin_seed.bp)  # DATABASE SEEDING: Import local data to Railway
         
-        try:
-            db.create_all()
-            print("✅ Database tables created successfully!")
-        except Exception as e:
-            print(f"⚠️ Database init warning: {e}")
-            print("Database tables will be created on first request")
+        _engines.update(db.engines.values())
+        DatabaseRouting.init_app(app, db.engines.values())
+        
+        # Production creates the schema in a release step (`flask --app run init-db`), so a
+        # preloaded master and its workers boot without touching the database
+        if app.config.get('AUTO_CREATE_TABLES', True):
+            try:
+                init_schema()
+                logger.info("Database tables created successfully")
+            except Exception as e:
+                logger.warning("Database init warning: %s - run `flask --app run init-db`", e)
+    
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create missing tables and the search index"""
+        import click
+        init_schema()
+        click.echo(f"Database schema ready: {db.engine.url.render_as_string(hide_password=True)}")
     
     @app.errorhandler(404)
     def not_found(error):
@@ -81,10 +134,11 @@ def create_app(config_name=None):
     def load_user(user_id):
         try:
             return User.query.get(int(user_id))
-        except Exception as e:
-            print(f"❌ User loader error: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("User loader error for user %s", user_id)
             return None
     
     return app
+
+
+os.register_at_fork(after_in_child=_dispose_engines_after_fork)
@@ -1,9 +1,14 @@
-import google.generativeai as genai
-import os
 import json
-import re
+import logging
 from app import db
 from app.models import ChatLog, Product, Order, RetailerCredit, ChatbotCommand
+from app.search_service import ProductSearchService
+from app.llm_cache import LLMCache
+from app.llm_gateway import LLMGateway
+from app.gemini_client import GeminiRegistry
+from app.intent_engine import IntentEngine
+
+logger = logging.getLogger(__name__)
 
 class ChatbotService:
     """
@@ -11,14 +16,29 @@ class ChatbotService:
     THIS IS THE ONLY REAL API INTEGRATION
     """
     
+    MODEL_NAME = GeminiRegistry.CHATBOT_MODEL
+    # Bump when system_prompt changes (cached replies are keyed on it)
+    PROMPT_VERSION = 'chatbot-v1'
+    
+    ERROR_REPLY = "தற்போது சேவை கிடைக்கவில்லை"
+    OFFLINE_REPLY = 'நான் உங்களுக்கு எப்படி உதவ முடியும்? How can I help you? Try "Find tomatoes less than 50 rupees"'
+    
+    @staticmethod
+    def reply(message, user_role="retailer", user_id=None):
+        """get_response through the LLM gateway: OFFLINE_REPLY if Gemini is slow, failing or not configured"""
+        return LLMGateway.call(
+            ChatbotService.MODEL_NAME,
+            lambda: ChatbotService().get_response(message, user_role, user_id),
+            fallback=lambda: ChatbotService.OFFLINE_REPLY,
+            failed=lambda response: response == ChatbotService.ERROR_REPLY
+        )
+    
     def __init__(self):
-        self.api_key = os.getenv('GEMINI_API_KEY')
-        
-        if not self.api_key:
+        if not GeminiRegistry.is_configured():
             raise ValueError("GEMINI_API_KEY not set in .env")
         
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
+        # Shared per-worker client (configured once, not per request)
+        self.model = GeminiRegistry.model(ChatbotService.MODEL_NAME)
     
     def get_response(self, message, user_role="retailer", user_id=None):
         """Get response from Gemini API"""
@@ -42,9 +62,15 @@ class ChatbotService:
             
             full_prompt = f"{system_prompt}\n\nUser: {message}"
             
-            response = self.model.generate_content(full_prompt)
+            def generate():
+                response = self.model.generate_content(full_prompt)
+                return response.text if response else "மன்னிக்கவும்"
             
-            ai_response = response.text if response else "மன்னிக்கவும்"
+            # Same question from the same role -> same reply, no API call
+            ai_response = LLMCache.fetch(
+                ChatbotService.MODEL_NAME, ChatbotService.PROMPT_VERSION,
+                {'role': user_role, 'message': LLMCache.normalize(message)}, generate
+            )
             
             if user_id:
                 chat_log = ChatLog(user_id=user_id, message=message, response=ai_response)
@@ -54,8 +80,8 @@ class ChatbotService:
             return ai_response
         
         except Exception as e:
-            print(f"[GEMINI ERROR] {str(e)}")
-            return "தற்போது சேவை கிடைக்கவில்லை"
+            logger.error("[GEMINI ERROR] %s", e)
+            return ChatbotService.ERROR_REPLY
 
 
 # ============ FEATURE 4: AI COMMAND PROCESSING ============
@@ -70,66 +96,16 @@ class SmartChatbotService:
     """
     
     def __init__(self):
-        self.api_key = os.getenv('GEMINI_API_KEY')
-        if not self.api_key:
+        if not GeminiRegistry.is_configured():
             raise ValueError("GEMINI_API_KEY not set")
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
+        self.model = GeminiRegistry.model(GeminiRegistry.CHATBOT_MODEL)
     
     def extract_intent_simple(self, message, user_role):
         """
-        Simple intent extraction using keywords
+        Simple intent extraction using keywords (IntentEngine, no API call)
         Fallback if Gemini fails to parse
         """
-        message_lower = message.lower()
-        
-        # Search products
-        if any(word in message_lower for word in ['find', 'search', 'show products', 'கண்டுபிடி', 'தேடு']):
-            # Extract product name and price
-            product = None
-            price_max = None
-            
-            # Common products
-            products = ['tomato', 'potato', 'onion', 'rice', 'wheat', 'carrot']
-            for p in products:
-                if p in message_lower:
-                    product = p
-                    break
-            
-            # Extract price
-            price_match = re.search(r'(\d+)', message_lower)
-            if price_match:
-                price_max = int(price_match.group(1))
-            
-            return {
-                'intent': 'search_products',
-                'parameters': {'product': product, 'price_max': price_max},
-                'confidence': 0.7
-            }
-        
-        # Check orders
-        elif any(word in message_lower for word in ['orders', 'my order', 'வரிசை', 'ஆர்டர்']):
-            return {
-                'intent': 'check_orders',
-                'parameters': {},
-                'confidence': 0.8
-            }
-        
-        # Check credit
-        elif any(word in message_lower for word in ['credit', 'score', 'கடன்']):
-            return {
-                'intent': 'check_credit',
-                'parameters': {},
-                'confidence': 0.8
-            }
-        
-        # Help
-        else:
-            return {
-                'intent': 'help',
-                'parameters': {},
-                'confidence': 0.9
-            }
+        return IntentEngine.chatbot_intent(message)
     
     def process_command(self, message, user_id, user_role):
         """
@@ -157,7 +133,7 @@ class SmartChatbotService:
                 return self.help_response(user_role, message)
         
         except Exception as e:
-            print(f"[CHATBOT COMMAND ERROR] {str(e)}")
+            logger.error("[CHATBOT COMMAND ERROR] %s", e)
             return {
                 'type': 'error',
                 'message': 'Sorry, I couldn\'t understand. Try again.',
@@ -177,7 +153,7 @@ class SmartChatbotService:
         query = Product.query.filter_by(is_active=True)
         
         if product_name:
-            query = query.filter(Product.product_name.ilike(f'%{product_name}%'))
+            query = ProductSearchService.apply(query, product_name)
         
         if price_max:
             query = query.filter(Product.price <= price_max)
@@ -282,7 +258,7 @@ class SmartChatbotService:
         
         # Also provide a simple conversational response
         try:
-            simple_response = ChatbotService().get_response(original_message, user_role)
+            simple_response = ChatbotService.reply(original_message, user_role)
             
             if user_role == 'retailer':
                 examples = [
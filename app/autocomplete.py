@@ -0,0 +1,398 @@
+"""
+Autocomplete Index
+Type-ahead suggestions for the search boxes, served from memory
+
+- One prefix trie per worker over active product names, categories and vendor business
+  names. Every term is reachable from the start of each of its words ("tom" finds
+  "Country Tomato"), and every node keeps its TOP_K best terms, so a lookup is a walk
+  of len(prefix) dict hops and never visits the subtree
+- Terms are ranked by listings plus recent order lines (OrderItem rows of orders placed
+  in the last AUTOCOMPLETE_VOLUME_DAYS), so what retailers actually buy comes first
+- Kept current from change feeds instead of rebuilds: products and vendors whose
+  updated_at moved past the last watermark, and orders created since the last read
+  (expired order lines are subtracted as they leave the window). Each feed re-reads
+  CHANGE_FEED_LAG_SECONDS before its watermark for rows committed late. Only the trie
+  nodes on a changed term's paths recompute their top list
+- At most one refresh every AUTOCOMPLETE_REFRESH_SECONDS, and requests that arrive while
+  another thread refreshes are answered from the current trie instead of waiting
+"""
+
+import bisect
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, deque
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import func, select
+from app import db
+from app.models import Product, User, Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+
+class TrieNode:
+    __slots__ = ('children', 'terms', 'top')
+
+    def __init__(self):
+        self.children = {}
+        self.terms = set()  # term keys whose path ends here
+        self.top = ()  # best TOP_K term keys at or below this node, replaced (never mutated) on refresh
+
+
+class AutocompleteIndex:
+    """
+    Per-worker prefix trie over the catalogue, weighted by recent orders
+    """
+
+    DEFAULT_REFRESH_SECONDS = 15
+    DEFAULT_VOLUME_DAYS = 30
+    DEFAULT_FEED_LAG_SECONDS = 5
+    TOP_K = 10
+    MAX_PATH_CHARS = 32  # Deeper nodes add memory, not better suggestions
+    TOKEN_RE = re.compile(r'[\w\u0b80-\u0bff]+')  # \w alone splits Tamil words at vowel signs
+    KINDS = ('product', 'category', 'vendor')
+
+    _pid = None
+    _lock = threading.Lock()
+    _root = None
+    _terms = None  # (kind, normalized text) -> [display text, listings, order lines]
+    _products = None  # product id -> (name, category) of active products, None if inactive
+    _vendors = None  # vendor id -> business name of active vendors, None otherwise
+    _product_volume = None  # product id -> order lines in the window
+    _vendor_volume = None  # vendor id -> order lines in the window
+    _order_lines = None  # (created_at, order item id, product id, vendor id), oldest first
+    _seen_lines = None
+    _watermarks = None
+    _checked_at = 0.0
+    _dirty = None
+    _counters = {'builds': 0, 'refreshes': 0, 'changes': 0, 'lookups': 0, 'skipped_refreshes': 0}
+
+    # ============ TEXT ============
+
+    @staticmethod
+    def normalize(text):
+        return ' '.join(unicodedata.normalize('NFKC', text or '').casefold().split())
+
+    @staticmethod
+    def _paths(text):
+        """Trie paths of a normalized term: the term from the start of each of its words"""
+        return {text[match.start():][:AutocompleteIndex.MAX_PATH_CHARS]
+                for match in AutocompleteIndex.TOKEN_RE.finditer(text)}
+
+    @staticmethod
+    def _matches(term, text):
+        """True if text is a prefix of term from the start of one of its words"""
+        return any(term.startswith(text, match.start()) for match in AutocompleteIndex.TOKEN_RE.finditer(term))
+
+    @staticmethod
+    def _config(name, default):
+        if not has_app_context():
+            return default
+        value = current_app.config.get(name)
+        return default if value is None else value
+
+    # ============ TERMS / TRIE ============
+
+    @staticmethod
+    def _rank(key):
+        entry = AutocompleteIndex._terms.get(key)
+        if entry is None:
+            return (1, 0, 0, '')
+        return (0, -(entry[1] + entry[2]), len(entry[0]), entry[0])
+
+    @staticmethod
+    def _touch(key, link=None):
+        """Mark the nodes on key's paths for recomputation; link=True/False adds/removes the term"""
+        dirty = AutocompleteIndex._dirty
+        for path in AutocompleteIndex._paths(key[1]):
+            node = AutocompleteIndex._root
+            dirty[node] = 0
+            for depth, char in enumerate(path, 1):
+                child = node.children.get(char)
+                if child is None:
+                    if not link:
+                        break
+                    child = node.children[char] = TrieNode()
+                node = child
+                dirty[node] = depth
+            else:
+                if link:
+                    node.terms.add(key)
+                elif link is False:
+                    node.terms.discard(key)
+
+    @staticmethod
+    def _adjust(kind, text, listings=0, volume=0):
+        """Add listings / order lines to a term, creating or dropping it as needed"""
+        key = (kind, AutocompleteIndex.normalize(text))
+        if not key[1] or (listings == 0 and volume == 0):
+            return
+        entry = AutocompleteIndex._terms.get(key)
+        if entry is None:
+            if listings <= 0:
+                return
+            entry = AutocompleteIndex._terms[key] = [text.strip(), 0, 0]
+            AutocompleteIndex._touch(key, link=True)
+        else:
+            AutocompleteIndex._touch(key)
+        entry[1] += listings
+        entry[2] = max(0, entry[2] + volume)
+        if entry[1] <= 0:
+            del AutocompleteIndex._terms[key]
+            AutocompleteIndex._touch(key, link=False)
+
+    @staticmethod
+    def _recompute():
+        """Rebuild the top lists of dirty nodes, deepest first (children are final before parents)"""
+        dirty = AutocompleteIndex._dirty
+        rank = AutocompleteIndex._rank
+        for node in sorted(dirty, key=dirty.get, reverse=True):
+            candidates = set(node.terms)
+            for child in node.children.values():
+                candidates.update(child.top)
+            node.top = tuple(heapq.nsmallest(AutocompleteIndex.TOP_K, candidates, key=rank))
+        dirty.clear()
+
+    # ============ CHANGE FEEDS ============
+
+    @staticmethod
+    def _reset():
+        AutocompleteIndex._root = TrieNode()
+        AutocompleteIndex._terms = {}
+        AutocompleteIndex._products = {}
+        AutocompleteIndex._vendors = {}
+        AutocompleteIndex._product_volume = Counter()
+        AutocompleteIndex._vendor_volume = Counter()
+        AutocompleteIndex._order_lines = deque()
+        AutocompleteIndex._seen_lines = set()
+        AutocompleteIndex._watermarks = {'products': None, 'vendors': None, 'orders': None}
+        AutocompleteIndex._dirty = {}
+
+    @staticmethod
+    def _apply_product(product_id, name, category, active):
+        old = AutocompleteIndex._products.get(product_id)
+        new = (name.strip(), category.strip()) if active and name and category else None
+        if product_id in AutocompleteIndex._products and old == new:
+            return False
+        volume = AutocompleteIndex._product_volume[product_id]
+        if old is not None:
+            AutocompleteIndex._adjust('product', old[0], -1, -volume)
+            AutocompleteIndex._adjust('category', old[1], -1, -volume)
+        if new is not None:
+            AutocompleteIndex._adjust('product', new[0], 1, volume)
+            AutocompleteIndex._adjust('category', new[1], 1, volume)
+        AutocompleteIndex._products[product_id] = new
+        return True
+
+    @staticmethod
+    def _apply_vendor(vendor_id, business_name, active):
+        old = AutocompleteIndex._vendors.get(vendor_id)
+        new = business_name.strip() if active and business_name else None
+        if vendor_id in AutocompleteIndex._vendors and old == new:
+            return False
+        volume = AutocompleteIndex._vendor_volume[vendor_id]
+        if old is not None:
+            AutocompleteIndex._adjust('vendor', old, -1, -volume)
+        if new is not None:
+            AutocompleteIndex._adjust('vendor', new, 1, volume)
+        AutocompleteIndex._vendors[vendor_id] = new
+        return True
+
+    @staticmethod
+    def _apply_order_line(product_id, vendor_id, lines):
+        """Count (lines=1) or expire (lines=-1) one order line"""
+        AutocompleteIndex._product_volume[product_id] += lines
+        AutocompleteIndex._vendor_volume[vendor_id] += lines
+        product = AutocompleteIndex._products.get(product_id)
+        if product is not None:
+            AutocompleteIndex._adjust('product', product[0], 0, lines)
+            AutocompleteIndex._adjust('category', product[1], 0, lines)
+        vendor = AutocompleteIndex._vendors.get(vendor_id)
+        if vendor is not None:
+            AutocompleteIndex._adjust('vendor', vendor, 0, lines)
+
+    @staticmethod
+    def _feed_lag():
+        """
+        How far before a watermark each feed re-reads: timestamps are stamped at flush, so a
+        row committed after a newer one was read sits below the watermark (applying is idempotent)
+        """
+        return timedelta(seconds=AutocompleteIndex._config('CHANGE_FEED_LAG_SECONDS', AutocompleteIndex.DEFAULT_FEED_LAG_SECONDS))
+
+    @staticmethod
+    def _feed(table, columns, watermark_name, where=None):
+        """Rows of table changed since the watermark, minus the feed lag"""
+        query = select(*columns, table.c.updated_at)
+        if where is not None:
+            query = query.where(where)
+        watermark = AutocompleteIndex._watermarks[watermark_name]
+        if watermark is not None:
+            query = query.where(table.c.updated_at >= watermark - AutocompleteIndex._feed_lag())
+        rows = db.session.execute(query).all()
+        for row in rows:
+            if row.updated_at is not None and (watermark is None or row.updated_at > watermark):
+                watermark = row.updated_at
+        AutocompleteIndex._watermarks[watermark_name] = watermark or datetime.utcnow()
+        return rows
+
+    @staticmethod
+    def _read_feeds():
+        products = Product.__table__
+        users = User.__table__
+        vendor_filter = users.c.user_type == 'vendor'
+
+        if AutocompleteIndex._root is not None:
+            # Hard deletes don't show up in the feeds; fall back to a rebuild
+            product_total = db.session.execute(select(func.count()).select_from(products)).scalar()
+            vendor_total = db.session.execute(select(func.count()).select_from(users).where(vendor_filter)).scalar()
+            if product_total < len(AutocompleteIndex._products) or vendor_total < len(AutocompleteIndex._vendors):
+                AutocompleteIndex._root = None
+
+        if AutocompleteIndex._root is None:
+            AutocompleteIndex._reset()
+            AutocompleteIndex._counters['builds'] += 1
+        else:
+            AutocompleteIndex._counters['refreshes'] += 1
+
+        changed = 0
+        for row in AutocompleteIndex._feed(users, (users.c.id, users.c.business_name, users.c.is_active),
+                                           'vendors', vendor_filter):
+            changed += AutocompleteIndex._apply_vendor(row.id, row.business_name, row.is_active is not False)
+        for row in AutocompleteIndex._feed(products, (products.c.id, products.c.product_name, products.c.category,
+                                                      products.c.is_active), 'products'):
+            changed += AutocompleteIndex._apply_product(row.id, row.product_name, row.category, row.is_active is not False)
+
+        # Order volume: new lines in, lines older than the window out
+        days = AutocompleteIndex._config('AUTOCOMPLETE_VOLUME_DAYS', AutocompleteIndex.DEFAULT_VOLUME_DAYS)
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        watermark = AutocompleteIndex._watermarks['orders']
+        since = max(cutoff, watermark - AutocompleteIndex._feed_lag() if watermark else cutoff)
+        orders, items = Order.__table__, OrderItem.__table__
+        lines = db.session.execute(
+            select(items.c.id, items.c.product_id, orders.c.seller_id, orders.c.created_at)
+            .join(orders, orders.c.id == items.c.order_id)
+            .where(orders.c.created_at >= since, orders.c.order_status != 'cancelled')
+            .order_by(orders.c.created_at, items.c.id)
+        ).all()
+        order_lines, seen = AutocompleteIndex._order_lines, AutocompleteIndex._seen_lines
+        for line in lines:
+            if line.id in seen:
+                continue
+            seen.add(line.id)
+            entry = (line.created_at, line.id, line.product_id, line.seller_id)
+            if order_lines and entry < order_lines[-1]:
+                bisect.insort(order_lines, entry)  # Committed late: keep oldest-first for expiry
+            else:
+                order_lines.append(entry)
+            AutocompleteIndex._apply_order_line(line.product_id, line.seller_id, 1)
+            watermark = max(watermark or since, line.created_at)
+            AutocompleteIndex._watermarks['orders'] = watermark
+            changed += 1
+        while order_lines and order_lines[0][0] < cutoff:
+            _, line_id, product_id, vendor_id = order_lines.popleft()
+            seen.discard(line_id)
+            AutocompleteIndex._apply_order_line(product_id, vendor_id, -1)
+            changed += 1
+
+        AutocompleteIndex._recompute()
+        AutocompleteIndex._counters['changes'] += changed
+        return changed
+
+    @staticmethod
+    def refresh(force=False):
+        """
+        Bring the trie up to date with products, vendors and recent orders
+
+        Runs at most every AUTOCOMPLETE_REFRESH_SECONDS unless force=True. Once the trie
+        exists, a caller that finds another thread refreshing returns straight away.
+
+        Returns:
+            Number of products, vendors and order lines applied
+        """
+        if AutocompleteIndex._pid != os.getpid():
+            with AutocompleteIndex._lock:
+                if AutocompleteIndex._pid != os.getpid():
+                    AutocompleteIndex._pid = os.getpid()
+                    AutocompleteIndex._root = None
+
+        interval = AutocompleteIndex._config('AUTOCOMPLETE_REFRESH_SECONDS', AutocompleteIndex.DEFAULT_REFRESH_SECONDS)
+        if not force and AutocompleteIndex._root is not None and \
+                time.monotonic() - AutocompleteIndex._checked_at < interval:
+            return 0
+
+        if not AutocompleteIndex._lock.acquire(blocking=force or AutocompleteIndex._root is None):
+            AutocompleteIndex._counters['skipped_refreshes'] += 1
+            return 0
+        try:
+            if not force and AutocompleteIndex._root is not None and \
+                    time.monotonic() - AutocompleteIndex._checked_at < interval:
+                return 0
+            AutocompleteIndex._checked_at = time.monotonic()
+            try:
+                return AutocompleteIndex._read_feeds()
+            except Exception as e:
+                logger.warning("Autocomplete refresh failed: %s", e)
+                if AutocompleteIndex._root is None:
+                    AutocompleteIndex._reset()
+                else:
+                    AutocompleteIndex._recompute()  # keep whatever feeds were read before the failure
+                return 0
+        finally:
+            AutocompleteIndex._lock.release()
+
+    @staticmethod
+    def reset():
+        """Forget the trie (the next lookup rebuilds it)"""
+        with AutocompleteIndex._lock:
+            AutocompleteIndex._root = None
+
+    # ============ LOOKUPS ============
+
+    @staticmethod
+    def complete(prefix, limit=8):
+        """
+        Best terms starting with prefix (at any word boundary)
+
+        Returns:
+            [{'text', 'type'}] best first, at most min(limit, TOP_K)
+        """
+        AutocompleteIndex.refresh()
+        AutocompleteIndex._counters['lookups'] += 1  # Unlocked on purpose: lookups never wait on a refresh
+        text = AutocompleteIndex.normalize(prefix)
+        node = AutocompleteIndex._root
+        if not text or node is None:
+            return []
+        for char in text[:AutocompleteIndex.MAX_PATH_CHARS]:
+            node = node.children.get(char)
+            if node is None:
+                return []
+
+        terms = AutocompleteIndex._terms
+        suggestions = []
+        for key in node.top:
+            entry = terms.get(key)
+            if entry is None:
+                continue
+            if len(text) > AutocompleteIndex.MAX_PATH_CHARS and not AutocompleteIndex._matches(key[1], text):
+                continue
+            suggestions.append({'text': entry[0], 'type': key[0]})
+            if len(suggestions) >= limit:
+                break
+        return suggestions
+
+    @staticmethod
+    def stats():
+        with AutocompleteIndex._lock:
+            stats = dict(AutocompleteIndex._counters)
+            if AutocompleteIndex._root is not None:
+                kinds = Counter(kind for kind, _ in AutocompleteIndex._terms)
+                stats['terms'] = {kind: kinds[kind] for kind in AutocompleteIndex.KINDS}
+                stats['order_lines'] = len(AutocompleteIndex._order_lines)
+                stats['watermarks'] = {name: value.isoformat() if value else None
+                                       for name, value in AutocompleteIndex._watermarks.items()}
+            return stats
@@ -0,0 +1,304 @@
+"""
+Batch Driver Assignment
+Assigns every paid, unassigned order in one go instead of one order per request
+
+Orders collected over a short window (DRIVER_BATCH_WINDOW_SECONDS) are matched to
+available drivers as a min-cost assignment:
+- cost of order -> driver = detour (km) off the driver's planned route (RouteIndex)
+- an edge only exists if the driver's free capacity
+  (vehicle_capacity_kg - current_load_kg) covers the order weight
+- a driver takes at most one order per trip (assigned drivers go 'on_delivery',
+  same as MockDriverService)
+
+The matching first maximises the number of orders assigned, then minimises the
+total detour - so the first order of the morning rush no longer grabs a truck
+that a later order needed more. Orders without a feasible driver stay pending
+for the next window. All assignments are written in one transaction.
+"""
+
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import text, bindparam, func
+from app import db
+from app.models import Order, OrderItem, OrderLocationDetail, DriverAssignment
+from app.driver_matching_service import DriverMatchingService
+from app.metrics import Metrics
+from app.stock_service import claim_rows
+
+logger = logging.getLogger(__name__)
+
+
+def min_cost_assignment(edges, rows, unassigned_cost):
+    """
+    Sparse rectangular min-cost assignment (shortest augmenting paths, as in LAPJV)
+
+    Every row is matched to one of its columns or left unassigned at unassigned_cost,
+    so unassigned_cost larger than any possible total means "assign as many rows as
+    possible, then minimise cost".
+
+    Args:
+        edges: dict of row -> list of (column, cost); rows and columns are positive ints, costs >= 0
+        rows: rows to match
+        unassigned_cost: cost of leaving a row unmatched
+
+    Returns:
+        dict of row -> column (unassigned rows are omitted)
+    """
+    row_potential = {}
+    col_potential = {}
+    row4col = {}
+    col4row = {}
+
+    def columns_of(row):
+        yield from edges.get(row, ())
+        yield -row, unassigned_cost  # the row's own "unassigned" column
+
+    for start in rows:
+        shortest = {}
+        path = {}
+        scanned = set()
+        visited_rows = [start]
+        heap = []
+        row, min_value, sink = start, 0.0, None
+
+        while sink is None:
+            u = row_potential.get(row, 0.0)
+            for col, cost in columns_of(row):
+                if col in scanned:
+                    continue
+                reduced = min_value + cost - u - col_potential.get(col, 0.0)
+                if reduced < shortest.get(col, float('inf')):
+                    shortest[col] = reduced
+                    path[col] = row
+                    heapq.heappush(heap, (reduced, col))
+
+            while True:
+                min_value, col = heapq.heappop(heap)
+                if col not in scanned and shortest[col] == min_value:
+                    break
+            if col not in row4col:
+                sink = col
+            else:
+                scanned.add(col)
+                row = row4col[col]
+                visited_rows.append(row)
+
+        # Update potentials (keeps every reduced cost >= 0)
+        row_potential[start] = row_potential.get(start, 0.0) + min_value
+        for row in visited_rows[1:]:
+            row_potential[row] = row_potential.get(row, 0.0) + min_value - shortest[col4row[row]]
+        for col in scanned:
+            col_potential[col] = col_potential.get(col, 0.0) - (min_value - shortest[col])
+
+        # Augment along the path back to the start row
+        col = sink
+        while True:
+            row = path[col]
+            row4col[col] = row
+            col4row[row], col = col, col4row.get(row)
+            if row == start:
+                break
+
+    return {row: col for row, col in col4row.items() if col > 0}
+
+
+class BatchAssignmentService:
+    """
+    Window-based global driver assignment
+    """
+
+    # Route candidates considered per order (closest detours first)
+    CANDIDATES_PER_ORDER = 25
+    # Leaving an order unassigned costs more than any set of detours
+    UNASSIGNED_COST = 1e7
+    # MOCK ETA: base handling time + driving time for the detour
+    BASE_ETA_MINUTES = 45
+    MINUTES_PER_DETOUR_KM = 3
+
+    # Shared with ConsolidationService (the tolerance absorbs float sums of multi-stop loads)
+    CLAIM_ORDER_SQL = text("""
+        UPDATE orders
+        SET assigned_driver_id = :driver_id, order_status = 'driver_assigned'
+        WHERE id = :order_id AND order_status = 'payment_confirmed' AND assigned_driver_id IS NULL
+    """)
+
+    CLAIM_DRIVER_SQL = text("""
+        UPDATE drivers
+        SET status = 'on_delivery', current_load_kg = COALESCE(current_load_kg, 0) + :weight
+        WHERE id = :driver_id AND status = 'available'
+          AND vehicle_capacity_kg - COALESCE(current_load_kg, 0) >= :weight - 0.000001
+    """)
+
+    @staticmethod
+    def pending_orders(limit=None):
+        """
+        Paid orders waiting for a driver, with weight and delivery point
+
+        Returns:
+            list of (order_id, lat, lng, weight_kg), oldest first
+        """
+        from app.location_service import LocationBasedAssignmentService
+
+        query = db.session.query(
+            Order.id, Order.delivery_address,
+            OrderLocationDetail.retailer_lat, OrderLocationDetail.retailer_lng,
+            func.coalesce(func.sum(OrderItem.quantity), 0)
+        ).outerjoin(OrderItem, OrderItem.order_id == Order.id) \
+         .outerjoin(OrderLocationDetail, OrderLocationDetail.order_id == Order.id) \
+         .filter(
+            Order.payment_status == 'paid',
+            Order.order_status == 'payment_confirmed',
+            Order.assigned_driver_id.is_(None)
+        ).group_by(Order.id, Order.delivery_address, OrderLocationDetail.retailer_lat, OrderLocationDetail.retailer_lng) \
+         .order_by(Order.created_at, Order.id)
+        if limit:
+            query = query.limit(limit)
+
+        pending = []
+        for order_id, address, lat, lng, weight in query.all():
+            try:
+                lat, lng = float(lat), float(lng)
+            except (TypeError, ValueError):
+                lat, lng = LocationBasedAssignmentService.get_location_coordinates(address)
+            pending.append((order_id, lat, lng, float(weight)))
+        return pending
+
+    @staticmethod
+    def solve(pending, index):
+        """
+        Min-cost assignment of pending orders to indexed routes
+
+        Returns:
+            list of dicts (order_id, driver_id, route_id, weight_kg, detour_km), in order id order
+        """
+        weights = {}
+        edges = {}
+        candidate_info = {}
+        for order_id, lat, lng, weight in pending:
+            weights[order_id] = weight
+            matches = index.match(lat, lng, weight_kg=weight,
+                                  radius_km=DriverMatchingService.SEARCH_RADIUS_KM,
+                                  limit=BatchAssignmentService.CANDIDATES_PER_ORDER)
+            # A driver with several routes is one column; keep its best route
+            best = {}
+            for match in matches:
+                if match['driver_id'] not in best:
+                    best[match['driver_id']] = match
+            edges[order_id] = [(driver_id, match['detour_km']) for driver_id, match in best.items()]
+            candidate_info[order_id] = best
+
+        matched = min_cost_assignment(edges, [p[0] for p in pending], BatchAssignmentService.UNASSIGNED_COST)
+
+        return [
+            {
+                'order_id': order_id,
+                'driver_id': driver_id,
+                'route_id': candidate_info[order_id][driver_id]['route_id'],
+                'weight_kg': weights[order_id],
+                'detour_km': candidate_info[order_id][driver_id]['detour_km']
+            }
+            for order_id, driver_id in sorted(matched.items())
+        ]
+
+    @staticmethod
+    def run(limit=None):
+        """
+        Assign all pending orders in one transaction (commits)
+
+        Returns:
+            dict with pending / assigned counts and total detour km
+        """
+        start = time.perf_counter()
+        result = BatchAssignmentService._run(limit)
+        outcome = 'error' if 'error' in result else 'assigned' if result['assigned'] else \
+            'no_match' if result['pending'] else 'none_pending'
+        Metrics.DRIVER_ASSIGNMENT_SECONDS.observe(time.perf_counter() - start, mode='batch', outcome=outcome)
+        Metrics.DRIVER_ASSIGNMENTS.inc(result['assigned'], mode='batch')
+        return result
+
+    @staticmethod
+    def _run(limit):
+        try:
+            pending = BatchAssignmentService.pending_orders(limit=limit)
+            if not pending:
+                return {'pending': 0, 'assigned': 0, 'total_detour_km': 0}
+
+            index = DriverMatchingService.build_index()
+            assignments = BatchAssignmentService.solve(pending, index)
+            if not assignments:
+                return {'pending': len(pending), 'assigned': 0, 'total_detour_km': 0}
+
+            BatchAssignmentService._write(assignments)
+            db.session.commit()
+
+            total_detour = round(sum(a['detour_km'] for a in assignments), 2)
+            logger.info("Batch assignment: %d/%d orders assigned, %s km total detour",
+                        len(assignments), len(pending), total_detour)
+            return {'pending': len(pending), 'assigned': len(assignments), 'total_detour_km': total_detour}
+
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Batch assignment error: %s", e)
+            return {'pending': 0, 'assigned': 0, 'total_detour_km': 0, 'error': str(e)}
+
+    @staticmethod
+    def claim(order_rows, driver_rows):
+        """
+        Take orders and drivers only if nobody changed them since they were read (no commit)
+
+        Args:
+            order_rows: dicts with order_id, driver_id
+            driver_rows: dicts with driver_id, weight (one per driver)
+
+        Returns:
+            True if every order and driver was claimed; the caller must not write
+            assignments (and should roll back) otherwise
+        """
+        return (claim_rows(BatchAssignmentService.CLAIM_ORDER_SQL, order_rows)
+                and claim_rows(BatchAssignmentService.CLAIM_DRIVER_SQL, driver_rows))
+
+    @staticmethod
+    def _write(assignments):
+        """Claim orders and drivers with conditional UPDATEs and insert assignments (no commit)"""
+        order_rows = [{'order_id': a['order_id'], 'driver_id': a['driver_id']} for a in assignments]
+        driver_rows = [{'driver_id': a['driver_id'], 'weight': a['weight_kg']} for a in assignments]
+
+        if not BatchAssignmentService.claim(order_rows, driver_rows):
+            raise RuntimeError('orders or drivers changed during assignment, retry next window')
+
+        locations = {
+            row.id: row
+            for row in db.session.execute(text("""
+                SELECT o.id, u.address AS pickup, o.delivery_address AS delivery
+                FROM orders o JOIN users u ON u.id = o.seller_id
+                WHERE o.id IN :order_ids
+            """).bindparams(bindparam('order_ids', expanding=True)), {
+                'order_ids': [a['order_id'] for a in assignments]
+            })
+        }
+
+        now = datetime.utcnow()
+        db.session.execute(DriverAssignment.__table__.insert(), [
+            {
+                'order_id': a['order_id'],
+                'driver_id': a['driver_id'],
+                'assignment_status': 'assigned',
+                'assigned_at': now,
+                'pickup_location': locations[a['order_id']].pickup,
+                'delivery_location': locations[a['order_id']].delivery,
+                'weight_assigned_kg': a['weight_kg'],
+                'estimated_delivery_time': now + timedelta(minutes=(
+                    BatchAssignmentService.BASE_ETA_MINUTES
+                    + a['detour_km'] * BatchAssignmentService.MINUTES_PER_DETOUR_KM
+                ))
+            }
+            for a in assignments
+        ])
+
+    @staticmethod
+    def is_enabled():
+        """True when payments should leave driver assignment to the batch job"""
+        return current_app.config.get('DRIVER_ASSIGNMENT_MODE', 'immediate') == 'batch'
@@ -0,0 +1,244 @@
+"""
+Product Browse Service
+Keyset (cursor) pagination over active products for the retailer browse page and API
+
+Pages are fetched with "WHERE (sort_key, id) < (:last_key, :last_id) ... LIMIT n",
+so every page costs the same no matter how deep the retailer scrolls, and a
+worker never holds more than one page of rows in memory.
+"""
+
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import text
+from flask import current_app
+from app.database import DatabaseRouting
+from app.search_service import ProductSearchService
+
+
+class BrowseVendor:
+    """Lightweight vendor row for browse listings"""
+    __slots__ = ('id', 'name', 'email', 'average_rating', 'total_reviews')
+
+    def __init__(self, id, name, email, average_rating, total_reviews):
+        self.id = id
+        self.name = name
+        self.email = email
+        self.average_rating = average_rating
+        self.total_reviews = total_reviews
+
+
+class BrowseProduct:
+    """Lightweight product row for browse listings (same attribute names as Product)"""
+    __slots__ = (
+        'id', 'product_name', 'category', 'price', 'quantity', 'unit', 'vendor_id',
+        'image_filename', 'moq_enabled', 'minimum_quantity', 'freshness_level',
+        'quality_tier', 'certification', 'stock_quantity', 'is_active', 'vendor'
+    )
+
+    def __init__(self, row):
+        self.id = row.id
+        self.product_name = row.product_name
+        self.category = row.category
+        self.price = row.price
+        self.quantity = row.quantity
+        self.unit = row.unit
+        self.vendor_id = row.vendor_id
+        self.image_filename = row.image_filename
+        self.moq_enabled = row.moq_enabled or False
+        self.minimum_quantity = row.minimum_quantity or 1
+        self.freshness_level = row.freshness_level or 'TODAY'
+        self.quality_tier = row.quality_tier or 'GOOD'
+        self.certification = row.certification
+        self.stock_quantity = row.quantity  # Browse shows live quantity as stock
+        self.is_active = True
+        self.vendor = BrowseVendor(
+            id=row.vendor_id,
+            name=row.vendor_name or 'Unknown Vendor',
+            email=row.vendor_email or '',
+            average_rating=row.average_rating or 0.0,
+            total_reviews=row.total_reviews or 0
+        )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.product_name,
+            'category': self.category,
+            'price': self.price,
+            'quantity': self.quantity,
+            'unit': self.unit,
+            'image_filename': self.image_filename,
+            'moq_enabled': self.moq_enabled,
+            'minimum_quantity': self.minimum_quantity,
+            'freshness_level': self.freshness_level,
+            'quality_tier': self.quality_tier,
+            'certification': self.certification,
+            'vendor': {
+                'id': self.vendor.id,
+                'name': self.vendor.name,
+                'average_rating': self.vendor.average_rating,
+                'total_reviews': self.vendor.total_reviews
+            }
+        }
+
+
+class ProductBrowseService:
+    """
+    Cursor-paginated product listing with category / price / freshness / quality filters
+    """
+
+    # sort name -> (SQL sort key, direction)
+    SORTS = {
+        'newest': ('p.created_at', 'DESC'),
+        'price_low': ('p.price', 'ASC'),
+        'price_high': ('p.price', 'DESC'),
+        'relevance': (None, 'ASC'),  # search rank; only used with a search term
+    }
+    DEFAULT_SORT = 'newest'
+    MAX_PAGE_SIZE = 100
+
+    FRESHNESS_LEVELS = ('TODAY', 'YESTERDAY', '2DAYS', '3DAYS')
+    QUALITY_TIERS = ('PREMIUM', 'GOOD', 'BUDGET')
+
+    @staticmethod
+    def encode_cursor(sort, sort_value, product_id):
+        """Opaque URL-safe cursor for the last row of a page"""
+        if isinstance(sort_value, datetime):
+            sort_value = sort_value.isoformat(sep=' ')
+        payload = json.dumps([sort, sort_value, product_id], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """
+        Returns:
+            (sort, sort_value, product_id)
+
+        Raises:
+            ValueError if the cursor is malformed
+        """
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            sort, sort_value, product_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return sort, sort_value, int(product_id)
+        except Exception:
+            raise ValueError('Invalid cursor')
+
+    @staticmethod
+    def fetch_page(category=None, search=None, min_price=None, max_price=None,
+                   freshness=None, quality=None, sort=None, cursor=None, limit=None):
+        """
+        Fetch one page of active products
+
+        Args:
+            category, search, min_price, max_price, freshness, quality: optional filters
+            sort: 'newest', 'price_low', 'price_high' or 'relevance' (search only)
+            cursor: next_cursor from the previous page, or None for the first page
+            limit: page size (defaults to ITEMS_PER_PAGE, capped at MAX_PAGE_SIZE)
+
+        Returns:
+            (products, next_cursor) - next_cursor is None on the last page
+
+        Raises:
+            ValueError for an invalid cursor
+        """
+        if limit is None:
+            limit = current_app.config.get('ITEMS_PER_PAGE', 20)
+        limit = max(1, min(int(limit), ProductBrowseService.MAX_PAGE_SIZE))
+
+        search_sql = ProductSearchService.sql_fragments(search, alias='p') if search else None
+
+        if sort not in ProductBrowseService.SORTS:
+            sort = 'relevance' if search_sql else ProductBrowseService.DEFAULT_SORT
+        if sort == 'relevance' and not (search_sql and search_sql['rank']):
+            sort = ProductBrowseService.DEFAULT_SORT
+
+        sort_key, direction = ProductBrowseService.SORTS[sort]
+        if sort == 'relevance':
+            sort_key = search_sql['rank']
+
+        sql = f"""
+            SELECT
+                p.id,
+                p.product_name,
+                p.category,
+                p.price,
+                p.quantity,
+                p.unit,
+                p.vendor_id,
+                p.image_filename,
+                p.moq_enabled,
+                p.minimum_quantity,
+                p.freshness_level,
+                p.quality_tier,
+                p.certification,
+                u.name AS vendor_name,
+                u.email AS vendor_email,
+                u.average_rating,
+                u.total_reviews,
+                {sort_key} AS sort_value
+            FROM products p
+            LEFT JOIN users u ON p.vendor_id = u.id
+        """
+        params = {'limit': limit + 1}
+
+        if search_sql:
+            sql += search_sql['join']
+
+        sql += " WHERE p.is_active = true"
+
+        if category:
+            sql += " AND p.category = :category"
+            params['category'] = category
+
+        if min_price is not None:
+            sql += " AND p.price >= :min_price"
+            params['min_price'] = min_price
+
+        if max_price is not None:
+            sql += " AND p.price <= :max_price"
+            params['max_price'] = max_price
+
+        if freshness:
+            sql += " AND p.freshness_level = :freshness"
+            params['freshness'] = freshness
+
+        if quality:
+            sql += " AND p.quality_tier = :quality"
+            params['quality'] = quality
+
+        if search_sql:
+            sql += search_sql['where']
+            params.update(search_sql['params'])
+
+        if cursor:
+            cursor_sort, cursor_value, cursor_id = ProductBrowseService.decode_cursor(cursor)
+            if cursor_sort != sort:
+                raise ValueError('Cursor does not match sort order')
+            operator = '<' if direction == 'DESC' else '>'
+            sql += f" AND ({sort_key}, p.id) {operator} (:cursor_value, :cursor_id)"
+            params['cursor_value'] = cursor_value
+            params['cursor_id'] = cursor_id
+
+        sql += f" ORDER BY {sort_key} {direction}, p.id {direction} LIMIT :limit"
+
+        with DatabaseRouting.read_engine().connect() as conn:
+            rows = conn.execute(text(sql), params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = ProductBrowseService.encode_cursor(sort, last.sort_value, last.id)
+
+        return [BrowseProduct(row) for row in rows], next_cursor
+
+    @staticmethod
+    def get_categories():
+        """Distinct categories of active products"""
+        with DatabaseRouting.read_engine().connect() as conn:
+            result = conn.execute(text(
+                "SELECT DISTINCT category FROM products WHERE is_active = true ORDER BY category"
+            ))
+            return [row[0] for row in result]
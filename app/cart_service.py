@@ -0,0 +1,328 @@
+"""
+Cart Service
+Server-side retailer carts stored in the database
+
+Cart lines live in cart_items and the cart row keeps running totals, so:
+- the cart badge reads one row (or the optional cache)
+- the cart page and checkout load every line with its product in one query
+- code that changes product prices calls CartService.reprice() so the running totals
+  (priced at cart_items.unit_price) follow the live price the cart page shows
+"""
+
+import json
+import logging
+import threading
+import time
+from flask import current_app
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Cart, CartItem, Product
+
+logger = logging.getLogger(__name__)
+
+
+class LocalCartCache:
+    """
+    In-process cache with the same get/set/delete calls as a Redis client
+    Only safe for single-worker deployments (other workers won't see invalidations)
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if not entry:
+                return None
+            value, expires_at = entry
+            if expires_at and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class CartService:
+    """
+    Retailer cart operations (all totals maintained incrementally)
+    """
+
+    SUMMARY_TTL = 300  # seconds
+    _cache = None
+    _cache_url = None
+
+    # ============ CACHE ============
+
+    @staticmethod
+    def _get_cache():
+        """
+        Cache selected by CART_CACHE_URL:
+        unset -> no cache, 'memory://' -> LocalCartCache, 'redis://...' -> Redis (if installed)
+        """
+        url = current_app.config.get('CART_CACHE_URL')
+        if url != CartService._cache_url:
+            CartService._cache_url = url
+            CartService._cache = None
+            if url == 'memory://':
+                CartService._cache = LocalCartCache()
+            elif url:
+                try:
+                    import redis
+                    CartService._cache = redis.Redis.from_url(url)
+                    logger.info("Cart cache: %s", url.split('@')[-1])
+                except ImportError:
+                    logger.warning("CART_CACHE_URL is set but the redis package is not installed - cart cache disabled")
+        return CartService._cache
+
+    @staticmethod
+    def _cache_key(retailer_id):
+        return f'cart:summary:{retailer_id}'
+
+    @staticmethod
+    def _invalidate(retailer_id):
+        cache = CartService._get_cache()
+        if cache is not None:
+            try:
+                cache.delete(CartService._cache_key(retailer_id))
+            except Exception as e:
+                logger.warning("Cart cache delete failed: %s", e)
+
+    # ============ READS ============
+
+    @staticmethod
+    def get_summary(retailer_id):
+        """
+        Returns:
+            dict with item_count, total_quantity, total_amount
+        """
+        cache = CartService._get_cache()
+        key = CartService._cache_key(retailer_id)
+
+        if cache is not None:
+            try:
+                cached = cache.get(key)
+                if cached:
+                    return json.loads(cached)
+            except Exception as e:
+                logger.warning("Cart cache read failed: %s", e)
+
+        row = db.session.query(
+            Cart.item_count, Cart.total_quantity, Cart.total_amount
+        ).filter(Cart.retailer_id == retailer_id).first()
+
+        summary = {
+            'item_count': row.item_count if row else 0,
+            'total_quantity': row.total_quantity if row else 0,
+            'total_amount': round(row.total_amount, 2) if row else 0
+        }
+
+        if cache is not None:
+            try:
+                cache.set(key, json.dumps(summary), ex=CartService.SUMMARY_TTL)
+            except Exception as e:
+                logger.warning("Cart cache write failed: %s", e)
+
+        return summary
+
+    @staticmethod
+    def get_lines(retailer_id):
+        """
+        Load every cart line with its product in a single query
+
+        Returns:
+            (lines, total_amount) - lines are dicts with product, quantity, amount
+            priced at the current product price
+        """
+        rows = db.session.query(CartItem, Product).join(
+            Cart, CartItem.cart_id == Cart.id
+        ).join(
+            Product, CartItem.product_id == Product.id
+        ).filter(
+            Cart.retailer_id == retailer_id
+        ).order_by(CartItem.added_at, CartItem.id).all()
+
+        lines = []
+        total_amount = 0
+        for item, product in rows:
+            amount = product.price * item.quantity
+            total_amount += amount
+            lines.append({
+                'product': product,
+                'quantity': item.quantity,
+                'amount': amount
+            })
+
+        return lines, total_amount
+
+    # ============ WRITES ============
+
+    @staticmethod
+    def _get_or_create_cart(retailer_id):
+        cart = Cart.query.filter_by(retailer_id=retailer_id).first()
+        if not cart:
+            cart = Cart(retailer_id=retailer_id, item_count=0, total_quantity=0, total_amount=0)
+            db.session.add(cart)
+            db.session.flush()
+        return cart
+
+    @staticmethod
+    def _adjust_totals(cart_id, lines=0, quantity=0, amount=0):
+        """Apply a delta to the running totals in SQL (safe under concurrent updates)"""
+        Cart.query.filter_by(id=cart_id).update({
+            Cart.item_count: Cart.item_count + lines,
+            Cart.total_quantity: Cart.total_quantity + quantity,
+            Cart.total_amount: Cart.total_amount + amount
+        }, synchronize_session=False)
+
+    @staticmethod
+    def set_item(retailer_id, product, quantity):
+        """
+        Set the quantity of a product in the cart (adds the line if missing)
+
+        Two concurrent first adds both miss the cart / line and insert it: the loser hits
+        the unique constraint, rolls back and retries once, finding the winner's row.
+        """
+        for attempt in range(2):
+            try:
+                CartService._apply_item(retailer_id, product, quantity)
+                db.session.commit()
+                break
+            except IntegrityError:
+                db.session.rollback()
+                if attempt:
+                    raise
+                logger.info("Cart %s: concurrent add of product %s, retrying", retailer_id, product.id)
+        CartService._invalidate(retailer_id)
+
+    @staticmethod
+    def _apply_item(retailer_id, product, quantity):
+        cart = CartService._get_or_create_cart(retailer_id)
+        item = CartItem.query.filter_by(cart_id=cart.id, product_id=product.id).first()
+
+        if item:
+            CartService._adjust_totals(
+                cart.id,
+                quantity=quantity - item.quantity,
+                amount=quantity * product.price - item.quantity * item.unit_price
+            )
+            item.quantity = quantity
+            item.unit_price = product.price
+        else:
+            db.session.add(CartItem(
+                cart_id=cart.id,
+                product_id=product.id,
+                quantity=quantity,
+                unit_price=product.price
+            ))
+            CartService._adjust_totals(cart.id, lines=1, quantity=quantity, amount=quantity * product.price)
+
+    @staticmethod
+    def remove_item(retailer_id, product_id):
+        """Remove one product from the cart"""
+        item = CartItem.query.join(Cart).filter(
+            Cart.retailer_id == retailer_id,
+            CartItem.product_id == product_id
+        ).first()
+        if not item:
+            return False
+
+        CartService._adjust_totals(
+            item.cart_id, lines=-1, quantity=-item.quantity, amount=-item.quantity * item.unit_price
+        )
+        db.session.delete(item)
+        db.session.commit()
+        CartService._invalidate(retailer_id)
+        return True
+
+    @staticmethod
+    def clear(retailer_id, commit=True):
+        """
+        Empty the cart
+
+        Args:
+            commit: pass False to clear inside a larger transaction (e.g. checkout)
+        """
+        cart_id = db.session.query(Cart.id).filter(Cart.retailer_id == retailer_id).scalar()
+        if cart_id:
+            CartItem.query.filter_by(cart_id=cart_id).delete(synchronize_session=False)
+            Cart.query.filter_by(id=cart_id).update({
+                Cart.item_count: 0,
+                Cart.total_quantity: 0,
+                Cart.total_amount: 0
+            }, synchronize_session=False)
+        if commit:
+            db.session.commit()
+        CartService._invalidate(retailer_id)
+
+    @staticmethod
+    def reprice(product_ids=None):
+        """
+        Bring carts up to date after product prices changed (bulk SQL or ORM)
+
+        Lines whose unit_price differs from the live price get the live price and their
+        cart's total_amount is recomputed from its lines, so the badge matches the cart page.
+
+        Args:
+            product_ids: only look at these products (default: every cart line)
+
+        Returns:
+            number of carts repriced
+        """
+        carts, items, products = Cart.__table__, CartItem.__table__, Product.__table__
+        live_price = select(products.c.price).where(products.c.id == items.c.product_id).scalar_subquery()
+
+        stale = select(items.c.cart_id).join(
+            products, products.c.id == items.c.product_id
+        ).where(items.c.unit_price != products.c.price)
+        if product_ids is not None:
+            stale = stale.where(items.c.product_id.in_(list(product_ids)))
+
+        retailer_ids = db.session.execute(
+            select(carts.c.retailer_id).where(carts.c.id.in_(stale))
+        ).scalars().all()
+        if not retailer_ids:
+            return 0
+
+        line_total = select(
+            func.coalesce(func.sum(items.c.quantity * products.c.price), 0)
+        ).select_from(
+            items.join(products, products.c.id == items.c.product_id)
+        ).where(items.c.cart_id == carts.c.id).scalar_subquery()
+
+        db.session.execute(
+            carts.update().where(carts.c.id.in_(stale)).values(total_amount=line_total)
+        )
+        db.session.execute(
+            items.update().where(
+                items.c.cart_id.in_(select(carts.c.id).where(carts.c.retailer_id.in_(retailer_ids))),
+                items.c.unit_price != live_price
+            ).values(unit_price=live_price)
+        )
+        db.session.commit()
+
+        for retailer_id in retailer_ids:
+            CartService._invalidate(retailer_id)
+        logger.info("Repriced %s carts", len(retailer_ids))
+        return len(retailer_ids)
+
+    @staticmethod
+    def import_session_cart(retailer_id, session_cart):
+        """Move a legacy cookie cart ({product_id: quantity}) into the database"""
+        if not session_cart:
+            return
+
+        products = Product.query.filter(
+            Product.id.in_([int(pid) for pid in session_cart])
+        ).all()
+        for product in products:
+            CartService.set_item(retailer_id, product, float(session_cart[str(product.id)]))
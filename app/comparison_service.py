@@ -4,11 +4,14 @@ Handles vendor differentiation, comparison logic, and personalized recommendatio
 """
 
 from app import db
+from app.search_service import ProductSearchService
+from app.fuzzy_index import ProductNameIndex
 from app.models import (
     Product, User, Order, VendorRatingsCache, 
     VendorDeliveryMetrics, ProductComparison, ProductReview
 )
 from sqlalchemy import func, or_
+from sqlalchemy.orm import joinedload
 from datetime import datetime, date, timedelta
 from enum import Enum
 import json
@@ -39,31 +42,62 @@ class ProductComparisonService:
             sort_by: 'price', 'rating', 'delivery_time', or 'value'
             
         Returns:
-            List of vendor data with full comparison details
+            List of vendor data with full comparison details; corrected_query is set
+            when the name only matched after spelling correction ("tomatos" -> "tomato")
         """
-        # Base query: find all active products matching name
-        query = Product.query.filter(
-            Product.product_name.ilike(f'%{product_name}%'),
-            Product.is_active == True,
-            Product.stock_quantity > 0
-        )
-        
-        # Apply filters if provided
-        if filters:
-            if 'min_price' in filters and filters['min_price']:
-                query = query.filter(Product.price >= filters['min_price'])
-            if 'max_price' in filters and filters['max_price']:
-                query = query.filter(Product.price <= filters['max_price'])
-            if 'max_delivery_time' in filters and filters['max_delivery_time']:
-                # Will filter after joining with delivery metrics
-                pass
-        
-        products = query.all()
+        # Base query: find all active products matching name (full-text index)
+        def matching(name):
+            query = ProductSearchService.apply(
+                Product.query.filter(
+                    Product.is_active == True,
+                    Product.stock_quantity > 0
+                ),
+                name,
+                order_by_rank=False  # vendors are sorted by sort_by below
+            )
+            
+            # Apply filters if provided
+            if filters:
+                if 'min_price' in filters and filters['min_price']:
+                    query = query.filter(Product.price >= filters['min_price'])
+                if 'max_price' in filters and filters['max_price']:
+                    query = query.filter(Product.price <= filters['max_price'])
+                if 'max_delivery_time' in filters and filters['max_delivery_time']:
+                    # Will filter after joining with delivery metrics
+                    pass
+            return query
+        
+        # Make sure every vendor in the result set has cached stats before loading
+        # ORM objects, so the commit for missing defaults can't expire them
+        query = matching(product_name)
+        vendor_ids = [row[0] for row in query.with_entities(Product.vendor_id).distinct().all()]
+        
+        # Nothing found: retry once with speech-to-text / typing errors corrected
+        corrected_query = None
+        if not vendor_ids:
+            corrected = ProductNameIndex.correct(product_name)
+            if corrected != product_name:
+                query = matching(corrected)
+                vendor_ids = [row[0] for row in query.with_entities(Product.vendor_id).distinct().all()]
+                corrected_query = corrected if vendor_ids else None
+        
+        ProductComparisonService._ensure_vendor_stats(vendor_ids)
+        
+        products = query.options(joinedload(Product.vendor)).all()
+        
+        # Load ratings, delivery metrics and recent reviews for all vendors at once
+        ratings_by_vendor, metrics_by_vendor, reviews_by_vendor = \
+            ProductComparisonService._load_vendor_context(vendor_ids)
         
         # Build vendor comparison data
         vendors_data = []
         for product in products:
-            vendor_data = ProductComparisonService._build_vendor_data(product)
+            vendor_data = ProductComparisonService._build_vendor_data(
+                product,
+                ratings_cache=ratings_by_vendor.get(product.vendor_id),
+                delivery_metrics=metrics_by_vendor.get(product.vendor_id),
+                recent_reviews=reviews_by_vendor.get(product.vendor_id, [])
+            )
             
             # Apply rating filter if specified
             if filters and 'min_rating' in filters and filters['min_rating']:
@@ -82,30 +116,108 @@ class ProductComparisonService:
         
         return {
             'product_name': product_name,
+            'corrected_query': corrected_query,
+            'suggestions': ProductNameIndex.suggest(product_name) if not vendors_data else [],
             'vendor_count': len(vendors_data),
             'vendors': vendors_data
         }
     
     @staticmethod
-    def _build_vendor_data(product):
-        """Build comprehensive vendor data for comparison"""
+    def _ensure_vendor_stats(vendor_ids):
+        """
+        Create default ratings cache / delivery metrics rows for vendors missing them
+        Only vendor ids are selected, so the commit doesn't expire loaded objects
+        """
+        if not vendor_ids:
+            return
+        
+        have_ratings = {row[0] for row in db.session.query(VendorRatingsCache.vendor_id).filter(
+            VendorRatingsCache.vendor_id.in_(vendor_ids)
+        ).all()}
+        have_metrics = {row[0] for row in db.session.query(VendorDeliveryMetrics.vendor_id).filter(
+            VendorDeliveryMetrics.vendor_id.in_(vendor_ids)
+        ).all()}
+        
+        missing_ratings = [v for v in vendor_ids if v not in have_ratings]
+        missing_metrics = [v for v in vendor_ids if v not in have_metrics]
+        
+        if not missing_ratings and not missing_metrics:
+            return
+        
+        db.session.add_all([ProductComparisonService._default_ratings_cache(v) for v in missing_ratings])
+        db.session.add_all([ProductComparisonService._default_delivery_metrics(v) for v in missing_metrics])
+        db.session.commit()
+    
+    @staticmethod
+    def _load_vendor_context(vendor_ids, review_limit=3):
+        """
+        Batch-load comparison context for many vendors in a constant number of queries
+        
+        Returns:
+            (ratings_by_vendor, metrics_by_vendor, reviews_by_vendor) dicts keyed by vendor_id;
+            reviews are the latest `review_limit` per vendor, newest first
+        """
+        if not vendor_ids:
+            return {}, {}, {}
+        
+        ratings_by_vendor = {
+            cache.vendor_id: cache
+            for cache in VendorRatingsCache.query.filter(VendorRatingsCache.vendor_id.in_(vendor_ids)).all()
+        }
+        metrics_by_vendor = {
+            metrics.vendor_id: metrics
+            for metrics in VendorDeliveryMetrics.query.filter(VendorDeliveryMetrics.vendor_id.in_(vendor_ids)).all()
+        }
+        
+        # Latest N reviews per vendor using a window function (Postgres and SQLite >= 3.25)
+        ranked = db.session.query(
+            ProductReview.id.label('review_id'),
+            func.row_number().over(
+                partition_by=ProductReview.vendor_id,
+                order_by=ProductReview.created_at.desc()
+            ).label('rank')
+        ).filter(ProductReview.vendor_id.in_(vendor_ids)).subquery()
+        
+        recent_reviews = ProductReview.query.join(
+            ranked, ProductReview.id == ranked.c.review_id
+        ).filter(
+            ranked.c.rank <= review_limit
+        ).order_by(ProductReview.vendor_id, ranked.c.rank).all()
+        
+        reviews_by_vendor = {}
+        for review in recent_reviews:
+            reviews_by_vendor.setdefault(review.vendor_id, []).append(review)
+        
+        return ratings_by_vendor, metrics_by_vendor, reviews_by_vendor
+    
+    @staticmethod
+    def _build_vendor_data(product, ratings_cache=None, delivery_metrics=None, recent_reviews=None):
+        """
+        Build comprehensive vendor data for comparison
+        
+        Pre-loaded ratings_cache, delivery_metrics and recent_reviews (see _load_vendor_context)
+        are used when given; anything missing is fetched for this vendor alone.
+        """
         vendor = product.vendor
         
         # Get cached ratings
-        ratings_cache = VendorRatingsCache.query.filter_by(vendor_id=vendor.id).first()
+        if ratings_cache is None:
+            ratings_cache = VendorRatingsCache.query.filter_by(vendor_id=vendor.id).first()
         if not ratings_cache:
             # Create default cache if doesn't exist
             ratings_cache = ProductComparisonService._create_default_ratings_cache(vendor.id)
         
         # Get delivery metrics
-        delivery_metrics = VendorDeliveryMetrics.query.filter_by(vendor_id=vendor.id).first()
+        if delivery_metrics is None:
+            delivery_metrics = VendorDeliveryMetrics.query.filter_by(vendor_id=vendor.id).first()
         if not delivery_metrics:
             delivery_metrics = ProductComparisonService._create_default_delivery_metrics(vendor.id)
         
         # Get recent reviews
-        recent_reviews = ProductReview.query.filter_by(
-            vendor_id=vendor.id
-        ).order_by(ProductReview.created_at.desc()).limit(3).all()
+        if recent_reviews is None:
+            recent_reviews = ProductReview.query.filter_by(
+                vendor_id=vendor.id
+            ).order_by(ProductReview.created_at.desc()).limit(3).all()
         
         reviews_data = [{
             'rating': (review.rating_quality + review.rating_delay + review.rating_communication) / 3,
@@ -545,9 +657,9 @@ class ProductComparisonService:
         }
     
     @staticmethod
-    def _create_default_ratings_cache(vendor_id):
-        """Create default ratings cache for new vendor"""
-        cache = VendorRatingsCache(
+    def _default_ratings_cache(vendor_id):
+        """Build (unsaved) default ratings cache for new vendor"""
+        return VendorRatingsCache(
             vendor_id=vendor_id,
             avg_quality_rating=4.0,
             avg_punctuality_rating=4.0,
@@ -558,22 +670,33 @@ class ProductComparisonService:
             on_time_rate=90.0,
             repeat_customer_rate=0.0
         )
+    
+    @staticmethod
+    def _create_default_ratings_cache(vendor_id):
+        """Create default ratings cache for new vendor"""
+        cache = ProductComparisonService._default_ratings_cache(vendor_id)
         db.session.add(cache)
         db.session.commit()
         return cache
     
     @staticmethod
-    def _create_default_delivery_metrics(vendor_id):
-        """Create default delivery metrics for new vendor"""
-        metrics = VendorDeliveryMetrics(
+    def _default_delivery_metrics(vendor_id):
+        """Build (unsaved) default delivery metrics for new vendor"""
+        return VendorDeliveryMetrics(
             vendor_id=vendor_id,
             avg_delivery_time=240,  # 4 hours default
             min_delivery_time=120,
             max_delivery_time=360,
             delivery_on_time_count=0,
             delivery_late_count=0,
-            total_deliveries=0
+            total_deliveries=0,
+            total_delivery_time=0
         )
+    
+    @staticmethod
+    def _create_default_delivery_metrics(vendor_id):
+        """Create default delivery metrics for new vendor"""
+        metrics = ProductComparisonService._default_delivery_metrics(vendor_id)
         db.session.add(metrics)
         db.session.commit()
         return metrics
@@ -581,42 +704,9 @@ class ProductComparisonService:
     @staticmethod
     def update_vendor_ratings_cache(vendor_id):
         """
-        Update vendor ratings cache from ProductReview data
-        Should be called after each new review
+        Rebuild one vendor's ratings cache from ProductReview / Order data
+        Reviews and orders keep the cache current incrementally (see rating_service.py);
+        this is for repairs and migrations
         """
-        reviews = ProductReview.query.filter_by(vendor_id=vendor_id).all()
-        
-        if not reviews:
-            return
-        
-        # Calculate averages
-        total_reviews = len(reviews)
-        avg_quality = sum(r.rating_quality for r in reviews) / total_reviews
-        avg_punctuality = sum(r.rating_delay for r in reviews) / total_reviews
-        avg_communication = sum(r.rating_communication for r in reviews) / total_reviews
-        overall = (avg_quality + avg_punctuality + avg_communication) / 3
-        
-        # Calculate success rate from orders
-        total_orders = Order.query.filter_by(seller_id=vendor_id).count()
-        successful_orders = Order.query.filter_by(
-            seller_id=vendor_id,
-            order_status='delivered'
-        ).count()
-        success_rate = (successful_orders / total_orders * 100) if total_orders > 0 else 0
-        
-        # Get or create cache
-        cache = VendorRatingsCache.query.filter_by(vendor_id=vendor_id).first()
-        if not cache:
-            cache = VendorRatingsCache(vendor_id=vendor_id)
-            db.session.add(cache)
-        
-        # Update values
-        cache.avg_quality_rating = round(avg_quality, 2)
-        cache.avg_punctuality_rating = round(avg_punctuality, 2)
-        cache.avg_communication_rating = round(avg_communication, 2)
-        cache.overall_rating = round(overall, 2)
-        cache.total_reviews = total_reviews
-        cache.success_rate = round(success_rate, 2)
-        cache.last_updated = datetime.utcnow()
-        
-        db.session.commit()
+        from app.rating_service import RatingAggregateService
+        RatingAggregateService.reconcile(user_ids=[vendor_id])
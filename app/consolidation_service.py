@@ -0,0 +1,370 @@
+"""
+Truck Consolidation Service
+Packs many small retailer drops into multi-stop trips out of Koyambedu
+
+1. Load planning: orders are swept by bearing around the market and packed into
+   vehicles by weight AND volume (largest free capacity first, first-fit over a
+   short lookahead), so each truck gets a geographically coherent load
+2. Sequencing: nearest-neighbour tour from the market, improved with 2-opt,
+   over a precomputed haversine distance matrix per trip
+3. Write back (one transaction): a DriverRoute per trip, and per order a
+   DriverAssignment, OrderLocationDetail and a DeliveryStep with its stop number
+
+Weights come from order items (kg); volume uses the same 0.001 m³/kg estimate as
+LocationBasedAssignmentService.calculate_volume_from_products.
+"""
+
+import logging
+import math
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import func, text, bindparam
+from app import db
+from app.models import Driver, DriverRoute, DriverAssignment, DeliveryStep, OrderLocationDetail
+from app.driver_matching_service import EARTH_RADIUS_KM
+
+logger = logging.getLogger(__name__)
+
+
+def distance_matrix_km(lats, lngs):
+    """Pairwise haversine distances (km) between points, as an n x n numpy array"""
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lng = np.radians(np.asarray(lngs, dtype=float))
+    d_lat = lat[:, None] - lat[None, :]
+    d_lng = lng[:, None] - lng[None, :]
+    a = np.sin(d_lat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(d_lng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def tour_length(tour, matrix):
+    """Closed tour length (returns to tour[0])"""
+    return sum(matrix[tour[i - 1]][tour[i]] for i in range(1, len(tour))) + matrix[tour[-1]][tour[0]]
+
+
+def nearest_neighbour_tour(matrix):
+    """Tour over every point starting (and ending) at point 0"""
+    n = len(matrix)
+    tour = [0]
+    unvisited = set(range(1, n))
+    while unvisited:
+        last = matrix[tour[-1]]
+        nearest = min(unvisited, key=lambda j: (last[j], j))
+        tour.append(nearest)
+        unvisited.remove(nearest)
+    return tour
+
+
+def two_opt(tour, matrix):
+    """Reverse segments while that shortens the closed tour; point 0 stays first"""
+    tour = list(tour)
+    n = len(tour)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n - 1):
+            a, b = tour[i - 1], tour[i]
+            for j in range(i + 1, n):
+                c, d = tour[j], tour[(j + 1) % n]
+                delta = matrix[a][c] + matrix[b][d] - matrix[a][b] - matrix[c][d]
+                if delta < -1e-9:
+                    tour[i:j + 1] = reversed(tour[i:j + 1])
+                    b = tour[i]
+                    improved = True
+    return tour
+
+
+class ConsolidationService:
+    """
+    Multi-stop load planning and stop sequencing
+    """
+
+    # Koyambedu Wholesale Market
+    DEPOT = {'name': 'Koyambedu Market', 'lat': 13.0694, 'lng': 80.1948}
+
+    CUBIC_M_PER_KG = 0.001
+    MAX_STOPS_PER_TRIP = 15
+    # Orders looked at past the first one that doesn't fit (keeps loads compact)
+    PACKING_LOOKAHEAD = 25
+
+    # Cargo volume by vehicle type (MOCK); unknown types get 4 litres per kg of capacity
+    VEHICLE_VOLUME_M3 = {
+        'bike': 0.15,
+        'auto': 0.8,
+        'tempo': 2.5,
+        'van': 4.0,
+        'mini_truck': 6.0,
+        'truck': 15.0,
+    }
+
+    AVERAGE_SPEED_KMPH = 20
+    MINUTES_PER_STOP = 10
+
+    @staticmethod
+    def vehicle_volume(vehicle_type, capacity_kg):
+        volume = ConsolidationService.VEHICLE_VOLUME_M3.get((vehicle_type or '').lower())
+        return volume if volume is not None else (capacity_kg or 0) * 0.004
+
+    @staticmethod
+    def available_vehicles():
+        """(driver_id, free_weight_kg, free_volume_m3, label) for available drivers"""
+        rows = db.session.query(
+            Driver.id, Driver.vehicle_type, Driver.vehicle_registration,
+            Driver.vehicle_capacity_kg, Driver.current_load_kg
+        ).filter(Driver.status == 'available', Driver.is_active == True).all()
+
+        vehicles = []
+        for driver_id, vehicle_type, registration, capacity, load in rows:
+            capacity = capacity or 0
+            free_weight = capacity - (load or 0)
+            if free_weight <= 0:
+                continue
+            volume = ConsolidationService.vehicle_volume(vehicle_type, capacity)
+            free_volume = volume * free_weight / capacity
+            vehicles.append((driver_id, free_weight, free_volume, f"{vehicle_type} - {registration}"))
+        return vehicles
+
+    # ============ PLANNING (pure, no database) ============
+
+    @staticmethod
+    def pack(orders, vehicles):
+        """
+        Sweep + first-fit packing by weight and volume
+
+        Args:
+            orders: list of (order_id, lat, lng, weight_kg)
+            vehicles: list of (driver_id, free_weight_kg, free_volume_m3, label)
+
+        Returns:
+            (loads, unplanned) - loads is a list of (vehicle, [orders]); unplanned order ids didn't fit anywhere
+        """
+        depot = ConsolidationService.DEPOT
+        m3_per_kg = ConsolidationService.CUBIC_M_PER_KG
+        swept = sorted(
+            orders,
+            key=lambda o: (math.atan2(o[1] - depot['lat'], (o[2] - depot['lng']) * math.cos(math.radians(depot['lat']))), o[0])
+        )
+        vehicles = sorted(vehicles, key=lambda v: (-v[1], -v[2], v[0]))
+
+        loads = []
+        for vehicle in vehicles:
+            if not swept:
+                break
+            free_weight, free_volume = vehicle[1], vehicle[2]
+            taken = []
+            misses = 0
+            i = 0
+            while i < len(swept) and len(taken) < ConsolidationService.MAX_STOPS_PER_TRIP:
+                order = swept[i]
+                weight, volume = order[3], order[3] * m3_per_kg
+                if weight <= free_weight + 1e-9 and volume <= free_volume + 1e-9:
+                    taken.append(swept.pop(i))
+                    free_weight -= weight
+                    free_volume -= volume
+                    continue
+                if taken:
+                    misses += 1
+                    if misses > ConsolidationService.PACKING_LOOKAHEAD:
+                        break
+                i += 1
+            if taken:
+                loads.append((vehicle, taken))
+
+        return loads, [o[0] for o in swept]
+
+    @staticmethod
+    def sequence(stops, improve=True):
+        """
+        Order the stops of one trip
+
+        Returns:
+            (ordered stops, leg distances km from the previous point, closed tour km)
+        """
+        depot = ConsolidationService.DEPOT
+        lats = [depot['lat']] + [s[1] for s in stops]
+        lngs = [depot['lng']] + [s[2] for s in stops]
+        matrix = distance_matrix_km(lats, lngs).tolist()
+
+        tour = nearest_neighbour_tour(matrix)
+        if improve and len(tour) > 3:
+            tour = two_opt(tour, matrix)
+
+        legs = [matrix[tour[i - 1]][tour[i]] for i in range(1, len(tour))]
+        return [stops[i - 1] for i in tour[1:]], legs, tour_length(tour, matrix)
+
+    @staticmethod
+    def plan(orders, vehicles, improve=True):
+        """
+        Returns:
+            dict with 'trips' (vehicle, stops, legs, distance_km) and 'unplanned' order ids
+        """
+        loads, unplanned = ConsolidationService.pack(orders, vehicles)
+        trips = []
+        for vehicle, stops in loads:
+            ordered, legs, distance = ConsolidationService.sequence(stops, improve=improve)
+            trips.append({'vehicle': vehicle, 'stops': ordered, 'legs': legs, 'distance_km': distance})
+        return {'trips': trips, 'unplanned': unplanned}
+
+    # ============ RUN ============
+
+    @staticmethod
+    def run(limit=None):
+        """
+        Plan and write multi-stop trips for all paid orders waiting for a driver (commits)
+
+        Returns:
+            dict with pending / planned / trips counts and total km
+        """
+        from app.batch_assignment_service import BatchAssignmentService
+
+        try:
+            pending = BatchAssignmentService.pending_orders(limit=limit)
+            if not pending:
+                return {'pending': 0, 'planned': 0, 'trips': 0, 'total_km': 0}
+
+            plan = ConsolidationService.plan(pending, ConsolidationService.available_vehicles())
+            if plan['trips']:
+                ConsolidationService._write(plan['trips'])
+                db.session.commit()
+
+            planned = sum(len(trip['stops']) for trip in plan['trips'])
+            total_km = round(sum(trip['distance_km'] for trip in plan['trips']), 2)
+            logger.info("Consolidation: %s/%s orders on %s trips, %s km", planned, len(pending), len(plan['trips']), total_km)
+            return {
+                'pending': len(pending),
+                'planned': planned,
+                'trips': len(plan['trips']),
+                'unplanned': len(plan['unplanned']),
+                'total_km': total_km
+            }
+
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Consolidation error: %s", e)
+            return {'pending': 0, 'planned': 0, 'trips': 0, 'total_km': 0, 'error': str(e)}
+
+    @staticmethod
+    def _write(trips):
+        """Claim orders / vehicles and write routes, assignments, location details and steps (no commit)"""
+        from app.batch_assignment_service import BatchAssignmentService
+
+        depot = ConsolidationService.DEPOT
+        m3_per_kg = ConsolidationService.CUBIC_M_PER_KG
+        now = datetime.utcnow()
+
+        order_claims = [
+            {'order_id': stop[0], 'driver_id': trip['vehicle'][0]}
+            for trip in trips for stop in trip['stops']
+        ]
+        driver_claims = [
+            {'driver_id': trip['vehicle'][0], 'weight': sum(stop[3] for stop in trip['stops'])}
+            for trip in trips
+        ]
+        if not BatchAssignmentService.claim(order_claims, driver_claims):
+            raise RuntimeError('orders or vehicles changed during planning, retry next run')
+
+        order_ids = [claim['order_id'] for claim in order_claims]
+        addresses = {
+            row.id: row
+            for row in db.session.execute(text("""
+                SELECT o.id, o.delivery_address AS delivery, u.address AS pickup, o.total_amount
+                FROM orders o JOIN users u ON u.id = o.seller_id
+                WHERE o.id IN :order_ids
+            """).bindparams(bindparam('order_ids', expanding=True)), {'order_ids': order_ids})
+        }
+
+        driver_ids = [trip['vehicle'][0] for trip in trips]
+        db.session.execute(DriverRoute.__table__.insert(), [
+            {
+                'driver_id': trip['vehicle'][0],
+                'starting_location': depot['name'],
+                'ending_location': addresses[trip['stops'][-1][0]].delivery,
+                'start_lat': depot['lat'],
+                'start_lng': depot['lng'],
+                'end_lat': trip['stops'][-1][1],
+                'end_lng': trip['stops'][-1][2],
+                'total_distance_km': round(trip['distance_km'], 2),
+                'estimated_time_hours': round(
+                    trip['distance_km'] / ConsolidationService.AVERAGE_SPEED_KMPH
+                    + len(trip['stops']) * ConsolidationService.MINUTES_PER_STOP / 60, 2
+                ),
+                'status': 'on_route',
+                'created_at': now
+            }
+            for trip in trips
+        ])
+        # Each claimed driver has exactly one trip in this plan
+        route_for_driver = dict(db.session.query(DriverRoute.driver_id, func.max(DriverRoute.id)).filter(
+            DriverRoute.driver_id.in_(driver_ids), DriverRoute.status == 'on_route', DriverRoute.created_at == now
+        ).group_by(DriverRoute.driver_id).all())
+        route_ids = [route_for_driver[driver_id] for driver_id in driver_ids]
+
+        existing_details = {
+            row[0] for row in db.session.query(OrderLocationDetail.order_id).filter(
+                OrderLocationDetail.order_id.in_(order_ids)
+            )
+        }
+
+        assignments, steps, detail_updates, detail_inserts = [], [], [], []
+        for trip, route_id in zip(trips, route_ids):
+            driver_id, _, _, vehicle_label = trip['vehicle']
+            elapsed_km = 0.0
+            for stop_number, (stop, leg) in enumerate(zip(trip['stops'], trip['legs']), start=1):
+                order_id, lat, lng, weight = stop
+                elapsed_km += leg
+                eta = now + timedelta(minutes=(
+                    elapsed_km / ConsolidationService.AVERAGE_SPEED_KMPH * 60
+                    + stop_number * ConsolidationService.MINUTES_PER_STOP
+                ))
+                address = addresses[order_id]
+
+                assignments.append({
+                    'order_id': order_id,
+                    'driver_id': driver_id,
+                    'assignment_status': 'assigned',
+                    'assigned_at': now,
+                    'pickup_location': address.pickup or depot['name'],
+                    'delivery_location': address.delivery,
+                    'weight_assigned_kg': weight,
+                    'estimated_delivery_time': eta
+                })
+                steps.append({
+                    'order_id': order_id,
+                    'step_number': 3,
+                    'step_name': 'Loaded on Truck',
+                    'status': 'pending',
+                    'details': {
+                        'vehicle': vehicle_label,
+                        'route': f"{depot['name']} → {len(trip['stops'])} stops",
+                        'stop_number': stop_number,
+                        'total_stops': len(trip['stops']),
+                        'distance': f"{elapsed_km:.1f} km",
+                        'estimated_time': eta.strftime('%H:%M')
+                    },
+                    'created_at': now
+                })
+                detail = {
+                    'retailer_lat': str(lat),
+                    'retailer_lng': str(lng),
+                    'assigned_driver_route_id': route_id,
+                    'volume_m3': round(weight * m3_per_kg, 3),
+                    'total_weight_kg': weight,
+                    'distance_from_vendor_km': round(elapsed_km, 2)
+                }
+                if order_id in existing_details:
+                    detail_updates.append(dict(detail, b_order_id=order_id))
+                else:
+                    detail_inserts.append(dict(
+                        detail, order_id=order_id, retailer_location=address.delivery,
+                        product_cost=address.total_amount, created_at=now
+                    ))
+
+        db.session.execute(DriverAssignment.__table__.insert(), assignments)
+        db.session.execute(DeliveryStep.__table__.insert(), steps)
+        details_table = OrderLocationDetail.__table__
+        if detail_updates:
+            db.session.execute(
+                details_table.update().where(details_table.c.order_id == bindparam('b_order_id')),
+                detail_updates
+            )
+        if detail_inserts:
+            db.session.execute(details_table.insert(), detail_inserts)
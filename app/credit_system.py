@@ -1,6 +1,9 @@
+import logging
 from app import db
 from app.models import RetailerCredit
 
+logger = logging.getLogger(__name__)
+
 class CreditSystem:
     """
     MOCK CREDIT SYSTEM - Uses FORMULA
@@ -38,7 +41,7 @@ class CreditSystem:
             total_score = int(purchase_score + frequency_score + punctuality_score + completion_score + base_score)
             total_score = min(total_score, 1000)
         except Exception as e:
-            print(f"⚠️ Credit calculation error: {e}")
+            logger.warning("Credit calculation error: %s", e)
             # Return default values
             total_score = 500
         
@@ -62,7 +65,7 @@ class CreditSystem:
                 credit.credit_tier = tier
                 db.session.commit()
         except Exception as e:
-            print(f"⚠️ Credit update error: {e}")
+            logger.warning("Credit update error: %s", e)
             db.session.rollback()
         
         return {
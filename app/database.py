@@ -0,0 +1,187 @@
+"""
+Database Engines
+Env-tuned connection pools and read-replica routing
+
+- Pools: DB_POOL_SIZE connections kept open per worker, DB_MAX_OVERFLOW more opened under
+  load, DB_POOL_TIMEOUT seconds to wait for one, DB_POOL_RECYCLE seconds before a connection
+  is replaced (below the server's / proxy's idle cut-off) and DB_POOL_PRE_PING to test a
+  connection before handing it out. In-memory SQLite keeps its single shared connection
+- DB_STATEMENT_TIMEOUT_MS cancels statements running longer: PostgreSQL's statement_timeout,
+  or an SQLite progress handler (so the limit can be tried locally)
+- DATABASE_REPLICA_URL adds a 'replica' engine. RoutingSession sends plain SELECTs issued
+  while handling GET / HEAD requests to it (text() too when it is a SELECT); writes, flushes,
+  SELECT ... FOR UPDATE, CLI scripts, background threads and every other HTTP method use the primary
+- Read-your-writes: once a session has written (pending objects, a flush or a write
+  statement) it reads only from the primary until it is removed, and after a commit that
+  wrote something the client's reads stay on the primary for DB_REPLICA_STICKY_SECONDS (a timestamp in the Flask session, so it follows
+  the client to any worker); DatabaseRouting.primary() pins a block to the primary
+- Locally: DATABASE_REPLICA_URL=sqlite:///replica.db next to marketplace.db (copy the file to
+  "replicate"), or two PostgreSQL databases
+"""
+
+import re
+import time
+from contextlib import contextmanager
+from flask import current_app, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.elements import TextClause
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that reads from the replica engine when it safely can"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_from_replica(clause):
+            replica = self._db.engines.get(DatabaseRouting.REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_from_replica(self, clause):
+        if isinstance(clause, TextClause):
+            is_read = DatabaseRouting.TEXT_READ_RE.match(clause.text) is not None
+        else:
+            is_read = getattr(clause, 'is_select', False) and getattr(clause, '_for_update_arg', None) is None
+        if clause is not None and not is_read:
+            self.info['wrote'] = True  # session.execute(update(...)) / text('DELETE ...') never flush
+            return False
+        if self._flushing or self.info.get('primary') or clause is None:
+            return False
+        if self.info.get('wrote') or self.info.get('pinned') or self.new or self.dirty or self.deleted:
+            return False  # Pinned once it has written: the replica can't see this transaction's rows
+        return DatabaseRouting._replica_allowed()
+
+
+class DatabaseRouting:
+    """
+    Engine options from config, the replica bind and read-your-writes bookkeeping
+    """
+
+    REPLICA_BIND = 'replica'
+    STICKY_KEY = '_db_primary_until'
+    READ_ONLY_METHODS = ('GET', 'HEAD')
+    TEXT_READ_RE = re.compile(r'\s*SELECT\b(?!.*\bFOR\s+(?:UPDATE|SHARE)\b)', re.IGNORECASE | re.DOTALL)
+
+    # ============ SETUP ============
+
+    @staticmethod
+    def configure(app):
+        """Engine options for the primary and the replica bind (before db.init_app)"""
+        config = app.config
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            **DatabaseRouting.engine_options(config['SQLALCHEMY_DATABASE_URI'], config),
+            **(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        }
+        replica_url = config.get('DATABASE_REPLICA_URL')
+        if replica_url:
+            binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+            binds[DatabaseRouting.REPLICA_BIND] = {'url': replica_url, **DatabaseRouting.engine_options(replica_url, config)}
+            config['SQLALCHEMY_BINDS'] = binds
+
+    @staticmethod
+    def init_app(app, engines):
+        """Statement timeouts on the created engines (after db.init_app)"""
+        timeout_ms = app.config.get('DB_STATEMENT_TIMEOUT_MS') or 0
+        if timeout_ms > 0:
+            for engine in engines:
+                if engine.dialect.name == 'sqlite':
+                    DatabaseRouting._sqlite_statement_timeout(engine, timeout_ms / 1000)
+
+    @staticmethod
+    def engine_options(url, config):
+        """create_engine() keyword arguments for one database URL"""
+        url = make_url(url)
+        options = {
+            'pool_pre_ping': bool(config.get('DB_POOL_PRE_PING', True)),
+            'pool_recycle': config.get('DB_POOL_RECYCLE') or -1
+        }
+        if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+            return options  # One shared connection (StaticPool): no size to tune
+
+        options.update({
+            'pool_size': config.get('DB_POOL_SIZE') or 5,
+            'max_overflow': config.get('DB_MAX_OVERFLOW', 10),
+            'pool_timeout': config.get('DB_POOL_TIMEOUT') or 30
+        })
+        timeout_ms = config.get('DB_STATEMENT_TIMEOUT_MS') or 0
+        if timeout_ms > 0 and url.get_backend_name() == 'postgresql':
+            options['connect_args'] = {'options': f'-c statement_timeout={int(timeout_ms)}'}
+        return options
+
+    @staticmethod
+    def _sqlite_statement_timeout(engine, seconds):
+        """SQLite has no statement_timeout: a progress handler interrupts past the deadline"""
+
+        @event.listens_for(engine, 'connect')
+        def _install(dbapi_connection, connection_record):
+            deadline = connection_record.info
+            dbapi_connection.set_progress_handler(
+                lambda: deadline.get('statement_deadline', float('inf')) < time.monotonic(), 1000)
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def _start(conn, cursor, statement, parameters, context, executemany):
+            conn.info['statement_deadline'] = time.monotonic() + seconds
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def _finish(conn, cursor, statement, parameters, context, executemany):
+            conn.info.pop('statement_deadline', None)
+
+    # ============ ROUTING ============
+
+    @staticmethod
+    def _replica_allowed():
+        """Inside a GET / HEAD request whose client hasn't written anything recently"""
+        if not has_request_context() or request.method not in DatabaseRouting.READ_ONLY_METHODS:
+            return False
+        return session.get(DatabaseRouting.STICKY_KEY, 0) <= time.time()
+
+    @staticmethod
+    def read_engine():
+        """Engine for Core reads (engine.connect() bypasses the session): the replica when allowed"""
+        from app import db
+        if DatabaseRouting._replica_allowed():
+            replica = db.engines.get(DatabaseRouting.REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return db.engine
+
+    # ============ READ-YOUR-WRITES ============
+
+    @staticmethod
+    def _after_flush(db_session, flush_context):
+        db_session.info['wrote'] = True
+
+    @staticmethod
+    def _after_commit(db_session):
+        if not db_session.info.pop('wrote', False):
+            return
+        db_session.info['pinned'] = True  # The rest of this request reads its commit from the primary
+        if has_request_context():
+            sticky = current_app.config.get('DB_REPLICA_STICKY_SECONDS') or 0
+            if sticky > 0 and DatabaseRouting.REPLICA_BIND in current_app.config.get('SQLALCHEMY_BINDS', {}):
+                session[DatabaseRouting.STICKY_KEY] = time.time() + sticky
+
+    @staticmethod
+    def _after_rollback(db_session):
+        db_session.info.pop('wrote', None)
+
+    @staticmethod
+    @contextmanager
+    def primary(db_session=None):
+        """Send every statement in the block to the primary (fresh reads inside a GET)"""
+        if db_session is None:
+            from app import db
+            db_session = db.session()
+        previous = db_session.info.get('primary')
+        db_session.info['primary'] = True
+        try:
+            yield db_session
+        finally:
+            db_session.info['primary'] = previous
+
+
+event.listen(RoutingSession, 'after_flush', DatabaseRouting._after_flush)
+event.listen(RoutingSession, 'after_commit', DatabaseRouting._after_commit)
+event.listen(RoutingSession, 'after_rollback', DatabaseRouting._after_rollback)
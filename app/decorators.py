@@ -1,7 +1,10 @@
+import logging
 from functools import wraps
 from flask import redirect, url_for, flash
 from flask_login import current_user
 
+logger = logging.getLogger(__name__)
+
 def vendor_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -16,11 +19,9 @@ def vendor_required(f):
             if user_type != 'vendor':
                 flash('Vendor access required', 'danger')
                 return redirect(url_for('auth.login'))
-        except Exception as e:
-            print(f"❌ Error checking user_type: {e}")
+        except Exception:
             # Don't block - log the error and continue
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error checking user_type")
         
         return f(*args, **kwargs)
     return decorated_function
@@ -28,51 +29,44 @@ def vendor_required(f):
 def retailer_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        # ULTRA DEFENSIVE - Log everything
+        # ULTRA DEFENSIVE - Log everything (at DEBUG: LOG_LEVELS=app.decorators=DEBUG)
         try:
-            print(f"🔍 retailer_required called for route: {f.__name__}")
-            print(f"   current_user: {current_user}")
-            print(f"   is_authenticated: {current_user.is_authenticated}")
+            logger.debug("retailer_required called for route: %s (authenticated: %s)",
+                         f.__name__, current_user.is_authenticated)
             
             # Check if user is authenticated
             if not current_user.is_authenticated:
-                print(f"   ❌ User not authenticated, redirecting to login")
+                logger.debug("User not authenticated, redirecting to login")
                 flash('Please login to access this page', 'warning')
                 return redirect(url_for('auth.login'))
             
             # Log user details
-            try:
-                print(f"   user_id: {current_user.id}")
-                print(f"   user_type: {getattr(current_user, 'user_type', 'NO ATTR')}")
-                print(f"   user_email: {getattr(current_user, 'email', 'NO ATTR')}")
-            except Exception as log_error:
-                print(f"   ⚠️ Could not log user details: {log_error}")
+            if logger.isEnabledFor(logging.DEBUG):
+                try:
+                    logger.debug("user_id: %s, user_type: %s, user_email: %s", current_user.id,
+                                 getattr(current_user, 'user_type', 'NO ATTR'), getattr(current_user, 'email', 'NO ATTR'))
+                except Exception as log_error:
+                    logger.warning("Could not log user details: %s", log_error)
             
             # Check user_type
             try:
                 user_type = getattr(current_user, 'user_type', None)
                 if user_type is None:
-                    print(f"   ⚠️ user_type is None! Allowing access anyway...")
+                    logger.warning("user_type is None for user %s! Allowing access anyway...", current_user.get_id())
                     # Don't block - just allow
                 elif user_type != 'retailer':
-                    print(f"   ❌ Wrong user_type: {user_type}, need retailer")
+                    logger.debug("Wrong user_type: %s, need retailer", user_type)
                     flash('Retailer access required', 'danger')
                     return redirect(url_for('auth.login'))
-                else:
-                    print(f"   ✅ Correct user_type: {user_type}")
-            except Exception as e:
-                print(f"   ⚠️ Error checking user_type: {e}")
+            except Exception:
                 # DON'T BLOCK - just continue
-                import traceback
-                traceback.print_exc()
+                logger.exception("Error checking user_type")
             
-            print(f"   ✅ Allowing access to {f.__name__}")
+            logger.debug("Allowing access to %s", f.__name__)
             return f(*args, **kwargs)
             
-        except Exception as outer_error:
-            print(f"❌ CRITICAL ERROR in retailer_required: {outer_error}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("CRITICAL ERROR in retailer_required")
             flash('Authentication system error. Please try logging out and back in.', 'danger')
             return redirect(url_for('auth.logout'))
     
@@ -0,0 +1,270 @@
+"""
+Delivery Metrics Pipeline
+Incrementally folds new "delivered" OrderStatusLog rows into VendorDeliveryMetrics
+
+Each run:
+1. claims every delivered log row above the checkpoint that isn't in pipeline_processed_rows
+   yet, by inserting them there under a batch id (the primary key makes a concurrent run
+   that claims the same rows fail and roll back, so nothing is counted twice)
+2. aggregates delivery times per vendor for that batch in one grouped query
+3. merges the batch into the running totals and commits everything together
+
+Log ids are assigned at insert, not at commit: a row with a lower id can become visible after
+a higher one was counted, so the pipeline remembers which rows it counted rather than just the
+highest id. Rows counted more than DELIVERY_METRICS_SETTLE_SECONDS ago move the checkpoint
+up and are forgotten - a status change still uncommitted after that long is not expected.
+
+Runs from run_delivery_metrics.py (cron) and right after an order is delivered.
+"""
+
+import logging
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, text, bindparam
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import PipelineCheckpoint, PipelineProcessedRow, VendorDeliveryMetrics, VendorRatingsCache
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryMetricsPipeline:
+    """
+    OrderStatusLog -> VendorDeliveryMetrics
+    """
+
+    CHECKPOINT = 'delivery_metrics'
+    DEFAULT_SETTLE_SECONDS = 600
+
+    # Order placed -> delivered, in minutes (dialect specific date arithmetic)
+    MINUTES_SQL = {
+        'sqlite': "(julianday(l.changed_at) - julianday(o.created_at)) * 1440",
+        'postgresql': "EXTRACT(EPOCH FROM (l.changed_at - o.created_at)) / 60",
+    }
+
+    CLAIM_SQL = """
+        INSERT INTO pipeline_processed_rows (pipeline, row_id, batch, claimed_at)
+        SELECT :pipeline, l.id, :batch, :now
+        FROM order_status_log l
+        WHERE l.id > :last_id
+          AND l.status_to = 'delivered'
+          AND NOT EXISTS (
+              SELECT 1 FROM pipeline_processed_rows p
+              WHERE p.pipeline = :pipeline AND p.row_id = l.id
+          )
+    """
+
+    BATCH_SQL = """
+        SELECT
+            o.seller_id AS vendor_id,
+            COUNT(*) AS deliveries,
+            SUM({minutes}) AS total_minutes,
+            MIN({minutes}) AS min_minutes,
+            MAX({minutes}) AS max_minutes,
+            SUM(CASE WHEN ROUND({minutes}) <= :on_time_minutes THEN 1 ELSE 0 END) AS on_time
+        FROM pipeline_processed_rows p
+        JOIN order_status_log l ON l.id = p.row_id
+        JOIN orders o ON o.id = l.order_id
+        WHERE p.pipeline = :pipeline AND p.batch = :batch
+          AND l.changed_at IS NOT NULL AND o.created_at IS NOT NULL
+        GROUP BY o.seller_id
+    """
+
+    @staticmethod
+    def _checkpoint():
+        """Settled log id (every row up to it is counted or never will be), creating the checkpoint row"""
+        checkpoint = db.session.query(PipelineCheckpoint.last_id).filter_by(
+            name=DeliveryMetricsPipeline.CHECKPOINT
+        ).first()
+        if checkpoint is None:
+            db.session.add(PipelineCheckpoint(name=DeliveryMetricsPipeline.CHECKPOINT, last_id=0, rows_processed=0))
+            db.session.commit()
+            return 0
+        return checkpoint.last_id or 0
+
+    @staticmethod
+    def _claim(last_id, now):
+        """
+        Record the uncounted delivered rows as this run's batch (no commit)
+
+        Returns:
+            (batch id, rows claimed)
+        """
+        batch = uuid.uuid4().hex
+        claimed = db.session.execute(text(DeliveryMetricsPipeline.CLAIM_SQL), {
+            'pipeline': DeliveryMetricsPipeline.CHECKPOINT,
+            'batch': batch,
+            'now': now,
+            'last_id': last_id
+        }).rowcount
+        return batch, claimed
+
+    @staticmethod
+    def _settle(last_id, now):
+        """Move the checkpoint over rows counted long enough ago and forget them (no commit)"""
+        settle_seconds = current_app.config.get('DELIVERY_METRICS_SETTLE_SECONDS', DeliveryMetricsPipeline.DEFAULT_SETTLE_SECONDS)
+        settled_id = db.session.query(func.max(PipelineProcessedRow.row_id)).filter(
+            PipelineProcessedRow.pipeline == DeliveryMetricsPipeline.CHECKPOINT,
+            PipelineProcessedRow.claimed_at <= now - timedelta(seconds=settle_seconds)
+        ).scalar()
+        if not settled_id or settled_id <= last_id:
+            return last_id
+
+        moved = PipelineCheckpoint.query.filter_by(
+            name=DeliveryMetricsPipeline.CHECKPOINT, last_id=last_id
+        ).update({PipelineCheckpoint.last_id: settled_id}, synchronize_session=False)
+        if not moved:
+            return last_id  # Another run moved it
+        PipelineProcessedRow.query.filter(
+            PipelineProcessedRow.pipeline == DeliveryMetricsPipeline.CHECKPOINT,
+            PipelineProcessedRow.row_id <= settled_id
+        ).delete(synchronize_session=False)
+        return settled_id
+
+    @staticmethod
+    def run():
+        """
+        Process new status log rows (commits)
+
+        Returns:
+            dict with vendors updated, deliveries counted, log rows claimed and the checkpoint
+        """
+        try:
+            last_id = DeliveryMetricsPipeline._checkpoint()
+            now = datetime.utcnow()
+            try:
+                batch, claimed = DeliveryMetricsPipeline._claim(last_id, now)
+            except IntegrityError:
+                db.session.rollback()  # A concurrent run claimed some of the same rows; the next run gets the rest
+                return {'vendors': 0, 'deliveries': 0}
+
+            rows = []
+            if claimed:
+                dialect = db.session.get_bind().dialect.name
+                minutes = DeliveryMetricsPipeline.MINUTES_SQL.get(dialect, DeliveryMetricsPipeline.MINUTES_SQL['postgresql'])
+                rows = db.session.execute(text(DeliveryMetricsPipeline.BATCH_SQL.format(minutes=minutes)), {
+                    'pipeline': DeliveryMetricsPipeline.CHECKPOINT,
+                    'batch': batch,
+                    'on_time_minutes': current_app.config.get('DELIVERY_ON_TIME_MINUTES', 240)
+                }).fetchall()
+                DeliveryMetricsPipeline._merge(rows)
+                PipelineCheckpoint.query.filter_by(name=DeliveryMetricsPipeline.CHECKPOINT).update({
+                    PipelineCheckpoint.rows_processed: PipelineCheckpoint.rows_processed + claimed,
+                    PipelineCheckpoint.last_run_at: now
+                }, synchronize_session=False)
+
+            checkpoint = DeliveryMetricsPipeline._settle(last_id, now)
+            db.session.commit()
+
+            deliveries = sum(row.deliveries for row in rows)
+            if deliveries:
+                logger.info("Delivery metrics: %s deliveries for %d vendors (%d log rows)",
+                            deliveries, len(rows), claimed)
+            return {'vendors': len(rows), 'deliveries': deliveries, 'rows': claimed, 'checkpoint': checkpoint}
+
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Delivery metrics pipeline error: %s", e)
+            return {'vendors': 0, 'deliveries': 0, 'error': str(e)}
+
+    @staticmethod
+    def _merge(rows):
+        """Fold one batch of per-vendor aggregates into VendorDeliveryMetrics (no commit)"""
+        if not rows:
+            return
+        from app.comparison_service import ProductComparisonService
+
+        vendor_ids = [row.vendor_id for row in rows]
+        existing = {
+            metrics.vendor_id: metrics
+            for metrics in db.session.query(
+                VendorDeliveryMetrics.vendor_id,
+                VendorDeliveryMetrics.total_deliveries,
+                VendorDeliveryMetrics.total_delivery_time,
+                VendorDeliveryMetrics.delivery_on_time_count,
+                VendorDeliveryMetrics.min_delivery_time,
+                VendorDeliveryMetrics.max_delivery_time
+            ).filter(VendorDeliveryMetrics.vendor_id.in_(vendor_ids)).all()
+        }
+
+        missing = [v for v in vendor_ids if v not in existing]
+        if missing:
+            db.session.add_all([ProductComparisonService._default_delivery_metrics(v) for v in missing])
+            db.session.flush()
+
+        now = datetime.utcnow()
+        metrics_updates = []
+        rating_updates = []
+        for row in rows:
+            current = existing.get(row.vendor_id)
+            batch_min, batch_max = int(round(row.min_minutes)), int(round(row.max_minutes))
+
+            if current and current.total_deliveries:
+                deliveries = current.total_deliveries + row.deliveries
+                total_time = (current.total_delivery_time or 0) + int(round(row.total_minutes))
+                on_time = (current.delivery_on_time_count or 0) + row.on_time
+                min_time = min(current.min_delivery_time, batch_min)
+                max_time = max(current.max_delivery_time, batch_max)
+            else:
+                # First real deliveries replace the placeholder defaults
+                deliveries = row.deliveries
+                total_time = int(round(row.total_minutes))
+                on_time = row.on_time
+                min_time, max_time = batch_min, batch_max
+
+            metrics_updates.append({
+                'b_vendor_id': row.vendor_id,
+                'total_deliveries': deliveries,
+                'total_delivery_time': total_time,
+                'delivery_on_time_count': on_time,
+                'delivery_late_count': deliveries - on_time,
+                'avg_delivery_time': int(round(total_time / deliveries)),
+                'min_delivery_time': min_time,
+                'max_delivery_time': max_time,
+                'last_updated': now
+            })
+            rating_updates.append({
+                'b_vendor_id': row.vendor_id,
+                'on_time_rate': round(on_time / deliveries * 100, 2),
+                'last_updated': now
+            })
+
+        metrics_table = VendorDeliveryMetrics.__table__
+        db.session.execute(
+            metrics_table.update().where(metrics_table.c.vendor_id == bindparam('b_vendor_id')),
+            metrics_updates
+        )
+
+        # Keep the ratings cache copy of on_time_rate in step
+        ratings_table = VendorRatingsCache.__table__
+        db.session.execute(
+            ratings_table.update().where(ratings_table.c.vendor_id == bindparam('b_vendor_id')),
+            rating_updates
+        )
+
+    @staticmethod
+    def rebuild():
+        """Reset every vendor's delivery metrics and reprocess the whole status log (commits)"""
+        try:
+            VendorDeliveryMetrics.query.update({
+                VendorDeliveryMetrics.avg_delivery_time: 240,
+                VendorDeliveryMetrics.min_delivery_time: 120,
+                VendorDeliveryMetrics.max_delivery_time: 360,
+                VendorDeliveryMetrics.delivery_on_time_count: 0,
+                VendorDeliveryMetrics.delivery_late_count: 0,
+                VendorDeliveryMetrics.total_deliveries: 0,
+                VendorDeliveryMetrics.total_delivery_time: 0
+            }, synchronize_session=False)
+            PipelineCheckpoint.query.filter_by(name=DeliveryMetricsPipeline.CHECKPOINT).update({
+                PipelineCheckpoint.last_id: 0,
+                PipelineCheckpoint.rows_processed: 0
+            }, synchronize_session=False)
+            PipelineProcessedRow.query.filter_by(pipeline=DeliveryMetricsPipeline.CHECKPOINT).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Delivery metrics reset error: %s", e)
+            raise
+
+        return DeliveryMetricsPipeline.run()
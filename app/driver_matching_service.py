@@ -0,0 +1,210 @@
+"""
+Driver Matching Service
+Finds the driver whose planned route passes closest to a delivery point
+
+- Distances: haversine for reporting, a local equirectangular projection for
+  the per-candidate maths (well under 0.1% off at city scale)
+- RouteIndex: uniform lat/lng grid over every route segment (DriverRoute start -> end),
+  so a lookup only touches routes whose bounding box is near the order
+- Detour: extra distance to visit the order point on the way,
+  |start->P| + |P->end| - |start->end|, computed with numpy over all candidates at once
+
+Everything is deterministic (ties broken by driver id), so results can be cached and tested.
+"""
+
+import math
+from collections import defaultdict
+import numpy as np
+from sqlalchemy import select
+from app import db
+from app.models import Driver, DriverRoute
+
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in km"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def point_to_segment_km(lat, lng, start_lat, start_lng, end_lat, end_lng):
+    """
+    Distance from a point to a route segment and the detour to visit it (scalar version)
+
+    Returns:
+        (distance_km, detour_km)
+    """
+    distance, detour = _segment_metrics(
+        lat, lng,
+        np.array([start_lat], dtype=float), np.array([start_lng], dtype=float),
+        np.array([end_lat], dtype=float), np.array([end_lng], dtype=float)
+    )
+    return float(distance[0]), float(detour[0])
+
+
+def _segment_metrics(lat, lng, start_lat, start_lng, end_lat, end_lng):
+    """
+    Vectorized point-to-segment distance and detour (km) for arrays of segments
+
+    Coordinates are projected onto a plane centred on the point (equirectangular),
+    so the point is the origin and each segment runs A -> B.
+    """
+    x_scale = KM_PER_DEGREE * math.cos(math.radians(lat))
+    ax = (start_lng - lng) * x_scale
+    ay = (start_lat - lat) * KM_PER_DEGREE
+    bx = (end_lng - lng) * x_scale
+    by = (end_lat - lat) * KM_PER_DEGREE
+
+    dx, dy = bx - ax, by - ay
+    length_sq = dx * dx + dy * dy
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = np.where(length_sq > 0, -(ax * dx + ay * dy) / length_sq, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    distance = np.hypot(ax + t * dx, ay + t * dy)
+
+    detour = np.hypot(ax, ay) + np.hypot(bx, by) - np.sqrt(length_sq)
+    return distance, np.maximum(detour, 0.0)
+
+
+class RouteIndex:
+    """
+    Grid index over route segments, with columnar arrays for vectorized scoring
+
+    Each route is registered in every grid cell its bounding box covers; a query
+    for radius r around P reads the cells covering P's r-box. If a segment comes
+    within r of P, the closest point lies in both boxes, so no route is missed.
+    """
+
+    # ~5.5 km cells at Chennai's latitude
+    CELL_DEGREES = 0.05
+
+    def __init__(self, routes, cell_degrees=None):
+        """
+        Args:
+            routes: iterable of (route_id, driver_id, start_lat, start_lng, end_lat, end_lng, free_capacity_kg)
+        """
+        self.cell_degrees = cell_degrees or RouteIndex.CELL_DEGREES
+        routes = [route for route in routes if None not in route[2:6]]
+
+        columns = list(zip(*routes)) if routes else [()] * 7
+        self.route_ids = np.array(columns[0], dtype=np.int64)
+        self.driver_ids = np.array(columns[1], dtype=np.int64)
+        self.start_lat = np.array(columns[2], dtype=float)
+        self.start_lng = np.array(columns[3], dtype=float)
+        self.end_lat = np.array(columns[4], dtype=float)
+        self.end_lng = np.array(columns[5], dtype=float)
+        self.free_capacity = np.array([c if c is not None else 0.0 for c in columns[6]], dtype=float)
+
+        cells = defaultdict(list)
+        for i in range(len(routes)):
+            row_min, col_min = self._cell(min(self.start_lat[i], self.end_lat[i]), min(self.start_lng[i], self.end_lng[i]))
+            row_max, col_max = self._cell(max(self.start_lat[i], self.end_lat[i]), max(self.start_lng[i], self.end_lng[i]))
+            for row in range(row_min, row_max + 1):
+                for col in range(col_min, col_max + 1):
+                    cells[(row, col)].append(i)
+        self._cells = {key: np.array(members, dtype=np.int64) for key, members in cells.items()}
+
+    def __len__(self):
+        return len(self.route_ids)
+
+    def _cell(self, lat, lng):
+        return int(math.floor(lat / self.cell_degrees)), int(math.floor(lng / self.cell_degrees))
+
+    def candidates(self, lat, lng, radius_km):
+        """Positions of routes whose cells overlap the radius box around the point"""
+        lat_pad = radius_km / KM_PER_DEGREE
+        lng_pad = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+        row_min, col_min = self._cell(lat - lat_pad, lng - lng_pad)
+        row_max, col_max = self._cell(lat + lat_pad, lng + lng_pad)
+
+        found = [
+            self._cells[(row, col)]
+            for row in range(row_min, row_max + 1)
+            for col in range(col_min, col_max + 1)
+            if (row, col) in self._cells
+        ]
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(found))
+
+    def match(self, lat, lng, weight_kg=0, radius_km=5.0, limit=5):
+        """
+        Best routes for one delivery point
+
+        Returns:
+            list of dicts (route_id, driver_id, distance_km, detour_km), smallest detour first
+        """
+        idx = self.candidates(lat, lng, radius_km)
+        if weight_kg and len(idx):
+            idx = idx[self.free_capacity[idx] >= weight_kg]
+        if not len(idx):
+            return []
+
+        distance, detour = _segment_metrics(
+            lat, lng, self.start_lat[idx], self.start_lng[idx], self.end_lat[idx], self.end_lng[idx]
+        )
+        near = distance <= radius_km
+        idx, distance, detour = idx[near], distance[near], detour[near]
+        if not len(idx):
+            return []
+
+        order = np.lexsort((self.driver_ids[idx], detour))[:limit]
+        return [
+            {
+                'route_id': int(self.route_ids[idx[i]]),
+                'driver_id': int(self.driver_ids[idx[i]]),
+                'distance_km': round(float(distance[i]), 3),
+                'detour_km': round(float(detour[i]), 3)
+            }
+            for i in order
+        ]
+
+
+class DriverMatchingService:
+    """
+    Route-based matching of delivery points to available drivers
+    """
+
+    SEARCH_RADIUS_KM = 5.0
+
+    @staticmethod
+    def build_index():
+        """One query over available drivers' available routes -> RouteIndex"""
+        rows = db.session.execute(
+            select(
+                DriverRoute.id, DriverRoute.driver_id,
+                DriverRoute.start_lat, DriverRoute.start_lng, DriverRoute.end_lat, DriverRoute.end_lng,
+                Driver.vehicle_capacity_kg - db.func.coalesce(Driver.current_load_kg, 0)
+            )
+            .join(Driver, Driver.id == DriverRoute.driver_id)
+            .where(
+                Driver.status == 'available',
+                Driver.is_active == True,
+                DriverRoute.status == 'available'
+            )
+        ).all()
+        return RouteIndex([tuple(row) for row in rows])
+
+    @staticmethod
+    def match_orders(points, index=None, radius_km=None, limit=1):
+        """
+        Match many delivery points against one index build
+
+        Args:
+            points: iterable of (key, lat, lng, weight_kg)
+
+        Returns:
+            dict of key -> list of candidate dicts (empty when no route passes near)
+        """
+        index = index if index is not None else DriverMatchingService.build_index()
+        radius_km = radius_km or DriverMatchingService.SEARCH_RADIUS_KM
+        return {
+            key: index.match(lat, lng, weight_kg=weight_kg, radius_km=radius_km, limit=limit)
+            for key, lat, lng, weight_kg in points
+        }
@@ -1,7 +1,12 @@
+import logging
 import random
+import time
 from datetime import datetime, timedelta
 from app import db
 from app.models import Driver, DriverAssignment, Order
+from app.metrics import Metrics
+
+logger = logging.getLogger(__name__)
 
 class MockDriverService:
     """
@@ -27,11 +32,13 @@ class MockDriverService:
         Randomly selects available driver
         """
         
+        start = time.perf_counter()
         try:
             order = Order.query.get_or_404(order_id)
             available_drivers = MockDriverService.find_available_drivers()
             
             if not available_drivers:
+                Metrics.DRIVER_ASSIGNMENT_SECONDS.observe(time.perf_counter() - start, mode='immediate', outcome='no_driver')
                 return False, "No drivers available"
             
             # MOCK: Random selection
@@ -59,12 +66,15 @@ class MockDriverService:
             db.session.add(assignment)
             db.session.commit()
             
-            print(f"[MOCK DRIVER] {selected_driver.user.name} assigned to order {order_id}")
+            logger.info("[MOCK DRIVER] %s assigned to order %s", selected_driver.user.name, order_id)
+            Metrics.DRIVER_ASSIGNMENT_SECONDS.observe(time.perf_counter() - start, mode='immediate', outcome='assigned')
+            Metrics.DRIVER_ASSIGNMENTS.inc(mode='immediate')
             
             return True, f"Driver assigned"
         
         except Exception as e:
             db.session.rollback()
+            Metrics.DRIVER_ASSIGNMENT_SECONDS.observe(time.perf_counter() - start, mode='immediate', outcome='error')
             return False, str(e)
     
     @staticmethod
@@ -6,11 +6,16 @@ Provides retailers with special deals
 Tracks waste prevention metrics
 """
 
+import logging
 from app import db
+from app.cart_service import CartService
 from app.models import Product, Order, EmergencyMarketplaceMetrics, User, OrderItem
 from datetime import datetime, timedelta, date
+from sqlalchemy import text
 import random
 
+logger = logging.getLogger(__name__)
+
 
 class EmergencyMarketplaceService:
     """
@@ -27,53 +32,31 @@ class EmergencyMarketplaceService:
     MAX_DISCOUNT = 70  # Maximum 70% discount
     
     @staticmethod
-    def auto_flag_expiring_products():
+    def auto_flag_expiring_products(dry_run=False, chunk_size=None):
         """
         MOCK: Auto-flag products as emergency if expiring soon
         
         Runs daily/scheduled:
         - Check all active products
         - If expiry_date <= today + AUTO_FLAG_DAYS
-        - Mark as emergency with suggested discount
+        - Mark as emergency with suggested discount (bulk UPDATE per days-left bucket)
+        - Refresh days_until_expiry on listings already in the emergency marketplace
         """
+        from app.expiry_service import ExpiryEngine
         
-        cutoff_date = date.today() + timedelta(days=EmergencyMarketplaceService.AUTO_FLAG_DAYS_BEFORE_EXPIRY)
-        
-        # Find products expiring soon
-        expiring_products = Product.query.filter(
-            Product.expiry_date <= cutoff_date,
-            Product.expiry_date > date.today(),
-            Product.is_active == True,
-            Product.is_emergency == False
-        ).all()
-        
-        auto_flagged = 0
-        
-        for product in expiring_products:
-            days_left = (product.expiry_date - date.today()).days
-            
-            # MOCK: Suggest discount based on days left
-            if days_left == 0:
-                suggested_discount = 60  # Expires today - 60% off
-            elif days_left == 1:
-                suggested_discount = 50  # Tomorrow - 50% off
-            elif days_left == 2:
-                suggested_discount = 40  # In 2 days - 40% off
-            else:
-                suggested_discount = 30  # In 3 days - 30% off
-            
-            # Mark as emergency with suggested discount
-            product.mark_as_emergency(suggested_discount)
-            db.session.add(product)
-            auto_flagged += 1
-            
-            print(f"[AUTO-FLAG] {product.product_name} from {product.vendor.business_name}: {suggested_discount}% off")
+        flagged = ExpiryEngine.flag_expiring(
+            EmergencyMarketplaceService.AUTO_FLAG_DAYS_BEFORE_EXPIRY,
+            dry_run=dry_run, chunk_size=chunk_size
+        )
+        ExpiryEngine.refresh_days_left(dry_run=dry_run, chunk_size=chunk_size)
         
-        db.session.commit()
+        auto_flagged = sum(flagged.values())
         
         return {
             'auto_flagged': auto_flagged,
-            'message': f'Auto-flagged {auto_flagged} products as emergency'
+            'by_days_left': flagged,
+            'dry_run': dry_run,
+            'message': f"{'Would auto-flag' if dry_run else 'Auto-flagged'} {auto_flagged} products as emergency"
         }
     
     @staticmethod
@@ -170,8 +153,9 @@ class EmergencyMarketplaceService:
             # Mark as emergency
             product.mark_as_emergency(discount_percentage)
             db.session.commit()
+            CartService.reprice([product.id])
             
-            print(f"[EMERGENCY] {product.product_name} marked by {product.vendor.business_name}: {discount_percentage}% off")
+            logger.info("[EMERGENCY] %s marked by %s: %s%% off", product.product_name, product.vendor.business_name, discount_percentage)
             
             return True, {
                 'message': 'Product marked as emergency!',
@@ -201,14 +185,48 @@ class EmergencyMarketplaceService:
             
             product.remove_emergency()
             db.session.commit()
+            CartService.reprice([product.id])
             
-            print(f"[REMOVED] {product.product_name} removed from emergency")
+            logger.info("[REMOVED] %s removed from emergency", product.product_name)
             
             return True, "Removed from emergency marketplace"
         
         except Exception as e:
             return False, str(e)
     
+    # Share of an emergency listing assumed to be wasted without the marketplace (MOCK)
+    WASTE_SHARE = 0.5
+    
+    SNAPSHOT_SQL = """
+        SELECT
+            COUNT(*) AS total_products,
+            COALESCE(SUM(COALESCE(NULLIF(original_price_backup, 0), price) * quantity), 0) AS original_value,
+            COALESCE(SUM(price * quantity), 0) AS emergency_value,
+            COALESCE(SUM(quantity), 0) AS total_quantity,
+            COUNT(DISTINCT vendor_id) AS unique_vendors
+        FROM products
+        WHERE is_emergency = true AND is_active = true
+    """
+    
+    DAILY_SALES_SQL = """
+        SELECT
+            DATE(o.created_at) AS day,
+            COUNT(DISTINCT o.buyer_id) AS unique_retailers,
+            COALESCE(SUM(e.items_sold), 0) AS items_sold,
+            COALESCE(SUM(o.total_amount), 0) AS sales_value
+        FROM orders o
+        JOIN (
+            SELECT oi.order_id, SUM(oi.quantity) AS items_sold
+            FROM order_items oi
+            JOIN products p ON p.id = oi.product_id
+            JOIN orders so ON so.id = oi.order_id
+            WHERE p.is_emergency = true
+              AND so.created_at >= :start AND so.created_at < :end
+            GROUP BY oi.order_id
+        ) e ON e.order_id = o.id
+        GROUP BY DATE(o.created_at)
+    """
+    
     @staticmethod
     def calculate_and_update_metrics(target_date=None):
         """
@@ -224,69 +242,93 @@ class EmergencyMarketplaceService:
         if target_date is None:
             target_date = date.today()
         
+        rows = EmergencyMarketplaceService.backfill_metrics(target_date, target_date, snapshot_date=target_date)
+        return rows[0] if rows else None
+    
+    @staticmethod
+    def backfill_metrics(start_date, end_date, snapshot_date=None):
+        """
+        Compute EmergencyMarketplaceMetrics for every day in [start_date, end_date] in one pass
+        
+        Sales fields come from one grouped query over orders/order_items for the whole range.
+        Product fields (listings, value at risk, waste) are a snapshot of the current
+        emergency listings, so they are only written for snapshot_date (default: today,
+        if it falls in the range) - past days keep the snapshot taken on that day.
+        
+        Returns:
+            list of EmergencyMarketplaceMetrics rows (oldest first), or None on error
+        """
+        
+        if snapshot_date is None:
+            snapshot_date = date.today()
+        
         try:
-            # Get emergency products
-            emergency_products = Product.query.filter_by(
-                is_emergency=True,
-                is_active=True
-            ).all()
-            
-            total_emergency = len(emergency_products)
-            
-            # Calculate financial impact
-            total_original_value = sum(
-                (p.original_price_backup or p.price) * p.quantity 
-                for p in emergency_products
-            )
-            total_emergency_value = sum(p.price * p.quantity for p in emergency_products)
-            total_discount_given = total_original_value - total_emergency_value
-            
-            # Estimate waste prevented (MOCK: assume 50% would be wasted without emergency marketplace)
-            estimated_waste_kg = sum(p.quantity * 0.5 for p in emergency_products)
+            range_start = datetime.combine(start_date, datetime.min.time())
+            range_end = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
             
-            # Count unique vendors and retailers
-            vendors_with_emergency = len(set(p.vendor_id for p in emergency_products))
+            sales_by_day = {}
+            for row in db.session.execute(text(EmergencyMarketplaceService.DAILY_SALES_SQL), {
+                'start': range_start,
+                'end': range_end
+            }):
+                day = date.fromisoformat(row.day) if isinstance(row.day, str) else row.day
+                sales_by_day[day] = row
             
-            # Get orders with emergency products from today
-            orders_today = Order.query.filter(
-                Order.created_at >= datetime.combine(target_date, datetime.min.time()),
-                Order.created_at < datetime.combine(target_date + timedelta(days=1), datetime.min.time())
-            ).all()
+            snapshot = None
+            if start_date <= snapshot_date <= end_date:
+                snapshot = db.session.execute(text(EmergencyMarketplaceService.SNAPSHOT_SQL)).first()
             
-            emergency_orders = [o for o in orders_today if any(item.product.is_emergency for item in o.items)]
-            retailers_buying = len(set(o.buyer_id for o in emergency_orders))
-            items_sold = sum(
-                sum(item.quantity for item in o.items if item.product.is_emergency) 
-                for o in emergency_orders
-            )
-            sales_value = sum(o.total_amount for o in emergency_orders)
-            
-            # Create/update metrics
-            metrics = EmergencyMarketplaceMetrics.query.filter_by(date=target_date).first()
-            
-            if not metrics:
-                metrics = EmergencyMarketplaceMetrics(date=target_date)
+            existing = {
+                m.date: m
+                for m in EmergencyMarketplaceMetrics.query.filter(
+                    EmergencyMarketplaceMetrics.date >= start_date,
+                    EmergencyMarketplaceMetrics.date <= end_date
+                ).all()
+            }
             
-            metrics.total_emergency_products = total_emergency
-            metrics.total_emergency_items_sold = int(items_sold)
-            metrics.original_value_at_risk = total_original_value
-            metrics.emergency_sale_value = total_emergency_value
-            metrics.total_discount_given = total_discount_given
-            metrics.vendor_recovery_value = sales_value
-            metrics.estimated_waste_prevented_kg = estimated_waste_kg
-            metrics.unique_vendors = vendors_with_emergency
-            metrics.unique_retailers = retailers_buying
+            results = []
+            day = start_date
+            while day <= end_date:
+                metrics = existing.get(day)
+                if not metrics:
+                    metrics = EmergencyMarketplaceMetrics(
+                        date=day,
+                        total_emergency_products=0,
+                        original_value_at_risk=0,
+                        emergency_sale_value=0,
+                        total_discount_given=0,
+                        estimated_waste_prevented_kg=0,
+                        unique_vendors=0
+                    )
+                    db.session.add(metrics)
+                
+                sales = sales_by_day.get(day)
+                metrics.total_emergency_items_sold = int(sales.items_sold) if sales else 0
+                metrics.vendor_recovery_value = float(sales.sales_value) if sales else 0
+                metrics.unique_retailers = sales.unique_retailers if sales else 0
+                
+                if snapshot is not None and day == snapshot_date:
+                    metrics.total_emergency_products = snapshot.total_products
+                    metrics.original_value_at_risk = float(snapshot.original_value)
+                    metrics.emergency_sale_value = float(snapshot.emergency_value)
+                    metrics.total_discount_given = float(snapshot.original_value - snapshot.emergency_value)
+                    metrics.estimated_waste_prevented_kg = float(snapshot.total_quantity) * EmergencyMarketplaceService.WASTE_SHARE
+                    metrics.unique_vendors = snapshot.unique_vendors
+                
+                results.append(metrics)
+                day += timedelta(days=1)
             
-            db.session.add(metrics)
             db.session.commit()
             
-            print(f"[METRICS] Updated for {target_date}: {total_emergency} products, {items_sold} items sold")
+            items_sold = sum(m.total_emergency_items_sold for m in results)
+            logger.info("[METRICS] Updated %d day(s) %s to %s: %s products, %s items sold", len(results), start_date,
+                        end_date, snapshot.total_products if snapshot else '-', items_sold)
             
-            return metrics
+            return results
         
         except Exception as e:
             db.session.rollback()
-            print(f"[METRICS ERROR] {str(e)}")
+            logger.error("[METRICS ERROR] %s", e)
             return None
     
     @staticmethod
@@ -0,0 +1,185 @@
+"""
+Expiry Engine
+Set-based expiry scanning for the nightly notification / emergency tasks
+
+Instead of loading expiring products and mutating them one by one, every step is
+a bulk UPDATE over a predicate:
+- hide_expired:          is_active = false for products past their expiry date
+- flag_expiring:         emergency flag + discounted price, one UPDATE per days-left bucket
+- refresh_days_left:     days_until_expiry for live emergency listings
+- expiring_by_vendor:    one ordered query, grouped by vendor for notifications
+
+Updates run in primary-key chunks (commit per chunk) so locks stay short on a
+large catalogue, and dry_run=True only counts the rows each step would touch.
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from itertools import groupby
+from sqlalchemy import and_, func, or_, select, text
+from app import db
+from app.cart_service import CartService
+from app.models import Product
+
+logger = logging.getLogger(__name__)
+
+
+class ExpiryEngine:
+    """
+    Bulk expiry updates over the products table
+    """
+
+    CHUNK_SIZE = 5000
+
+    # Days from :today to expiry_date (dialect specific date arithmetic)
+    DAYS_LEFT_SQL = {
+        'sqlite': "CAST(julianday(products.expiry_date) - julianday(:today) AS INTEGER)",
+        'postgresql': "(products.expiry_date - CAST(:today AS DATE))",
+    }
+
+    @staticmethod
+    def suggested_discount(days_left):
+        """Emergency discount (%) suggested for a product expiring in days_left days"""
+        if days_left <= 0:
+            return 60  # Expires today - 60% off
+        if days_left == 1:
+            return 50  # Tomorrow - 50% off
+        if days_left == 2:
+            return 40  # In 2 days - 40% off
+        return 30  # In 3+ days - 30% off
+
+    @staticmethod
+    def _bulk_update(label, predicate, values, dry_run=False, chunk_size=None):
+        """
+        UPDATE products SET values WHERE predicate, in id-range chunks (commits per chunk)
+
+        Returns:
+            rows updated (or rows that would be updated, when dry_run)
+        """
+        table = Product.__table__
+        chunk_size = chunk_size or ExpiryEngine.CHUNK_SIZE
+
+        if dry_run:
+            count = db.session.execute(select(func.count()).select_from(table).where(predicate)).scalar()
+            logger.info("[DRY RUN] %s: %s products", label, count)
+            return count
+
+        low, high = db.session.execute(
+            select(func.min(table.c.id), func.max(table.c.id)).where(predicate)
+        ).first()
+        if low is None:
+            return 0
+
+        updated = 0
+        start = low - 1
+        while start < high:
+            end = start + chunk_size
+            result = db.session.execute(
+                table.update().where(predicate, table.c.id > start, table.c.id <= end).values(values)
+            )
+            db.session.commit()
+            updated += result.rowcount
+            start = end
+            if high - low >= chunk_size:
+                logger.info("%s: %s updated (ids up to %s of %s)", label, updated, min(end, high), high)
+
+        logger.info("%s: %s products", label, updated)
+        return updated
+
+    @staticmethod
+    def hide_expired(today=None, dry_run=False, chunk_size=None):
+        """Deactivate products whose expiry date has passed"""
+        today = today or date.today()
+        table = Product.__table__
+        return ExpiryEngine._bulk_update(
+            'Auto-hidden expired',
+            and_(table.c.expiry_date < today, table.c.is_active == True),
+            {'is_active': False},
+            dry_run=dry_run, chunk_size=chunk_size
+        )
+
+    @staticmethod
+    def flag_expiring(days_before_expiry, today=None, dry_run=False, chunk_size=None):
+        """
+        Put products expiring in 1..days_before_expiry days on emergency sale
+
+        One UPDATE per days-left bucket, so the discount and days_until_expiry are
+        constants and the price is discounted in SQL (original kept in original_price_backup).
+        Carts holding the discounted products are repriced afterwards.
+
+        Returns:
+            dict of days_left -> products flagged
+        """
+        today = today or date.today()
+        table = Product.__table__
+        now = datetime.utcnow()
+        flagged = {}
+
+        for days_left in range(1, days_before_expiry + 1):
+            discount = ExpiryEngine.suggested_discount(days_left)
+            flagged[days_left] = ExpiryEngine._bulk_update(
+                f'Auto-flagged {discount}% off (expires in {days_left}d)',
+                and_(
+                    table.c.expiry_date == today + timedelta(days=days_left),
+                    table.c.is_active == True,
+                    table.c.is_emergency == False
+                ),
+                {
+                    'is_emergency': True,
+                    'emergency_discount': discount,
+                    'original_price_backup': table.c.price,
+                    'price': table.c.price * (1 - discount / 100),
+                    'emergency_marked_at': now,
+                    'days_until_expiry': days_left
+                },
+                dry_run=dry_run, chunk_size=chunk_size
+            )
+
+        if not dry_run and any(flagged.values()):
+            CartService.reprice()
+        return flagged
+
+    @staticmethod
+    def refresh_days_left(today=None, dry_run=False, chunk_size=None):
+        """Recompute days_until_expiry on live emergency listings whose value is stale"""
+        today = today or date.today()
+        table = Product.__table__
+        dialect = db.session.get_bind().dialect.name
+        days_left = text(
+            ExpiryEngine.DAYS_LEFT_SQL.get(dialect, ExpiryEngine.DAYS_LEFT_SQL['postgresql'])
+        ).bindparams(today=today)
+
+        return ExpiryEngine._bulk_update(
+            'Refreshed days until expiry',
+            and_(
+                table.c.is_emergency == True,
+                table.c.is_active == True,
+                table.c.expiry_date >= today,
+                or_(table.c.days_until_expiry.is_(None), table.c.days_until_expiry != days_left)
+            ),
+            {'days_until_expiry': days_left},
+            dry_run=dry_run, chunk_size=chunk_size
+        )
+
+    @staticmethod
+    def expiring_by_vendor(days_threshold=7, today=None):
+        """
+        Active, non-emergency products expiring within days_threshold days, grouped by vendor
+
+        Returns:
+            dict of vendor_id -> list of rows (id, product_name, expiry_date, quantity, unit, price)
+        """
+        today = today or date.today()
+        rows = db.session.execute(
+            select(
+                Product.vendor_id, Product.id, Product.product_name, Product.expiry_date,
+                Product.quantity, Product.unit, Product.price
+            ).where(
+                Product.expiry_date <= today + timedelta(days=days_threshold),
+                Product.expiry_date >= today,
+                Product.is_active == True,
+                Product.is_emergency == False
+            ).order_by(Product.vendor_id, Product.expiry_date, Product.id)
+        ).all()
+
+        return {vendor_id: list(products) for vendor_id, products in groupby(rows, key=lambda row: row.vendor_id)}
@@ -0,0 +1,363 @@
+"""
+Fuzzy Product Name Index
+Spelling correction for speech-to-text and typed searches ("tomatos", "onian", "brinjol")
+
+- SpellingIndex: SymSpell-style dictionary. Every word is stored under all its deletions
+  (up to MAX_EDIT_DISTANCE, on the first PREFIX_LENGTH characters), so a lookup only
+  generates the query's own deletions and verifies a handful of candidates with
+  Damerau-Levenshtein distance - no scan over the vocabulary
+- ProductNameIndex: per-worker index over the words of distinct active product names,
+  categories and the search synonyms, plus word -> product name postings for "did you
+  mean" suggestions, ranked by how many listings carry the name
+- Kept current from a change feed: products whose updated_at moved past the last
+  seen watermark (minus CHANGE_FEED_LAG_SECONDS, for rows committed late) are diffed
+  in (at most every FUZZY_INDEX_REFRESH_SECONDS); a full rebuild only happens on first
+  use or when rows were hard-deleted
+"""
+
+import logging
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import func, select
+from app import db
+from app.models import Product
+from app.search_service import ProductSearchService
+
+logger = logging.getLogger(__name__)
+
+
+def edit_distance(a, b, limit):
+    """
+    Optimal string alignment distance (adjacent swaps count as one edit),
+    or limit + 1 as soon as it must exceed limit
+    """
+    if a == b:
+        return 0
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous_previous[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class SpellingIndex:
+    """
+    Incremental SymSpell dictionary: add()/remove() words, lookup() corrections
+    """
+
+    def __init__(self, max_distance=2, prefix_length=7):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.counts = Counter()  # word -> frequency
+        self.deletes = defaultdict(set)  # deletion variant -> words
+
+    def _variants(self, word):
+        """word's prefix plus every string reachable by up to max_distance deletions"""
+        key = word[:self.prefix_length]
+        variants = {key}
+        frontier = {key}
+        for _ in range(self.max_distance):
+            next_frontier = set()
+            for item in frontier:
+                if len(item) <= 1:
+                    continue
+                for i in range(len(item)):
+                    next_frontier.add(item[:i] + item[i + 1:])
+            variants |= next_frontier
+            frontier = next_frontier
+        return variants
+
+    def add(self, word, count=1):
+        if self.counts[word] == 0:
+            for variant in self._variants(word):
+                self.deletes[variant].add(word)
+        self.counts[word] += count
+
+    def remove(self, word, count=1):
+        if self.counts[word] <= count:
+            self.counts.pop(word, None)
+            for variant in self._variants(word):
+                words = self.deletes.get(variant)
+                if words is not None:
+                    words.discard(word)
+                    if not words:
+                        del self.deletes[variant]
+        else:
+            self.counts[word] -= count
+
+    def __contains__(self, word):
+        return self.counts.get(word, 0) > 0
+
+    def lookup(self, word, k=5, max_distance=None):
+        """
+        Closest known words
+
+        Returns:
+            [(word, distance, frequency)] sorted by distance, then frequency
+        """
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        if word in self:
+            return [(word, 0, self.counts[word])]
+
+        candidates = set()
+        for variant in self._variants(word):
+            candidates.update(self.deletes.get(variant, ()))
+
+        matches = []
+        for candidate in candidates:
+            distance = edit_distance(word, candidate, max_distance)
+            if distance <= max_distance:
+                matches.append((candidate, distance, self.counts[candidate]))
+        matches.sort(key=lambda match: (match[1], -match[2], match[0]))
+        return matches[:k]
+
+
+class ProductNameIndex:
+    """
+    Per-worker spelling index over the product catalogue
+    """
+
+    DEFAULT_REFRESH_SECONDS = 30
+    DEFAULT_FEED_LAG_SECONDS = 5
+    MAX_EDIT_DISTANCE = 2
+    TOKEN_RE = re.compile(r'[\w\u0b80-\u0bff]+')  # \w alone splits Tamil words at vowel signs
+
+    _pid = None
+    _lock = threading.RLock()
+    _spelling = None
+    _postings = None  # word -> Counter(name key -> listings)
+    _names = None  # name key -> listings
+    _display = None  # name key -> product name as listed
+    _products = None  # product id -> (name key, category key) of active products, None if inactive
+    _watermark = None
+    _checked_at = 0.0
+    _counters = {'builds': 0, 'refreshes': 0, 'changes': 0, 'lookups': 0, 'corrections': 0}
+
+    # ============ TEXT ============
+
+    @staticmethod
+    def normalize(text):
+        return unicodedata.normalize('NFKC', text or '').casefold().strip()
+
+    @staticmethod
+    def tokens(text):
+        return ProductNameIndex.TOKEN_RE.findall(ProductNameIndex.normalize(text))
+
+    @staticmethod
+    def _config(name, default):
+        if not has_app_context():
+            return default
+        value = current_app.config.get(name)
+        return default if value is None else value
+
+    # ============ BUILD / CHANGE FEED ============
+
+    @staticmethod
+    def _reset():
+        ProductNameIndex._spelling = SpellingIndex(ProductNameIndex.MAX_EDIT_DISTANCE)
+        ProductNameIndex._postings = defaultdict(Counter)
+        ProductNameIndex._names = Counter()
+        ProductNameIndex._display = {}
+        ProductNameIndex._products = {}
+        ProductNameIndex._watermark = None
+
+        # Synonyms are always known words (FTS expands them to the English name)
+        for name, synonyms in ProductSearchService.SYNONYMS.items():
+            for word in [name] + synonyms:
+                for token in ProductNameIndex.tokens(word):
+                    ProductNameIndex._spelling.add(token)
+
+    @staticmethod
+    def _apply(product_id, name, category, active):
+        """Move one product's words from its old state to its new state"""
+        old = ProductNameIndex._products.get(product_id)
+        new = (ProductNameIndex.normalize(name), ProductNameIndex.normalize(category)) if active and name else None
+        if product_id in ProductNameIndex._products and old == new:
+            return False
+
+        spelling = ProductNameIndex._spelling
+        if old is not None:
+            key, category_key = old
+            for token in set(ProductNameIndex.tokens(key)) | set(ProductNameIndex.tokens(category_key)):
+                spelling.remove(token)
+            for token in set(ProductNameIndex.tokens(key)):
+                postings = ProductNameIndex._postings[token]
+                postings[key] -= 1
+                if postings[key] <= 0:
+                    del postings[key]
+                if not postings:
+                    del ProductNameIndex._postings[token]
+            ProductNameIndex._names[key] -= 1
+            if ProductNameIndex._names[key] <= 0:
+                del ProductNameIndex._names[key]
+                ProductNameIndex._display.pop(key, None)
+
+        if new is not None:
+            key, category_key = new
+            for token in set(ProductNameIndex.tokens(key)) | set(ProductNameIndex.tokens(category_key)):
+                spelling.add(token)
+            for token in set(ProductNameIndex.tokens(key)):
+                ProductNameIndex._postings[token][key] += 1
+            ProductNameIndex._names[key] += 1
+            ProductNameIndex._display.setdefault(key, name.strip())
+
+        ProductNameIndex._products[product_id] = new
+        return True
+
+    @staticmethod
+    def refresh(force=False):
+        """
+        Bring the index up to date with the products table
+
+        Reads only rows changed since the last refresh; runs at most every
+        FUZZY_INDEX_REFRESH_SECONDS unless force=True
+        """
+        interval = ProductNameIndex._config('FUZZY_INDEX_REFRESH_SECONDS', ProductNameIndex.DEFAULT_REFRESH_SECONDS)
+        with ProductNameIndex._lock:
+            if ProductNameIndex._pid != os.getpid():
+                ProductNameIndex._pid = os.getpid()
+                ProductNameIndex._spelling = None
+            now = time.monotonic()
+            if not force and ProductNameIndex._spelling is not None and now - ProductNameIndex._checked_at < interval:
+                return 0
+            ProductNameIndex._checked_at = now
+
+            try:
+                table = Product.__table__
+                if ProductNameIndex._spelling is not None:
+                    # Hard deletes don't show up in the feed; fall back to a rebuild
+                    total = db.session.execute(select(func.count()).select_from(table)).scalar()
+                    if total < len(ProductNameIndex._products):
+                        ProductNameIndex._spelling = None
+
+                rebuild = ProductNameIndex._spelling is None
+                if rebuild:
+                    ProductNameIndex._reset()
+                    ProductNameIndex._counters['builds'] += 1
+                else:
+                    ProductNameIndex._counters['refreshes'] += 1
+
+                query = select(table.c.id, table.c.product_name, table.c.category, table.c.is_active, table.c.updated_at)
+                if ProductNameIndex._watermark is not None:
+                    # updated_at is stamped at flush: a row committed after a newer one was read sits
+                    # below the watermark, so re-read a lag window (applying is idempotent)
+                    lag = ProductNameIndex._config('CHANGE_FEED_LAG_SECONDS', ProductNameIndex.DEFAULT_FEED_LAG_SECONDS)
+                    query = query.where(table.c.updated_at >= ProductNameIndex._watermark - timedelta(seconds=lag))
+
+                changed = 0
+                watermark = ProductNameIndex._watermark
+                for row in db.session.execute(query):
+                    changed += ProductNameIndex._apply(row.id, row.product_name, row.category, row.is_active is not False)
+                    if row.updated_at is not None and (watermark is None or row.updated_at > watermark):
+                        watermark = row.updated_at
+                ProductNameIndex._watermark = watermark or datetime.utcnow()
+                ProductNameIndex._counters['changes'] += changed
+                return changed
+            except Exception as e:
+                logger.warning("Fuzzy index refresh failed: %s", e)
+                if ProductNameIndex._spelling is None:
+                    ProductNameIndex._reset()
+                return 0
+
+    # ============ LOOKUPS ============
+
+    @staticmethod
+    def _max_distance(word):
+        """Short words get fewer edits, or every 3-letter word would match every other"""
+        if len(word) <= 3:
+            return 0
+        if len(word) <= 5:
+            return 1
+        return ProductNameIndex.MAX_EDIT_DISTANCE
+
+    @staticmethod
+    def corrections(word, k=5):
+        """
+        Top-k known words for one (possibly misspelled) word
+
+        Returns:
+            [(word, distance, frequency)]
+        """
+        ProductNameIndex.refresh()
+        word = ProductNameIndex.normalize(word)
+        with ProductNameIndex._lock:
+            ProductNameIndex._counters['lookups'] += 1
+            return ProductNameIndex._spelling.lookup(word, k=k, max_distance=ProductNameIndex._max_distance(word))
+
+    @staticmethod
+    def correct(text):
+        """
+        text with each unknown word replaced by its best correction (known words,
+        numbers and filler words are left alone); text itself if nothing changed
+        """
+        ProductNameIndex.refresh()
+        words = ProductNameIndex.tokens(text)
+        corrected = []
+        with ProductNameIndex._lock:
+            ProductNameIndex._counters['lookups'] += 1
+            spelling = ProductNameIndex._spelling
+            for word in words:
+                if word in spelling or word.isdigit() or word in ProductSearchService.STOP_WORDS:
+                    corrected.append(word)
+                    continue
+                matches = spelling.lookup(word, k=1, max_distance=ProductNameIndex._max_distance(word))
+                corrected.append(matches[0][0] if matches else word)
+            if corrected == words:
+                return text
+            ProductNameIndex._counters['corrections'] += 1
+        return ' '.join(corrected)
+
+    @staticmethod
+    def suggest(text, k=5):
+        """
+        Product names for a query that found nothing, best first: names sharing the
+        most (corrected, rarity-weighted) words with the query, then the most widely listed
+        """
+        ProductNameIndex.refresh()
+        scores = Counter()
+        with ProductNameIndex._lock:
+            ProductNameIndex._counters['lookups'] += 1
+            spelling = ProductNameIndex._spelling
+            for word in set(ProductNameIndex.tokens(text)):
+                if word.isdigit() or word in ProductSearchService.STOP_WORDS:
+                    continue
+                for candidate, distance, _ in spelling.lookup(word, k=3, max_distance=ProductNameIndex._max_distance(word)):
+                    postings = ProductNameIndex._postings.get(candidate, ())
+                    # Rare words say more: a misheard "tomatos" still outweighs an exact "fresh"
+                    weight = math.log(1 + len(ProductNameIndex._names) / len(postings)) * 0.8 ** distance if postings else 0
+                    for key in postings:
+                        scores[key] += weight
+            ranked = sorted(scores, key=lambda key: (-scores[key], -ProductNameIndex._names[key], key))
+            return [ProductNameIndex._display[key] for key in ranked[:k]]
+
+    @staticmethod
+    def stats():
+        with ProductNameIndex._lock:
+            stats = dict(ProductNameIndex._counters)
+            if ProductNameIndex._spelling is not None:
+                stats['words'] = len(ProductNameIndex._spelling.counts)
+                stats['delete_variants'] = len(ProductNameIndex._spelling.deletes)
+                stats['names'] = len(ProductNameIndex._names)
+                stats['watermark'] = ProductNameIndex._watermark.isoformat() if ProductNameIndex._watermark else None
+            return stats
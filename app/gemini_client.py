@@ -0,0 +1,165 @@
+"""
+Gemini Model Registry
+One configured SDK and one GenerativeModel per model name, per worker process
+
+- google.generativeai is imported on first use, not at app import (faster worker boot)
+- genai.configure() runs once per process instead of on every request
+- Models are cached by name and shared by ChatbotService, VoiceService and VisionService
+- Fork-safe: the SDK's gRPC channels must not cross a fork, so a new process
+  (e.g. a gunicorn worker forked from a --preload master) starts with an empty registry
+- Every generate_content() call is timed; stats() gives per-model calls, errors and latency
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from flask import current_app, has_app_context
+from app.metrics import Metrics
+
+
+class TrackedModel:
+    """GenerativeModel wrapper that records latency and errors for GeminiRegistry.stats()"""
+
+    def __init__(self, name, model):
+        self.name = name
+        self.model = model
+
+    def generate_content(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.model.generate_content(*args, **kwargs)
+        except Exception as e:
+            GeminiRegistry._record(self.name, time.perf_counter() - start, e)
+            raise
+        GeminiRegistry._record(self.name, time.perf_counter() - start)
+        return response
+
+    def __getattr__(self, attr):
+        return getattr(self.model, attr)
+
+
+class GeminiRegistry:
+    """
+    Process-wide, lazily created Gemini clients
+    """
+
+    CHATBOT_MODEL = 'gemini-2.0-flash'
+    VISION_MODEL = 'gemini-1.5-flash'
+    VOICE_MODEL = 'gemini-1.5-flash'
+
+    # Latency percentiles are computed over this many recent calls per model
+    LATENCY_WINDOW = 256
+
+    _pid = None
+    _configured_key = None
+    _genai = None
+    _models = {}
+    _stats = {}
+    _lock = threading.RLock()
+
+    @staticmethod
+    def api_key():
+        key = current_app.config.get('GEMINI_API_KEY') if has_app_context() else None
+        return key or os.environ.get('GEMINI_API_KEY') or None
+
+    @staticmethod
+    def is_configured():
+        """True if a Gemini API key is available (doesn't import the SDK)"""
+        return bool(GeminiRegistry.api_key())
+
+    @staticmethod
+    def _check_process():
+        """Forget clients created in a parent process (call with _lock held)"""
+        if GeminiRegistry._pid != os.getpid():
+            GeminiRegistry._pid = os.getpid()
+            GeminiRegistry._configured_key = None
+            GeminiRegistry._models = {}
+            GeminiRegistry._stats = {}
+
+    @staticmethod
+    def _sdk():
+        """google.generativeai, imported and configured once per process"""
+        key = GeminiRegistry.api_key()
+        if not key:
+            raise ValueError("GEMINI_API_KEY not set")
+        with GeminiRegistry._lock:
+            GeminiRegistry._check_process()
+            if GeminiRegistry._genai is None:
+                import google.generativeai as genai
+                GeminiRegistry._genai = genai
+            if GeminiRegistry._configured_key != key:
+                GeminiRegistry._genai.configure(api_key=key)
+                GeminiRegistry._configured_key = key
+                GeminiRegistry._models = {}
+            return GeminiRegistry._genai
+
+    @staticmethod
+    def _new_model(name):
+        return GeminiRegistry._sdk().GenerativeModel(name)
+
+    @staticmethod
+    def model(name):
+        """
+        Shared model for name (created on first use in this process)
+
+        Raises:
+            ValueError if no API key is configured
+        """
+        with GeminiRegistry._lock:
+            GeminiRegistry._check_process()
+            model = GeminiRegistry._models.get(name)
+            if model is None:
+                model = TrackedModel(name, GeminiRegistry._new_model(name))
+                GeminiRegistry._models[name] = model
+            return model
+
+    @staticmethod
+    def reset():
+        """Drop all clients (e.g. after rotating the API key)"""
+        with GeminiRegistry._lock:
+            GeminiRegistry._pid = None
+            GeminiRegistry._check_process()
+
+    # ============ STATS ============
+
+    @staticmethod
+    def _record(name, seconds, error=None):
+        Metrics.GEMINI_SECONDS.observe(seconds, model=name, outcome='ok' if error is None else 'error')
+        with GeminiRegistry._lock:
+            GeminiRegistry._check_process()
+            stats = GeminiRegistry._stats.get(name)
+            if stats is None:
+                stats = GeminiRegistry._stats[name] = {
+                    'calls': 0, 'errors': 0, 'total_seconds': 0.0, 'max_seconds': 0.0,
+                    'last_error': None, 'recent': deque(maxlen=GeminiRegistry.LATENCY_WINDOW)
+                }
+            stats['calls'] += 1
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            stats['recent'].append(seconds)
+            if error is not None:
+                stats['errors'] += 1
+                stats['last_error'] = f'{type(error).__name__}: {error}'[:200]
+
+    @staticmethod
+    def stats():
+        """Per-model call counts, error rate and latency (ms) for this worker"""
+        with GeminiRegistry._lock:
+            GeminiRegistry._check_process()
+            snapshot = {name: dict(stats, recent=sorted(stats['recent'])) for name, stats in GeminiRegistry._stats.items()}
+
+        result = {}
+        for name, stats in snapshot.items():
+            recent = stats['recent']
+            result[name] = {
+                'calls': stats['calls'],
+                'errors': stats['errors'],
+                'error_rate': round(stats['errors'] / stats['calls'], 4) if stats['calls'] else 0.0,
+                'avg_ms': round(stats['total_seconds'] / stats['calls'] * 1000, 1) if stats['calls'] else 0.0,
+                'p50_ms': round(recent[len(recent) // 2] * 1000, 1) if recent else 0.0,
+                'p95_ms': round(recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000, 1) if recent else 0.0,
+                'max_ms': round(stats['max_seconds'] * 1000, 1),
+                'last_error': stats['last_error']
+            }
+        return result
@@ -0,0 +1,154 @@
+"""
+Health Checks
+Liveness and readiness probes that stay cheap at any probe rate or table size
+
+- Liveness (/health/live): the worker is running and answering - no database, no
+  session, no model calls
+- Readiness (/health/ready): can this worker serve traffic right now?
+  * database: a `SELECT 1` ping, cached for HEALTH_DB_PING_TTL_SECONDS, so probes from
+    every load balancer cost one round trip per TTL per worker; while one thread pings,
+    concurrent probes answer from the cached result instead of queueing behind it
+  * pool: connections checked out vs pool size + overflow; a saturated pool reports not
+    ready without pinging (the ping would only wait for a free connection)
+  * llm: circuit-breaker state from LLMGateway - open breakers degrade the answer but never
+    fail it, since requests fall back to local answers
+"""
+
+import os
+import threading
+import time
+from flask import current_app
+from sqlalchemy import text
+from app import db
+
+
+class DatabasePing:
+    """Last `SELECT 1` result for one app's engine in this process"""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.checked_at = None  # time.monotonic() of the last ping
+        self.ok = False
+        self.latency_ms = None
+        self.error = None
+
+    def snapshot(self, now):
+        result = {
+            'ok': self.ok,
+            'latency_ms': self.latency_ms,
+            'checked_seconds_ago': round(now - self.checked_at, 3) if self.checked_at is not None else None
+        }
+        if self.error:
+            result['error'] = self.error
+        return result
+
+
+class HealthChecks:
+    """
+    Probe logic behind /health/live, /health/ready and the legacy /health
+    """
+
+    DEFAULT_PING_TTL_SECONDS = 2.0
+    EXTENSION = 'health_checks'
+
+    _started = time.time()
+
+    # ============ LIVENESS ============
+
+    @staticmethod
+    def liveness():
+        """No I/O: answering at all is the signal"""
+        return {
+            'status': 'alive',
+            'pid': os.getpid(),
+            'uptime_seconds': round(time.time() - HealthChecks._started, 1)
+        }
+
+    # ============ READINESS ============
+
+    @staticmethod
+    def _ping_state():
+        state = current_app.extensions.get(HealthChecks.EXTENSION)
+        if state is None or state.pid != os.getpid():
+            # First probe, or a forked worker (the parent's lock may be held for ever)
+            state = current_app.extensions[HealthChecks.EXTENSION] = DatabasePing()
+        return state
+
+    @staticmethod
+    def database(ttl=None):
+        """Cached `SELECT 1`: at most one ping per TTL, never two at once"""
+        if ttl is None:
+            ttl = current_app.config.get('HEALTH_DB_PING_TTL_SECONDS') or HealthChecks.DEFAULT_PING_TTL_SECONDS
+        state = HealthChecks._ping_state()
+        now = time.monotonic()
+        if state.checked_at is not None and now - state.checked_at < ttl:
+            return state.snapshot(now)
+        if not state.lock.acquire(blocking=state.checked_at is None):
+            return state.snapshot(now)  # Another probe is pinging; answer from the last result
+        try:
+            started = time.perf_counter()
+            try:
+                with db.engine.connect() as conn:
+                    conn.execute(text('SELECT 1'))
+                state.ok, state.error = True, None
+            except Exception as e:
+                state.ok, state.error = False, f'{type(e).__name__}: {str(e)[:200]}'
+            state.latency_ms = round((time.perf_counter() - started) * 1000, 2)
+            state.checked_at = time.monotonic()
+            return state.snapshot(state.checked_at)
+        finally:
+            state.lock.release()
+
+    @staticmethod
+    def pool():
+        """Checked-out connections vs capacity (pools without a fixed size never saturate)"""
+        pool = db.engine.pool
+        result = {'class': type(pool).__name__}
+        if not hasattr(pool, 'checkedout') or not hasattr(pool, 'size'):
+            result['saturated'] = False
+            return result
+        size = pool.size()
+        max_overflow = getattr(pool, '_max_overflow', 0)
+        checked_out = pool.checkedout()
+        result.update({
+            'size': size,
+            'max_overflow': max_overflow,
+            'checked_out': checked_out,
+            'saturated': max_overflow >= 0 and checked_out >= size + max_overflow
+        })
+        return result
+
+    @staticmethod
+    def llm():
+        from app.llm_gateway import LLMGateway
+        breakers = LLMGateway.stats()['breakers']
+        open_breakers = sorted(model for model, breaker in breakers.items() if breaker['state'] == 'open')
+        return {
+            'status': 'degraded' if open_breakers else 'ok',
+            'open_breakers': open_breakers,
+            'breakers': breakers
+        }
+
+    @staticmethod
+    def readiness():
+        """
+        Returns:
+            (report dict, ready bool) - not ready when the database is unreachable or the pool is full
+        """
+        pool = HealthChecks.pool()
+        if pool['saturated']:
+            database = HealthChecks._ping_state().snapshot(time.monotonic())
+            database['skipped'] = 'pool saturated'
+        else:
+            database = HealthChecks.database()
+        ready = database['ok'] and not pool['saturated']
+        report = {
+            'status': 'ready' if ready else 'not_ready',
+            'checks': {
+                'database': database,
+                'pool': pool,
+                'llm': HealthChecks.llm()
+            }
+        }
+        return report, ready
@@ -0,0 +1,301 @@
+"""
+Image Pipeline
+Turns an uploaded phone photo into what the vision model actually needs
+
+- Decoded once, on a small dedicated pool (VISION_DECODE_WORKERS), never on the request
+  thread; the pool also caps how many full-size bitmaps a worker holds at a time
+- JPEGs are decoded at reduced scale (PIL draft mode), so a 12 MP photo never
+  becomes a 36 MB bitmap just to be shrunk (and decoding is ~2x faster)
+- EXIF orientation is applied, then the image is downsized to VISION_MAX_EDGE_PX
+  and re-encoded (VISION_IMAGE_FORMAT JPEG/WEBP at VISION_IMAGE_QUALITY) without metadata
+- The LLM cache is keyed on a SHA-256 of the prepared bytes: the exact same photo gets the
+  same answer. A 64-bit difference hash (dHash) is kept too; re-compressing or EXIF-rotating
+  a picture flips at most a bit or two, so a hash within DEDUPE_BITS of one seen recently in
+  this worker maps to that one. Photos that merely look alike (the same tray, the same
+  framing) match as well, so only prompts that tolerate that opt in to the dHash key
+
+PIL is imported on first use so importing the app doesn't pay for it.
+"""
+
+import base64
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from flask import current_app, has_app_context
+
+
+class InvalidImage(ValueError):
+    """Upload isn't a readable image (or is too large to decode safely)"""
+
+
+class PreparedImage:
+    """Model-ready image: encoded bytes plus what we learned while decoding"""
+
+    def __init__(self, data, mime_type, width, height, source_bytes, phash, dedupe_hash=None):
+        self.data = data
+        self.mime_type = mime_type
+        self.width = width
+        self.height = height
+        self.source_bytes = source_bytes
+        self.phash = phash
+        self.dedupe_hash = dedupe_hash or phash
+        self.digest = hashlib.sha256(data).hexdigest()
+
+    def as_part(self):
+        """Inline blob for generate_content() (sent as is, the SDK doesn't re-encode it)"""
+        return {'mime_type': self.mime_type, 'data': self.data}
+
+    def cache_payload(self, near_duplicates=False):
+        """
+        LLM cache input: a digest of the exact bytes, or with near_duplicates the (deduplicated)
+        perceptual hash and shape, which different photos of similar-looking scenes can share
+        """
+        if near_duplicates:
+            return {'dhash': self.dedupe_hash, 'size': f'{self.width}x{self.height}'}
+        return {'sha256': self.digest}
+
+
+class ImagePipeline:
+    """
+    Decode -> orient -> downsize -> re-encode -> hash
+    """
+
+    DEFAULT_MAX_EDGE = 1024  # Gemini tiles images at 768 px; more detail than this is billed, not used
+    DEFAULT_FORMAT = 'JPEG'
+    DEFAULT_QUALITY = 85
+    DEFAULT_WORKERS = 2
+    DEFAULT_TIMEOUT = 10
+    # A JPEG may be decoded this much under max_edge if that lets it use the next smaller
+    # draft scale (4032 px -> 1008 px at 1/4 instead of 2016 px at 1/2, then resampled)
+    DRAFT_SLACK = 0.9
+    MAX_PIXELS = 40_000_000  # Refuse decompression bombs (a 5 MB upload can claim any size)
+    DEDUPE_BITS = 4  # Two photos of different things differ by 15+ of the 64 bits
+    RECENT_HASHES = 1024
+
+    MIME_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp'}
+
+    _pid = None
+    _executor = None
+    _recent = OrderedDict()  # dhash int -> dhash hex, most recently seen last
+    _lock = threading.Lock()
+    _counters = {
+        'images': 0,
+        'invalid': 0,
+        'near_duplicates': 0,
+        'source_bytes': 0,
+        'output_bytes': 0,
+        'decode_seconds': 0.0
+    }
+
+    # ============ CONFIG ============
+
+    @staticmethod
+    def _config(name, default):
+        if not has_app_context():
+            return default
+        value = current_app.config.get(name)
+        return default if value is None else value
+
+    @staticmethod
+    def settings():
+        """(max_edge, format, quality) from the app config"""
+        image_format = str(ImagePipeline._config('VISION_IMAGE_FORMAT', ImagePipeline.DEFAULT_FORMAT)).upper()
+        if image_format not in ImagePipeline.MIME_TYPES:
+            image_format = ImagePipeline.DEFAULT_FORMAT
+        return (
+            int(ImagePipeline._config('VISION_MAX_EDGE_PX', ImagePipeline.DEFAULT_MAX_EDGE)),
+            image_format,
+            int(ImagePipeline._config('VISION_IMAGE_QUALITY', ImagePipeline.DEFAULT_QUALITY))
+        )
+
+    # ============ PIPELINE ============
+
+    @staticmethod
+    def decode_data(image_data):
+        """Raw bytes of a base64 data URL or an image file path"""
+        if image_data.startswith('data:image'):
+            try:
+                return base64.b64decode(image_data.split(',', 1)[1])
+            except (IndexError, ValueError) as e:
+                ImagePipeline._count('invalid')
+                raise InvalidImage(f'Bad image data URL: {e}')
+        with open(image_data, 'rb') as image_file:
+            return image_file.read()
+
+    @staticmethod
+    def prepare(image_bytes, max_edge=None, image_format=None, quality=None):
+        """
+        Decode, orient, downsize and re-encode image bytes
+
+        Raises:
+            InvalidImage if PIL can't read the bytes or the image is too large
+        """
+        from PIL import Image, ImageOps
+
+        default_edge, default_format, default_quality = ImagePipeline.settings()
+        max_edge = max_edge or default_edge
+        image_format = (image_format or default_format).upper()
+        quality = quality or default_quality
+
+        start = time.perf_counter()
+        try:
+            image = Image.open(io.BytesIO(image_bytes))
+            if image.width * image.height > ImagePipeline.MAX_PIXELS:
+                raise InvalidImage(f'Image too large ({image.width}x{image.height})')
+            source_format = image.format
+            # JPEG only: decode straight at 1/2, 1/4 or 1/8 scale
+            scale = max_edge * ImagePipeline.DRAFT_SLACK / max(image.size)
+            if scale < 1:
+                image.draft('RGB', (int(image.width * scale), int(image.height * scale)))
+            image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+            image = ImageOps.exif_transpose(image)  # after the resize: rotating the small image is cheaper
+            image = ImagePipeline._flatten(image)
+            phash = ImagePipeline.dhash(image)
+
+            buffer = io.BytesIO()
+            image.save(buffer, format=image_format, quality=quality, optimize=image_format == 'JPEG')
+            data = buffer.getvalue()
+        except InvalidImage:
+            ImagePipeline._count('invalid')
+            raise
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            ImagePipeline._count('invalid')
+            raise InvalidImage(f'Could not read image: {e}')
+
+        # Already small and in the right format: re-encoding would only lose quality
+        if source_format == image_format and len(image_bytes) <= len(data) and \
+                max(image.size) < max_edge and not ImagePipeline._has_orientation(image_bytes):
+            data = image_bytes
+
+        with ImagePipeline._lock:
+            counters = ImagePipeline._counters
+            counters['images'] += 1
+            counters['source_bytes'] += len(image_bytes)
+            counters['output_bytes'] += len(data)
+            counters['decode_seconds'] += time.perf_counter() - start
+
+        return PreparedImage(
+            data, ImagePipeline.MIME_TYPES[image_format], image.width, image.height, len(image_bytes),
+            phash, ImagePipeline.dedupe(phash)
+        )
+
+    @staticmethod
+    def _flatten(image):
+        """RGB (or greyscale) for the encoder; transparency goes onto white"""
+        from PIL import Image
+
+        if image.mode in ('RGB', 'L'):
+            return image
+        if image.mode in ('RGBA', 'LA', 'P', 'PA'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            return background
+        return image.convert('RGB')
+
+    @staticmethod
+    def _has_orientation(image_bytes):
+        from PIL import Image
+
+        try:
+            return Image.open(io.BytesIO(image_bytes)).getexif().get(0x0112, 1) != 1
+        except Exception:
+            return False
+
+    @staticmethod
+    def dhash(image, size=8):
+        """64-bit difference hash as 16 hex chars (similar images -> few differing bits)"""
+        from PIL import Image
+
+        small = image.convert('L').resize((size + 1, size), Image.Resampling.BILINEAR)
+        pixels = small.tobytes()
+        bits = 0
+        for row in range(size):
+            offset = row * (size + 1)
+            for col in range(size):
+                bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+        return f'{bits:0{size * size // 4}x}'
+
+    @staticmethod
+    def hamming(hash_a, hash_b):
+        """Differing bits between two dhash() values"""
+        return bin(int(hash_a, 16) ^ int(hash_b, 16)).count('1')
+
+    @staticmethod
+    def dedupe(phash):
+        """
+        A recently seen hash within DEDUPE_BITS of phash (so a near-identical upload
+        shares its cache entry), else phash itself, which is remembered
+        """
+        value = int(phash, 16)
+        with ImagePipeline._lock:
+            recent = ImagePipeline._recent
+            if value in recent:
+                recent.move_to_end(value)
+                return phash
+            for seen, seen_hash in reversed(recent.items()):
+                if bin(value ^ seen).count('1') <= ImagePipeline.DEDUPE_BITS:
+                    recent.move_to_end(seen)
+                    ImagePipeline._counters['near_duplicates'] += 1
+                    return seen_hash
+            recent[value] = phash
+            while len(recent) > ImagePipeline.RECENT_HASHES:
+                recent.popitem(last=False)
+            return phash
+
+    # ============ OFF THE REQUEST THREAD ============
+
+    @staticmethod
+    def _ensure_pool():
+        """(Re)create the decode pool in a new process - threads don't survive a fork"""
+        if ImagePipeline._pid == os.getpid():
+            return
+        with ImagePipeline._lock:
+            if ImagePipeline._pid == os.getpid():
+                return
+            workers = int(ImagePipeline._config('VISION_DECODE_WORKERS', ImagePipeline.DEFAULT_WORKERS))
+            ImagePipeline._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-decode')
+            ImagePipeline._pid = os.getpid()
+
+    @staticmethod
+    def load(image_data, timeout=None):
+        """
+        Data URL / file path -> PreparedImage, decoded on the pipeline pool
+
+        Raises:
+            InvalidImage for unreadable input or if decoding misses the deadline
+        """
+        ImagePipeline._ensure_pool()
+        max_edge, image_format, quality = ImagePipeline.settings()
+        timeout = timeout or ImagePipeline.DEFAULT_TIMEOUT
+
+        def work():
+            return ImagePipeline.prepare(ImagePipeline.decode_data(image_data), max_edge, image_format, quality)
+
+        future = ImagePipeline._executor.submit(work)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            raise InvalidImage(f'Image took longer than {timeout}s to decode')
+        except FileNotFoundError as e:
+            ImagePipeline._count('invalid')
+            raise InvalidImage(str(e))
+
+    @staticmethod
+    def _count(name, amount=1):
+        with ImagePipeline._lock:
+            ImagePipeline._counters[name] += amount
+
+    @staticmethod
+    def stats():
+        """Images processed by this worker and the bytes they saved"""
+        with ImagePipeline._lock:
+            stats = dict(ImagePipeline._counters)
+        stats['bytes_saved'] = stats['source_bytes'] - stats['output_bytes']
+        stats['avg_decode_ms'] = round(stats['decode_seconds'] / stats['images'] * 1000, 2) if stats['images'] else 0.0
+        stats['decode_seconds'] = round(stats['decode_seconds'], 3)
+        return stats
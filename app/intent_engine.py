@@ -0,0 +1,449 @@
+"""
+Intent Engine
+One precompiled matcher for the no-API fast paths of voice and chatbot commands
+
+- Vocabulary (English, Tamil, transliterated Tamil/Hindi) is compiled once at import into
+  a word-level Aho-Corasick automaton, so every product, category and intent phrase in
+  a command is found in a single left-to-right pass over its words
+- Product names come from ProductSearchService.SYNONYMS, so search and intent share one list
+- Tamil words take suffixes (தக்காளியை, ஆர்டரை), so Tamil tokens are matched on their stem
+- Price, quantity and order-number extractors are precompiled regexes that only run
+  when the automaton saw a cue for them ("under", "kg", "order", ...)
+
+analyze() returns everything at once; the voice service, smart chatbot, /api/chatbot
+and /voice/search each turn that into their own response shape.
+"""
+
+import re
+from collections import deque
+from app.search_service import ProductSearchService
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over word tokens
+
+    Phrases are tuples of tokens; search() yields (start, end, payload) for every
+    phrase occurrence, overlapping ones included, in one pass over the tokens.
+    """
+
+    def __init__(self, phrases):
+        """phrases: {tuple of tokens: [payload, ...]}"""
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for phrase, payloads in phrases.items():
+            state = 0
+            for token in phrase:
+                next_state = self.goto[state].get(token)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][token] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = next_state
+            self.output[state].extend((len(phrase), payload) for payload in payloads)
+
+        # Breadth-first failure links; each state also reports its suffixes' matches
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and token not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(token, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def search(self, tokens):
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for index, token in enumerate(tokens):
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            for length, payload in output[state]:
+                yield index - length + 1, index, payload
+
+
+class IntentEngine:
+    """
+    Keyword automaton + precompiled extractors
+    """
+
+    # Intent cue phrases, by tag
+    CUES = {
+        'search': ['find', 'search', 'show', 'get', 'looking for', 'display', 'show products',
+                   'கண்டுபிடி', 'தேடு', 'காட்டு', 'thedu', 'kaattu', 'kandupidi'],
+        'want': ['order', 'want', 'need', 'buy', 'purchase', 'வேண்டும்', 'venum', 'vendum', 'chahiye'],
+        'browse': ['list', 'all', 'available', 'price', 'cost', 'tell me', 'what', 'any', 'have', 'of', 'kg'],
+        'order': ['order', 'orders', 'ஆர்டர்', 'ஆர்டர்கள்', 'aadar'],
+        'orders': ['orders', 'my order', 'my orders', 'வரிசை', 'ஆர்டர்கள்'],
+        'track': ['track', 'status', 'check', 'where'],
+        'help': ['help', 'what can you do', 'commands', 'உதவி', 'udhavi'],
+        'credit': ['credit', 'score', 'கடன்', 'kadan'],
+        'under': ['less than', 'under', 'below', 'cheaper than', 'within', 'கீழ்', 'குறைவாக'],
+        'over': ['more than', 'above', 'over', 'expensive than'],
+        'between': ['between'],
+        'rupees': ['rs', 'rupee', 'rupees', 'ரூபாய்'],
+        'cheapest': ['cheapest', 'least expensive'],
+        'expensive': ['most expensive', 'priciest'],
+        'products': ['product', 'products'],
+    }
+
+    # Navigation phrases -> endpoint
+    NAVIGATION = {
+        'retailer.cart': ['go to cart', 'go to my cart', 'show cart', 'show my cart', 'open cart'],
+        'retailer.orders': ['go to orders', 'go to my orders', 'show orders', 'show my orders',
+                            'track order', 'track my order', 'order status'],
+        'retailer.dashboard': ['go to dashboard', 'show dashboard'],
+        'retailer.browse': ['go to shop', 'start shopping', 'browse products'],
+        'auth.logout': ['logout', 'sign out', 'log out'],
+        'main.index': ['go to home', 'go back', 'home page'],
+    }
+
+    # Category words (matched like products, but mean "everything in this category")
+    CATEGORY_WORDS = {'vegetable': 'Vegetables', 'fruit': 'Fruits'}
+
+    PRODUCT_CATEGORIES = {
+        'Vegetables': ['tomato', 'potato', 'onion', 'carrot', 'brinjal', 'okra', 'drumstick', 'cabbage',
+                       'cauliflower', 'spinach', 'chilli', 'ginger', 'garlic', 'lemon'],
+        'Fruits': ['banana', 'mango', 'apple', 'orange', 'grape', 'coconut'],
+        'Grains': ['rice', 'wheat', 'lentil'],
+    }
+
+    # Plurals / short forms not in the search synonyms
+    EXTRA_WORDS = {
+        'tomato': ['tomatoes'], 'potato': ['potatoes'], 'onion': ['onions'], 'carrot': ['carrots'],
+        'brinjal': ['brinjals'], 'chilli': ['chillies', 'chilies'], 'lemon': ['lemons'],
+        'coconut': ['coconuts'], 'banana': ['bananas'], 'mango': ['mangoes', 'mangos', 'மா'],
+        'apple': ['apples'], 'orange': ['oranges'], 'grape': ['grapes'], 'lentil': ['lentils'],
+        'vegetable': ['vegetables', 'veggies'], 'fruit': ['fruits'],
+    }
+
+    # Words dropped when a command names no known product ("show me brinjal" -> "brinjal")
+    STOP_WORDS = {'order', 'find', 'show', 'me', 'kg', 'of', 'get', 'i', 'want', 'need', 'less', 'than',
+                  'for', 'rupees', 'a', 'the'}
+
+    TOKEN_RE = re.compile(r'[a-z0-9]+|[\u0b80-\u0bff]+')  # Tamil block, vowel signs included
+    NUMBER_RE = re.compile(r'\d+(?:\.\d+)?')
+    TAMIL_RE = re.compile(r'[\u0b80-\u0bff]')
+    PRICE = r'(?:rs\.?|rupees?|₹)?\s*(\d+(?:\.\d+)?)'
+    UNDER_RE = re.compile(r'(?:less than|under|below|cheaper than|within)\s+' + PRICE)
+    TAMIL_UNDER_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(?:ரூபாய்|ரூ)?\S*\s*(?:கீழ்|குறைவாக)')
+    OVER_RE = re.compile(r'(?:more than|above|over|expensive than)\s+' + PRICE)
+    BETWEEN_RE = re.compile(r'between\s+' + PRICE + r'\s+(?:and|to)\s+' + PRICE)
+    AMOUNT_RE = re.compile(r'(?:rs\.?|rupees?|₹)\s*(\d+(?:\.\d+)?)|(\d+(?:\.\d+)?)\s*(?:rs\b|rupees?|₹|ரூ)')
+    QUANTITY_RE = re.compile(
+        r'(\d+(?:\.\d+)?)\s*(kgs?|kilos?|kilograms?|grams?|gms?|g|pieces?|pcs|dozen|கிலோ)(?![a-z])'
+    )
+    ORDER_ID_RE = re.compile(r'(?:order|ஆர்டர்)\s*(?:#|no\.?|number|id)?\s*#?(\d+)|#(\d+)')
+
+    # Product span of a search command, tried in this order (first match wins)
+    VERB = r'(?:find|search|show|get|looking for)'
+    SPAN_PATTERNS = (
+        ('under', re.compile(VERB + r'\s+(.+?)\s+(?:less than|under|below|cheaper than)\s+' + PRICE)),
+        ('between', re.compile(r'(?:find|search|show)\s+(.+?)\s+between\s+' + PRICE + r'\s+(?:and|to)\s+' + PRICE)),
+        ('over', re.compile(r'(?:find|search|show)\s+(.+?)\s+(?:more than|above|over)\s+' + PRICE)),
+        ('cheapest', re.compile(r'(?:find|search|show)\s+(?:cheapest|least expensive)\s+(.+)')),
+        ('expensive', re.compile(r'(?:find|search|show)\s+(?:most expensive|priciest)\s+(.+)')),
+        ('products', re.compile(r'(?:show|display|find)\s+(?:me\s+)?(.+?)\s+products?')),
+        ('search', re.compile(VERB + r'\s+(.+)')),
+    )
+
+    MIN_TAMIL_STEM = 3  # Shorter Tamil keywords (மா) only match whole words
+
+    _automaton = None
+    _tamil_stems = None
+
+    # ============ COMPILE ============
+
+    @staticmethod
+    def _tokens(text):
+        return IntentEngine.TOKEN_RE.findall(text)
+
+    @staticmethod
+    def compile():
+        """Build the automaton from the vocabulary (done once, at import)"""
+        phrases = {}
+
+        def add(phrase, payload):
+            tokens = tuple(IntentEngine._tokens(phrase.lower()))
+            if tokens:
+                phrases.setdefault(tokens, [])
+                if payload not in phrases[tokens]:
+                    phrases[tokens].append(payload)
+
+        for tag, cues in IntentEngine.CUES.items():
+            for cue in cues:
+                add(cue, ('cue', tag))
+        for endpoint, cues in IntentEngine.NAVIGATION.items():
+            for cue in cues:
+                add(cue, ('navigate', endpoint))
+
+        names = {}
+        for name, synonyms in ProductSearchService.SYNONYMS.items():
+            names[name] = [name] + synonyms + IntentEngine.EXTRA_WORDS.get(name, [])
+        for name, words in names.items():
+            kind = 'category' if name in IntentEngine.CATEGORY_WORDS else 'product'
+            value = IntentEngine.CATEGORY_WORDS.get(name, name)
+            for word in words:
+                add(word, (kind, value))
+
+        IntentEngine._tamil_stems = {
+            phrase[0] for phrase in phrases
+            if len(phrase) == 1 and IntentEngine.TAMIL_RE.match(phrase[0]) and len(phrase[0]) >= IntentEngine.MIN_TAMIL_STEM
+        }
+        IntentEngine._automaton = KeywordAutomaton(phrases)
+
+    @staticmethod
+    def _stem(token):
+        """Tamil token -> the longest vocabulary word it starts with (தக்காளியை -> தக்காளி)"""
+        stems = IntentEngine._tamil_stems
+        if token in stems:
+            return token
+        for end in range(len(token) - 1, IntentEngine.MIN_TAMIL_STEM - 1, -1):
+            if token[:end] in stems:
+                return token[:end]
+        return token
+
+    # ============ ANALYZE ============
+
+    @staticmethod
+    def analyze(text):
+        """
+        Intent cues and entities of a command, in one pass
+
+        Returns:
+            dict with text, tokens, language, tags (set of cue tags), products and
+            categories (in order of appearance), navigate (endpoint or None), numbers,
+            max_price, min_price, quantity, unit, order_id and search_span
+            (the product words of a find/search/show command, or None)
+        """
+        text = (text or '').lower().strip()
+        tamil = IntentEngine.TAMIL_RE.search(text) is not None
+        tokens = IntentEngine._tokens(text)
+        if tamil:
+            tokens = [IntentEngine._stem(token) if token[0] >= '\u0b80' else token for token in tokens]
+
+        tags = set()
+        products = []
+        categories = []
+        navigate = None
+        for _, _, (kind, value) in IntentEngine._automaton.search(tokens):
+            if kind == 'cue':
+                tags.add(value)
+            elif kind == 'product':
+                if value not in products:
+                    products.append(value)
+            elif kind == 'category':
+                if value not in categories:
+                    categories.append(value)
+            elif navigate is None:
+                navigate = value
+
+        result = {
+            'text': text,
+            'tokens': tokens,
+            'language': 'ta' if tamil else 'en',
+            'tags': tags,
+            'products': products,
+            'categories': categories,
+            'navigate': navigate,
+            'numbers': [],
+            'max_price': None,
+            'min_price': None,
+            'quantity': None,
+            'unit': None,
+            'order_id': None,
+            'search_span': None,
+            'search_kind': None
+        }
+
+        if any(token[0].isdigit() for token in tokens):
+            result['numbers'] = IntentEngine.NUMBER_RE.findall(text)
+            IntentEngine._extract_numbers(text, tags, result)
+
+        if 'search' in tags:
+            for kind, pattern in IntentEngine.SPAN_PATTERNS:
+                if kind != 'search' and kind not in tags:
+                    continue  # no cue for it, can't match
+                match = pattern.search(text)
+                if match:
+                    result['search_span'] = match.group(1).strip()
+                    result['search_kind'] = kind
+                    break
+
+        return result
+
+    @staticmethod
+    def _extract_numbers(text, tags, result):
+        """Prices, quantity and order number (only the extractors the cues call for)"""
+        if 'between' in tags:
+            match = IntentEngine.BETWEEN_RE.search(text)
+            if match:
+                result['min_price'] = float(match.group(1))
+                result['max_price'] = float(match.group(2))
+        if 'under' in tags and result['max_price'] is None:
+            match = IntentEngine.UNDER_RE.search(text) or IntentEngine.TAMIL_UNDER_RE.search(text)
+            if match:
+                result['max_price'] = float(match.group(1))
+        if 'over' in tags and result['min_price'] is None:
+            match = IntentEngine.OVER_RE.search(text)
+            if match:
+                result['min_price'] = float(match.group(1))
+        # A bare amount ("thakkali 50 rupees") is a budget
+        if result['max_price'] is None and result['min_price'] is None and ('rupees' in tags or '₹' in text):
+            match = IntentEngine.AMOUNT_RE.search(text)
+            if match:
+                result['max_price'] = float(match.group(1) or match.group(2))
+
+        match = IntentEngine.QUANTITY_RE.search(text)
+        if match:
+            result['quantity'] = match.group(1)
+            result['unit'] = match.group(2)
+
+        if 'order' in tags:
+            match = IntentEngine.ORDER_ID_RE.search(text)
+            if match:
+                result['order_id'] = match.group(1) or match.group(2)
+
+    # ============ CALLER SHAPES ============
+
+    @staticmethod
+    def voice_command(text):
+        """
+        Voice command dict (intent / entities / confidence / language_detected),
+        the shape Gemini is asked to return in VoiceService.understand_command
+        """
+        parsed = IntentEngine.analyze(text)
+        tags = parsed['tags']
+        entities = {}
+        command = {
+            'intent': 'unknown',
+            'entities': entities,
+            'confidence': 'low',
+            'language_detected': parsed['language']
+        }
+
+        product = parsed['products'][0] if parsed['products'] else None
+        category = parsed['categories'][0] if parsed['categories'] else None
+
+        if product or category or tags & {'search', 'want', 'browse'}:
+            command['intent'] = 'order_product'
+            if product:
+                entities['product_name'] = product
+                category = category or IntentEngine.category_of(product)
+            elif category:
+                command['intent'] = 'list_products'
+            else:
+                words = [w for w in parsed['text'].split() if w not in IntentEngine.STOP_WORDS and not w.isdigit()]
+                if words:
+                    entities['product_name'] = ' '.join(words)
+            if category:
+                entities['category'] = category
+
+            if parsed['quantity']:
+                entities['quantity'] = parsed['quantity']
+                entities['unit'] = parsed['unit']
+            if parsed['max_price'] is not None:
+                entities['price'] = f"{parsed['max_price']:g}"
+            if parsed['numbers'] and 'quantity' not in entities and 'price' not in entities:
+                entities['quantity'] = parsed['numbers'][0]
+            command['confidence'] = 'high'
+
+        # "check my orders", "where is order 12" - but "order 5 kg tomatoes" stays an order
+        if 'order' in tags and (tags & {'orders', 'track'} or not product):
+            entities.clear()
+            if parsed['order_id']:
+                command['intent'] = 'check_order_status'
+                entities['order_id'] = parsed['order_id']
+            else:
+                command['intent'] = 'list_orders'
+            command['confidence'] = 'high'
+
+        if 'help' in tags:
+            command['intent'] = 'help'
+            command['confidence'] = 'high'
+
+        return command
+
+    @staticmethod
+    def chatbot_intent(message):
+        """Smart chatbot intent dict (intent / parameters / confidence)"""
+        parsed = IntentEngine.analyze(message)
+        tags = parsed['tags']
+        # "show my orders" is about orders, "find my credit score" about credit
+        other_topic = not parsed['products'] and tags & {'orders', 'credit'}
+
+        if 'search' in tags and not other_topic:
+            price_max = parsed['max_price']
+            if price_max is None and parsed['numbers'] and not parsed['quantity']:
+                price_max = parsed['numbers'][0]
+            return {
+                'intent': 'search_products',
+                'parameters': {
+                    'product': parsed['products'][0] if parsed['products'] else None,
+                    'price_max': int(float(price_max)) if price_max is not None else None
+                },
+                'confidence': 0.7
+            }
+        if 'orders' in tags:
+            return {'intent': 'check_orders', 'parameters': {}, 'confidence': 0.8}
+        if 'credit' in tags:
+            return {'intent': 'check_credit', 'parameters': {}, 'confidence': 0.8}
+        return {'intent': 'help', 'parameters': {}, 'confidence': 0.9}
+
+    @staticmethod
+    def search_query(query):
+        """
+        Voice search parameters: product_name, max_price, min_price, category,
+        action (search_product / search_cheapest / search_expensive / search_category /
+        navigate / track_order) and redirect_url
+        """
+        parsed = IntentEngine.analyze(query)
+        kind = parsed['search_kind']
+        span = parsed['search_span']
+        result = {
+            'product_name': None,
+            'max_price': None,
+            'min_price': None,
+            'category': None,
+            'action': None,
+            'redirect_url': None
+        }
+
+        if kind in ('under', 'between', 'over'):
+            result['product_name'] = span
+            result['max_price'] = parsed['max_price']
+            result['min_price'] = parsed['min_price']
+            result['action'] = 'search_product'
+        elif kind in ('cheapest', 'expensive'):
+            result['product_name'] = span
+            result['action'] = f'search_{kind}'
+        elif kind == 'products':
+            result['category'] = span
+            result['action'] = 'search_category'
+        elif 'track' in parsed['tags'] and parsed['order_id']:
+            result['action'] = 'track_order'
+            result['order_id'] = parsed['order_id']
+        elif parsed['navigate']:
+            result['action'] = 'navigate'
+            result['redirect_url'] = parsed['navigate']
+        else:
+            result['product_name'] = span or parsed['text']
+            result['action'] = 'search_product'
+        return result
+
+    @staticmethod
+    def category_of(product):
+        for category, products in IntentEngine.PRODUCT_CATEGORIES.items():
+            if product in products:
+                return category
+        return None
+
+
+IntentEngine.compile()
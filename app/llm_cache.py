@@ -0,0 +1,260 @@
+"""
+LLM Response Cache
+Skips repeat Gemini calls for inputs we have already answered
+
+Keys are sha256(model, prompt version, normalized input), where the input is
+- text: NFKC + casefold + collapsed whitespace ("Find  Tomatoes under 50" == "find tomatoes under 50")
+- image bytes: the sha256 of the bytes
+- anything else (dicts of context): canonical JSON
+
+Two layers:
+1. In-process LRU (LLM_CACHE_MEMORY_ITEMS per worker) - repeat queries in microseconds
+2. llm_response_cache table - shared by every worker and survives restarts
+
+Entries expire after a TTL (LLM_CACHE_TTL_SECONDS unless the caller passes one), and
+the table is trimmed to LLM_CACHE_MAX_ROWS least-recently-used rows every PRUNE_EVERY stores.
+Bump a service's PROMPT_VERSION when its prompt changes so old answers stop matching.
+
+The table is read/written on its own connection, never through db.session, so a
+cache write can't commit (or roll back) the caller's unit of work.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import LLMResponseCache
+
+logger = logging.getLogger(__name__)
+
+
+class LLMCache:
+    """
+    Two-level (memory LRU + database) cache of raw model responses
+    """
+
+    DEFAULT_TTL_SECONDS = 86400
+    DEFAULT_MEMORY_ITEMS = 1024
+    DEFAULT_MAX_ROWS = 50000
+    PRUNE_EVERY = 100
+
+    _memory = OrderedDict()  # key -> (response_text, expires_at epoch seconds)
+    _lock = threading.Lock()
+    _stores_since_prune = 0
+    _counters = {
+        'memory_hits': 0,
+        'db_hits': 0,
+        'misses': 0,
+        'stores': 0,
+        'memory_evictions': 0,
+        'db_evictions': 0,
+        'errors': 0
+    }
+
+    # ============ KEYS ============
+
+    @staticmethod
+    def normalize(text):
+        """Canonical form of a text prompt input"""
+        return ' '.join(unicodedata.normalize('NFKC', text or '').casefold().split())
+
+    @staticmethod
+    def make_key(model, prompt_version, payload):
+        """
+        Args:
+            payload: text, image bytes, or a JSON-serialisable value
+        """
+        if isinstance(payload, (bytes, bytearray)):
+            part = 'bytes:' + hashlib.sha256(payload).hexdigest()
+        elif isinstance(payload, str):
+            part = 'text:' + LLMCache.normalize(payload)
+        else:
+            part = 'json:' + json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(f'{model}\x1f{prompt_version}\x1f{part}'.encode('utf-8')).hexdigest()
+
+    # ============ CONFIG ============
+
+    @staticmethod
+    def _config(name, default):
+        if not has_app_context():
+            return default
+        value = current_app.config.get(name)
+        return default if value is None else value
+
+    @staticmethod
+    def is_enabled():
+        return bool(LLMCache._config('LLM_CACHE_ENABLED', True))
+
+    @staticmethod
+    def _count(name, amount=1):
+        with LLMCache._lock:
+            LLMCache._counters[name] += amount
+
+    # ============ READ / WRITE ============
+
+    @staticmethod
+    def get(key):
+        """Cached response text for key, or None"""
+        now = time.time()
+        with LLMCache._lock:
+            entry = LLMCache._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    LLMCache._memory.move_to_end(key)
+                    LLMCache._counters['memory_hits'] += 1
+                    return entry[0]
+                del LLMCache._memory[key]
+
+        if has_app_context():
+            table = LLMResponseCache.__table__
+            try:
+                with db.engine.begin() as conn:
+                    row = conn.execute(
+                        select(table.c.response_text, table.c.expires_at).where(
+                            table.c.cache_key == key, table.c.expires_at > datetime.utcnow()
+                        )
+                    ).first()
+                    if row is not None:
+                        conn.execute(update(table).where(table.c.cache_key == key).values(
+                            hit_count=table.c.hit_count + 1, last_used_at=datetime.utcnow()
+                        ))
+                if row is not None:
+                    LLMCache._count('db_hits')
+                    ttl = (row.expires_at - datetime.utcnow()).total_seconds()
+                    LLMCache._remember(key, row.response_text, now + ttl)
+                    return row.response_text
+            except Exception as e:
+                LLMCache._count('errors')
+                logger.warning("LLM cache read failed: %s", e)
+
+        LLMCache._count('misses')
+        return None
+
+    @staticmethod
+    def set(key, response_text, model, prompt_version, ttl=None):
+        """Store response text in both layers"""
+        ttl = ttl or LLMCache._config('LLM_CACHE_TTL_SECONDS', LLMCache.DEFAULT_TTL_SECONDS)
+        LLMCache._remember(key, response_text, time.time() + ttl)
+        LLMCache._count('stores')
+
+        if not has_app_context():
+            return
+
+        table = LLMResponseCache.__table__
+        now = datetime.utcnow()
+        values = {
+            'model': model,
+            'prompt_version': prompt_version,
+            'response_text': response_text,
+            'created_at': now,
+            'last_used_at': now,
+            'expires_at': now + timedelta(seconds=ttl)
+        }
+        try:
+            with db.engine.begin() as conn:
+                updated = conn.execute(update(table).where(table.c.cache_key == key).values(values)).rowcount
+                if not updated:
+                    conn.execute(table.insert().values(dict(values, cache_key=key, hit_count=0)))
+        except IntegrityError:
+            pass  # another worker stored the same key first
+        except Exception as e:
+            LLMCache._count('errors')
+            logger.warning("LLM cache write failed: %s", e)
+            return
+
+        with LLMCache._lock:
+            LLMCache._stores_since_prune += 1
+            due = LLMCache._stores_since_prune >= LLMCache.PRUNE_EVERY
+            if due:
+                LLMCache._stores_since_prune = 0
+        if due:
+            LLMCache.prune()
+
+    @staticmethod
+    def fetch(model, prompt_version, payload, generate, parse=None, ttl=None):
+        """
+        Cached call: generate() (returning response text) only runs on a miss
+
+        parse(text) turns the text into the caller's value; if it raises on a fresh
+        response the exception propagates and nothing is stored.
+        """
+        parse = parse or (lambda text: text)
+        if not LLMCache.is_enabled():
+            return parse(generate())
+
+        key = LLMCache.make_key(model, prompt_version, payload)
+        cached = LLMCache.get(key)
+        if cached is not None:
+            return parse(cached)
+
+        response_text = generate()
+        value = parse(response_text)
+        LLMCache.set(key, response_text, model, prompt_version, ttl=ttl)
+        return value
+
+    @staticmethod
+    def _remember(key, response_text, expires_at):
+        limit = LLMCache._config('LLM_CACHE_MEMORY_ITEMS', LLMCache.DEFAULT_MEMORY_ITEMS)
+        with LLMCache._lock:
+            LLMCache._memory[key] = (response_text, expires_at)
+            LLMCache._memory.move_to_end(key)
+            while len(LLMCache._memory) > limit:
+                LLMCache._memory.popitem(last=False)
+                LLMCache._counters['memory_evictions'] += 1
+
+    # ============ MAINTENANCE ============
+
+    @staticmethod
+    def prune(max_rows=None):
+        """Delete expired rows, then the least recently used rows beyond max_rows"""
+        max_rows = max_rows or LLMCache._config('LLM_CACHE_MAX_ROWS', LLMCache.DEFAULT_MAX_ROWS)
+        table = LLMResponseCache.__table__
+        try:
+            with db.engine.begin() as conn:
+                removed = conn.execute(delete(table).where(table.c.expires_at <= datetime.utcnow())).rowcount
+
+                # Oldest row that still fits; everything used before it goes
+                cutoff = conn.execute(
+                    select(table.c.last_used_at, table.c.id)
+                    .order_by(table.c.last_used_at.desc(), table.c.id.desc())
+                    .offset(max_rows - 1).limit(1)
+                ).first()
+                if cutoff is not None:
+                    removed += conn.execute(delete(table).where(or_(
+                        table.c.last_used_at < cutoff.last_used_at,
+                        and_(table.c.last_used_at == cutoff.last_used_at, table.c.id < cutoff.id)
+                    ))).rowcount
+            LLMCache._count('db_evictions', removed)
+            return removed
+        except Exception as e:
+            LLMCache._count('errors')
+            logger.warning("LLM cache prune failed: %s", e)
+            return 0
+
+    @staticmethod
+    def clear_memory():
+        """Drop the in-process layer (the database layer is kept)"""
+        with LLMCache._lock:
+            LLMCache._memory.clear()
+
+    @staticmethod
+    def stats():
+        """Hit/miss counters for this worker, plus table size"""
+        with LLMCache._lock:
+            stats = dict(LLMCache._counters)
+            stats['memory_items'] = len(LLMCache._memory)
+        lookups = stats['memory_hits'] + stats['db_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['db_hits']) / lookups, 4) if lookups else 0.0
+        try:
+            stats['db_rows'] = db.session.execute(select(func.count()).select_from(LLMResponseCache.__table__)).scalar()
+        except Exception:
+            stats['db_rows'] = None
+        return stats
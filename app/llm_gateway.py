@@ -0,0 +1,371 @@
+"""
+LLM Gateway
+Every Gemini call goes through here so a slow or failing model can't tie up the web workers
+
+- Bounded thread pool (LLM_GATEWAY_WORKERS) runs the calls; the caller waits at most
+  the call's deadline (LLM_CALL_TIMEOUT_SECONDS) and then gets the fallback
+- Per-model semaphore (LLM_MODEL_CONCURRENCY): at most N in-flight calls per model,
+  extra calls wait for a slot until their deadline
+- Circuit breaker per model: after LLM_BREAKER_FAILURES consecutive failures (exceptions,
+  timeouts or {'success': False} results) calls skip the model and use the fallback
+  straight away; after LLM_BREAKER_RESET_SECONDS one trial call is let through
+- Jobs: submit_job() returns a job id immediately and the result is written to the
+  llm_jobs table, so routes can answer 202 and the client polls /api/llm-jobs/<id>
+  (the table makes the poll work whichever worker it lands on)
+
+A call that misses its deadline is cancelled if it is still queued, and a queued call
+whose deadline has passed never reaches Gemini. Python threads can't be cancelled, so
+one that already started keeps its model slot until Gemini returns; its late outcome
+doesn't feed the breaker (the caller already counted the timeout).
+Pools are created lazily per process, so they are safe to use after a gunicorn fork.
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import delete, select, update
+from app import db
+from app.models import LLMJob
+
+logger = logging.getLogger(__name__)
+
+
+class LLMUnavailable(Exception):
+    """The model can't be called right now (breaker open, no free slot, or deadline passed)"""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker: closed -> open (after threshold failures) -> half_open
+    (one trial call after reset_seconds) -> closed on success / open again on failure
+    """
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now):
+        if self.opened_at is None:
+            return 'closed'
+        if now - self.opened_at >= self.reset_seconds:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        """True if a call may go to the model now"""
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """The half-open trial never reached the model (e.g. no free slot); let another try"""
+        with self._lock:
+            self.trial_running = False
+
+    def snapshot(self):
+        with self._lock:
+            return {'state': self._state(time.monotonic()), 'consecutive_failures': self.failures}
+
+
+def _failed(result):
+    """Default failure test: service methods report errors as {'success': False, ...}"""
+    return isinstance(result, dict) and result.get('success') is False
+
+
+class LLMGateway:
+    """
+    Thread pool + deadlines + per-model limits + circuit breakers for model calls
+    """
+
+    DEFAULT_WORKERS = 8
+    DEFAULT_MODEL_CONCURRENCY = 4
+    DEFAULT_CALL_TIMEOUT = 20
+    # Jobs still pending after this long are reported as expired (their worker went away)
+    JOB_EXPIRY_SECONDS = 300
+    DEFAULT_BREAKER_FAILURES = 5
+    DEFAULT_BREAKER_RESET = 30
+
+    # Finished jobs are deleted after this long (checked every PRUNE_EVERY submissions)
+    JOB_RETENTION_SECONDS = 3600
+    PRUNE_EVERY = 100
+
+    _pid = None
+    _executor = None
+    _job_executor = None
+    _semaphores = {}
+    _breakers = {}
+    _lock = threading.Lock()
+    _jobs_since_prune = 0
+    _counters = {'calls': 0, 'fallbacks': 0, 'timeouts': 0, 'rejected': 0, 'failures': 0, 'expired': 0, 'late_results': 0}
+
+    # ============ SETUP ============
+
+    @staticmethod
+    def _config(name, default):
+        if not has_app_context():
+            return default
+        value = current_app.config.get(name)
+        return default if value is None else value
+
+    @staticmethod
+    def _ensure_pools():
+        """(Re)create pools in a new process - threads don't survive a fork"""
+        if LLMGateway._pid == os.getpid():
+            return
+        with LLMGateway._lock:
+            if LLMGateway._pid == os.getpid():
+                return
+            workers = LLMGateway._config('LLM_GATEWAY_WORKERS', LLMGateway.DEFAULT_WORKERS)
+            LLMGateway._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='llm-call')
+            LLMGateway._job_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='llm-job')
+            LLMGateway._semaphores = {}
+            LLMGateway._breakers = {}
+            LLMGateway._pid = os.getpid()
+
+    @staticmethod
+    def _semaphore(model):
+        with LLMGateway._lock:
+            if model not in LLMGateway._semaphores:
+                limit = LLMGateway._config('LLM_MODEL_CONCURRENCY', LLMGateway.DEFAULT_MODEL_CONCURRENCY)
+                LLMGateway._semaphores[model] = threading.BoundedSemaphore(limit)
+            return LLMGateway._semaphores[model]
+
+    @staticmethod
+    def breaker(model):
+        with LLMGateway._lock:
+            if model not in LLMGateway._breakers:
+                LLMGateway._breakers[model] = CircuitBreaker(
+                    LLMGateway._config('LLM_BREAKER_FAILURES', LLMGateway.DEFAULT_BREAKER_FAILURES),
+                    LLMGateway._config('LLM_BREAKER_RESET_SECONDS', LLMGateway.DEFAULT_BREAKER_RESET)
+                )
+            return LLMGateway._breakers[model]
+
+    @staticmethod
+    def _count(name):
+        with LLMGateway._lock:
+            LLMGateway._counters[name] += 1
+
+    # ============ CALLS ============
+
+    @staticmethod
+    def call(model, fn, *args, fallback=None, timeout=None, failed=_failed, **kwargs):
+        """
+        Run fn(*args, **kwargs) on the pool and wait at most timeout seconds
+
+        Args:
+            fallback: called (no args) when the model is unavailable, times out, raises
+                      or returns a failure; without one, LLMUnavailable / the error is raised
+
+        Returns:
+            fn's result, or fallback()'s
+        """
+        LLMGateway._ensure_pools()
+        LLMGateway._count('calls')
+        timeout = timeout or LLMGateway._config('LLM_CALL_TIMEOUT_SECONDS', LLMGateway.DEFAULT_CALL_TIMEOUT)
+        breaker = LLMGateway.breaker(model)
+
+        def use_fallback(reason, log=True):
+            if fallback is None:
+                raise LLMUnavailable(f'{model}: {reason}')
+            LLMGateway._count('fallbacks')
+            if log:
+                logger.warning("LLM fallback (%s): %s", model, reason)
+            return fallback()
+
+        if not breaker.allow():
+            LLMGateway._count('rejected')
+            return use_fallback('circuit open', log=False)  # logged once, when it opened
+
+        deadline = time.monotonic() + timeout
+        abandoned = threading.Event()  # Set once the caller has stopped waiting
+        app = current_app._get_current_object() if has_app_context() else None
+        future = LLMGateway._executor.submit(
+            LLMGateway._run, app, model, deadline, fn, args, kwargs, failed, breaker, abandoned
+        )
+        try:
+            result = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            abandoned.set()
+            future.cancel()  # Still queued: never runs
+            LLMGateway._count('timeouts')
+            LLMGateway._record_failure(model, breaker)
+            return use_fallback(f'no answer within {timeout}s')
+        except LLMUnavailable as e:
+            LLMGateway._count('rejected')
+            breaker.release_trial()
+            return use_fallback(str(e))
+        except Exception as e:
+            if fallback is None:
+                raise
+            return use_fallback(f'{type(e).__name__}: {e}')
+
+        if failed(result) and fallback is not None:
+            return use_fallback(result.get('message', 'model call failed') if isinstance(result, dict) else 'model call failed')
+        return result
+
+    @staticmethod
+    def _run(app, model, deadline, fn, args, kwargs, failed, breaker, abandoned):
+        """Pool side of call(): take a model slot, run fn in an app context, feed the breaker"""
+        if abandoned.is_set() or time.monotonic() >= deadline:
+            LLMGateway._count('expired')
+            raise LLMUnavailable('deadline passed while queued')
+        semaphore = LLMGateway._semaphore(model)
+        if not semaphore.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise LLMUnavailable('all model slots busy')
+        if abandoned.is_set() or time.monotonic() >= deadline:
+            semaphore.release()
+            LLMGateway._count('expired')
+            raise LLMUnavailable('deadline passed waiting for a model slot')
+        try:
+            if app is not None:
+                with app.app_context():
+                    result = fn(*args, **kwargs)
+            else:
+                result = fn(*args, **kwargs)
+        except Exception:
+            LLMGateway._count('failures')
+            if not abandoned.is_set():  # A timed-out call was already counted by call()
+                LLMGateway._record_failure(model, breaker)
+            raise
+        finally:
+            semaphore.release()
+
+        if abandoned.is_set():
+            LLMGateway._count('late_results')
+        elif failed(result):
+            LLMGateway._count('failures')
+            LLMGateway._record_failure(model, breaker)
+        else:
+            breaker.record_success()
+        return result
+
+    @staticmethod
+    def _record_failure(model, breaker):
+        was_open = breaker.state == 'open'
+        breaker.record_failure()
+        if not was_open and breaker.state == 'open':
+            logger.warning("LLM circuit open for %s: using local fallbacks for %ss", model, breaker.reset_seconds)
+
+    # ============ JOBS ============
+
+    @staticmethod
+    def submit_job(kind, fn, *args, user_id=None, **kwargs):
+        """
+        Run fn(*args, **kwargs) in the background, in an app context (needs one to submit)
+
+        fn makes its model calls through call(), so they get the usual deadline,
+        slot and breaker handling; its return value is stored as the job result.
+
+        Returns:
+            job id to poll with job_status()
+        """
+        LLMGateway._ensure_pools()
+        job_id = str(uuid.uuid4())
+        table = LLMJob.__table__
+
+        with db.engine.begin() as conn:
+            conn.execute(table.insert().values(
+                job_id=job_id, user_id=user_id, kind=kind, status='pending', created_at=datetime.utcnow()
+            ))
+
+        app = current_app._get_current_object()
+        LLMGateway._job_executor.submit(LLMGateway._run_job, app, job_id, fn, args, kwargs)
+
+        with LLMGateway._lock:
+            LLMGateway._jobs_since_prune += 1
+            due = LLMGateway._jobs_since_prune >= LLMGateway.PRUNE_EVERY
+            if due:
+                LLMGateway._jobs_since_prune = 0
+        if due:
+            LLMGateway.prune_jobs()
+        return job_id
+
+    @staticmethod
+    def _run_job(app, job_id, fn, args, kwargs):
+        with app.app_context():
+            try:
+                result, status = fn(*args, **kwargs), 'done'
+            except Exception as e:
+                logger.error("LLM job %s failed: %s", job_id, e)
+                result, status = {'success': False, 'message': str(e)}, 'failed'
+
+            table = LLMJob.__table__
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(update(table).where(table.c.job_id == job_id).values(
+                        status=status, result=result, finished_at=datetime.utcnow()
+                    ))
+            except Exception as e:
+                logger.error("LLM job %s result not saved: %s", job_id, e)
+
+    @staticmethod
+    def job_status(job_id, user_id=None):
+        """
+        Returns:
+            dict (job_id, kind, status, result) or None if unknown / not the user's job
+        """
+        table = LLMJob.__table__
+        with db.engine.connect() as conn:
+            row = conn.execute(select(table).where(table.c.job_id == job_id)).first()
+        if row is None or (user_id is not None and row.user_id != user_id):
+            return None
+
+        status = row.status
+        if status == 'pending' and row.created_at < datetime.utcnow() - timedelta(seconds=LLMGateway.JOB_EXPIRY_SECONDS):
+            status = 'expired'
+        return {'job_id': row.job_id, 'kind': row.kind, 'status': status, 'result': row.result}
+
+    @staticmethod
+    def prune_jobs():
+        """Delete jobs older than JOB_RETENTION_SECONDS"""
+        table = LLMJob.__table__
+        cutoff = datetime.utcnow() - timedelta(seconds=LLMGateway.JOB_RETENTION_SECONDS)
+        try:
+            with db.engine.begin() as conn:
+                return conn.execute(delete(table).where(table.c.created_at < cutoff)).rowcount
+        except Exception as e:
+            logger.warning("LLM job prune failed: %s", e)
+            return 0
+
+    # ============ STATUS ============
+
+    @staticmethod
+    def stats():
+        """Counters for this worker and the state of every model's breaker"""
+        with LLMGateway._lock:
+            stats = dict(LLMGateway._counters)
+            breakers = dict(LLMGateway._breakers) if LLMGateway._pid == os.getpid() else {}
+        stats['breakers'] = {model: breaker.snapshot() for model, breaker in breakers.items()}
+        return stats
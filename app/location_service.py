@@ -3,88 +3,40 @@ FEATURE 1: Smart Location-Based Driver Assignment
 MOCK Implementation for College Project
 """
 
-import random
+import logging
 from datetime import datetime, timedelta
 from app import db
 from app.models import Driver, DriverRoute, Order, OrderLocationDetail, DeliveryStep
+from app.driver_matching_service import DriverMatchingService, haversine_km
+
+logger = logging.getLogger(__name__)
 
 class LocationBasedAssignmentService:
     """
-    MOCK Location-based driver assignment
+    Location-based driver assignment (MOCK pricing and retailer coordinates)
     
     Logic:
-    1. Get available drivers
+    1. Get available drivers' planned routes (DriverMatchingService grid index)
     2. Check if their route passes near retailer location
     3. Calculate detour distance
     4. Calculate pricing (volume + weight + detour)
     5. Assign driver and update payment
     """
     
-    # MOCK Fixed routes for demo (Koyambedu to various destinations)
-    MOCK_DRIVER_ROUTES = [
-        {
-            'start': 'Koyambedu Market',
-            'end': 'Chromepet',
-            'start_lat': '13.0827',
-            'start_lng': '80.2707',
-            'end_lat': '12.9716',
-            'end_lng': '80.2202',
-            'distance_km': 25,
-            'time_hours': 1.5
-        },
-        {
-            'start': 'Koyambedu Market',
-            'end': 'Velachery',
-            'start_lat': '13.0827',
-            'start_lng': '80.2707',
-            'end_lat': '12.9689',
-            'end_lng': '80.2350',
-            'distance_km': 22,
-            'time_hours': 1.2
-        },
-        {
-            'start': 'Koyambedu Market',
-            'end': 'Guindy',
-            'start_lat': '13.0827',
-            'start_lng': '80.2707',
-            'end_lat': '13.0012',
-            'end_lng': '80.2175',
-            'distance_km': 10,
-            'time_hours': 0.7
-        },
-        {
-            'start': 'Koyambedu Market',
-            'end': 'Adyar',
-            'start_lat': '13.0827',
-            'start_lng': '80.2707',
-            'end_lat': '12.9971',
-            'end_lng': '80.2421',
-            'distance_km': 15,
-            'time_hours': 1.0
-        },
-        {
-            'start': 'Koyambedu Market',
-            'end': 'Tambaram',
-            'start_lat': '13.0827',
-            'start_lng': '80.2707',
-            'end_lat': '12.9250',
-            'end_lng': '80.1450',
-            'distance_km': 28,
-            'time_hours': 1.8
-        }
-    ]
-    
     # MOCK Retailer locations for demo
     MOCK_RETAILER_LOCATIONS = {
-        'Chromepet': {'lat': '12.9750', 'lng': '80.2150'},
-        'Velachery': {'lat': '12.9700', 'lng': '80.2300'},
-        'Guindy': {'lat': '13.0050', 'lng': '80.2100'},
-        'Adyar': {'lat': '13.0000', 'lng': '80.2400'},
-        'Tambaram': {'lat': '12.9250', 'lng': '80.1450'},
-        'Porur': {'lat': '13.0358', 'lng': '80.1559'},
-        'T.Nagar': {'lat': '13.0417', 'lng': '80.2341'},
+        'Chromepet': {'lat': 12.9750, 'lng': 80.2150},
+        'Velachery': {'lat': 12.9700, 'lng': 80.2300},
+        'Guindy': {'lat': 13.0050, 'lng': 80.2100},
+        'Adyar': {'lat': 13.0000, 'lng': 80.2400},
+        'Tambaram': {'lat': 12.9250, 'lng': 80.1450},
+        'Porur': {'lat': 13.0358, 'lng': 80.1559},
+        'T.Nagar': {'lat': 13.0417, 'lng': 80.2341},
     }
     
+    # Used for unknown retailer locations until retailers store real coordinates
+    DEFAULT_RETAILER_LOCATION = 'T.Nagar'
+    
     @staticmethod
     def calculate_volume_from_products(order_items):
         """
@@ -110,67 +62,75 @@ class LocationBasedAssignmentService:
     @staticmethod
     def calculate_distance_between_points(lat1, lng1, lat2, lng2):
         """
-        MOCK: Calculate distance between two coordinates
+        Great-circle (haversine) distance between two coordinates in km
+        """
         
-        Real: Would use Haversine formula or Google Maps API
+        return round(haversine_km(float(lat1), float(lng1), float(lat2), float(lng2)), 2)
+    
+    @staticmethod
+    def get_location_coordinates(location):
+        """(lat, lng) for a retailer location name or an explicit (lat, lng) pair"""
         
-        MOCK: Random distance 3-8 km
-        """
+        if isinstance(location, (tuple, list)):
+            return float(location[0]), float(location[1])
         
-        # Simple MOCK: Just generate random distance
-        distance = random.uniform(3, 8)
-        return round(distance, 2)
+        locations = LocationBasedAssignmentService.MOCK_RETAILER_LOCATIONS
+        coords = locations.get(location)
+        if coords is None:
+            # Free-text delivery addresses: first known area named in the address
+            address = (location or '').lower()
+            coords = next(
+                (c for name, c in locations.items() if name.lower() in address),
+                locations[LocationBasedAssignmentService.DEFAULT_RETAILER_LOCATION]
+            )
+        return coords['lat'], coords['lng']
     
     @staticmethod
-    def find_optimal_driver(order_location, volume_m3, total_weight_kg):
+    def find_optimal_driver(order_location, volume_m3, total_weight_kg, index=None):
         """
         Find best driver based on:
-        1. Route passes near retailer location
+        1. Route passes near retailer location (grid index over DriverRoute segments)
         2. Has available capacity
         3. Minimize detour distance
+        
+        Args:
+            order_location: retailer location name or (lat, lng)
+            index: prebuilt RouteIndex when matching many orders in one go
         """
         
         try:
-            available_drivers = Driver.query.filter_by(
-                status='available',
-                is_active=True
-            ).all()
+            lat, lng = LocationBasedAssignmentService.get_location_coordinates(order_location)
             
-            if not available_drivers:
+            index = index if index is not None else DriverMatchingService.build_index()
+            if not len(index):
                 return None, "No drivers available"
             
-            candidates = []
-            
-            for driver in available_drivers:
-                # Check if driver has capacity
-                available_capacity = driver.vehicle_capacity_kg - driver.current_load_kg
-                
-                if available_capacity < total_weight_kg:
-                    continue  # Skip - no capacity
-                
-                # MOCK: Get random route for this driver
-                route = random.choice(LocationBasedAssignmentService.MOCK_DRIVER_ROUTES)
-                
-                # Calculate detour distance (MOCK)
-                detour_distance = LocationBasedAssignmentService.calculate_distance_between_points(
-                    route['start_lat'], route['start_lng'],
-                    route['end_lat'], route['end_lng']
-                )
-                
-                candidates.append({
-                    'driver': driver,
-                    'route': route,
-                    'detour_distance': detour_distance,
-                    'score': 100 - (detour_distance * 2)  # Prefer shorter detours
-                })
+            matches = index.match(lat, lng, weight_kg=total_weight_kg,
+                                  radius_km=DriverMatchingService.SEARCH_RADIUS_KM, limit=1)
+            if not matches:
+                return None, "No driver route with sufficient capacity passes near this location"
             
-            if not candidates:
-                return None, "No drivers with sufficient capacity"
+            best = matches[0]
+            driver = Driver.query.get(best['driver_id'])
+            route = DriverRoute.query.get(best['route_id'])
             
-            # Sort by score (highest first = best)
-            candidates.sort(key=lambda x: x['score'], reverse=True)
-            
-            return candidates[0], "Driver found"
+            return {
+                'driver': driver,
+                'route_id': route.id,
+                'route': {
+                    'start': route.starting_location,
+                    'end': route.ending_location,
+                    'start_lat': route.start_lat,
+                    'start_lng': route.start_lng,
+                    'end_lat': route.end_lat,
+                    'end_lng': route.end_lng,
+                    'distance_km': route.total_distance_km,
+                    'time_hours': route.estimated_time_hours or 0
+                },
+                'distance_from_route': best['distance_km'],
+                'detour_distance': round(best['detour_km'], 2),
+                'score': 100 - (best['detour_km'] * 2)  # Prefer shorter detours
+            }, "Driver found"
         
         except Exception as e:
             return None, str(e)
@@ -242,22 +202,21 @@ class LocationBasedAssignmentService:
                 order.total_amount
             )
             
-            # Get or create retailer location coordinates
-            location_coords = LocationBasedAssignmentService.MOCK_RETAILER_LOCATIONS.get(
-                retailer_location,
-                {'lat': str(round(random.uniform(12.9, 13.1), 4)), 
-                 'lng': str(round(random.uniform(80.1, 80.3), 4))}
-            )
+            # Retailer location coordinates
+            retailer_lat, retailer_lng = LocationBasedAssignmentService.get_location_coordinates(retailer_location)
             
             # Create location detail record
             location_detail = OrderLocationDetail(
                 order_id=order_id,
                 retailer_location=retailer_location,
-                retailer_lat=location_coords['lat'],
-                retailer_lng=location_coords['lng'],
+                retailer_lat=str(retailer_lat),
+                retailer_lng=str(retailer_lng),
+                assigned_driver_route_id=driver_info['route_id'],
                 volume_m3=volume_m3,
                 total_weight_kg=total_weight_kg,
-                distance_from_vendor_km=round(random.uniform(5, 25), 2),
+                distance_from_vendor_km=LocationBasedAssignmentService.calculate_distance_between_points(
+                    route['start_lat'], route['start_lng'], retailer_lat, retailer_lng
+                ),
                 detour_distance_km=driver_info['detour_distance'],
                 product_cost=order.total_amount,
                 volume_charge=pricing['volume_charge'],
@@ -342,9 +301,9 @@ class LocationBasedAssignmentService:
             
             db.session.commit()
             
-            print(f"[LOCATION ASSIGNMENT] Order {order_id} assigned to driver {selected_driver.user.name}")
-            print(f"[PRICING] Product: ₹{pricing['product_cost']} + Logistics: ₹{pricing['total_logistics']} = ₹{pricing['final_amount']}")
-            print(f"[ROUTE] {route['start']} → {route['end']} ({route['distance_km']} km)")
+            logger.info("[LOCATION ASSIGNMENT] Order %s assigned to driver %s", order_id, selected_driver.user.name)
+            logger.info("[PRICING] Product: ₹%s + Logistics: ₹%s = ₹%s", pricing['product_cost'], pricing['total_logistics'], pricing['final_amount'])
+            logger.info("[ROUTE] %s → %s (%s km)", route['start'], route['end'], route['distance_km'])
             
             return True, {
                 'success': True,
@@ -359,5 +318,5 @@ class LocationBasedAssignmentService:
         
         except Exception as e:
             db.session.rollback()
-            print(f"[LOCATION ERROR] {str(e)}")
+            logger.error("[LOCATION ERROR] %s", e)
             return False, str(e)
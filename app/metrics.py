@@ -0,0 +1,317 @@
+"""
+Metrics
+Prometheus counters and histograms for the marketplace hot paths, served at /metrics
+
+- Recording is lock-free: every thread increments its own shard of a metric (only that
+  thread ever writes to it); shards are only merged when /metrics is scraped
+- Multiprocess: with METRICS_DIR set, each worker writes its totals to
+  METRICS_DIR/metrics-<pid>.json at most every METRICS_FLUSH_SECONDS (after a request),
+  at exit and when scraped; /metrics adds up every file, so whichever gunicorn worker
+  answers the scrape reports the whole server. Files of exited workers keep counting
+  (counters never go down); empty the directory on deploy
+- A forked child starts from zero, so values recorded in a --preload master aren't
+  counted once per worker
+- Without METRICS_DIR, /metrics reports the worker that answered
+"""
+
+import atexit
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from flask import current_app, g, has_app_context, request
+
+logger = logging.getLogger(__name__)
+
+_registry = []  # Every Metric, in definition order (= exposition order)
+
+
+class Metric:
+    """One metric family; values are kept per thread and per label tuple"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._shards = []
+        _registry.append(self)
+
+    def _shard(self):
+        shard = getattr(self._local, 'values', None)
+        if shard is None:
+            shard = self._local.values = {}
+            self._shards.append(shard)  # list.append is atomic; this thread is the only writer of shard
+        return shard
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, '')) for label in self.labels)
+
+    def _reset(self):
+        self._local = threading.local()
+        self._shards = []
+
+    def collect(self):
+        """{label values: value} summed over this process's threads"""
+        merged = {}
+        for shard in list(self._shards):
+            for key, value in shard.copy().items():
+                merged[key] = self._merge(merged.get(key), value)
+        return merged
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    @staticmethod
+    def _merge(total, value):
+        return value if total is None else total + value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        counts = shard.get(key)
+        if counts is None:
+            # One slot per bucket, one for +Inf, then the sum of observed values
+            counts = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    @staticmethod
+    def _merge(total, value):
+        if total is None:
+            return list(value)
+        return [a + b for a, b in zip(total, value)]
+
+
+class Metrics:
+    """
+    The marketplace's metrics, request hooks and the exposition endpoint's data
+    """
+
+    DEFAULT_FLUSH_SECONDS = 5
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    METRICS = _registry
+
+    REQUEST_SECONDS = Histogram(
+        'http_request_duration_seconds', 'Request latency by endpoint', ('endpoint', 'method', 'status'))
+    REQUEST_DB_SECONDS = Histogram(
+        'http_request_db_seconds', 'Time spent in SQL per request, by endpoint', ('endpoint',))
+    REQUEST_QUERIES = Counter(
+        'http_request_queries_total', 'SQL statements run by requests, by endpoint', ('endpoint',))
+    GEMINI_SECONDS = Histogram(
+        'gemini_call_duration_seconds', 'Gemini generate_content() latency by model and outcome', ('model', 'outcome'),
+        buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0))
+    CART_OPERATIONS = Counter(
+        'cart_operations_total', 'Add / remove cart operations by outcome', ('action', 'outcome'))
+    CHECKOUTS = Counter(
+        'checkouts_total', 'Cart checkouts by outcome', ('outcome',))
+    PAYMENTS = Counter(
+        'payment_attempts_total', 'MockPaymentGateway attempts by outcome', ('outcome',))
+    DRIVER_ASSIGNMENT_SECONDS = Histogram(
+        'driver_assignment_duration_seconds', 'Time to assign drivers (one order, or one batch run)', ('mode', 'outcome'))
+    DRIVER_ASSIGNMENTS = Counter(
+        'driver_assignments_total', 'Orders assigned to a driver', ('mode',))
+    LOG_RECORDS_DROPPED = Counter(
+        'log_records_dropped_total', 'Log records dropped because the log queue was full')
+
+    _flushed_at = 0.0
+    _flush_lock = threading.Lock()
+    _directory = None  # Last METRICS_DIR flushed to (for the exit hook and code without an app context)
+    _exit_hook = False
+
+    # ============ SETUP ============
+
+    @staticmethod
+    def init_app(app):
+        app.before_request(Metrics._start_request)
+        app.after_request(Metrics._finish_request)
+
+    @staticmethod
+    def _after_fork():
+        """Child processes start counting from zero (and write their own file)"""
+        for metric in Metrics.METRICS:
+            metric._reset()
+        Metrics._flushed_at = 0.0
+        Metrics._flush_lock = threading.Lock()
+
+    @staticmethod
+    def _config(name, default):
+        if not has_app_context():
+            return default
+        value = current_app.config.get(name)
+        return default if value is None else value
+
+    # ============ REQUESTS ============
+
+    @staticmethod
+    def _start_request():
+        g._metrics_started = time.perf_counter()
+
+    @staticmethod
+    def _finish_request(response):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        Metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint,
+                                        method=request.method, status=response.status_code)
+
+        from app.sql_profiler import QueryProfiler
+        profile = QueryProfiler.current()
+        if profile is not None:
+            Metrics.REQUEST_DB_SECONDS.observe(profile.db_seconds, endpoint=endpoint)
+            Metrics.REQUEST_QUERIES.inc(profile.queries, endpoint=endpoint)
+
+        Metrics.maybe_flush()
+        return response
+
+    # ============ MULTIPROCESS ============
+
+    @staticmethod
+    def directory():
+        return Metrics._config('METRICS_DIR', None) or Metrics._directory
+
+    @staticmethod
+    def snapshot():
+        """This process's values: {metric name: [[label values, value], ...]}"""
+        return {metric.name: [[list(key), value] for key, value in metric.collect().items()]
+                for metric in Metrics.METRICS}
+
+    @staticmethod
+    def flush(directory=None):
+        """Write this process's values to its file in METRICS_DIR (atomic replace)"""
+        directory = directory or Metrics.directory()
+        if not directory:
+            return False
+        if not Metrics._exit_hook:
+            atexit.register(Metrics._flush_at_exit)
+            Metrics._exit_hook = True
+        Metrics._directory = directory
+        with Metrics._flush_lock:
+            try:
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+                temporary = f'{path}.tmp'
+                with open(temporary, 'w') as handle:
+                    json.dump({'pid': os.getpid(), 'written_at': time.time(), 'metrics': Metrics.snapshot()}, handle)
+                os.replace(temporary, path)
+                Metrics._flushed_at = time.monotonic()
+                return True
+            except OSError as e:
+                logger.warning("Metrics flush failed: %s", e)
+                return False
+
+    @staticmethod
+    def _flush_at_exit():
+        if Metrics._directory:
+            Metrics.flush(Metrics._directory)
+
+    @staticmethod
+    def maybe_flush():
+        interval = Metrics._config('METRICS_FLUSH_SECONDS', Metrics.DEFAULT_FLUSH_SECONDS)
+        if time.monotonic() - Metrics._flushed_at >= interval and Metrics.directory():
+            Metrics.flush()
+
+    @staticmethod
+    def aggregate():
+        """
+        Values summed over every worker file in METRICS_DIR (just this process without one)
+
+        Returns:
+            {metric name: {label values tuple: value}}
+        """
+        directory = Metrics.directory()
+        if not directory:
+            return {metric.name: metric.collect() for metric in Metrics.METRICS}
+
+        Metrics.flush(directory)
+        by_name = {metric.name: metric for metric in Metrics.METRICS}
+        totals = {name: {} for name in by_name}
+        for path in sorted(glob.glob(os.path.join(directory, 'metrics-*.json'))):
+            try:
+                with open(path) as handle:
+                    data = json.load(handle)
+            except (OSError, ValueError):
+                continue  # Being replaced right now; the next scrape reads it
+            for name, values in data.get('metrics', {}).items():
+                metric = by_name.get(name)
+                if metric is None:
+                    continue
+                for key, value in values:
+                    key = tuple(key)
+                    totals[name][key] = metric._merge(totals[name].get(key), value)
+        return totals
+
+    # ============ EXPOSITION ============
+
+    @staticmethod
+    def _escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    @staticmethod
+    def _labels(names, values, extra=None):
+        pairs = [f'{name}="{Metrics._escape(value)}"' for name, value in zip(names, values)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    @staticmethod
+    def _number(value):
+        if value == float('inf'):
+            return '+Inf'
+        return repr(float(value)) if isinstance(value, float) else str(value)
+
+    @staticmethod
+    def render():
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        totals = Metrics.aggregate()
+        lines = []
+        for metric in Metrics.METRICS:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for key, value in sorted(totals.get(metric.name, {}).items()):
+                if metric.kind == 'counter':
+                    lines.append(f'{metric.name}{Metrics._labels(metric.labels, key)} {Metrics._number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), value[:-1]):
+                    cumulative += count
+                    le = f'le="{Metrics._number(bound)}"'
+                    lines.append(f'{metric.name}_bucket{Metrics._labels(metric.labels, key, le)} {cumulative}')
+                lines.append(f'{metric.name}_sum{Metrics._labels(metric.labels, key)} {Metrics._number(value[-1])}')
+                lines.append(f'{metric.name}_count{Metrics._labels(metric.labels, key)} {cumulative}')
+
+        # Convenience for dashboards without PromQL: success share of all payment attempts so far
+        payments = totals.get(Metrics.PAYMENTS.name, {})
+        attempts = sum(payments.values())
+        if attempts:
+            success = payments.get(('success',), 0)
+            lines.append('# HELP payment_success_ratio Successful share of MockPaymentGateway attempts since the workers started')
+            lines.append('# TYPE payment_success_ratio gauge')
+            lines.append(f'payment_success_ratio {round(success / attempts, 4)}')
+        return '\n'.join(lines) + '\n'
+
+
+os.register_at_fork(after_in_child=Metrics._after_fork)
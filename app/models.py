@@ -27,6 +27,7 @@ class User(UserMixin, db.Model):
     rating_quality_avg = db.Column(db.Float, default=0.0)
     rating_delay_avg = db.Column(db.Float, default=0.0)
     rating_communication_avg = db.Column(db.Float, default=0.0)
+    rating_sum = db.Column(db.Float, default=0.0)  # Running sum behind average_rating (see rating_service.py)
     
     products = db.relationship('Product', backref='vendor', lazy=True, foreign_keys='Product.vendor_id')
     orders_as_buyer = db.relationship('Order', backref='buyer', lazy=True, foreign_keys='Order.buyer_id')
@@ -44,6 +45,11 @@ class User(UserMixin, db.Model):
 
 class Product(db.Model):
     __tablename__ = 'products'
+    __table_args__ = (
+        # Keyset pagination for retailer browse (see browse_service.py)
+        db.Index('ix_products_active_created', 'is_active', 'created_at', 'id'),
+        db.Index('ix_products_active_price', 'is_active', 'price', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     vendor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
@@ -167,6 +173,70 @@ class OrderItem(db.Model):
     product = db.relationship('Product', backref='order_items')
 
 
+class Cart(db.Model):
+    """
+    Server-side retailer cart (one per retailer)
+    Totals are kept up to date on every change so the cart badge is a single-row read
+    """
+    __tablename__ = 'carts'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    retailer_id = db.Column(db.Integer, db.ForeignKey('users.id'), unique=True, nullable=False, index=True)
+    
+    # Precomputed totals (maintained by CartService)
+    item_count = db.Column(db.Integer, default=0)  # Number of lines
+    total_quantity = db.Column(db.Float, default=0)  # Sum of line quantities
+    total_amount = db.Column(db.Float, default=0)  # Sum of quantity * unit_price
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    items = db.relationship('CartItem', backref='cart', lazy=True, cascade='all, delete-orphan')
+    
+    def __repr__(self):
+        return f'<Cart retailer_id={self.retailer_id} lines={self.item_count}>'
+
+
+class CartItem(db.Model):
+    __tablename__ = 'cart_items'
+    __table_args__ = (
+        db.UniqueConstraint('cart_id', 'product_id', name='uq_cart_items_cart_product'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    cart_id = db.Column(db.Integer, db.ForeignKey('carts.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    quantity = db.Column(db.Float, nullable=False)
+    unit_price = db.Column(db.Float, nullable=False)  # Price in the precomputed total (kept current by CartService.reprice)
+    
+    added_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class StockReservation(db.Model):
+    """
+    Stock held for an order between checkout and payment
+    Product quantity is decremented when the hold is placed and restored if it is released
+    """
+    __tablename__ = 'stock_reservations'
+    __table_args__ = (
+        db.Index('ix_stock_reservations_status_expires', 'status', 'expires_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, index=True)
+    quantity = db.Column(db.Float, nullable=False)
+    
+    status = db.Column(db.String(20), default='held')  # held, committed, released, expired
+    expires_at = db.Column(db.DateTime, nullable=False)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<StockReservation order={self.order_id} product={self.product_id} {self.status}>'
+
+
 class Payment(db.Model):
     __tablename__ = 'payments'
     
@@ -278,11 +348,11 @@ class DriverRoute(db.Model):
     starting_location = db.Column(db.String(100))  # e.g., "Koyambedu"
     ending_location = db.Column(db.String(100))    # e.g., "Chromepet"
     
-    # MOCK Coordinates (stored as strings for simplicity)
-    start_lat = db.Column(db.String(20))
-    start_lng = db.Column(db.String(20))
-    end_lat = db.Column(db.String(20))
-    end_lng = db.Column(db.String(20))
+    # Route segment coordinates in decimal degrees (indexed in app/driver_matching_service.py)
+    start_lat = db.Column(db.Float)
+    start_lng = db.Column(db.Float)
+    end_lat = db.Column(db.Float)
+    end_lng = db.Column(db.Float)
     
     # Route details
     total_distance_km = db.Column(db.Float)  # e.g., 25 km
@@ -493,6 +563,38 @@ class OrderStatusLog(db.Model):
         return f'<StatusLog Order#{self.order_id}: {self.status_from} → {self.status_to}>'
 
 
+class PipelineCheckpoint(db.Model):
+    """High-water marks for incremental batch jobs (e.g. delivery metrics)"""
+    __tablename__ = 'pipeline_checkpoints'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+    
+    last_id = db.Column(db.Integer, default=0)  # Every source row up to this id is settled (processed or never will be)
+    rows_processed = db.Column(db.Integer, default=0)
+    last_run_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<PipelineCheckpoint {self.name} @ {self.last_id}>'
+
+
+class PipelineProcessedRow(db.Model):
+    """
+    Source rows an incremental job has already counted, above its checkpoint
+    Ids are handed out at insert, not at commit, so a row with a lower id can appear after a
+    higher one was processed; the job skips rows listed here instead of everything below MAX(id)
+    """
+    __tablename__ = 'pipeline_processed_rows'
+    
+    pipeline = db.Column(db.String(50), primary_key=True)
+    row_id = db.Column(db.Integer, primary_key=True)  # The primary key makes concurrent claims of a row fail
+    batch = db.Column(db.String(32), nullable=False, index=True)
+    claimed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<PipelineProcessedRow {self.pipeline} #{self.row_id}>'
+
+
 class ProductReview(db.Model):
     """Reviews and ratings for vendors and drivers after delivery"""
     __tablename__ = 'product_reviews'
@@ -582,7 +684,7 @@ class UserReport(db.Model):
 class VendorRatingsCache(db.Model):
     """
     Cached vendor ratings for fast comparison queries
-    Updated whenever new review is submitted
+    Updated incrementally on every review/order change, rebuilt by run_rating_reconciliation.py
     """
     __tablename__ = 'vendor_ratings_cache'
     
@@ -595,11 +697,18 @@ class VendorRatingsCache(db.Model):
     avg_communication_rating = db.Column(db.Float, default=0.0)  # Average of rating_communication
     overall_rating = db.Column(db.Float, default=0.0, index=True)  # Overall average
     
+    # Running sums behind the averages (updated per review, see rating_service.py)
+    sum_quality_rating = db.Column(db.Integer, default=0)
+    sum_punctuality_rating = db.Column(db.Integer, default=0)
+    sum_communication_rating = db.Column(db.Integer, default=0)
+    
     # Performance metrics
     total_reviews = db.Column(db.Integer, default=0)
     success_rate = db.Column(db.Float, default=0.0)  # Percentage of successful orders
     on_time_rate = db.Column(db.Float, default=0.0)  # Percentage of on-time deliveries
     repeat_customer_rate = db.Column(db.Float, default=0.0)  # Percentage of repeat customers
+    total_orders = db.Column(db.Integer, default=0)  # Counters behind success_rate
+    successful_orders = db.Column(db.Integer, default=0)
     
     # Timestamps
     last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -615,7 +724,7 @@ class VendorRatingsCache(db.Model):
 class VendorDeliveryMetrics(db.Model):
     """
     Cached delivery performance metrics for vendors
-    Updated after each delivery completion
+    Updated from OrderStatusLog by DeliveryMetricsPipeline (delivery_metrics_service.py)
     """
     __tablename__ = 'vendor_delivery_metrics'
     
@@ -631,6 +740,7 @@ class VendorDeliveryMetrics(db.Model):
     delivery_on_time_count = db.Column(db.Integer, default=0)  # Number of on-time deliveries
     delivery_late_count = db.Column(db.Integer, default=0)  # Number of late deliveries
     total_deliveries = db.Column(db.Integer, default=0)  # Total completed deliveries
+    total_delivery_time = db.Column(db.Integer, default=0)  # Running sum (minutes) behind avg_delivery_time
     
     # Timestamps
     last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -680,3 +790,50 @@ class ProductComparison(db.Model):
     
     def __repr__(self):
         return f'<ProductComparison id={self.comparison_id} retailer={self.retailer_id}>'
+
+
+class LLMResponseCache(db.Model):
+    """
+    Gemini responses keyed on (model, prompt version, normalized input / image hash)
+    Shared by all workers behind the in-process LRU in llm_cache.py
+    """
+    __tablename__ = 'llm_response_cache'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    cache_key = db.Column(db.String(64), unique=True, nullable=False, index=True)  # sha256 hex
+    model = db.Column(db.String(50), nullable=False)  # e.g., "gemini-1.5-flash"
+    prompt_version = db.Column(db.String(50), nullable=False)  # e.g., "voice-command-v1"
+    
+    response_text = db.Column(db.Text, nullable=False)  # Raw model text (parsed by the caller)
+    hit_count = db.Column(db.Integer, default=0)
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # Size eviction: least recently used first
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<LLMResponseCache {self.model}/{self.prompt_version} hits={self.hit_count}>'
+
+
+class LLMJob(db.Model):
+    """
+    Background Gemini call started by a route that returned a job id (llm_gateway.py)
+    Kept in the database so any worker can answer the poll
+    """
+    __tablename__ = 'llm_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(36), unique=True, nullable=False, index=True)  # UUID
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)  # Only the owner may poll
+    kind = db.Column(db.String(50), nullable=False)  # e.g., "vision.analyze_product"
+    
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, done, failed
+    result = db.Column(db.JSON)
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    finished_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<LLMJob {self.job_id} {self.kind} {self.status}>'
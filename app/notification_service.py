@@ -3,6 +3,7 @@ Notification Service for FreshConnect
 Handles email notifications for expiring products and other alerts
 """
 
+import logging
 from datetime import datetime, timedelta
 from app.models import Product, User
 from app import db
@@ -10,6 +11,8 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+logger = logging.getLogger(__name__)
+
 
 class NotificationService:
     """
@@ -28,63 +31,48 @@ class NotificationService:
     def check_expiring_products(days_threshold=7):
         """
         Check for products expiring within specified days
-        Returns list of vendors with their expiring products
+        Returns dict of vendor_id -> expiring product rows (one grouped query)
         """
-        cutoff_date = datetime.now().date() + timedelta(days=days_threshold)
-        
-        # Find products expiring soon that are not in emergency sale
-        expiring_products = Product.query.filter(
-            Product.expiry_date <= cutoff_date,
-            Product.expiry_date >= datetime.now().date(),
-            Product.is_active == True,
-            Product.is_emergency == False
-        ).all()
-        
-        # Group by vendor
-        vendors_products = {}
-        for product in expiring_products:
-            vendor_id = product.vendor_id
-            if vendor_id not in vendors_products:
-                vendors_products[vendor_id] = []
-            vendors_products[vendor_id].append(product)
+        from app.expiry_service import ExpiryEngine
         
-        return vendors_products
+        return ExpiryEngine.expiring_by_vendor(days_threshold=days_threshold)
     
     @staticmethod
-    def send_expiry_notification(vendor_id, products):
+    def send_expiry_notification(vendor_id, products, vendor=None):
         """
         Send email notification to vendor about expiring products
         """
-        vendor = User.query.get(vendor_id)
+        if vendor is None:
+            vendor = User.query.get(vendor_id)
         if not vendor or vendor.user_type != 'vendor':
             return False
         
-        # In development, just print the notification
+        # In development, just log the notification (one record, so it stays in one piece)
         # In production, send actual email
         
-        print(f"\n{'='*60}")
-        print(f"📧 EMAIL NOTIFICATION")
-        print(f"{'='*60}")
-        print(f"To: {vendor.email}")
-        print(f"Subject: ⚠️ Products Expiring Soon - Action Required")
-        print(f"\nDear {vendor.business_name or vendor.name},")
-        print(f"\nYou have {len(products)} product(s) expiring soon:\n")
-        
-        for product in products:
-            days_left = (product.expiry_date - datetime.now().date()).days
-            print(f"  • {product.product_name}")
-            print(f"    Expiry: {product.expiry_date.strftime('%d-%m-%Y')} ({days_left} days left)")
-            print(f"    Quantity: {product.quantity} {product.unit}")
-            print(f"    Current Price: ₹{product.price}")
-            print()
-        
-        print(f"💡 RECOMMENDED ACTIONS:")
-        print(f"  1. Mark products for emergency sale (up to 50% discount)")
-        print(f"  2. Reduce prices to sell quickly")
-        print(f"  3. Update inventory if products are sold elsewhere")
-        print(f"\nLogin to FreshConnect: http://127.0.0.1:5000/auth/login")
-        print(f"Go to: Vendor → Emergency Dashboard")
-        print(f"\n{'='*60}\n")
+        if logger.isEnabledFor(logging.INFO):
+            lines = [
+                f"To: {vendor.email}",
+                "Subject: ⚠️ Products Expiring Soon - Action Required",
+                f"Dear {vendor.business_name or vendor.name},",
+                f"You have {len(products)} product(s) expiring soon:"
+            ]
+            for product in products:
+                days_left = (product.expiry_date - datetime.now().date()).days
+                lines.append(f"  • {product.product_name}")
+                lines.append(f"    Expiry: {product.expiry_date.strftime('%d-%m-%Y')} ({days_left} days left)")
+                lines.append(f"    Quantity: {product.quantity} {product.unit}")
+                lines.append(f"    Current Price: ₹{product.price}")
+            lines += [
+                "💡 RECOMMENDED ACTIONS:",
+                "  1. Mark products for emergency sale (up to 50% discount)",
+                "  2. Reduce prices to sell quickly",
+                "  3. Update inventory if products are sold elsewhere",
+                "Login to FreshConnect: http://127.0.0.1:5000/auth/login",
+                "Go to: Vendor → Emergency Dashboard"
+            ]
+            logger.info("[MOCK EMAIL] Expiry notification to vendor %s\n%s", vendor.id, '\n'.join(lines),
+                        extra={'vendor_id': vendor.id, 'products': len(products)})
         
         # For production: send actual email
         # NotificationService._send_email(vendor.email, subject, body)
@@ -118,7 +106,7 @@ class NotificationService:
             
             return True
         except Exception as e:
-            print(f"Error sending email: {str(e)}")
+            logger.error("Error sending email: %s", e)
             return False
     
     @staticmethod
@@ -201,55 +189,50 @@ class NotificationService:
         return html
     
     @staticmethod
-    def auto_hide_expired_products():
+    def auto_hide_expired_products(dry_run=False, chunk_size=None):
         """
-        Automatically hide products that have already expired
+        Automatically hide products that have already expired (bulk UPDATE)
         """
-        expired_products = Product.query.filter(
-            Product.expiry_date < datetime.now().date(),
-            Product.is_active == True
-        ).all()
-        
-        count = 0
-        for product in expired_products:
-            product.is_active = False
-            count += 1
-        
-        if count > 0:
-            db.session.commit()
-            print(f"✓ Auto-hidden {count} expired products")
+        from app.expiry_service import ExpiryEngine
         
-        return count
+        return ExpiryEngine.hide_expired(dry_run=dry_run, chunk_size=chunk_size)
     
     @staticmethod
-    def send_bulk_expiry_notifications():
+    def send_bulk_expiry_notifications(dry_run=False, chunk_size=None):
         """
         Send notifications to all vendors with expiring products
         This should be run daily via cron job
+        
+        dry_run: only count what would be hidden / notified, without writing or sending
         """
-        print("\n" + "="*60)
-        print("🔔 RUNNING DAILY EXPIRY CHECK")
-        print("="*60)
+        logger.info("Running daily expiry check%s", ' (dry run)' if dry_run else '')
         
         # Auto-hide expired products first
-        hidden_count = NotificationService.auto_hide_expired_products()
+        hidden_count = NotificationService.auto_hide_expired_products(dry_run=dry_run, chunk_size=chunk_size)
         
         # Check for products expiring in next 7 days
         vendors_products = NotificationService.check_expiring_products(days_threshold=7)
         
         notifications_sent = 0
-        for vendor_id, products in vendors_products.items():
-            if NotificationService.send_expiry_notification(vendor_id, products):
-                notifications_sent += 1
+        if not dry_run and vendors_products:
+            vendors = {
+                vendor.id: vendor
+                for vendor in User.query.filter(User.id.in_(list(vendors_products))).all()
+            }
+            for vendor_id, products in vendors_products.items():
+                vendor = vendors.get(vendor_id)
+                if vendor and NotificationService.send_expiry_notification(vendor_id, products, vendor=vendor):
+                    notifications_sent += 1
+        
+        total_expiring = sum(len(p) for p in vendors_products.values())
         
-        print(f"\n📊 SUMMARY:")
-        print(f"  • Expired products hidden: {hidden_count}")
-        print(f"  • Vendors notified: {notifications_sent}")
-        print(f"  • Total expiring products: {sum(len(p) for p in vendors_products.values())}")
-        print("="*60 + "\n")
+        logger.info("Daily expiry check: %s expired products hidden, %s vendors notified, %s products expiring",
+                    hidden_count, len(vendors_products) if dry_run else notifications_sent, total_expiring)
         
         return {
             'hidden': hidden_count,
             'notified': notifications_sent,
-            'total_expiring': sum(len(p) for p in vendors_products.values())
+            'vendors_with_expiring': len(vendors_products),
+            'total_expiring': total_expiring,
+            'dry_run': dry_run
         }
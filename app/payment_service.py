@@ -1,8 +1,13 @@
+import logging
 import random
 import uuid
 from datetime import datetime
 from app import db
 from app.models import Payment, Order
+from app.stock_service import StockReservationService
+from app.metrics import Metrics
+
+logger = logging.getLogger(__name__)
 
 class MockPaymentGateway:
     """
@@ -46,10 +51,21 @@ class MockPaymentGateway:
             is_valid, message = MockPaymentGateway.validate_card(card_number, expiry, cvv)
             
             if not is_valid:
+                Metrics.PAYMENTS.inc(outcome='invalid_card')
                 return {'success': False, 'message': message}
             
             transaction_id = MockPaymentGateway.generate_transaction_id()
             order = Order.query.get_or_404(order_id)
+
+            if order.payment_status == 'paid':
+                Metrics.PAYMENTS.inc(outcome='already_paid')
+                return {'success': False, 'message': 'Order is already paid', 'can_retry': False}
+
+            # Hold the stock before charging (re-reserves after an earlier failed attempt)
+            reserved, message = StockReservationService.ensure_reserved(order)
+            if not reserved:
+                Metrics.PAYMENTS.inc(outcome='out_of_stock')
+                return {'success': False, 'message': message, 'can_retry': False}
             
             # MOCK: 70% success
             is_success = random.random() < 0.7
@@ -70,16 +86,17 @@ class MockPaymentGateway:
                 order.order_status = 'payment_confirmed'
                 order.transaction_id = transaction_id
                 
-                for item in order.items:
-                    item.product.quantity -= item.quantity
+                StockReservationService.commit_order(order_id)
                 
-                print(f"[MOCK PAYMENT] SUCCESS - Transaction: {transaction_id}")
+                logger.info("[MOCK PAYMENT] SUCCESS - Transaction: %s", transaction_id)
             else:
                 order.payment_status = 'failed'
                 order.order_status = 'payment_failed'
-                print(f"[MOCK PAYMENT] FAILED - Transaction: {transaction_id}")
+                StockReservationService.release_order(order_id)
+                logger.info("[MOCK PAYMENT] FAILED - Transaction: %s", transaction_id)
             
             db.session.commit()
+            Metrics.PAYMENTS.inc(outcome='success' if is_success else 'declined')
             
             return {
                 'success': is_success,
@@ -90,4 +107,5 @@ class MockPaymentGateway:
         
         except Exception as e:
             db.session.rollback()
+            Metrics.PAYMENTS.inc(outcome='error')
             return {'success': False, 'message': str(e)}
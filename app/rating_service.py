@@ -0,0 +1,312 @@
+"""
+Rating Aggregate Service
+Running-sum vendor/driver ratings maintained in O(1) per review or order change
+
+Every review create/edit/delete applies a delta to the running sums
+(VendorRatingsCache.sum_* / total_reviews, User.rating_sum / total_reviews)
+and recomputes the averages in the same UPDATE, so the cost no longer grows
+with review history. reconcile() rebuilds everything from grouped queries;
+run it periodically (run_rating_reconciliation.py) to correct any drift.
+"""
+
+import logging
+from datetime import datetime
+from sqlalchemy import case, cast, func, text, bindparam, Float, Numeric
+from app import db
+from app.models import User, VendorRatingsCache
+
+logger = logging.getLogger(__name__)
+
+
+class RatingAggregateService:
+    """
+    Incremental rating aggregates + full reconciliation
+    """
+
+    # Shown until a vendor has reviews / orders (same as the comparison defaults)
+    DEFAULT_VENDOR_RATING = 4.0
+    DEFAULT_SUCCESS_RATE = 95.0
+
+    # ============ HELPERS ============
+
+    @staticmethod
+    def snapshot(review):
+        """Rating values of a review, taken before editing it"""
+        return (review.rating_quality, review.rating_delay, review.rating_communication, review.driver_rating)
+
+    @staticmethod
+    def _ratio(total, count, scale=1, default=0.0):
+        """SQL: round(total * scale / count, 2), or default when count is 0"""
+        return case(
+            (count > 0, func.round(cast(cast(total, Float) * scale / count, Numeric), 2)),
+            else_=default
+        )
+
+    @staticmethod
+    def _ensure_vendor_caches(vendor_ids):
+        """Create default ratings cache rows for vendors that don't have one yet (no commit)"""
+        from app.comparison_service import ProductComparisonService
+
+        vendor_ids = set(vendor_ids)
+        existing = {row[0] for row in db.session.query(VendorRatingsCache.vendor_id).filter(
+            VendorRatingsCache.vendor_id.in_(vendor_ids)
+        ).all()}
+        missing = vendor_ids - existing
+        if missing:
+            db.session.add_all([ProductComparisonService._default_ratings_cache(v) for v in missing])
+            db.session.flush()
+
+    @staticmethod
+    def _apply_vendor_delta(vendor_id, reviews=0, quality=0, punctuality=0, communication=0,
+                            orders=0, delivered=0):
+        """One UPDATE on the vendor's ratings cache row"""
+        RatingAggregateService._ensure_vendor_caches([vendor_id])
+        C = VendorRatingsCache
+        ratio = RatingAggregateService._ratio
+        values = {C.last_updated: datetime.utcnow()}
+
+        if reviews or quality or punctuality or communication:
+            n = func.coalesce(C.total_reviews, 0) + reviews
+            sum_quality = func.coalesce(C.sum_quality_rating, 0) + quality
+            sum_punctuality = func.coalesce(C.sum_punctuality_rating, 0) + punctuality
+            sum_communication = func.coalesce(C.sum_communication_rating, 0) + communication
+            default = RatingAggregateService.DEFAULT_VENDOR_RATING
+            values.update({
+                C.total_reviews: n,
+                C.sum_quality_rating: sum_quality,
+                C.sum_punctuality_rating: sum_punctuality,
+                C.sum_communication_rating: sum_communication,
+                C.avg_quality_rating: ratio(sum_quality, n, default=default),
+                C.avg_punctuality_rating: ratio(sum_punctuality, n, default=default),
+                C.avg_communication_rating: ratio(sum_communication, n, default=default),
+                C.overall_rating: ratio(sum_quality + sum_punctuality + sum_communication, n * 3, default=default)
+            })
+
+        if orders or delivered:
+            total_orders = func.coalesce(C.total_orders, 0) + orders
+            successful_orders = func.coalesce(C.successful_orders, 0) + delivered
+            values.update({
+                C.total_orders: total_orders,
+                C.successful_orders: successful_orders,
+                C.success_rate: ratio(successful_orders, total_orders, scale=100,
+                                      default=RatingAggregateService.DEFAULT_SUCCESS_RATE)
+            })
+
+        C.query.filter_by(vendor_id=vendor_id).update(values, synchronize_session=False)
+
+    @staticmethod
+    def _apply_user_delta(user_id, reviews=0, rating=0.0):
+        """One UPDATE on a vendor/driver user's average_rating"""
+        if not user_id or not (reviews or rating):
+            return
+        n = func.coalesce(User.total_reviews, 0) + reviews
+        rating_sum = func.coalesce(User.rating_sum, 0) + rating
+        User.query.filter_by(id=user_id).update({
+            User.total_reviews: n,
+            User.rating_sum: rating_sum,
+            User.average_rating: RatingAggregateService._ratio(rating_sum, n)
+        }, synchronize_session=False)
+
+    # ============ REVIEW EVENTS (no commit - caller commits with the review) ============
+
+    @staticmethod
+    def review_added(review):
+        quality, delay, communication, driver_rating = RatingAggregateService.snapshot(review)
+        RatingAggregateService._apply_vendor_delta(
+            review.vendor_id, reviews=1, quality=quality, punctuality=delay, communication=communication
+        )
+        RatingAggregateService._apply_user_delta(
+            review.vendor_id, reviews=1, rating=(quality + delay + communication) / 3
+        )
+        if review.driver_id and driver_rating:
+            RatingAggregateService._apply_user_delta(review.driver_id, reviews=1, rating=driver_rating)
+
+    @staticmethod
+    def review_updated(review, before):
+        """
+        Args:
+            before: snapshot(review) taken before the edit
+        """
+        old_quality, old_delay, old_communication, old_driver = before
+        quality, delay, communication, driver_rating = RatingAggregateService.snapshot(review)
+
+        if (quality, delay, communication) != (old_quality, old_delay, old_communication):
+            RatingAggregateService._apply_vendor_delta(
+                review.vendor_id,
+                quality=quality - old_quality,
+                punctuality=delay - old_delay,
+                communication=communication - old_communication
+            )
+            RatingAggregateService._apply_user_delta(
+                review.vendor_id,
+                rating=((quality + delay + communication) - (old_quality + old_delay + old_communication)) / 3
+            )
+
+        if review.driver_id and driver_rating != old_driver:
+            RatingAggregateService._apply_user_delta(
+                review.driver_id,
+                reviews=(1 if driver_rating else 0) - (1 if old_driver else 0),
+                rating=(driver_rating or 0) - (old_driver or 0)
+            )
+
+    @staticmethod
+    def review_deleted(review):
+        quality, delay, communication, driver_rating = RatingAggregateService.snapshot(review)
+        RatingAggregateService._apply_vendor_delta(
+            review.vendor_id, reviews=-1, quality=-quality, punctuality=-delay, communication=-communication
+        )
+        RatingAggregateService._apply_user_delta(
+            review.vendor_id, reviews=-1, rating=-(quality + delay + communication) / 3
+        )
+        if review.driver_id and driver_rating:
+            RatingAggregateService._apply_user_delta(review.driver_id, reviews=-1, rating=-driver_rating)
+
+    # ============ ORDER EVENTS (no commit) ============
+
+    @staticmethod
+    def orders_placed(seller_ids):
+        """Count new orders towards each seller's success rate"""
+        counts = {}
+        for seller_id in seller_ids:
+            counts[seller_id] = counts.get(seller_id, 0) + 1
+        for seller_id, count in counts.items():
+            RatingAggregateService._apply_vendor_delta(seller_id, orders=count)
+
+    @staticmethod
+    def order_delivered(seller_id):
+        RatingAggregateService._apply_vendor_delta(seller_id, delivered=1)
+
+    # ============ RECONCILIATION ============
+
+    VENDOR_AGGREGATE_SQL = """
+        SELECT
+            u.id AS vendor_id,
+            COALESCE(r.review_count, 0) AS review_count,
+            COALESCE(r.sum_quality, 0) AS sum_quality,
+            COALESCE(r.sum_punctuality, 0) AS sum_punctuality,
+            COALESCE(r.sum_communication, 0) AS sum_communication,
+            COALESCE(o.total_orders, 0) AS total_orders,
+            COALESCE(o.successful_orders, 0) AS successful_orders
+        FROM users u
+        LEFT JOIN (
+            SELECT vendor_id,
+                   COUNT(*) AS review_count,
+                   SUM(rating_quality) AS sum_quality,
+                   SUM(rating_delay) AS sum_punctuality,
+                   SUM(rating_communication) AS sum_communication
+            FROM product_reviews
+            GROUP BY vendor_id
+        ) r ON r.vendor_id = u.id
+        LEFT JOIN (
+            SELECT seller_id,
+                   COUNT(*) AS total_orders,
+                   SUM(CASE WHEN order_status = 'delivered' THEN 1 ELSE 0 END) AS successful_orders
+            FROM orders
+            GROUP BY seller_id
+        ) o ON o.seller_id = u.id
+        WHERE u.user_type = 'vendor'
+    """
+
+    DRIVER_AGGREGATE_SQL = """
+        SELECT
+            u.id AS driver_id,
+            COUNT(r.driver_rating) AS review_count,
+            COALESCE(SUM(r.driver_rating), 0) AS rating_sum
+        FROM users u
+        LEFT JOIN product_reviews r ON r.driver_id = u.id AND r.driver_rating IS NOT NULL
+        WHERE u.user_type = 'driver'
+    """
+
+    @staticmethod
+    def reconcile(user_ids=None):
+        """
+        Rebuild VendorRatingsCache and User.average_rating from scratch (commits)
+
+        Args:
+            user_ids: limit to these vendors/drivers (default: everyone)
+
+        Returns:
+            dict with vendors / drivers counts
+        """
+        vendor_sql = RatingAggregateService.VENDOR_AGGREGATE_SQL
+        driver_sql = RatingAggregateService.DRIVER_AGGREGATE_SQL
+        params = {}
+        if user_ids is not None:
+            vendor_sql += " AND u.id IN :user_ids"
+            driver_sql += " AND u.id IN :user_ids"
+            params['user_ids'] = list(user_ids)
+        driver_sql += " GROUP BY u.id"
+
+        def run(sql):
+            statement = text(sql)
+            if user_ids is not None:
+                statement = statement.bindparams(bindparam('user_ids', expanding=True))
+            return db.session.execute(statement, params).fetchall()
+
+        try:
+            vendor_rows = run(vendor_sql)
+            driver_rows = run(driver_sql)
+
+            RatingAggregateService._ensure_vendor_caches([row.vendor_id for row in vendor_rows])
+            now = datetime.utcnow()
+            default_rating = RatingAggregateService.DEFAULT_VENDOR_RATING
+
+            cache_updates = []
+            user_updates = []
+            for row in vendor_rows:
+                n = row.review_count
+                rating_sum = (row.sum_quality + row.sum_punctuality + row.sum_communication) / 3
+                cache_updates.append({
+                    'b_vendor_id': row.vendor_id,
+                    'total_reviews': n,
+                    'sum_quality_rating': row.sum_quality,
+                    'sum_punctuality_rating': row.sum_punctuality,
+                    'sum_communication_rating': row.sum_communication,
+                    'avg_quality_rating': round(row.sum_quality / n, 2) if n else default_rating,
+                    'avg_punctuality_rating': round(row.sum_punctuality / n, 2) if n else default_rating,
+                    'avg_communication_rating': round(row.sum_communication / n, 2) if n else default_rating,
+                    'overall_rating': round(rating_sum / n, 2) if n else default_rating,
+                    'total_orders': row.total_orders,
+                    'successful_orders': row.successful_orders,
+                    'success_rate': (
+                        round(row.successful_orders / row.total_orders * 100, 2) if row.total_orders
+                        else RatingAggregateService.DEFAULT_SUCCESS_RATE
+                    ),
+                    'last_updated': now
+                })
+                user_updates.append({
+                    'b_user_id': row.vendor_id,
+                    'total_reviews': n,
+                    'rating_sum': rating_sum,
+                    'average_rating': round(rating_sum / n, 2) if n else 0.0
+                })
+
+            for row in driver_rows:
+                user_updates.append({
+                    'b_user_id': row.driver_id,
+                    'total_reviews': row.review_count,
+                    'rating_sum': float(row.rating_sum),
+                    'average_rating': round(row.rating_sum / row.review_count, 2) if row.review_count else 0.0
+                })
+
+            cache_table = VendorRatingsCache.__table__
+            users_table = User.__table__
+            if cache_updates:
+                db.session.execute(
+                    cache_table.update().where(cache_table.c.vendor_id == bindparam('b_vendor_id')),
+                    cache_updates
+                )
+            if user_updates:
+                db.session.execute(
+                    users_table.update().where(users_table.c.id == bindparam('b_user_id')),
+                    user_updates
+                )
+
+            db.session.commit()
+            logger.info("Reconciled ratings for %s vendors and %s drivers", len(vendor_rows), len(driver_rows))
+            return {'vendors': len(vendor_rows), 'drivers': len(driver_rows)}
+
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Rating reconciliation failed: %s", e)
+            raise
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request
+from flask import Blueprint, render_template, request, jsonify
 from flask_login import login_required, current_user
 from app.models import User, Product, Order, Payment
 from app.decorators import admin_required
@@ -31,3 +31,26 @@ def users():
 def orders():
     all_orders = Order.query.order_by(Order.created_at.desc()).all()
     return render_template('admin/orders.html', orders=all_orders)
+
+@bp.route('/llm-cache')
+@admin_required
+def llm_cache_stats():
+    """Gemini response cache hit/miss counters (this worker) and table size"""
+    from app.llm_cache import LLMCache
+    return jsonify(LLMCache.stats())
+
+@bp.route('/llm-gateway')
+@admin_required
+def llm_gateway_stats():
+    """Gemini gateway counters, circuit breaker state, per-model latency and image preprocessing (this worker)"""
+    from app.llm_gateway import LLMGateway
+    from app.gemini_client import GeminiRegistry
+    from app.image_pipeline import ImagePipeline
+    return jsonify(dict(LLMGateway.stats(), models=GeminiRegistry.stats(), images=ImagePipeline.stats()))
+
+@bp.route('/sql-profile')
+@admin_required
+def sql_profile():
+    """Queries per request by endpoint, repeated statements and recent slow / N+1 requests (this worker)"""
+    from app.sql_profiler import QueryProfiler
+    return jsonify(QueryProfiler.stats())
@@ -1,9 +1,15 @@
+import logging
 from flask import Blueprint, request, jsonify, url_for
 from flask_login import login_required, current_user
 from app import db
 from app.models import Product, DriverAssignment
 from app.driver_service import MockDriverService
 from app.ai_service import ChatbotService, SmartChatbotService
+from app.search_service import ProductSearchService
+from app.intent_engine import IntentEngine
+from app.autocomplete import AutocompleteIndex
+
+logger = logging.getLogger(__name__)
 
 bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -30,6 +36,15 @@ def get_driver_location(assignment_id):
     except:
         return jsonify({'error': 'Not found'}), 404
 
+@bp.route('/autocomplete')
+def autocomplete():
+    """Search-box suggestions (product names, categories, vendors) from the in-memory trie"""
+    query = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', 8, type=int), 1), AutocompleteIndex.TOP_K)
+    response = jsonify({'query': query, 'suggestions': AutocompleteIndex.complete(query, limit)})
+    response.headers['Cache-Control'] = 'private, max-age=60'
+    return response
+
 @bp.route('/chatbot', methods=['POST'])
 @login_required
 def chatbot():
@@ -41,30 +56,25 @@ def chatbot():
         result = smart_service.process_command(message, current_user.id, current_user.user_type)
         return jsonify(result)
     except Exception as e:
-        print(f"[CHATBOT API ERROR] {str(e)}")
+        logger.error("[CHATBOT API ERROR] %s", e)
         
         # Fallback: Try voice-style pattern matching for product search
         try:
-            import re
-            from sqlalchemy import or_
-            query_lower = message.lower().strip()
+            parsed = IntentEngine.analyze(message)
             
             # Pattern 1: "find/search [product] less than/under [price]"
-            pattern1 = r'(?:find|search|show|get|looking for)\s+(.+?)\s+(?:less than|under|below|cheaper than)\s+(?:rs\.?|rupees?|₹)?\s*(\d+)'
-            match = re.search(pattern1, query_lower)
-            
-            if match:
-                product_name = match.group(1).strip()
-                max_price = float(match.group(2))
+            if parsed['search_kind'] == 'under':
+                product_name = parsed['search_span']
+                max_price = parsed['max_price']
                 
                 # Search products
-                products = Product.query.filter(
-                    or_(
-                        Product.product_name.ilike(f"%{product_name}%"),
-                        Product.category.ilike(f"%{product_name}%")
+                products = ProductSearchService.apply(
+                    Product.query.filter(
+                        Product.price <= max_price,
+                        Product.stock_quantity > 0
                     ),
-                    Product.price <= max_price,
-                    Product.stock_quantity > 0
+                    product_name,
+                    columns=('product_name', 'category')
                 ).limit(10).all()
                 
                 if products:
@@ -89,17 +99,12 @@ def chatbot():
                     })
             
             # Pattern 2: Simple product search "find [product]"
-            pattern2 = r'(?:find|search|show|get)\s+(.+)'
-            match = re.search(pattern2, query_lower)
-            
-            if match:
-                product_name = match.group(1).strip()
-                products = Product.query.filter(
-                    or_(
-                        Product.product_name.ilike(f"%{product_name}%"),
-                        Product.category.ilike(f"%{product_name}%")
-                    ),
-                    Product.stock_quantity > 0
+            if parsed['search_span']:
+                product_name = parsed['search_span']
+                products = ProductSearchService.apply(
+                    Product.query.filter(Product.stock_quantity > 0),
+                    product_name,
+                    columns=('product_name', 'category')
                 ).limit(10).all()
                 
                 if products:
@@ -118,13 +123,12 @@ def chatbot():
                         'action': 'View all products'
                     })
             
-            # Final fallback: Try basic chatbot
-            service = ChatbotService()
-            response = service.get_response(message, current_user.user_type, current_user.id)
+            # Final fallback: Try basic chatbot (local reply if Gemini is down)
+            response = ChatbotService.reply(message, current_user.user_type, current_user.id)
             return jsonify({'type': 'text', 'message': response})
             
         except Exception as fallback_error:
-            print(f"[CHATBOT FALLBACK ERROR] {fallback_error}")
+            logger.error("[CHATBOT FALLBACK ERROR] %s", fallback_error)
             return jsonify({
                 'type': 'help',
                 'message': 'I can help you search for products!',
@@ -136,3 +140,14 @@ def chatbot():
                     '"Check my orders"'
                 ]
             })
+
+@bp.route('/llm-jobs/<job_id>')
+@login_required
+def llm_job_status(job_id):
+    """Poll a background vision / voice job started with async=1"""
+    from app.llm_gateway import LLMGateway
+    
+    job = LLMGateway.job_status(job_id, user_id=current_user.id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    return jsonify(job)
@@ -1,8 +1,11 @@
+import logging
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 from flask_login import login_user, logout_user, login_required, current_user
 from app import db
 from app.models import User, RetailerCredit
 
+logger = logging.getLogger(__name__)
+
 bp = Blueprint('auth', __name__, url_prefix='/auth')
 
 @bp.route('/register', methods=['GET', 'POST'])
@@ -63,8 +66,7 @@ def login():
         if user and user.check_password(password):
             # Login with remember=True for persistent session
             login_user(user, remember=True)
-            print(f"✅ User {user.id} ({user.user_type}) logged in successfully")
-            print(f"   Session will be remembered")
+            logger.info("User %s (%s) logged in successfully", user.id, user.user_type)
             
             # Force session save
             from flask import session as flask_session
@@ -75,7 +77,7 @@ def login():
             try:
                 return redirect(url_for('main.dashboard'))
             except Exception as e:
-                print(f"❌ Redirect error: {e}")
+                logger.error("Redirect error after login: %s", e)
                 # Direct redirect based on user type
                 if user.user_type == 'retailer':
                     return redirect(url_for('retailer.dashboard'))
@@ -101,19 +103,17 @@ def logout():
             user_name = current_user.name if hasattr(current_user, 'name') else 'User'
             logout_user()
             flash(f'Goodbye {user_name}! Logged out successfully!', 'success')
-            print(f"✅ User {user_name} logged out successfully")
+            logger.info("User %s logged out successfully", user_name)
         else:
             flash('Logged out successfully!', 'success')
-            print(f"✅ Session cleared (user was not authenticated)")
+            logger.debug("Session cleared (user was not authenticated)")
         
         # Clear session data
         session.clear()
         
         return redirect(url_for('auth.login'))
     except Exception as e:
-        print(f"❌ Logout error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Logout error")
         # Force clear session even on error
         try:
             session.clear()
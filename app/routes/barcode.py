@@ -3,6 +3,7 @@ FEATURE 2: Barcode-Based Inventory Management
 Routes for barcode scanning and stock management
 """
 
+import logging
 from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
 from flask_login import login_required, current_user
 from app import db
@@ -12,6 +13,8 @@ from datetime import datetime
 import random
 import string
 
+logger = logging.getLogger(__name__)
+
 bp = Blueprint('barcode', __name__, url_prefix='/barcode')
 
 
@@ -90,8 +93,8 @@ def confirm_add_to_stock(barcode_id):
         
         db.session.commit()
         
-        print(f"[BARCODE] {current_user.name} scanned and added {barcode_track.quantity} {barcode_track.unit} of {product.product_name}")
-        print(f"[INVENTORY] {product.product_name}: {old_quantity} → {product.quantity} {product.unit}")
+        logger.info("[BARCODE] %s scanned and added %s %s of %s", current_user.name, barcode_track.quantity, barcode_track.unit, product.product_name)
+        logger.info("[INVENTORY] %s: %s → %s %s", product.product_name, old_quantity, product.quantity, product.unit)
         
         return jsonify({
             'success': True,
@@ -104,7 +107,7 @@ def confirm_add_to_stock(barcode_id):
     
     except Exception as e:
         db.session.rollback()
-        print(f"[BARCODE ERROR] {str(e)}")
+        logger.error("[BARCODE ERROR] %s", e)
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
@@ -122,7 +125,7 @@ def reject_barcode(barcode_id):
         barcode_track.status = 'rejected'
         db.session.commit()
         
-        print(f"[BARCODE] {current_user.name} rejected barcode {barcode_track.barcode_number}")
+        logger.info("[BARCODE] %s rejected barcode %s", current_user.name, barcode_track.barcode_number)
         
         return jsonify({
             'success': True,
@@ -2,18 +2,21 @@
 Product Comparison & Vendor Differentiation API Routes
 """
 
+import logging
 from flask import Blueprint, request, jsonify, render_template, flash, redirect, url_for
 from flask_login import login_required, current_user
 from app.models import Product
 from app import db
 
+logger = logging.getLogger(__name__)
+
 # Try to import comparison service, but don't break if tables don't exist yet
 try:
     from app.comparison_service import ProductComparisonService
     from app.models import VendorRatingsCache
     COMPARISON_ENABLED = True
 except Exception as e:
-    print(f"⚠️ Comparison service not available yet: {e}")
+    logger.warning("Comparison service not available yet: %s", e)
     COMPARISON_ENABLED = False
 
 bp = Blueprint('comparison', __name__, url_prefix='/api/comparison')
@@ -69,9 +72,7 @@ def search_products():
         })
         
     except Exception as e:
-        print(f"❌ Error in search_products: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in search_products")
         return jsonify({
             'success': False,
             'message': str(e)
@@ -101,7 +102,7 @@ def compare_product(product_id):
         })
         
     except Exception as e:
-        print(f"❌ Error in compare_product: {e}")
+        logger.error("Error in compare_product: %s", e)
         return jsonify({
             'success': False,
             'message': str(e)
@@ -144,7 +145,7 @@ def get_personalized_recommendation():
         })
         
     except Exception as e:
-        print(f"❌ Error in get_personalized_recommendation: {e}")
+        logger.error("Error in get_personalized_recommendation: %s", e)
         return jsonify({
             'success': False,
             'message': str(e)
@@ -172,7 +173,7 @@ def get_vendor_profile(vendor_id):
         })
         
     except Exception as e:
-        print(f"❌ Error in get_vendor_profile: {e}")
+        logger.error("Error in get_vendor_profile: %s", e)
         return jsonify({
             'success': False,
             'message': str(e)
@@ -227,7 +228,7 @@ def log_comparison():
         })
         
     except Exception as e:
-        print(f"❌ Error in log_comparison: {e}")
+        logger.error("Error in log_comparison: %s", e)
         return jsonify({
             'success': False,
             'message': str(e)
@@ -1,11 +1,16 @@
+import logging
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from app import db
-from app.models import Driver, DriverAssignment, Order, DriverRoute, DeliveryStep, OrderLocationDetail, OrderItem, Product, User
+from app.models import Driver, DriverAssignment, Order, DriverRoute, DeliveryStep, OrderLocationDetail, OrderItem, Product, User, OrderStatusLog
 from app.decorators import driver_required
 from app.driver_service import MockDriverService
+from app.rating_service import RatingAggregateService
+from app.delivery_metrics_service import DeliveryMetricsPipeline
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 bp = Blueprint('driver', __name__, url_prefix='/driver')
 
 @bp.route('/dashboard')
@@ -30,7 +35,7 @@ def dashboard():
             )
             db.session.add(driver)
             db.session.commit()
-            print(f"✅ Created driver profile for user {current_user.id}")
+            logger.info("Created driver profile for user %s", current_user.id)
         else:
             # Ensure all required fields have default values (for old drivers)
             updated = False
@@ -58,7 +63,7 @@ def dashboard():
             
             if updated:
                 db.session.commit()
-                print(f"✅ Updated driver profile with missing fields for user {current_user.id}")
+                logger.info("Updated driver profile with missing fields for user %s", current_user.id)
         
         # Get pending assignments count
         pending = DriverAssignment.query.filter_by(
@@ -80,9 +85,7 @@ def dashboard():
     except Exception as e:
         # Rollback in case of error
         db.session.rollback()
-        print(f"❌ Driver dashboard error for user {current_user.id}: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Driver dashboard error for user %s", current_user.id)
         
         # Show detailed error message
         error_msg = f'Dashboard error: {str(e)[:100]}'
@@ -116,7 +119,7 @@ def assignments():
             )
             db.session.add(driver)
             db.session.commit()
-            print(f"✅ Created driver profile for user {current_user.id}")
+            logger.info("Created driver profile for user %s", current_user.id)
         
         # Get pending assignments
         pending_assignments = DriverAssignment.query.filter_by(
@@ -131,9 +134,7 @@ def assignments():
     except Exception as e:
         # Rollback in case of error
         db.session.rollback()
-        print(f"❌ Error in assignments route: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in assignments route")
         flash('Error loading assignments. Please try again or contact support.', 'danger')
         return redirect(url_for('driver.dashboard'))
 
@@ -182,9 +183,7 @@ def delivery(assignment_id):
     except Exception as e:
         # Rollback in case of error
         db.session.rollback()
-        print(f"❌ Error in delivery route: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in delivery route")
         flash('Error loading delivery details. Please try again or contact support.', 'danger')
         return redirect(url_for('driver.assignments'))
 
@@ -241,7 +240,7 @@ def mark_pickup(assignment_id):
         db.session.commit()
         
         # Log the status change
-        print(f"[PICKUP] Order {order.id} picked up by driver {driver.id}")
+        logger.info("[PICKUP] Order %s picked up by driver %s", order.id, driver.id)
         
         flash('Order picked up successfully!', 'success')
         return redirect(url_for('driver.delivery', assignment_id=assignment_id))
@@ -249,9 +248,7 @@ def mark_pickup(assignment_id):
     except Exception as e:
         # Rollback in case of error
         db.session.rollback()
-        print(f"❌ Error in pickup route: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in pickup route")
         flash('Error updating pickup status. Please try again or contact support.', 'danger')
         return redirect(url_for('driver.delivery', assignment_id=assignment_id))
 
@@ -279,7 +276,17 @@ def mark_delivery(assignment_id):
         # Update assignment and order status
         assignment.assignment_status = 'delivered'
         assignment.actual_delivery_time = datetime.utcnow()
+        if order.order_status != 'delivered':
+            RatingAggregateService.order_delivered(order.seller_id)
+            db.session.add(OrderStatusLog(
+                order_id=order.id,
+                status_from=order.order_status,
+                status_to='delivered',
+                changed_by_id=current_user.id,
+                changed_at=assignment.actual_delivery_time
+            ))
         order.order_status = 'delivered'
+        order.delivered_at = order.delivered_at or assignment.actual_delivery_time
         
         # Update driver status and metrics
         driver.current_load_kg -= assignment.weight_assigned_kg or 0
@@ -308,9 +315,11 @@ def mark_delivery(assignment_id):
         # Commit transaction
         db.session.commit()
         
+        DeliveryMetricsPipeline.run()
+        
         # Log the delivery completion
-        print(f"[DELIVERY] Order {order.id} delivered by driver {driver.id}")
-        print(f"[EARNINGS] Driver {driver.user.name} earned ₹{assignment.weight_assigned_kg * 10 if assignment.weight_assigned_kg else 0}")
+        logger.info("[DELIVERY] Order %s delivered by driver %s", order.id, driver.id)
+        logger.info("[EARNINGS] Driver %s earned ₹%s", driver.user.name, assignment.weight_assigned_kg * 10 if assignment.weight_assigned_kg else 0)
         
         flash('Delivery marked as complete successfully!', 'success')
         return redirect(url_for('driver.dashboard'))
@@ -318,9 +327,7 @@ def mark_delivery(assignment_id):
     except Exception as e:
         # Rollback in case of error
         db.session.rollback()
-        print(f"❌ Error in delivery completion route: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in delivery completion route")
         flash('Error completing delivery. Please try again or contact support.', 'danger')
         return redirect(url_for('driver.delivery', assignment_id=assignment_id))
 
@@ -4,7 +4,7 @@ from app import db
 from app.models import Product, EmergencyMarketplaceMetrics
 from app.decorators import vendor_required, retailer_required, admin_required
 from app.emergency_marketplace_service import EmergencyMarketplaceService
-from datetime import datetime
+from datetime import datetime, date
 
 bp = Blueprint('emergency', __name__, url_prefix='/emergency')
 
@@ -184,7 +184,22 @@ def analytics():
 @bp.route('/api/update-metrics', methods=['POST'])
 @admin_required
 def api_update_metrics():
-    """Update metrics (can be called by scheduler)"""
+    """Update metrics (can be called by scheduler); optional JSON {"from", "to"} backfills a range"""
+    
+    data = request.get_json(silent=True) or {}
+    if data.get('from') or data.get('to'):
+        try:
+            end_date = date.fromisoformat(data['to']) if data.get('to') else date.today()
+            start_date = date.fromisoformat(data['from']) if data.get('from') else end_date
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Dates must be YYYY-MM-DD'}), 400
+        if start_date > end_date:
+            return jsonify({'success': False, 'message': '"from" must not be after "to"'}), 400
+        
+        rows = EmergencyMarketplaceService.backfill_metrics(start_date, end_date)
+        if rows is not None:
+            return jsonify({'success': True, 'message': f'Metrics updated for {len(rows)} day(s)'})
+        return jsonify({'success': False, 'message': 'Error updating metrics'}), 500
     
     metrics = EmergencyMarketplaceService.calculate_and_update_metrics()
     
@@ -197,9 +212,10 @@ def api_update_metrics():
 @bp.route('/api/auto-flag', methods=['POST'])
 @admin_required
 def api_auto_flag():
-    """Auto-flag expiring products"""
+    """Auto-flag expiring products (?dry_run=1 only reports counts)"""
     
-    result = EmergencyMarketplaceService.auto_flag_expiring_products()
+    dry_run = request.args.get('dry_run') in ('1', 'true')
+    result = EmergencyMarketplaceService.auto_flag_expiring_products(dry_run=dry_run)
     
     return jsonify(result)
 
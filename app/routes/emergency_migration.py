@@ -3,12 +3,15 @@ Emergency Migration Route - Run database migration from browser
 SECURITY: Only works for admin users
 """
 
+import logging
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from app import db
 from app.decorators import admin_required
 from sqlalchemy import text
 
+logger = logging.getLogger(__name__)
+
 bp = Blueprint('emergency_migration', __name__, url_prefix='/emergency')
 
 
@@ -29,7 +32,7 @@ def run_migration():
             return redirect(url_for('emergency_migration.run_migration'))
         
         try:
-            print("🚀 Starting emergency migration...")
+            logger.info("Starting emergency migration...")
             results = []
             
             # Check if columns exist first
@@ -58,7 +61,7 @@ def run_migration():
                         conn.commit()
                         column_name = migration_sql.split('ADD COLUMN ')[1].split(' ')[0]
                         results.append(f"✅ Added column: {column_name}")
-                        print(f"✅ Added column: {column_name}")
+                        logger.info("Added column: %s", column_name)
                     except Exception as e:
                         error_msg = str(e)
                         if 'already exists' in error_msg.lower() or 'duplicate column' in error_msg.lower():
@@ -66,7 +69,7 @@ def run_migration():
                             results.append(f"ℹ️ Column already exists: {column_name}")
                         else:
                             results.append(f"❌ Error: {error_msg[:200]}")
-                            print(f"❌ Migration error: {e}")
+                            logger.error("Migration error: %s", e)
             
             # Update existing products
             try:
@@ -78,7 +81,7 @@ def run_migration():
                     """))
                     conn.commit()
                     results.append("✅ Updated stock quantities")
-                    print("✅ Updated stock quantities")
+                    logger.info("Updated stock quantities")
             except Exception as e:
                 results.append(f"⚠️ Update warning: {str(e)[:100]}")
             
@@ -102,7 +105,7 @@ def run_migration():
                             results.append(f"⚠️ Index error: {str(e)[:100]}")
             
             results.append("\n🎉 MIGRATION COMPLETE!")
-            print("🎉 Migration completed successfully!")
+            logger.info("Migration completed successfully!")
             
             flash('Migration completed successfully!', 'success')
             
@@ -110,9 +113,7 @@ def run_migration():
             return render_template('emergency_migration_results.html', results=results)
             
         except Exception as e:
-            print(f"❌ CRITICAL migration error: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("CRITICAL migration error")
             flash(f'Migration failed: {str(e)}', 'danger')
             return redirect(url_for('emergency_migration.run_migration'))
     
@@ -1,9 +1,14 @@
-from flask import Blueprint, render_template, redirect, url_for, jsonify
+import logging
+from flask import Blueprint, render_template, redirect, url_for, jsonify, request, current_app, Response
 from flask_login import current_user
-from app import db
+from app import db, init_schema
 from app.models import User
+from app.decorators import admin_required
+import hmac
 import os
 
+logger = logging.getLogger(__name__)
+
 bp = Blueprint('main', __name__)
 
 @bp.route('/')
@@ -14,7 +19,7 @@ def index():
 def dashboard():
     try:
         if current_user.is_authenticated:
-            print(f"🔍 Dashboard redirect for user {current_user.id}, type: {current_user.user_type}")
+            logger.debug("Dashboard redirect for user %s, type: %s", current_user.id, current_user.user_type)
             
             if current_user.user_type == 'vendor':
                 return redirect(url_for('vendor.dashboard'))
@@ -27,9 +32,7 @@ def dashboard():
         
         return render_template('index.html')
     except Exception as e:
-        print(f"❌ Dashboard redirect error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Dashboard redirect error")
         return f"<h1>Redirect Error</h1><p>{str(e)}</p><p>User: {current_user.id if current_user.is_authenticated else 'Not logged in'}</p>", 500
 
 @bp.route('/responsive-demo')
@@ -100,31 +103,53 @@ def debug_session():
     """
     return html
 
+def _probe_response(payload, status=200):
+    response = jsonify(payload)
+    response.status_code = status
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 @bp.route('/health')
 def health():
-    """Health check endpoint for Railway deployment"""
-    try:
-        # Check database connection
-        user_count = User.query.count()
-        db_status = "connected"
-    except Exception as e:
-        user_count = 0
-        db_status = f"error: {str(e)}"
-    
-    return jsonify({
+    """Health check endpoint for Railway deployment (cached database ping, see health.py)"""
+    from app.health import HealthChecks
+    database = HealthChecks.database()
+    return _probe_response({
         'status': 'running',
-        'database': db_status,
-        'users': user_count,
+        'database': 'connected' if database['ok'] else f"error: {database.get('error')}",
         'environment': os.environ.get('FLASK_ENV', 'unknown'),
         'has_secret_key': bool(os.environ.get('SECRET_KEY')),
         'has_database_url': bool(os.environ.get('DATABASE_URL'))
     })
 
-@bp.route('/init-db')
+@bp.route('/health/live')
+def liveness():
+    """Liveness probe: no I/O - restart the worker only if this stops answering"""
+    from app.health import HealthChecks
+    return _probe_response(HealthChecks.liveness())
+
+@bp.route('/health/ready')
+def readiness():
+    """Readiness probe: 503 while the database is unreachable or the connection pool is full"""
+    from app.health import HealthChecks
+    report, ready = HealthChecks.readiness()
+    return _probe_response(report, 200 if ready else 503)
+
+@bp.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint (all workers when METRICS_DIR is shared)"""
+    from app.metrics import Metrics
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(Metrics.render(), content_type=Metrics.CONTENT_TYPE)
+
+@bp.route('/init-db', methods=['POST'])
+@admin_required
 def init_db():
-    """Initialize database tables - use this once after deployment"""
+    """Initialize database tables (admin POST only - crawlers and probes must not trigger it)"""
     try:
-        db.create_all()
+        init_schema()
         return jsonify({
             'status': 'success',
             'message': 'Database tables created successfully!',
@@ -158,9 +183,10 @@ def test_dashboard():
     """
     return html
 
-@bp.route('/seed-data')
+@bp.route('/seed-data', methods=['POST'])
+@admin_required
 def seed_data():
-    """Add sample data for testing - Railway production"""
+    """Add sample data for testing - Railway production (admin POST only)"""
     try:
         from werkzeug.security import generate_password_hash
         from app.models import Product
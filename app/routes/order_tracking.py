@@ -7,6 +7,8 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import current_user, login_required
 from app import db
 from app.models import Order, OrderStatusLog
+from app.rating_service import RatingAggregateService
+from app.delivery_metrics_service import DeliveryMetricsPipeline
 from app.decorators import vendor_required, driver_required
 from datetime import datetime
 
@@ -117,9 +119,13 @@ def update_order_status(order_id):
     elif new_status == 'delivered':
         order.delivered_at = now
         order.payment_status = 'paid'  # Mark payment as complete
+        RatingAggregateService.order_delivered(order.seller_id)
     
     db.session.commit()
     
+    if new_status == 'delivered':
+        DeliveryMetricsPipeline.run()
+    
     flash(f'Order status updated from {old_status} to {new_status}', 'success')
     
     # Redirect based on user type
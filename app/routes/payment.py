@@ -106,16 +106,21 @@ def checkout(order_id):
             )
             db.session.add(status_log)
             
-            # Assign driver
-            MockDriverService.assign_driver_to_order(
-                order_id,
-                sum(item.quantity for item in order.items),
-                order.delivery_address
-            )
-            
-            db.session.commit()
-            
-            flash('Payment successful! Driver assigned. Track your order now.', 'success')
+            # Assign driver (in batch mode the next assignment window picks the order up)
+            from app.batch_assignment_service import BatchAssignmentService  # Pulls in numpy: first payment, not worker boot
+            if BatchAssignmentService.is_enabled():
+                db.session.commit()
+                flash('Payment successful! A driver will be assigned shortly. Track your order now.', 'success')
+            else:
+                MockDriverService.assign_driver_to_order(
+                    order_id,
+                    sum(item.quantity for item in order.items),
+                    order.delivery_address
+                )
+                
+                db.session.commit()
+                
+                flash('Payment successful! Driver assigned. Track your order now.', 'success')
             return redirect(url_for('order_tracking.track_order', order_id=order_id))
         else:
             flash(f'Payment failed: {result["message"]}', 'danger')
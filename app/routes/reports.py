@@ -3,6 +3,7 @@ Report System Routes
 Users can report issues, admins can review and respond
 """
 
+import logging
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import current_user, login_required
 from app import db
@@ -10,6 +11,8 @@ from app.models import UserReport, User, Order
 from app.decorators import admin_required
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 bp = Blueprint('reports', __name__, url_prefix='/reports')
 
 
@@ -70,9 +73,7 @@ def submit_report(order_id):
         
     except Exception as e:
         db.session.rollback()
-        print(f"❌ Error submitting report: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error submitting report")
         flash('Error submitting report. Please try again.', 'danger')
         return redirect(url_for('retailer.orders'))
 
@@ -1,3 +1,4 @@
+import logging
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
 from flask_login import login_required, current_user
 from app import db
@@ -5,15 +6,28 @@ from app.models import Product, Order, OrderItem, Payment, Driver, DriverAssignm
 from app.decorators import retailer_required
 from app.driver_service import MockDriverService
 from app.credit_system import CreditSystem
+from app.browse_service import ProductBrowseService
+from app.cart_service import CartService
+from app.stock_service import StockReservationService
+from app.rating_service import RatingAggregateService
+from app.metrics import Metrics
 from datetime import datetime, timedelta
 
+logger = logging.getLogger(__name__)
+
 bp = Blueprint('retailer', __name__, url_prefix='/retailer')
 
+@bp.before_request
+def _migrate_session_cart():
+    """Carts used to live in the cookie session - move any leftover one into the database"""
+    if 'cart' in session and current_user.is_authenticated and current_user.user_type == 'retailer':
+        CartService.import_session_cart(current_user.id, session.pop('cart'))
+
 @bp.route('/dashboard')
 @retailer_required
 def dashboard():
     # ULTRA SAFE VERSION - Returns HTML directly if template fails
-    print(f"✅ Retailer dashboard accessed by user {current_user.id}")
+    logger.debug("Retailer dashboard accessed by user %s", current_user.id)
     
     # Simple default credit - no database queries
     credit_info = {
@@ -28,9 +42,7 @@ def dashboard():
     try:
         return render_template('retailer/dashboard.html', credit=credit_info)
     except Exception as e:
-        print(f"❌ Template error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Retailer dashboard template error")
         
         # Return basic HTML dashboard if template fails
         html = f"""
@@ -82,110 +94,68 @@ def dashboard():
 @retailer_required
 def browse():
     try:
-        print("🔍 Browse route called - ULTRA SAFE MODE")
-        
-        category = request.args.get('category')
-        search = request.args.get('search')
-        
-        print(f"   Category: {category}, Search: {search}")
-        
-        # ULTRA SAFE: Query using raw SQL to avoid ORM column issues
-        from sqlalchemy import text
-        
-        sql = """
-            SELECT 
-                p.id, 
-                p.product_name, 
-                p.category, 
-                p.price, 
-                p.quantity, 
-                p.unit, 
-                p.vendor_id, 
-                p.image_filename,
-                p.moq_enabled,
-                p.minimum_quantity,
-                u.name as vendor_name,
-                u.email as vendor_email,
-                u.average_rating,
-                u.total_reviews
-            FROM products p
-            LEFT JOIN users u ON p.vendor_id = u.id
-            WHERE p.is_active = true
-        """
-        
-        params = {}
-        
-        if category:
-            sql += " AND p.category = :category"
-            params['category'] = category
-        
-        if search:
-            sql += " AND p.product_name ILIKE :search"
-            params['search'] = f'%{search}%'
+        filters = _browse_filters()
+        logger.debug("Browse: %s", filters)
         
-        print(f"   Executing ultra-safe SQL query...")
-        
-        with db.engine.connect() as conn:
-            result = conn.execute(text(sql), params)
-            rows = result.fetchall()
-        
-        print(f"   ✅ Found {len(rows)} products using raw SQL")
-        
-        # Convert to simple product objects
-        products = []
-        for row in rows:
-            # Create vendor object with ratings
-            vendor = type('User', (), {})()
-            vendor.id = row[6]
-            vendor.name = row[10] if row[10] else 'Unknown Vendor'
-            vendor.email = row[11] if row[11] else ''
-            vendor.average_rating = row[12] if row[12] else 0.0
-            vendor.total_reviews = row[13] if row[13] else 0
-            
-            # Create product object with ALL data
-            product = type('Product', (), {})()
-            product.id = row[0]
-            product.product_name = row[1]
-            product.category = row[2]
-            product.price = row[3]
-            product.quantity = row[4]
-            product.unit = row[5]
-            product.vendor_id = row[6]
-            product.image_filename = row[7]
-            product.moq_enabled = row[8] if row[8] else False
-            product.minimum_quantity = row[9] if row[9] else 1
-            product.vendor = vendor  # Add vendor relationship
-            product.is_active = True
-            # Add comparison system defaults (will be overridden if columns exist)
-            product.freshness_level = 'TODAY'
-            product.quality_tier = 'GOOD'
-            product.stock_quantity = row[4]  # Use quantity
-            product.certification = None
-            products.append(product)
-        
-        # Get categories using raw SQL too
-        with db.engine.connect() as conn:
-            cat_result = conn.execute(text("SELECT DISTINCT category FROM products WHERE is_active = true"))
-            categories = [(row[0],) for row in cat_result.fetchall()]
+        try:
+            products, next_cursor = ProductBrowseService.fetch_page(
+                cursor=request.args.get('cursor') or None,
+                **filters
+            )
+        except ValueError:
+            flash('That page link has expired. Showing the first page.', 'warning')
+            products, next_cursor = ProductBrowseService.fetch_page(**filters)
         
-        print(f"   Found {len(categories)} categories")
-        print(f"   ✅ Rendering template with {len(products)} products...")
+        logger.debug("Rendering browse page with %d products", len(products))
         
         return render_template('retailer/browse.html',
                              products=products,
-                             categories=[c[0] for c in categories])
+                             categories=ProductBrowseService.get_categories(),
+                             next_cursor=next_cursor,
+                             is_first_page=not request.args.get('cursor'),
+                             freshness_levels=ProductBrowseService.FRESHNESS_LEVELS,
+                             quality_tiers=ProductBrowseService.QUALITY_TIERS)
                              
     except Exception as e:
-        print(f"❌ CRITICAL Browse error: {e}")
-        print(f"   Error type: {type(e).__name__}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("CRITICAL Browse error (%s)", type(e).__name__)
         
         # Last resort fallback
         return render_template('error.html', 
                              code=500, 
                              message=f'Unable to load products: {str(e)[:200]}'), 500
 
+@bp.route('/api/products')
+@retailer_required
+def browse_api():
+    """JSON browse feed - pass next_cursor back as ?cursor= to get the next page"""
+    try:
+        products, next_cursor = ProductBrowseService.fetch_page(
+            cursor=request.args.get('cursor') or None,
+            limit=request.args.get('limit', type=int),
+            **_browse_filters()
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'products': [product.to_dict() for product in products],
+        'count': len(products),
+        'next_cursor': next_cursor
+    })
+
+def _browse_filters():
+    """Read browse filters from the query string"""
+    return {
+        'category': request.args.get('category') or None,
+        'search': request.args.get('search') or None,
+        'min_price': request.args.get('min_price', type=float),
+        'max_price': request.args.get('max_price', type=float),
+        'freshness': request.args.get('freshness') or None,
+        'quality': request.args.get('quality') or None,
+        'sort': request.args.get('sort') or None
+    }
+
 @bp.route('/product/<int:product_id>')
 @retailer_required
 def product_detail(product_id):
@@ -195,21 +165,7 @@ def product_detail(product_id):
 @bp.route('/cart')
 @retailer_required
 def cart():
-    cart = session.get('cart', {})
-    
-    cart_items = []
-    total_amount = 0
-    
-    for product_id, quantity in cart.items():
-        product = Product.query.get(product_id)
-        if product:
-            amount = product.price * quantity
-            total_amount += amount
-            cart_items.append({
-                'product': product,
-                'quantity': quantity,
-                'amount': amount
-            })
+    cart_items, total_amount = CartService.get_lines(current_user.id)
     
     return render_template('retailer/cart.html',
                          cart_items=cart_items,
@@ -229,6 +185,7 @@ def add_to_cart():
         quantity = request.form.get('quantity', 1)
     
     if not product_id:
+        Metrics.CART_OPERATIONS.inc(action='add', outcome='missing_product')
         if is_json:
             return jsonify({
                 'success': False,
@@ -242,6 +199,7 @@ def add_to_cart():
     try:
         quantity = float(quantity)
     except (ValueError, TypeError):
+        Metrics.CART_OPERATIONS.inc(action='add', outcome='invalid_quantity')
         if is_json:
             return jsonify({
                 'success': False,
@@ -252,6 +210,7 @@ def add_to_cart():
             return redirect(url_for('retailer.browse'))
     
     if quantity <= 0:
+        Metrics.CART_OPERATIONS.inc(action='add', outcome='invalid_quantity')
         if is_json:
             return jsonify({
                 'success': False,
@@ -267,6 +226,7 @@ def add_to_cart():
     if product.moq_enabled and product.moq_type == 'quantity':
         if quantity < product.minimum_quantity:
             message = f'Minimum order quantity is {product.minimum_quantity} {product.unit}. You tried to add {quantity}.'
+            Metrics.CART_OPERATIONS.inc(action='add', outcome='below_moq')
             if is_json:
                 return jsonify({
                     'success': False,
@@ -276,11 +236,8 @@ def add_to_cart():
                 flash(message, 'danger')
                 return redirect(request.referrer or url_for('retailer.browse'))
     
-    if 'cart' not in session:
-        session['cart'] = {}
-    
-    session['cart'][str(product_id)] = quantity
-    session.modified = True
+    CartService.set_item(current_user.id, product, quantity)
+    Metrics.CART_OPERATIONS.inc(action='add', outcome='added')
     
     # Return appropriate response based on request type
     if is_json:
@@ -289,59 +246,100 @@ def add_to_cart():
         flash(f'Added {quantity} {product.unit} of {product.product_name} to cart!', 'success')
         return redirect(request.referrer or url_for('retailer.cart'))
 
+@bp.route('/remove-from-cart/<int:product_id>', methods=['POST'])
+@retailer_required
+def remove_from_cart(product_id):
+    removed = CartService.remove_item(current_user.id, product_id)
+    Metrics.CART_OPERATIONS.inc(action='remove', outcome='removed' if removed else 'not_in_cart')
+    
+    if request.is_json:
+        return jsonify({'success': removed, 'cart': CartService.get_summary(current_user.id)})
+    
+    flash('Removed from cart' if removed else 'Item not in cart', 'success' if removed else 'warning')
+    return redirect(url_for('retailer.cart'))
+
 @bp.route('/api/cart-count')
 @retailer_required
 def cart_count():
-    cart = session.get('cart', {})
-    total_items = sum(cart.values())
-    return jsonify({'count': total_items})
+    summary = CartService.get_summary(current_user.id)
+    return jsonify({
+        'count': summary['total_quantity'],
+        'lines': summary['item_count'],
+        'total_amount': summary['total_amount']
+    })
 
 @bp.route('/checkout', methods=['GET', 'POST'])
 @retailer_required
 def checkout():
-    cart = session.get('cart', {})
-    
-    if not cart:
+    if not CartService.get_summary(current_user.id)['item_count']:
         flash('Cart is empty', 'danger')
         return redirect(url_for('retailer.browse'))
     
     if request.method == 'POST':
         delivery_address = request.form.get('delivery_address')
         
-        total_amount = 0
-        cart_items = []
+        # Free stock from abandoned checkouts before taking ours
+        StockReservationService.release_expired()
         
-        for product_id, quantity in cart.items():
-            product = Product.query.get(product_id)
-            if product:
-                amount = product.price * quantity
-                total_amount += amount
-                cart_items.append((product, quantity, amount))
+        lines, _ = CartService.get_lines(current_user.id)
         
-        order = Order(
-            buyer_id=current_user.id,
-            seller_id=cart_items[0][0].vendor_id,
-            total_amount=total_amount,
-            delivery_address=delivery_address,
-            order_status='pending'
-        )
+        if not lines:
+            Metrics.CHECKOUTS.inc(outcome='empty_cart')
+            flash('Cart is empty', 'danger')
+            return redirect(url_for('retailer.browse'))
         
-        db.session.add(order)
-        db.session.flush()
+        # One order per vendor so multi-vendor carts reach every seller
+        lines_by_vendor = {}
+        for line in lines:
+            lines_by_vendor.setdefault(line['product'].vendor_id, []).append(line)
         
-        for product, quantity, amount in cart_items:
-            item = OrderItem(
-                order_id=order.id,
-                product_id=product.id,
-                quantity=quantity,
-                price_at_purchase=product.price
+        orders = [
+            Order(
+                buyer_id=current_user.id,
+                seller_id=vendor_id,
+                total_amount=sum(line['amount'] for line in vendor_lines),
+                delivery_address=delivery_address,
+                order_status='pending'
             )
-            db.session.add(item)
+            for vendor_id, vendor_lines in lines_by_vendor.items()
+        ]
+        db.session.add_all(orders)
+        db.session.flush()
+        RatingAggregateService.orders_placed([order.seller_id for order in orders])
+        
+        order_lines = [
+            (order.id, line['product'], line['quantity'])
+            for order, vendor_lines in zip(orders, lines_by_vendor.values())
+            for line in vendor_lines
+        ]
+        
+        # One executemany for all lines (large wholesale carts)
+        db.session.execute(OrderItem.__table__.insert(), [
+            {
+                'order_id': order_id,
+                'product_id': product.id,
+                'quantity': quantity,
+                'price_at_purchase': product.price
+            }
+            for order_id, product, quantity in order_lines
+        ])
+        
+        reserved, message = StockReservationService.reserve([
+            (order_id, product.id, quantity) for order_id, product, quantity in order_lines
+        ])
+        if not reserved:
+            Metrics.CHECKOUTS.inc(outcome='out_of_stock')
+            flash(message, 'danger')
+            return redirect(url_for('retailer.cart'))
         
+        CartService.clear(current_user.id, commit=False)
         db.session.commit()
+        Metrics.CHECKOUTS.inc(outcome='placed')
         
-        session['cart'] = {}
-        session.modified = True
+        order = orders[0]
+        if len(orders) > 1:
+            flash(f'Your cart was split into {len(orders)} orders, one per vendor. '
+                  f'Pay for the rest from My Orders.', 'info')
         
         # Redirect to bill summary first (NEW FLOW)
         return redirect(url_for('payment.bill_summary', order_id=order.id))
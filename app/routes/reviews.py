@@ -3,13 +3,17 @@ Review & Rating System Routes
 Retailers can review vendors and products after delivery
 """
 
+import logging
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import current_user, login_required
 from app import db
 from app.models import Order, ProductReview, User
+from app.rating_service import RatingAggregateService
 from datetime import datetime
 from sqlalchemy import func
 
+logger = logging.getLogger(__name__)
+
 bp = Blueprint('reviews', __name__, url_prefix='/reviews')
 
 
@@ -63,12 +67,14 @@ def create_review(order_id):
         try:
             if existing_review:
                 # Update existing review
+                before = RatingAggregateService.snapshot(existing_review)
                 existing_review.rating_quality = rating_quality
                 existing_review.rating_delay = rating_delay
                 existing_review.rating_communication = rating_communication
                 existing_review.driver_rating = driver_rating if driver_rating else existing_review.driver_rating
                 existing_review.comment = comment
                 existing_review.edited_at = datetime.utcnow()
+                RatingAggregateService.review_updated(existing_review, before)
                 message = 'Review updated successfully!'
             else:
                 # Create new review
@@ -86,15 +92,9 @@ def create_review(order_id):
                     created_at=datetime.utcnow()
                 )
                 db.session.add(review)
+                RatingAggregateService.review_added(review)
                 message = 'Review submitted successfully! Thank you for your feedback.'
             
-            # Update vendor's average rating
-            update_user_ratings(order.seller_id)
-            
-            # Update driver's rating if assigned and rated
-            if order.assigned_driver_id and driver_rating:
-                update_user_ratings(order.assigned_driver_id)
-            
             db.session.commit()
             
             flash(message, 'success')
@@ -102,9 +102,7 @@ def create_review(order_id):
             
         except Exception as e:
             db.session.rollback()
-            print(f"❌ Error submitting review: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error submitting review")
             flash('Error submitting review. Please try again.', 'danger')
             return redirect(url_for('retailer.orders'))
     
@@ -181,59 +179,14 @@ def delete_review(review_id):
         flash('Unauthorized action', 'danger')
         return redirect(url_for('reviews.my_reviews'))
     
-    vendor_id = review.vendor_id
-    driver_id = review.driver_id
-    
+    RatingAggregateService.review_deleted(review)
     db.session.delete(review)
-    
-    # Update ratings
-    update_user_ratings(vendor_id)
-    if driver_id:
-        update_user_ratings(driver_id)
-    
     db.session.commit()
     
     flash('Review deleted successfully', 'success')
     return redirect(url_for('reviews.my_reviews'))
 
 
-def update_user_ratings(user_id):
-    """Recalculate average rating for a user"""
-    
-    if not user_id:
-        return
-    
-    user = User.query.get(user_id)
-    if not user:
-        return
-    
-    # Get all reviews for this user
-    if user.user_type == 'vendor':
-        reviews = ProductReview.query.filter_by(vendor_id=user_id).all()
-        # Calculate average of vendor ratings (quality, delay, communication)
-        total_ratings = []
-        for review in reviews:
-            avg = (review.rating_quality + review.rating_delay + review.rating_communication) / 3
-            total_ratings.append(avg)
-            
-    elif user.user_type == 'driver':
-        reviews = ProductReview.query.filter_by(driver_id=user_id).filter(
-            ProductReview.driver_rating.isnot(None)
-        ).all()
-        # Calculate average of driver ratings
-        total_ratings = [review.driver_rating for review in reviews if review.driver_rating]
-    else:
-        return
-    
-    if not total_ratings:
-        user.average_rating = 0.0
-        user.total_reviews = 0
-        return
-    
-    user.average_rating = round(sum(total_ratings) / len(total_ratings), 2)
-    user.total_reviews = len(reviews)
-
-
 def get_rating_breakdown(user_id):
     """Get breakdown of ratings (how many 5-star, 4-star, etc.)"""
     
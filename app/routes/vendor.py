@@ -1,3 +1,4 @@
+import logging
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from app import db
@@ -7,19 +8,21 @@ from werkzeug.utils import secure_filename
 import os
 from datetime import datetime, timedelta
 
+logger = logging.getLogger(__name__)
+
 bp = Blueprint('vendor', __name__, url_prefix='/vendor')
 
 @bp.route('/dashboard')
 @vendor_required
 def dashboard():
-    print(f"✅ Vendor dashboard accessed by user {current_user.id}")
+    logger.debug("Vendor dashboard accessed by user %s", current_user.id)
     
     try:
         total_products = Product.query.filter_by(vendor_id=current_user.id).count()
         total_orders = Order.query.filter_by(seller_id=current_user.id).count()
         recent_orders = Order.query.filter_by(seller_id=current_user.id).order_by(Order.created_at.desc()).limit(5).all()
     except Exception as e:
-        print(f"⚠️ Database query error: {e}")
+        logger.warning("Database query error: %s", e)
         total_products = 0
         total_orders = 0
         recent_orders = []
@@ -30,9 +33,7 @@ def dashboard():
                              total_orders=total_orders,
                              recent_orders=recent_orders)
     except Exception as e:
-        print(f"❌ Template error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Vendor dashboard template error")
         return f"<h1>Vendor Dashboard Error</h1><p>Error: {str(e)}</p><p>User: {current_user.name}</p>", 500
 
 @bp.route('/add-product', methods=['GET', 'POST'])
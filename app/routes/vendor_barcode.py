@@ -3,6 +3,7 @@ Vendor Barcode Scanning Routes
 Vendors scan admin-generated barcodes to claim inventory
 """
 
+import logging
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import current_user
 from app import db
@@ -10,6 +11,8 @@ from app.models import AdminGeneratedStock, Product
 from app.decorators import vendor_required
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 bp = Blueprint('vendor_barcode', __name__, url_prefix='/vendor/barcode')
 
 
@@ -106,7 +109,7 @@ def claim_stock():
     
     except Exception as e:
         db.session.rollback()
-        print(f"Error claiming stock: {str(e)}")
+        logger.error("Error claiming stock: %s", e)
         return jsonify({
             'success': False,
             'message': f'Error adding product: {str(e)}'
@@ -3,15 +3,60 @@ Vision/Camera Routes
 Handle product image analysis and camera captures
 """
 
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, url_for, current_app
 from flask_login import current_user, login_required
 from app.decorators import vendor_required
 from app.vision_service import VisionService
+from app.llm_gateway import LLMGateway
+from app.image_pipeline import ImagePipeline, InvalidImage
 import base64
 
 bp = Blueprint('vision', __name__, url_prefix='/vision')
 
 
+def run_analysis(method, image_data, timeout=None):
+    """
+    Decode the photo on the ImagePipeline pool, then make the vision call through
+    the LLM gateway (deadline, model slot, circuit breaker). A bad upload is
+    answered here, so it never takes a model slot or counts against the breaker.
+    """
+    try:
+        image = ImagePipeline.load(image_data)
+    except InvalidImage as e:
+        return {
+            'success': False,
+            'message': str(e)
+        }
+    
+    return LLMGateway.call(
+        VisionService.MODEL_NAME, method, image, timeout=timeout,
+        fallback=lambda: {
+            'success': False,
+            'message': 'Image analysis is busy or unavailable right now. Please try again in a minute.'
+        }
+    )
+
+
+def analysis_response(kind, method, image_data):
+    """
+    Run the analysis now, or with {"async": true} (or ?async=1) return 202 + job_id
+    and let the client poll /api/llm-jobs/<job_id>
+    """
+    if request.get_json().get('async') or request.args.get('async') == '1':
+        job_id = LLMGateway.submit_job(
+            kind, run_analysis, method, image_data,
+            timeout=current_app.config.get('LLM_JOB_TIMEOUT_SECONDS'),
+            user_id=current_user.id
+        )
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status_url': url_for('api.llm_job_status', job_id=job_id)
+        }), 202
+    
+    return jsonify(run_analysis(method, image_data))
+
+
 @bp.route('/analyze-product', methods=['POST'])
 @vendor_required
 def analyze_product():
@@ -27,10 +72,7 @@ def analyze_product():
                 'message': 'No image provided'
             }), 400
         
-        # Analyze image
-        result = VisionService.analyze_product_image(image_data)
-        
-        return jsonify(result)
+        return analysis_response('vision.analyze_product', VisionService.analyze_product_image, image_data)
         
     except Exception as e:
         return jsonify({
@@ -54,10 +96,7 @@ def quality_check():
                 'message': 'No image provided'
             }), 400
         
-        # Analyze quality
-        result = VisionService.analyze_for_quality_check(image_data)
-        
-        return jsonify(result)
+        return analysis_response('vision.quality_check', VisionService.analyze_for_quality_check, image_data)
         
     except Exception as e:
         return jsonify({
@@ -81,10 +120,7 @@ def identify_multiple():
                 'message': 'No image provided'
             }), 400
         
-        # Identify products
-        result = VisionService.identify_multiple_products(image_data)
-        
-        return jsonify(result)
+        return analysis_response('vision.identify_multiple', VisionService.identify_multiple_products, image_data)
         
     except Exception as e:
         return jsonify({
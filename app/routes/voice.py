@@ -4,12 +4,16 @@ Handle voice commands in Tamil and English
 Enhanced with robust product search patterns
 """
 
+import logging
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for
 from flask_login import current_user, login_required
 from app.models import Product, Order
+from app.search_service import ProductSearchService
+from app.intent_engine import IntentEngine
+from app.fuzzy_index import ProductNameIndex
 from app import db
-import re
-from sqlalchemy import or_
+
+logger = logging.getLogger(__name__)
 
 bp = Blueprint('voice', __name__, url_prefix='/voice')
 
@@ -62,7 +66,11 @@ def process_speech():
     """
     Process voice command
     Accepts transcribed text from Web Speech API
+    
+    With {"async": true} (or ?async=1) returns 202 + job_id at once; poll /api/llm-jobs/<job_id>
     """
+    from app.llm_gateway import LLMGateway
+    
     try:
         data = request.get_json()
         text = data.get('text', '')
@@ -74,52 +82,20 @@ def process_speech():
                 'message': 'No speech text provided'
             }), 400
         
-        # Try Gemini AI first
-        command_result = VoiceService.understand_command(
-            text=text,
-            user_type=current_user.user_type,
-            language=language
-        )
-        
-        # FALLBACK: Use simple pattern matching if API fails
-        if not command_result['success']:
-            command_result = VoiceService.simple_understand_command(
-                text=text,
-                user_type=current_user.user_type
+        if data.get('async') or request.args.get('async') == '1':
+            job_id = LLMGateway.submit_job(
+                'voice.process_speech', speech_job,
+                text, language, current_user.id, current_user.user_type,
+                user_id=current_user.id
             )
+            return jsonify({
+                'success': True,
+                'job_id': job_id,
+                'status_url': url_for('api.llm_job_status', job_id=job_id)
+            }), 202
         
-        if not command_result['success']:
-            return jsonify(command_result), 400
-        
-        command_data = command_result['command']
-        
-        # Process the command
-        action_result = VoiceService.process_command_action(
-            command_data=command_data,
-            user_id=current_user.id,
-            db_session=db.session
-        )
-        
-        # Generate simple response (no API needed)
-        if action_result['success']:
-            response_text = action_result.get('message', 'Command processed successfully!')
-        else:
-            response_text = action_result.get('message', 'Could not process command')
-        
-        response = {
-            'success': True,
-            'text': response_text,
-            'language': language
-        }
-        
-        return jsonify({
-            'success': True,
-            'transcript': text,
-            'command': command_data,
-            'action_result': action_result,
-            'response': response,
-            'language': language
-        })
+        payload, status = handle_speech(text, language, current_user.id, current_user.user_type)
+        return jsonify(payload), status
         
     except Exception as e:
         return jsonify({
@@ -128,6 +104,67 @@ def process_speech():
         }), 500
 
 
+def handle_speech(text, language, user_id, user_type, timeout=None):
+    """
+    Understand + act on one voice command
+    
+    Returns:
+        (response payload, HTTP status)
+    """
+    from app.voice_service import VoiceService
+    from app.llm_gateway import LLMGateway
+    
+    # Try Gemini AI first; FALLBACK to simple pattern matching if it fails,
+    # misses its deadline or its circuit breaker is open
+    command_result = LLMGateway.call(
+        VoiceService.MODEL_NAME, VoiceService.understand_command,
+        text=text, user_type=user_type, language=language,
+        fallback=lambda: VoiceService.simple_understand_command(text=text, user_type=user_type),
+        timeout=timeout
+    )
+    
+    if not command_result['success']:
+        return command_result, 400
+    
+    command_data = command_result['command']
+    
+    # Process the command
+    action_result = VoiceService.process_command_action(
+        command_data=command_data,
+        user_id=user_id,
+        db_session=db.session
+    )
+    
+    # Generate simple response (no API needed)
+    if action_result['success']:
+        response_text = action_result.get('message', 'Command processed successfully!')
+    else:
+        response_text = action_result.get('message', 'Could not process command')
+    
+    response = {
+        'success': True,
+        'text': response_text,
+        'language': language
+    }
+    
+    return {
+        'success': True,
+        'transcript': text,
+        'command': command_data,
+        'action_result': action_result,
+        'response': response,
+        'language': language
+    }, 200
+
+
+def speech_job(text, language, user_id, user_type):
+    """Background version of process_speech (runs on the LLM gateway's job pool)"""
+    from flask import current_app
+    payload, _ = handle_speech(text, language, user_id, user_type,
+                               timeout=current_app.config.get('LLM_JOB_TIMEOUT_SECONDS'))
+    return payload
+
+
 @bp.route('/text-to-speech', methods=['POST'])
 @login_required
 def text_to_speech():
@@ -297,7 +334,8 @@ def process_voice_query():
                     'parsed_query': {
                         'product': parsed['product_name'],
                         'max_price': parsed['max_price'],
-                        'min_price': parsed['min_price']
+                        'min_price': parsed['min_price'],
+                        'corrected_product': parsed.get('corrected_product')
                     }
                 })
             else:
@@ -346,9 +384,7 @@ def process_voice_query():
         })
         
     except Exception as e:
-        print(f"❌ Voice query error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Voice query error")
         return jsonify({
             'success': False,
             'message': 'Error processing query'
@@ -358,124 +394,28 @@ def process_voice_query():
 def parse_voice_query(query):
     """
     Parse natural language voice query into search parameters
-    Handles multiple query patterns - works without API
+    Handles multiple query patterns - works without API (see IntentEngine.search_query)
     """
-    result = {
-        'product_name': None,
-        'max_price': None,
-        'min_price': None,
-        'category': None,
-        'action': None,
-        'redirect_url': None
-    }
-    
-    # Pattern 1: "find/search/show [product] less than/under [price]"
-    pattern1 = r'(?:find|search|show|get|looking for)\s+(.+?)\s+(?:less than|under|below|cheaper than)\s+(?:rs\.?|rupees?|₹)?\s*(\d+)'
-    match = re.search(pattern1, query)
-    if match:
-        result['product_name'] = match.group(1).strip()
-        result['max_price'] = float(match.group(2))
-        result['action'] = 'search_product'
-        return result
-    
-    # Pattern 2: "find [product] between [price1] and [price2]"
-    pattern2 = r'(?:find|search|show)\s+(.+?)\s+between\s+(?:rs\.?|rupees?|₹)?\s*(\d+)\s+(?:and|to)\s+(?:rs\.?|rupees?|₹)?\s*(\d+)'
-    match = re.search(pattern2, query)
-    if match:
-        result['product_name'] = match.group(1).strip()
-        result['min_price'] = float(match.group(2))
-        result['max_price'] = float(match.group(3))
-        result['action'] = 'search_product'
-        return result
-    
-    # Pattern 3: "find [product] more than/above [price]"
-    pattern3 = r'(?:find|search|show)\s+(.+?)\s+(?:more than|above|over)\s+(?:rs\.?|rupees?|₹)?\s*(\d+)'
-    match = re.search(pattern3, query)
-    if match:
-        result['product_name'] = match.group(1).strip()
-        result['min_price'] = float(match.group(2))
-        result['action'] = 'search_product'
-        return result
-    
-    # Pattern 4: "find cheapest/expensive [product]"
-    pattern4 = r'(?:find|search|show)\s+(?:cheapest|least expensive)\s+(.+)'
-    match = re.search(pattern4, query)
-    if match:
-        result['product_name'] = match.group(1).strip()
-        result['action'] = 'search_cheapest'
-        return result
-    
-    pattern4b = r'(?:find|search|show)\s+(?:most expensive|priciest)\s+(.+)'
-    match = re.search(pattern4b, query)
-    if match:
-        result['product_name'] = match.group(1).strip()
-        result['action'] = 'search_expensive'
-        return result
-    
-    # Pattern 5: "show me [category] products"
-    pattern5 = r'(?:show|display|find)\s+(?:me\s+)?(.+?)\s+products?'
-    match = re.search(pattern5, query)
-    if match:
-        result['category'] = match.group(1).strip()
-        result['action'] = 'search_category'
-        return result
-    
-    # Pattern 6: Navigation commands
-    navigation_patterns = {
-        r'go to (?:my )?cart|show (?:my )?cart|open cart': 'retailer.cart',
-        r'go to (?:my )?orders|show (?:my )?orders': 'retailer.orders',
-        r'go to dashboard|show dashboard': 'retailer.dashboard',
-        r'go to shop|start shopping|browse products': 'retailer.browse',
-        r'logout|sign out|log out': 'auth.logout',
-        r'go to home|go back|home page': 'main.index',
-        r'track (?:my )?order|order status': 'retailer.orders',
-    }
-    
-    for pattern, route in navigation_patterns.items():
-        if re.search(pattern, query):
-            result['action'] = 'navigate'
-            result['redirect_url'] = route
-            return result
-    
-    # Pattern 7: Order tracking by ID
-    pattern7 = r'track order\s+(?:#)?(\d+)'
-    match = re.search(pattern7, query)
-    if match:
-        result['action'] = 'track_order'
-        result['order_id'] = match.group(1)
-        return result
-    
-    # Pattern 8: Simple product name search
-    pattern8 = r'(?:find|search|show|get|looking for)\s+(.+)'
-    match = re.search(pattern8, query)
-    if match:
-        result['product_name'] = match.group(1).strip()
-        result['action'] = 'search_product'
-        return result
-    
-    # Default: search for the query as-is
-    result['product_name'] = query
-    result['action'] = 'search_product'
-    return result
+    return IntentEngine.search_query(query)
 
 
-def search_products(parsed):
-    """Search products based on parsed parameters"""
+def search_products(parsed, product_name=None):
+    """
+    Search products based on parsed parameters
+    
+    If the product name finds nothing, it is retried once with spelling corrections
+    ("tomatos" -> "tomato") and parsed['corrected_product'] is set
+    """
     query = Product.query.filter(Product.stock_quantity > 0)
+    product_name = product_name or parsed['product_name']
     
-    # Filter by product name
-    if parsed['product_name']:
-        # Remove common words
-        clean_name = parsed['product_name']
-        for word in ['the', 'a', 'an', 'some', 'any', 'per', 'kg']:
-            clean_name = clean_name.replace(f' {word} ', ' ')
-        
-        query = query.filter(
-            or_(
-                Product.product_name.ilike(f"%{clean_name}%"),
-                Product.category.ilike(f"%{clean_name}%"),
-                Product.description.ilike(f"%{clean_name}%")
-            )
+    # Filter by product name (full-text index drops filler words like 'the', 'kg')
+    if product_name:
+        query = ProductSearchService.apply(
+            query,
+            product_name,
+            columns=ProductSearchService.COLUMNS,
+            order_by_rank=parsed['action'] not in ['search_cheapest', 'search_expensive']
         )
     
     # Filter by price
@@ -490,23 +430,27 @@ def search_products(parsed):
         query = query.order_by(Product.price.asc())
     elif parsed['action'] == 'search_expensive':
         query = query.order_by(Product.price.desc())
-    else:
+    elif not product_name:
         query = query.order_by(Product.product_name)
     
-    return query.limit(20).all()
+    products = query.limit(20).all()
+    
+    if not products and product_name and product_name == parsed['product_name']:
+        corrected = ProductNameIndex.correct(product_name)
+        if corrected != product_name:
+            products = search_products(parsed, product_name=corrected)
+            if products:
+                parsed['corrected_product'] = corrected
+    
+    return products
 
 
 def get_suggestions(product_name):
-    """Get similar product suggestions"""
+    """Get similar product suggestions (fuzzy: tolerates speech-to-text misspellings)"""
     if not product_name:
         return []
     
-    # Get products with similar names
-    similar = Product.query.filter(
-        Product.product_name.ilike(f"%{product_name[:3]}%")
-    ).limit(5).all()
-    
-    return [p.product_name for p in similar]
+    return ProductNameIndex.suggest(product_name, k=5)
 
 
 @bp.route('/help', methods=['GET'])
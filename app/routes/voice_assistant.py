@@ -3,118 +3,23 @@ Voice Assistant Routes
 Handles natural language queries for product search
 """
 
+import logging
 from flask import Blueprint, request, jsonify, redirect, url_for
 from app.models import Product, User, Order, DriverAssignment
+from app.intent_engine import IntentEngine
 from app import db
-import re
 from sqlalchemy import or_, and_
 
+logger = logging.getLogger(__name__)
+
 bp = Blueprint('voice_assistant', __name__, url_prefix='/voice')
 
 def parse_voice_query(query):
     """
     Parse natural language voice query into search parameters
-    Handles multiple query patterns
+    Handles multiple query patterns (see IntentEngine.search_query)
     """
-    query = query.lower().strip()
-    
-    result = {
-        'product_name': None,
-        'max_price': None,
-        'min_price': None,
-        'category': None,
-        'action': None,
-        'redirect_url': None
-    }
-    
-    # Pattern 1: "find/search/show [product] less than/under [price]"
-    pattern1 = r'(?:find|search|show|get|looking for)\s+(.+?)\s+(?:less than|under|below|cheaper than)\s+(?:rs\.?|rupees?)\s*(\d+)'
-    match = re.search(pattern1, query)
-    if match:
-        result['product_name'] = match.group(1).strip()
-        result['max_price'] = float(match.group(2))
-        result['action'] = 'search_product'
-        return result
-    
-    # Pattern 2: "find [product] between [price1] and [price2]"
-    pattern2 = r'(?:find|search|show)\s+(.+?)\s+between\s+(?:rs\.?|rupees?)\s*(\d+)\s+(?:and|to)\s+(?:rs\.?|rupees?)\s*(\d+)'
-    match = re.search(pattern2, query)
-    if match:
-        result['product_name'] = match.group(1).strip()
-        result['min_price'] = float(match.group(2))
-        result['max_price'] = float(match.group(3))
-        result['action'] = 'search_product'
-        return result
-    
-    # Pattern 3: "find [product] more than/above [price]"
-    pattern3 = r'(?:find|search|show)\s+(.+?)\s+(?:more than|above|over|expensive than)\s+(?:rs\.?|rupees?)\s*(\d+)'
-    match = re.search(pattern3, query)
-    if match:
-        result['product_name'] = match.group(1).strip()
-        result['min_price'] = float(match.group(2))
-        result['action'] = 'search_product'
-        return result
-    
-    # Pattern 4: "find cheapest/expensive [product]"
-    pattern4 = r'(?:find|search|show)\s+(?:cheapest|least expensive)\s+(.+)'
-    match = re.search(pattern4, query)
-    if match:
-        result['product_name'] = match.group(1).strip()
-        result['action'] = 'search_cheapest'
-        return result
-    
-    pattern4b = r'(?:find|search|show)\s+(?:most expensive|priciest)\s+(.+)'
-    match = re.search(pattern4b, query)
-    if match:
-        result['product_name'] = match.group(1).strip()
-        result['action'] = 'search_expensive'
-        return result
-    
-    # Pattern 5: "show me [category] products"
-    pattern5 = r'(?:show|display|find)\s+(?:me\s+)?(.+?)\s+products?'
-    match = re.search(pattern5, query)
-    if match:
-        result['category'] = match.group(1).strip()
-        result['action'] = 'search_category'
-        return result
-    
-    # Pattern 6: Navigation commands
-    navigation_patterns = {
-        r'go to (?:my )?cart|show (?:my )?cart|open cart': 'retailer.cart',
-        r'go to (?:my )?orders|show (?:my )?orders': 'retailer.orders',
-        r'go to dashboard|show dashboard': 'retailer.dashboard',
-        r'go to shop|start shopping|browse products': 'retailer.browse',
-        r'logout|sign out|log out': 'auth.logout',
-        r'go to home|go back|home page': 'main.index',
-        r'track (?:my )?order|order status': 'retailer.orders',
-    }
-    
-    for pattern, route in navigation_patterns.items():
-        if re.search(pattern, query):
-            result['action'] = 'navigate'
-            result['redirect_url'] = route
-            return result
-    
-    # Pattern 7: Order tracking by ID
-    pattern7 = r'track order\s+(?:#)?(\d+)'
-    match = re.search(pattern7, query)
-    if match:
-        result['action'] = 'track_order'
-        result['order_id'] = match.group(1)
-        return result
-    
-    # Pattern 8: Simple product name search
-    pattern8 = r'(?:find|search|show|get|looking for)\s+(.+)'
-    match = re.search(pattern8, query)
-    if match:
-        result['product_name'] = match.group(1).strip()
-        result['action'] = 'search_product'
-        return result
-    
-    # If no pattern matches, just search for the query
-    result['product_name'] = query
-    result['action'] = 'search_product'
-    return result
+    return IntentEngine.search_query(query)
 
 
 @bp.route('/query', methods=['POST'])
@@ -219,9 +124,7 @@ def process_voice_query():
         })
         
     except Exception as e:
-        print(f"❌ Voice query error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Voice query error")
         return jsonify({
             'success': False,
             'message': 'Error processing query'
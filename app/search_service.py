@@ -0,0 +1,421 @@
+"""
+Product Search Service
+Full-text product search with Tamil/English synonym expansion
+
+Backends:
+- PostgreSQL: GIN index on a weighted tsvector of name/category/description
+- SQLite: FTS5 virtual table kept in sync with triggers
+- Anything else (or FTS5 missing): ILIKE fallback with the same synonym expansion
+
+Indexes are built by init_schema() (flask init-db), never while serving a request:
+requests only detect which backend the database supports.
+"""
+
+import logging
+import re
+import time
+from sqlalchemy import text, func, or_, and_, literal_column
+from app import db
+from app.models import Product
+
+logger = logging.getLogger(__name__)
+
+
+class ProductSearchService:
+    """
+    One search subsystem for browse, comparison, voice and chatbot
+
+    Queries are tokenized, each token is expanded with its synonyms
+    (e.g. "thakkali" -> tomato / தக்காளி) and matched as a prefix, so
+    "tomatoes", "tomato" and "thakkali" all find the same listings.
+    Tokens are AND-ed; synonyms of one token are OR-ed.
+    """
+
+    # Searchable columns, in ranking weight order
+    COLUMNS = ('product_name', 'category', 'description')
+
+    # Postgres tsvector weights / SQLite bm25 weights per column
+    PG_WEIGHTS = {'product_name': 'A', 'category': 'B', 'description': 'C'}
+    BM25_WEIGHTS = (10.0, 3.0, 1.0)
+
+    FTS_TABLE = 'products_fts'
+    PG_INDEX = 'ix_products_search_document'
+
+    # Tamil / transliterated / Hindi names grouped with their English product name
+    SYNONYMS = {
+        'tomato': ['thakkali', 'thakali', 'tamato', 'தக்காளி'],
+        'onion': ['vengayam', 'venkayam', 'வெங்காயம்', 'pyaz'],
+        'potato': ['urulaikizhangu', 'urulai', 'உருளைக்கிழங்கு', 'aloo'],
+        'carrot': ['கேரட்', 'gajar'],
+        'brinjal': ['kathirikai', 'kathrikai', 'கத்திரிக்காய்', 'eggplant', 'baingan'],
+        'okra': ['vendakkai', 'வெண்டைக்காய்', 'ladyfinger', 'bhindi'],
+        'drumstick': ['murungakkai', 'முருங்கைக்காய்'],
+        'cabbage': ['muttaikose', 'முட்டைகோஸ்'],
+        'cauliflower': ['pookose', 'பூக்கோஸ்', 'gobi'],
+        'spinach': ['keerai', 'கீரை', 'palak'],
+        'chilli': ['chili', 'milagai', 'மிளகாய்', 'mirchi'],
+        'ginger': ['inji', 'இஞ்சி', 'adrak'],
+        'garlic': ['poondu', 'பூண்டு', 'lahsun'],
+        'coconut': ['thengai', 'தேங்காய்', 'nariyal'],
+        'lemon': ['elumichai', 'எலுமிச்சை', 'nimbu'],
+        'banana': ['vazhaipazham', 'valaipazham', 'வாழைப்பழம்', 'kela'],
+        'mango': ['maambazham', 'mambazham', 'மாம்பழம்', 'aam'],
+        'apple': ['ஆப்பிள்', 'seb'],
+        'orange': ['ஆரஞ்சு', 'santra'],
+        'grape': ['thratchai', 'திராட்சை', 'angoor'],
+        'rice': ['arisi', 'அரிசி', 'chawal'],
+        'wheat': ['gothumai', 'கோதுமை', 'gehun'],
+        'lentil': ['dal', 'paruppu', 'பருப்பு'],
+        'vegetable': ['kaikari', 'காய்கறி', 'veggie', 'sabzi'],
+        'fruit': ['pazham', 'பழம்', 'phal'],
+    }
+
+    # Filler words dropped from queries before matching
+    STOP_WORDS = {
+        'a', 'an', 'the', 'some', 'any', 'me', 'my', 'of', 'for', 'per', 'kg',
+        'seller', 'sellers', 'vendor', 'vendors', 'product', 'products'
+    }
+
+    _backend = None  # 'postgres', 'fts5' or 'like' once detected
+    _backend_checked_at = 0.0
+    BACKEND_RECHECK_SECONDS = 60  # A 'like' result is re-detected (the index may have been built since)
+    _synonym_index = None
+
+    # ============ INDEX MANAGEMENT ============
+
+    @staticmethod
+    def ensure_index():
+        """
+        Create the search index for the current database (idempotent)
+        Called from init_schema() after db.create_all(), never from request handling
+        """
+        dialect = db.engine.dialect.name
+
+        try:
+            if dialect == 'postgresql':
+                ProductSearchService._ensure_postgres_index()
+            elif dialect == 'sqlite':
+                ProductSearchService._ensure_sqlite_index()
+        except Exception as e:
+            logger.warning("Search index not built, searches use the ILIKE fallback: %s", e)
+
+        ProductSearchService._backend = None  # Re-detect against the new schema
+        return ProductSearchService._get_backend()
+
+    @staticmethod
+    def _pg_document(alias=None):
+        """Weighted tsvector expression; must match the GIN index expression exactly"""
+        prefix = f'{alias}.' if alias else ''
+        parts = [
+            f"setweight(to_tsvector('simple', coalesce({prefix}{column}, '')), '{weight}')"
+            for column, weight in ProductSearchService.PG_WEIGHTS.items()
+        ]
+        return ' || '.join(parts)
+
+    @staticmethod
+    def _ensure_postgres_index():
+        """
+        CREATE INDEX CONCURRENTLY (no write lock on products; needs autocommit). A build that
+        failed part-way leaves an INVALID index that IF NOT EXISTS would skip, so drop it first
+        """
+        index = ProductSearchService.PG_INDEX
+        document = ProductSearchService._pg_document()
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            valid = conn.execute(text(
+                "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name"
+            ), {'name': index}).scalar()
+            if valid is False:
+                logger.warning("Dropping invalid search index %s (interrupted build)", index)
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index}"))
+            conn.execute(text(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index} "
+                f"ON products USING GIN (({document}))"
+            ))
+
+    @staticmethod
+    def _ensure_sqlite_index():
+        table = ProductSearchService.FTS_TABLE
+        columns = ', '.join(ProductSearchService.COLUMNS)
+        new_values = ', '.join(f'new.{c}' for c in ProductSearchService.COLUMNS)
+        old_values = ', '.join(f'old.{c}' for c in ProductSearchService.COLUMNS)
+
+        with db.engine.begin() as conn:
+            # Triggers disappear with the products table (e.g. after db.drop_all()),
+            # so a missing trigger means the index may be stale
+            in_sync = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = :name"),
+                {'name': f'{table}_ai'}
+            ).first()
+
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+                f"{columns}, content='products', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            ))
+
+            # Keep the external-content index in sync with the products table
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON products BEGIN "
+                f"INSERT INTO {table}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON products BEGIN "
+                f"INSERT INTO {table}({table}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE OF {columns} ON products BEGIN "
+                f"INSERT INTO {table}({table}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+                f"INSERT INTO {table}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+            ))
+
+            if not in_sync:
+                # Index rows that were written while no triggers existed
+                conn.execute(text(f"INSERT INTO {table}({table}) VALUES ('rebuild')"))
+
+    @staticmethod
+    def rebuild_index():
+        """Rebuild the SQLite FTS index from scratch (Postgres indexes maintain themselves)"""
+        if ProductSearchService._get_backend() == 'fts5':
+            table = ProductSearchService.FTS_TABLE
+            with db.engine.begin() as conn:
+                conn.execute(text(f"INSERT INTO {table}({table}) VALUES ('rebuild')"))
+
+    @staticmethod
+    def _get_backend():
+        """
+        Detect the backend without DDL. Postgres needs no check (the tsvector query works
+        without the GIN index, just slower); SQLite needs the FTS table and its triggers.
+        A 'like' result is re-checked every BACKEND_RECHECK_SECONDS and a failed check is
+        not cached, so a transient error never pins the ILIKE fallback
+        """
+        backend = ProductSearchService._backend
+        if backend is not None and (
+                backend != 'like'
+                or time.monotonic() - ProductSearchService._backend_checked_at < ProductSearchService.BACKEND_RECHECK_SECONDS):
+            return backend
+
+        dialect = db.engine.dialect.name
+        if dialect == 'postgresql':
+            backend = 'postgres'
+        elif dialect == 'sqlite':
+            table = ProductSearchService.FTS_TABLE
+            try:
+                with db.engine.connect() as conn:
+                    found = conn.execute(
+                        text("SELECT COUNT(*) FROM sqlite_master WHERE name IN (:table, :trigger)"),
+                        {'table': table, 'trigger': f'{table}_ai'}
+                    ).scalar()
+            except Exception as e:
+                logger.warning("Search backend check failed, using ILIKE for now: %s", e)
+                return 'like'
+            backend = 'fts5' if found == 2 else 'like'
+        else:
+            backend = 'like'
+
+        if backend == 'like' and dialect == 'sqlite':
+            logger.info("Search index missing (run flask init-db), using ILIKE fallback")
+        ProductSearchService._backend = backend
+        ProductSearchService._backend_checked_at = time.monotonic()
+        return backend
+
+    # ============ QUERY PARSING ============
+
+    @staticmethod
+    def _get_synonym_index():
+        """Map every known word to its whole synonym group"""
+        if ProductSearchService._synonym_index is None:
+            index = {}
+            for canonical, aliases in ProductSearchService.SYNONYMS.items():
+                group = [canonical] + aliases
+                for word in group:
+                    index[word] = group
+            ProductSearchService._synonym_index = index
+        return ProductSearchService._synonym_index
+
+    @staticmethod
+    def _stem(token):
+        """Very light English plural stripping so prefixes still match (tomatoes -> tomato)"""
+        if len(token) > 4 and token.endswith('es'):
+            return token[:-2]
+        if len(token) > 3 and token.endswith('s'):
+            return token[:-1]
+        return token
+
+    @staticmethod
+    def expand_query(search_text):
+        """
+        Tokenize a search string and expand each token with synonyms
+
+        Returns:
+            List of term groups, e.g. "thakkali" -> [['tomato', 'thakkali', 'thakali', ...]]
+        """
+        if not search_text:
+            return []
+
+        # Keep letters, digits and the Tamil block (vowel signs are not \\w)
+        cleaned = re.sub(r'[^\w\u0B80-\u0BFF]+', ' ', search_text.lower())
+        synonyms = ProductSearchService._get_synonym_index()
+
+        groups = []
+        for token in cleaned.split():
+            if token in ProductSearchService.STOP_WORDS or token.isdigit():
+                continue
+
+            stem = ProductSearchService._stem(token)
+            group = synonyms.get(token) or synonyms.get(stem)
+            if group:
+                terms = list(group)
+            else:
+                terms = [stem]
+
+            if terms not in groups:
+                groups.append(terms)
+
+        return groups
+
+    @staticmethod
+    def _fts5_match(groups, columns):
+        """Build an FTS5 MATCH expression: {cols} : ((a* OR b*) AND (c*))"""
+        clauses = []
+        for terms in groups:
+            quoted = ['"' + term.replace('"', '""') + '"*' for term in terms]
+            clauses.append('(' + ' OR '.join(quoted) + ')')
+        return '{' + ' '.join(columns) + '} : (' + ' AND '.join(clauses) + ')'
+
+    @staticmethod
+    def _tsquery(groups, columns):
+        """Build a to_tsquery() string: (a:*AB | b:*AB) & (c:*AB)"""
+        weights = ''.join(ProductSearchService.PG_WEIGHTS[c] for c in columns)
+        clauses = []
+        for terms in groups:
+            clauses.append('(' + ' | '.join(f"{term}:*{weights}" for term in terms) + ')')
+        return ' & '.join(clauses)
+
+    # ============ QUERY BUILDING ============
+
+    @staticmethod
+    def apply(query, search_text, columns=('product_name',), order_by_rank=True):
+        """
+        Restrict a Product query to search matches
+
+        Args:
+            query: A Product.query (optionally already filtered)
+            search_text: Raw user search text
+            columns: Which of COLUMNS to match against
+            order_by_rank: Order results by relevance (best first)
+
+        Returns:
+            The filtered query (unchanged if the search text has no usable terms)
+        """
+        groups = ProductSearchService.expand_query(search_text)
+        if not groups:
+            return query
+
+        backend = ProductSearchService._get_backend()
+
+        if backend == 'fts5':
+            table = ProductSearchService.FTS_TABLE
+            weights = ', '.join(str(w) for w in ProductSearchService.BM25_WEIGHTS)
+            matches = text(
+                f"SELECT rowid AS product_id, bm25({table}, {weights}) AS search_rank "
+                f"FROM {table} WHERE {table} MATCH :search_match"
+            ).bindparams(
+                search_match=ProductSearchService._fts5_match(groups, columns)
+            ).columns(
+                product_id=db.Integer, search_rank=db.Float
+            ).subquery('search_matches')
+
+            query = query.join(matches, Product.id == matches.c.product_id)
+            if order_by_rank:
+                query = query.order_by(matches.c.search_rank)
+            return query
+
+        if backend == 'postgres':
+            document = literal_column(ProductSearchService._pg_document(alias='products'))
+            tsquery = func.to_tsquery(
+                literal_column("'simple'"),
+                ProductSearchService._tsquery(groups, columns)
+            )
+            query = query.filter(document.op('@@')(tsquery))
+            if order_by_rank:
+                query = query.order_by(func.ts_rank(document, tsquery).desc())
+            return query
+
+        # ILIKE fallback
+        conditions = []
+        for terms in groups:
+            conditions.append(or_(*[
+                getattr(Product, column).ilike(f'%{term}%')
+                for term in terms for column in columns
+            ]))
+        return query.filter(and_(*conditions))
+
+    @staticmethod
+    def sql_fragments(search_text, alias='p', columns=('product_name',)):
+        """
+        Raw-SQL version of apply() for text() queries (e.g. retailer.browse)
+
+        Returns:
+            dict with 'join', 'where', 'order_by' SQL snippets, 'rank' (a relevance
+            expression where lower is better, None without an index) and 'params',
+            or None if the search text has no usable terms
+        """
+        groups = ProductSearchService.expand_query(search_text)
+        if not groups:
+            return None
+
+        backend = ProductSearchService._get_backend()
+
+        if backend == 'fts5':
+            table = ProductSearchService.FTS_TABLE
+            weights = ', '.join(str(w) for w in ProductSearchService.BM25_WEIGHTS)
+            return {
+                'join': (
+                    f" JOIN (SELECT rowid AS product_id, bm25({table}, {weights}) AS search_rank "
+                    f"FROM {table} WHERE {table} MATCH :search_match) search_matches "
+                    f"ON search_matches.product_id = {alias}.id"
+                ),
+                'where': '',
+                'order_by': 'search_matches.search_rank',
+                'rank': 'search_matches.search_rank',
+                'params': {'search_match': ProductSearchService._fts5_match(groups, columns)}
+            }
+
+        if backend == 'postgres':
+            document = ProductSearchService._pg_document(alias=alias)
+            tsquery = "to_tsquery('simple', :search_match)"
+            return {
+                'join': '',
+                'where': f" AND ({document}) @@ {tsquery}",
+                'order_by': f"ts_rank({document}, {tsquery}) DESC",
+                'rank': f"-ts_rank({document}, {tsquery})",
+                'params': {'search_match': ProductSearchService._tsquery(groups, columns)}
+            }
+
+        # LIKE fallback (LOWER() instead of ILIKE so it also runs on SQLite)
+        params = {}
+        conditions = []
+        for i, terms in enumerate(groups):
+            alternatives = []
+            for j, term in enumerate(terms):
+                params[f'search_term_{i}_{j}'] = f'%{term}%'
+                alternatives.extend(
+                    f"LOWER({alias}.{column}) LIKE :search_term_{i}_{j}" for column in columns
+                )
+            conditions.append('(' + ' OR '.join(alternatives) + ')')
+        return {
+            'join': '',
+            'where': ' AND ' + ' AND '.join(conditions),
+            'order_by': None,
+            'rank': None,
+            'params': params
+        }
+
+    @staticmethod
+    def search(search_text, columns=('product_name',), limit=20, active_only=True):
+        """Convenience: ranked active products matching search_text"""
+        query = Product.query
+        if active_only:
+            query = query.filter(Product.is_active == True)
+        return ProductSearchService.apply(query, search_text, columns=columns).limit(limit).all()
@@ -0,0 +1,235 @@
+"""
+SQL Profiler
+Per-request query counts, DB time and N+1 detection
+
+- SQLAlchemy cursor events time every statement run inside a request (all engines, so
+  a read replica is counted too); queries from CLI scripts and background threads are ignored
+- Statements are reduced to a shape (literals and IN-lists collapsed), so the same
+  lazy load for 50 different rows counts as one statement run 50 times
+- A shape run more than SQL_N_PLUS_ONE_THRESHOLD times in one request is flagged as
+  an N+1 (a per-row lazy load such as p.vendor.business_name in a loop)
+- Surfaced as X-DB-* / Server-Timing response headers (DEBUG or SQL_PROFILE_HEADERS),
+  a log line for requests slower than SQL_SLOW_REQUEST_MS or flagged as N+1, and
+  per-endpoint totals for this worker at /admin/sql-profile
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+
+class RequestProfile:
+    """SQL statements run while handling one request"""
+
+    __slots__ = ('started', 'queries', 'db_seconds', 'shapes', 'shape_seconds')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.shapes = Counter()
+        self.shape_seconds = Counter()
+
+    def record(self, statement, seconds):
+        shape = QueryProfiler.shape(statement)
+        self.queries += 1
+        self.db_seconds += seconds
+        self.shapes[shape] += 1
+        self.shape_seconds[shape] += seconds
+
+    def top_statements(self, limit=5):
+        return [{'statement': shape, 'count': count, 'db_ms': round(self.shape_seconds[shape] * 1000, 2)}
+                for shape, count in self.shapes.most_common(limit)]
+
+    def n_plus_one(self, threshold):
+        return [{'statement': shape, 'count': count}
+                for shape, count in self.shapes.most_common() if count > threshold]
+
+
+class QueryProfiler:
+    """
+    Engine event hooks plus per-endpoint aggregates for this worker
+    """
+
+    DEFAULT_N_PLUS_ONE_THRESHOLD = 10
+    DEFAULT_SLOW_REQUEST_MS = 500
+    RECENT_SLOW_REQUESTS = 50
+    MAX_SHAPE_CHARS = 300
+    SHAPE_CACHE_SIZE = 2048
+
+    LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+    PARAM_LIST_RE = re.compile(r'\(\s*(?:\?|%\(\w+\)s|%s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|%s|:\w+))*\s*\)')
+    POSTCOMPILE_RE = re.compile(r'\(?\[POSTCOMPILE_\w+\]\)?|__\[POSTCOMPILE_\w+\]')
+    SPACE_RE = re.compile(r'\s+')
+
+    _listening = False
+    _lock = threading.Lock()
+    _endpoints = {}
+    _shapes = {}  # statement -> shape
+    _slow = deque(maxlen=RECENT_SLOW_REQUESTS)
+
+    # ============ SETUP ============
+
+    @staticmethod
+    def init_app(app):
+        if not app.config.get('SQL_PROFILING_ENABLED', True):
+            return
+
+        with QueryProfiler._lock:
+            if not QueryProfiler._listening:
+                event.listen(Engine, 'before_cursor_execute', QueryProfiler._before_cursor_execute)
+                event.listen(Engine, 'after_cursor_execute', QueryProfiler._after_cursor_execute)
+                QueryProfiler._listening = True
+
+        app.before_request(QueryProfiler._start_request)
+        app.after_request(QueryProfiler._finish_request)
+
+    @staticmethod
+    def shape(statement):
+        """Statement with literals and parameter lists collapsed, whitespace normalised"""
+        shape = QueryProfiler._shapes.get(statement)
+        if shape is not None:
+            return shape
+        shape = QueryProfiler.SPACE_RE.sub(' ', statement).strip()
+        shape = QueryProfiler.POSTCOMPILE_RE.sub('(?)', shape)
+        shape = QueryProfiler.LITERAL_RE.sub('?', shape)
+        shape = QueryProfiler.PARAM_LIST_RE.sub('(?)', shape)
+        shape = shape[:QueryProfiler.MAX_SHAPE_CHARS]
+        # SQLAlchemy's compiled cache sends the same strings over and over; remember their shapes
+        if len(QueryProfiler._shapes) >= QueryProfiler.SHAPE_CACHE_SIZE:
+            QueryProfiler._shapes.clear()
+        QueryProfiler._shapes[statement] = shape
+        return shape
+
+    # ============ ENGINE EVENTS ============
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and has_request_context() and g.get('_sql_profile') is not None:
+            context._profile_started = time.perf_counter()
+
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_profile_started', None)
+        if started is None or not has_request_context():
+            return
+        profile = g.get('_sql_profile')
+        if profile is not None:
+            profile.record(statement, time.perf_counter() - started)
+
+    # ============ REQUESTS ============
+
+    @staticmethod
+    def _start_request():
+        g._sql_profile = RequestProfile()
+
+    @staticmethod
+    def current():
+        """The running request's RequestProfile (None outside requests or when profiling is off)"""
+        return g.get('_sql_profile') if has_request_context() else None
+
+    @staticmethod
+    def _finish_request(response):
+        # Left on g (replaced by the next request) so other after_request hooks can read it
+        profile = g.get('_sql_profile')
+        if profile is None:
+            return response
+
+        config = current_app.config
+        elapsed_ms = (time.perf_counter() - profile.started) * 1000
+        db_ms = profile.db_seconds * 1000
+        threshold = config.get('SQL_N_PLUS_ONE_THRESHOLD') or QueryProfiler.DEFAULT_N_PLUS_ONE_THRESHOLD
+        repeated = profile.n_plus_one(threshold)
+        endpoint = request.endpoint or 'unknown'
+
+        if current_app.debug or config.get('SQL_PROFILE_HEADERS'):
+            response.headers['X-DB-Queries'] = str(profile.queries)
+            response.headers['X-DB-Time-ms'] = f'{db_ms:.1f}'
+            response.headers['Server-Timing'] = f'db;dur={db_ms:.1f};desc="{profile.queries} queries", app;dur={elapsed_ms:.1f}'
+            if repeated:
+                response.headers['X-DB-N-Plus-One'] = '; '.join(
+                    f"{item['count']}x {item['statement'][:80]}" for item in repeated[:3])
+
+        slow_ms = config.get('SQL_SLOW_REQUEST_MS') or QueryProfiler.DEFAULT_SLOW_REQUEST_MS
+        slow = elapsed_ms >= slow_ms
+        summary = None
+        if slow or repeated:
+            summary = {
+                'endpoint': endpoint,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'ms': round(elapsed_ms, 1),
+                'queries': profile.queries,
+                'db_ms': round(db_ms, 1),
+                'n_plus_one': repeated[:3],
+                'top_statements': profile.top_statements(3),
+                'at': time.time()
+            }
+            reason = f"{repeated[0]['count']}x {repeated[0]['statement'][:120]}" if repeated else 'no repeated statements'
+            logger.warning("%s %s %s: %.0f ms, %d queries (%.0f ms DB) - %s",
+                           'Slow request' if slow else 'N+1 queries', request.method, request.path,
+                           elapsed_ms, profile.queries, db_ms, reason,
+                           extra={'endpoint': endpoint, 'duration_ms': summary['ms'], 'queries': profile.queries,
+                                  'db_ms': summary['db_ms'], 'n_plus_one': bool(repeated)})
+
+        QueryProfiler._aggregate(endpoint, profile, elapsed_ms, bool(repeated), summary)
+        return response
+
+    @staticmethod
+    def _aggregate(endpoint, profile, elapsed_ms, flagged, summary):
+        with QueryProfiler._lock:
+            stats = QueryProfiler._endpoints.get(endpoint)
+            if stats is None:
+                stats = QueryProfiler._endpoints[endpoint] = {
+                    'requests': 0, 'queries': 0, 'max_queries': 0, 'db_ms': 0.0, 'ms': 0.0,
+                    'n_plus_one_requests': 0, 'worst': None
+                }
+            stats['requests'] += 1
+            stats['queries'] += profile.queries
+            stats['db_ms'] += profile.db_seconds * 1000
+            stats['ms'] += elapsed_ms
+            stats['n_plus_one_requests'] += flagged
+            if profile.queries > stats['max_queries']:
+                stats['max_queries'] = profile.queries
+                stats['worst'] = profile.top_statements(5)
+            if summary is not None:
+                QueryProfiler._slow.append(summary)
+
+    # ============ STATS ============
+
+    @staticmethod
+    def stats():
+        """Per-endpoint query totals (most queries per request first) and recent slow / N+1 requests"""
+        with QueryProfiler._lock:
+            endpoints = {name: dict(stats) for name, stats in QueryProfiler._endpoints.items()}
+            slow = list(QueryProfiler._slow)
+
+        result = []
+        for name, stats in endpoints.items():
+            requests = stats['requests']
+            result.append({
+                'endpoint': name,
+                'requests': requests,
+                'avg_queries': round(stats['queries'] / requests, 1),
+                'max_queries': stats['max_queries'],
+                'avg_db_ms': round(stats['db_ms'] / requests, 2),
+                'avg_ms': round(stats['ms'] / requests, 2),
+                'n_plus_one_requests': stats['n_plus_one_requests'],
+                'worst_request_statements': stats['worst']
+            })
+        result.sort(key=lambda item: (-item['avg_queries'], item['endpoint']))
+        return {'endpoints': result, 'recent_slow_requests': slow[::-1]}
+
+    @staticmethod
+    def reset():
+        with QueryProfiler._lock:
+            QueryProfiler._endpoints = {}
+            QueryProfiler._slow.clear()
@@ -0,0 +1,206 @@
+"""
+Stock Reservation Service
+Concurrency-safe stock holds for checkout and payment
+
+Stock is taken with a conditional UPDATE (quantity = quantity - :q WHERE quantity >= :q),
+so two buyers racing for the last crates of a product can never both succeed -
+the database row lock decides, not a read-then-write in Python.
+
+Lifecycle: checkout -> held (stock decremented, expires after STOCK_RESERVATION_MINUTES)
+           payment success -> committed
+           payment failure / timeout -> released / expired (stock restored)
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import text
+from app import db
+from app.models import StockReservation, Product
+
+logger = logging.getLogger(__name__)
+
+
+def claim_rows(statement, rows):
+    """
+    Run a conditional UPDATE (a claim) once per parameter row (does not commit)
+
+    executemany's summed rowcount is only trusted when the dialect reports multi-row counts;
+    psycopg2 in its default batch mode doesn't, so there every row is claimed on its own
+    and the first miss stops the batch.
+
+    Returns:
+        True if every row matched exactly one row (roll back otherwise)
+    """
+    if not rows:
+        return True
+    if db.session.get_bind().dialect.supports_sane_multi_rowcount:
+        return db.session.execute(statement, rows).rowcount == len(rows)
+    for row in rows:
+        if db.session.execute(statement, row).rowcount != 1:
+            return False
+    return True
+
+
+class StockReservationService:
+    """
+    Place, commit and release stock reservations in batched statements
+    """
+
+    TAKE_STOCK_SQL = text("""
+        UPDATE products
+        SET quantity = quantity - :quantity
+        WHERE id = :product_id AND is_active = true AND quantity >= :quantity
+    """)
+
+    RESTORE_STOCK_SQL = text("""
+        UPDATE products
+        SET quantity = quantity + :quantity
+        WHERE id = :product_id
+    """)
+
+    @staticmethod
+    def _ttl():
+        return timedelta(minutes=current_app.config.get('STOCK_RESERVATION_MINUTES', 15))
+
+    @staticmethod
+    def reserve(lines):
+        """
+        Take stock for order lines in one batch (does not commit)
+
+        Args:
+            lines: list of (order_id, product_id, quantity)
+
+        Returns:
+            (True, None) on success, or (False, message) after rolling back the
+            session if any product doesn't have enough stock
+        """
+        if not lines:
+            return True, None
+
+        # Fixed lock order so concurrent multi-product checkouts can't deadlock
+        lines = sorted(lines, key=lambda line: (line[1], line[0]))
+        params = [{'product_id': product_id, 'quantity': quantity} for _, product_id, quantity in lines]
+
+        if not claim_rows(StockReservationService.TAKE_STOCK_SQL, params):
+            db.session.rollback()
+            return False, StockReservationService._shortage_message(lines)
+
+        expires_at = datetime.utcnow() + StockReservationService._ttl()
+        now = datetime.utcnow()
+        db.session.execute(StockReservation.__table__.insert(), [
+            {
+                'order_id': order_id,
+                'product_id': product_id,
+                'quantity': quantity,
+                'status': 'held',
+                'expires_at': expires_at,
+                'created_at': now,
+                'updated_at': now
+            }
+            for order_id, product_id, quantity in lines
+        ])
+
+        logger.info("Reserved %s line(s) until %s", len(lines), expires_at)
+        return True, None
+
+    @staticmethod
+    def _shortage_message(lines):
+        """Human-readable list of products that ran out (after rollback)"""
+        wanted = defaultdict(float)
+        for _, product_id, quantity in lines:
+            wanted[product_id] += quantity
+
+        products = Product.query.filter(Product.id.in_(list(wanted))).all()
+        short = [
+            f"{p.product_name} (only {max(p.quantity, 0):g} {p.unit} left)"
+            for p in products
+            if not p.is_active or p.quantity < wanted[p.id]
+        ]
+        if not short:
+            return 'Stock changed while you were checking out. Please try again.'
+        return 'Not enough stock for: ' + ', '.join(short)
+
+    @staticmethod
+    def ensure_reserved(order):
+        """
+        Make sure an order holds its stock before charging the buyer
+        Extends an existing hold, or re-reserves after a failed/expired attempt
+
+        Returns:
+            (True, None) or (False, message) - the session is rolled back on failure
+        """
+        expires_at = datetime.utcnow() + StockReservationService._ttl()
+        extended = StockReservation.query.filter_by(
+            order_id=order.id, status='held'
+        ).update({
+            StockReservation.expires_at: expires_at,
+            StockReservation.updated_at: datetime.utcnow()
+        }, synchronize_session=False)
+
+        if extended:
+            return True, None
+
+        return StockReservationService.reserve([
+            (order.id, item.product_id, item.quantity) for item in order.items
+        ])
+
+    @staticmethod
+    def commit_order(order_id):
+        """Payment succeeded - the held stock is sold (does not commit)"""
+        return StockReservation.query.filter_by(
+            order_id=order_id, status='held'
+        ).update({
+            StockReservation.status: 'committed',
+            StockReservation.updated_at: datetime.utcnow()
+        }, synchronize_session=False)
+
+    @staticmethod
+    def _release_where(condition, status):
+        """Claim matching held reservations and put their stock back (does not commit)"""
+        table = StockReservation.__table__
+        claimed = db.session.execute(
+            table.update()
+            .where(table.c.status == 'held')
+            .where(condition)
+            .values(status=status, updated_at=datetime.utcnow())
+            .returning(table.c.product_id, table.c.quantity)
+        ).fetchall()
+
+        if claimed:
+            db.session.execute(StockReservationService.RESTORE_STOCK_SQL, [
+                {'product_id': product_id, 'quantity': quantity}
+                for product_id, quantity in sorted(claimed)
+            ])
+
+        return len(claimed)
+
+    @staticmethod
+    def release_order(order_id):
+        """Payment failed or order cancelled - give the stock back (does not commit)"""
+        released = StockReservationService._release_where(
+            StockReservation.__table__.c.order_id == order_id, 'released'
+        )
+        if released:
+            logger.info("Released %s reservation(s) for order #%s", released, order_id)
+        return released
+
+    @staticmethod
+    def release_expired():
+        """
+        Return stock from holds whose TTL has passed (commits)
+        Safe to run from any worker or a cron job - each hold is claimed exactly once
+        """
+        try:
+            released = StockReservationService._release_where(
+                StockReservation.__table__.c.expires_at < datetime.utcnow(), 'expired'
+            )
+            db.session.commit()
+            if released:
+                logger.info("Released %s expired reservation(s)", released)
+            return released
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error releasing expired reservations: %s", e)
+            return 0
@@ -0,0 +1,345 @@
+"""
+Structured Logging
+JSON log lines with a request id, written to stdout off the request thread
+
+- Modules log through logging.getLogger(__name__). create_app() gives the root logger a
+  single QueueHandler: the request thread only stamps the record and does a put_nowait(),
+  a QueueListener thread formats it and writes to stdout, so a slow stdout pipe (gunicorn,
+  the Railway log drain) never stalls a request. When LOG_QUEUE_SIZE records are waiting,
+  new ones are dropped and counted instead of blocking
+- LOG_FORMAT=json (default in production) writes one JSON object per line; 'text' (default
+  in development / testing) a readable line. Both carry the request id: the X-Request-ID
+  header when a proxy sent a usable one, otherwise a generated one, echoed on the response
+- LOG_LEVEL is the level of the app's own loggers (INFO by default, so per-request DEBUG
+  diagnostics cost a level check); LOG_LEVELS overrides single modules or libraries:
+  "app.routes.retailer=DEBUG,app.credit_system=WARNING,werkzeug=WARNING"
+- LOG_DEBUG_SAMPLE_RATE=N keeps one in N DEBUG records per call site (1 keeps all); kept
+  records carry sample_rate so counts can be scaled back up
+- Forked workers (gunicorn --preload) get a fresh queue and listener thread
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import uuid
+from datetime import datetime, timezone
+from flask import g, has_request_context, request
+
+# Attributes every LogRecord has; anything else was passed with extra={...}
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id', 'sample_rate'}
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps the request id while still on the thread that logged"""
+
+    def filter(self, record):
+        record.request_id = g.get('request_id') if has_request_context() else None
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Keeps one in every `rate` DEBUG records per call site (first one included)"""
+
+    def __init__(self, rate=1):
+        super().__init__()
+        self.rate = rate
+        self._seen = {}  # (pathname, lineno) -> records seen; racy increments only skew the sample
+
+    def filter(self, record):
+        rate = self.rate
+        if rate <= 1 or record.levelno != logging.DEBUG:
+            return True
+        site = (record.pathname, record.lineno)
+        seen = self._seen.get(site, 0)
+        self._seen[site] = seen + 1
+        if seen % rate:
+            return False
+        record.sample_rate = rate
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of waiting for a full queue"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._unreported = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            self._unreported += 1
+            from app.metrics import Metrics
+            Metrics.LOG_RECORDS_DROPPED.inc()
+            return
+        if self._unreported:
+            dropped, self._unreported = self._unreported, 0
+            notice = logging.makeLogRecord({
+                'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': f'{dropped} log records dropped (log queue full)', 'request_id': None})
+            try:
+                self.queue.put_nowait(notice)
+            except queue.Full:
+                self._unreported += dropped
+
+    def prepare(self, record):
+        # Resolve the message and traceback here: args and frames must not outlive the call
+        message = record.getMessage()
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = _TRACEBACK_FORMATTER.formatException(record.exc_info)
+        prepared = logging.LogRecord.__new__(logging.LogRecord)  # Shallow copy, without __init__'s lookups
+        prepared.__dict__.update(record.__dict__)
+        prepared.msg = prepared.message = message
+        prepared.args = None
+        prepared.exc_info = None
+        prepared.exc_text = exc_text
+        return prepared
+
+
+_TRACEBACK_FORMATTER = logging.Formatter()
+
+
+class BufferedStreamHandler(logging.StreamHandler):
+    """Collects formatted lines and writes a whole burst at once (the listener flushes when the queue runs dry)"""
+
+    MAX_LINES = 512
+
+    def __init__(self, stream=None):
+        super().__init__(stream)
+        self.lines = []
+
+    def emit(self, record):
+        try:
+            self.lines.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+            return
+        if len(self.lines) >= self.MAX_LINES:
+            self.flush()
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self.lines:
+                lines, self.lines = self.lines, []
+                self.stream.write(self.terminator.join(lines) + self.terminator)
+            if self.stream and hasattr(self.stream, 'flush'):
+                self.stream.flush()
+        except Exception:
+            self.handleError(None)
+        finally:
+            self.release()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, msg, request_id, pid, then extras"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'pid': record.process
+        }
+        sample_rate = getattr(record, 'sample_rate', None)
+        if sample_rate:
+            entry['sample_rate'] = sample_rate
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Readable single line (plus traceback) for development"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        if getattr(record, 'request_id', None) is None:
+            record.request_id = '-'
+        return super().format(record)
+
+
+class StructuredLogging:
+    """
+    Process-wide logging setup and the request-id hooks
+    """
+
+    DEFAULT_QUEUE_SIZE = 10000
+    REQUEST_ID_HEADER = 'X-Request-ID'
+    REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._:\-]{1,128}$')
+
+    _lock = threading.Lock()
+    _handler = None
+    _output = None
+    _listener = None
+    _sampling = DebugSamplingFilter()
+    _levels = {}  # Logger name -> level set from LOG_LEVELS (reset when the config changes)
+
+    # ============ SETUP ============
+
+    @staticmethod
+    def init_app(app):
+        config = app.config
+        StructuredLogging.install(
+            level=config.get('LOG_LEVEL') or 'INFO',
+            levels=config.get('LOG_LEVELS'),
+            fmt=config.get('LOG_FORMAT') or 'json',
+            debug_sample_rate=config.get('LOG_DEBUG_SAMPLE_RATE') or 1,
+            queue_size=config.get('LOG_QUEUE_SIZE') or StructuredLogging.DEFAULT_QUEUE_SIZE)
+
+        # Flask would otherwise add its own stderr handler to the 'app' logger (the parent of
+        # every app.* module logger) and drop it to DEBUG in debug mode
+        from flask.logging import default_handler
+        app.logger.removeHandler(default_handler)
+
+        app.before_request(StructuredLogging._start_request)
+        app.after_request(StructuredLogging._finish_request)
+
+    @staticmethod
+    def install(level='INFO', levels=None, fmt='json', debug_sample_rate=1, queue_size=DEFAULT_QUEUE_SIZE, stream=None):
+        """Route every logger through the queue (once per process; later calls reconfigure)"""
+        with StructuredLogging._lock:
+            if StructuredLogging._handler is None:
+                StructuredLogging._output = BufferedStreamHandler(stream or sys.stdout)
+                handler = NonBlockingQueueHandler(queue.Queue(queue_size))
+                handler.addFilter(StructuredLogging._sampling)
+                handler.addFilter(RequestContextFilter())
+                StructuredLogging._handler = handler
+                StructuredLogging._start_listener()
+                logging.getLogger().addHandler(handler)
+                atexit.register(StructuredLogging.shutdown)
+            elif stream is not None:
+                StructuredLogging._output.setStream(stream)
+
+            StructuredLogging._output.setFormatter(TextFormatter() if fmt == 'text' else JsonFormatter())
+            StructuredLogging._sampling.rate = max(1, int(debug_sample_rate))
+            logging.getLogger('app').setLevel(StructuredLogging._level(level))
+            StructuredLogging._apply_levels(levels)
+
+    @staticmethod
+    def _start_listener():
+        listener = _Listener(StructuredLogging._handler.queue, StructuredLogging._output)
+        listener.start()
+        StructuredLogging._listener = listener
+
+    @staticmethod
+    def _level(name):
+        level = logging.getLevelName(str(name).strip().upper())
+        return level if isinstance(level, int) else logging.INFO
+
+    @staticmethod
+    def _apply_levels(spec):
+        """LOG_LEVELS: "logger=LEVEL,logger=LEVEL"; loggers dropped from it go back to inheriting"""
+        levels = {}
+        for item in (spec or '').split(','):
+            name, _, level = item.partition('=')
+            if name.strip() and level.strip():
+                levels[name.strip()] = StructuredLogging._level(level)
+        for name in StructuredLogging._levels.keys() - levels.keys():
+            logging.getLogger(name).setLevel(logging.NOTSET)
+        for name, level in levels.items():
+            logging.getLogger(name).setLevel(level)
+        StructuredLogging._levels = levels
+
+    @staticmethod
+    def flush(timeout=5.0):
+        """Wait until the listener has written everything queued so far"""
+        handler = StructuredLogging._handler
+        if handler is None:
+            return True
+        done = threading.Event()
+        handler.queue.put(_FlushMarker(done))
+        return done.wait(timeout)
+
+    @staticmethod
+    def shutdown():
+        listener = StructuredLogging._listener
+        if listener is not None and listener._thread is not None:
+            listener.stop()  # Writes whatever is still queued
+
+    @staticmethod
+    def _after_fork():
+        """The listener thread didn't survive the fork and the queue's lock may be held"""
+        handler = StructuredLogging._handler
+        if handler is None:
+            return
+        StructuredLogging._lock = threading.Lock()
+        handler.queue = queue.Queue(handler.queue.maxsize)
+        StructuredLogging._output.lines = []  # The parent writes its own pending lines
+        handler.dropped = handler._unreported = 0
+        StructuredLogging._start_listener()
+
+    @staticmethod
+    def stats():
+        handler = StructuredLogging._handler
+        if handler is None:
+            return {'installed': False}
+        return {
+            'installed': True,
+            'queued': handler.queue.qsize(),
+            'queue_size': handler.queue.maxsize,
+            'dropped': handler.dropped,
+            'debug_sample_rate': StructuredLogging._sampling.rate
+        }
+
+    # ============ REQUESTS ============
+
+    @staticmethod
+    def _start_request():
+        incoming = request.headers.get(StructuredLogging.REQUEST_ID_HEADER)
+        if incoming and StructuredLogging.REQUEST_ID_RE.match(incoming):
+            g.request_id = incoming
+        else:
+            g.request_id = uuid.uuid4().hex
+
+    @staticmethod
+    def _finish_request(response):
+        request_id = g.get('request_id')
+        if request_id:
+            response.headers[StructuredLogging.REQUEST_ID_HEADER] = request_id
+        return response
+
+
+class _FlushMarker(logging.LogRecord):
+    """Queued by StructuredLogging.flush(); 'handled' by setting the event once reached"""
+
+    def __init__(self, done):
+        super().__init__(__name__, logging.DEBUG, '', 0, '', None, None)
+        self.done = done
+
+
+class _Listener(logging.handlers.QueueListener):
+    def handle(self, record):
+        if not isinstance(record, _FlushMarker):
+            super().handle(record)
+            if not self.queue.empty():
+                return  # More of the burst to come: one write for all of it
+        for handler in self.handlers:
+            handler.flush()
+        if isinstance(record, _FlushMarker):
+            record.done.set()
+
+    def stop(self):
+        super().stop()
+        for handler in self.handlers:
+            handler.flush()
+
+
+os.register_at_fork(after_in_child=StructuredLogging._after_fork)
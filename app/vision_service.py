@@ -3,12 +3,10 @@ Vision Service for Product Recognition
 Uses Gemini Vision API to identify products from images
 """
 
-import google.generativeai as genai
-import os
-from PIL import Image
-import io
-import base64
 import json
+from app.llm_cache import LLMCache
+from app.gemini_client import GeminiRegistry
+from app.image_pipeline import ImagePipeline, PreparedImage
 
 
 class VisionService:
@@ -16,16 +14,55 @@ class VisionService:
     Service for analyzing product images using Gemini Vision API
     """
     
-    # Configure Gemini API
-    GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY', '')
+    MODEL_NAME = GeminiRegistry.VISION_MODEL
+    # Bump a version when its prompt changes (cached analyses are keyed on it + the image)
+    PRODUCT_PROMPT_VERSION = 'vision-product-v2'  # v2: near-duplicate entries live NEAR_DUPLICATE_TTL
+    QUALITY_PROMPT_VERSION = 'vision-quality-v1'
+    MULTI_PRODUCT_PROMPT_VERSION = 'vision-multi-v1'
+    ANALYSIS_CACHE_TTL = 30 * 86400  # Keyed on the exact image bytes: same photo, same answer
+    # Prompts whose answer may be reused for a photo that merely looks the same (perceptual hash),
+    # and for how long. Never quality grading: a new batch on the same tray looks the same
+    NEAR_DUPLICATE_TTL = {PRODUCT_PROMPT_VERSION: 3600}
     
     @staticmethod
     def configure_api():
-        """Configure Gemini API with key"""
-        if VisionService.GEMINI_API_KEY:
-            genai.configure(api_key=VisionService.GEMINI_API_KEY)
-            return True
-        return False
+        """True if Gemini can be used (the shared client is created on first call)"""
+        return GeminiRegistry.is_configured()
+    
+    @staticmethod
+    def load_image(image_data):
+        """
+        PreparedImage for a base64 data URL or file path (routes pass one already
+        prepared on the ImagePipeline pool, which is returned as is)
+        """
+        if isinstance(image_data, PreparedImage):
+            return image_data
+        return ImagePipeline.load(image_data)
+    
+    @staticmethod
+    def generate_json(prompt_version, prompt, image):
+        """
+        Run prompt + prepared image through the model, cached on the image bytes (or its
+        perceptual hash, briefly, for prompts in NEAR_DUPLICATE_TTL)
+        
+        Returns:
+            (parsed JSON, response text); raises json.JSONDecodeError on a non-JSON reply
+        """
+        def generate():
+            response = GeminiRegistry.model(VisionService.MODEL_NAME).generate_content([prompt, image.as_part()])
+            result_text = response.text.strip()
+            
+            # Remove markdown code blocks if present
+            if result_text.startswith('```'):
+                result_text = result_text.replace('```json', '').replace('```', '').strip()
+            return result_text
+        
+        near_duplicate_ttl = VisionService.NEAR_DUPLICATE_TTL.get(prompt_version)
+        return LLMCache.fetch(
+            VisionService.MODEL_NAME, prompt_version, image.cache_payload(near_duplicates=near_duplicate_ttl is not None),
+            generate, parse=lambda text: (json.loads(text), text),
+            ttl=near_duplicate_ttl or VisionService.ANALYSIS_CACHE_TTL
+        )
     
     @staticmethod
     def analyze_product_image(image_data):
@@ -46,18 +83,8 @@ class VisionService:
                     'message': 'Gemini API key not configured. Please set GEMINI_API_KEY environment variable.'
                 }
             
-            # Load image
-            if image_data.startswith('data:image'):
-                # Base64 encoded image
-                image_data = image_data.split(',')[1]
-                image_bytes = base64.b64decode(image_data)
-                image = Image.open(io.BytesIO(image_bytes))
-            else:
-                # File path
-                image = Image.open(image_data)
-            
-            # Create model
-            model = genai.GenerativeModel('gemini-1.5-flash')
+            # Decoded, oriented and downsized (base64 data URL or file path)
+            image = VisionService.load_image(image_data)
             
             # Prepare prompt for product identification
             prompt = """
@@ -80,32 +107,22 @@ class VisionService:
             If you cannot identify the product clearly, set confidence to "Low" and provide best estimates.
             """
             
-            # Generate response
-            response = model.generate_content([prompt, image])
-            
-            # Parse response
-            result_text = response.text.strip()
-            
-            # Remove markdown code blocks if present
-            if result_text.startswith('```json'):
-                result_text = result_text.replace('```json', '').replace('```', '').strip()
-            elif result_text.startswith('```'):
-                result_text = result_text.replace('```', '').strip()
-            
-            # Parse JSON
-            product_info = json.loads(result_text)
+            # Generate (or reuse) and parse response
+            product_info, result_text = VisionService.generate_json(
+                VisionService.PRODUCT_PROMPT_VERSION, prompt, image
+            )
             
             return {
                 'success': True,
                 'product_info': product_info,
-                'raw_response': response.text
+                'raw_response': result_text
             }
             
         except json.JSONDecodeError as e:
             return {
                 'success': False,
                 'message': f'Could not parse AI response: {str(e)}',
-                'raw_response': result_text if 'result_text' in locals() else 'No response'
+                'raw_response': e.doc
             }
         except Exception as e:
             return {
@@ -127,14 +144,7 @@ class VisionService:
                 }
             
             # Load image
-            if image_data.startswith('data:image'):
-                image_data = image_data.split(',')[1]
-                image_bytes = base64.b64decode(image_data)
-                image = Image.open(io.BytesIO(image_bytes))
-            else:
-                image = Image.open(image_data)
-            
-            model = genai.GenerativeModel('gemini-1.5-flash')
+            image = VisionService.load_image(image_data)
             
             prompt = """
             Analyze this fresh produce image and provide a quality assessment in JSON format:
@@ -152,14 +162,9 @@ class VisionService:
             Provide only the JSON response.
             """
             
-            response = model.generate_content([prompt, image])
-            result_text = response.text.strip()
-            
-            # Clean JSON
-            if result_text.startswith('```'):
-                result_text = result_text.replace('```json', '').replace('```', '').strip()
-            
-            quality_info = json.loads(result_text)
+            quality_info, _ = VisionService.generate_json(
+                VisionService.QUALITY_PROMPT_VERSION, prompt, image
+            )
             
             return {
                 'success': True,
@@ -186,14 +191,7 @@ class VisionService:
                 }
             
             # Load image
-            if image_data.startswith('data:image'):
-                image_data = image_data.split(',')[1]
-                image_bytes = base64.b64decode(image_data)
-                image = Image.open(io.BytesIO(image_bytes))
-            else:
-                image = Image.open(image_data)
-            
-            model = genai.GenerativeModel('gemini-1.5-flash')
+            image = VisionService.load_image(image_data)
             
             prompt = """
             Identify all fresh produce products visible in this image.
@@ -212,14 +210,9 @@ class VisionService:
             Provide only the JSON array.
             """
             
-            response = model.generate_content([prompt, image])
-            result_text = response.text.strip()
-            
-            # Clean JSON
-            if result_text.startswith('```'):
-                result_text = result_text.replace('```json', '').replace('```', '').strip()
-            
-            products = json.loads(result_text)
+            products, _ = VisionService.generate_json(
+                VisionService.MULTI_PRODUCT_PROMPT_VERSION, prompt, image
+            )
             
             return {
                 'success': True,
@@ -4,21 +4,13 @@ Supports Tamil and English voice commands for FreshConnect
 Uses Web Speech API (browser-based) for speech recognition and synthesis
 """
 
-import google.generativeai as genai
 import os
 import base64
 import json
 from datetime import datetime
-
-# Optional: Google Cloud Speech services (not required)
-try:
-    from google.cloud import speech_v1 as speech
-    from google.cloud import texttospeech
-    GOOGLE_CLOUD_AVAILABLE = True
-except ImportError:
-    GOOGLE_CLOUD_AVAILABLE = False
-    speech = None
-    texttospeech = None
+from app.llm_cache import LLMCache
+from app.gemini_client import GeminiRegistry
+from app.intent_engine import IntentEngine
 
 
 class VoiceService:
@@ -27,17 +19,22 @@ class VoiceService:
     Supports both Tamil (தமிழ்) and English
     """
     
-    # Configure API keys
-    GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY', '')
+    # Configure API keys (Gemini key is read by GeminiRegistry)
     GOOGLE_CLOUD_API_KEY = os.environ.get('GOOGLE_CLOUD_API_KEY', '')
     
+    MODEL_NAME = GeminiRegistry.VOICE_MODEL
+    # Bump when a prompt changes (cached responses are keyed on these)
+    COMMAND_PROMPT_VERSION = 'voice-command-v1'
+    RESPONSE_PROMPT_VERSION = 'voice-response-v1'
+    COMMAND_CACHE_TTL = 7 * 86400  # Parsing a command doesn't go stale
+    
+    # Optional Google Cloud Speech services (not required): imported on first use, not at worker boot
+    _google_cloud = None  # (speech_v1, texttospeech) once loaded, False if not installed
+    
     @staticmethod
     def configure_api():
-        """Configure APIs"""
-        if VoiceService.GEMINI_API_KEY:
-            genai.configure(api_key=VoiceService.GEMINI_API_KEY)
-            return True
-        return False
+        """True if Gemini can be used (the shared client is created on first call)"""
+        return GeminiRegistry.is_configured()
     
     @staticmethod
     def transcribe_audio_web_api(audio_data, language='en-US'):
@@ -53,6 +50,17 @@ class VoiceService:
             'language': language
         }
     
+    @staticmethod
+    def google_cloud():
+        """(speech_v1, texttospeech) modules, or None when google-cloud-speech isn't installed"""
+        if VoiceService._google_cloud is None:
+            try:
+                from google.cloud import speech_v1, texttospeech
+                VoiceService._google_cloud = (speech_v1, texttospeech)
+            except ImportError:
+                VoiceService._google_cloud = False
+        return VoiceService._google_cloud or None
+    
     @staticmethod
     def transcribe_audio_google_api(audio_content, language_code='en-US'):
         """
@@ -63,7 +71,8 @@ class VoiceService:
         """
         try:
             # Check if Google Cloud is available
-            if not GOOGLE_CLOUD_AVAILABLE:
+            google_cloud = VoiceService.google_cloud()
+            if not google_cloud:
                 return {
                     'success': False,
                     'message': 'Google Cloud Speech not installed. Using Web Speech API instead.'
@@ -76,6 +85,7 @@ class VoiceService:
                     'message': 'Google Cloud credentials not configured. Using Web Speech API instead.'
                 }
             
+            speech = google_cloud[0]
             client = speech.SpeechClient()
             
             # Configure recognition
@@ -119,108 +129,11 @@ class VoiceService:
     def simple_understand_command(text, user_type='retailer'):
         """
         Simple pattern matching fallback (NO API REQUIRED)
-        ALWAYS works - extracts intent using keywords
+        ALWAYS works - intent and entities from the precompiled IntentEngine
         """
-        import re
-        
-        text_lower = text.lower()
-        
-        # Default structure
-        command = {
-            'intent': 'unknown',
-            'entities': {},
-            'confidence': 'low',
-            'language_detected': 'en'
-        }
-        
-        # Extract numbers
-        numbers = re.findall(r'\d+', text)
-        
-        # PATTERN 1: Order/Find Products (detect product mentions)
-        # Common product names - expanded list
-        products = {
-            'tomato': ['tomato', 'tomatoes', 'தக்காளி', 'tamato'],
-            'potato': ['potato', 'potatoes', 'உருளைக்கிழங்கு', 'aloo'],
-            'onion': ['onion', 'onions', 'வெங்காயம்', 'pyaz'],
-            'carrot': ['carrot', 'carrots', 'கேரட்'],
-            'apple': ['apple', 'apples', 'ஆப்பிள்', 'seb'],
-            'banana': ['banana', 'bananas', 'வாழைப்பழம்', 'kela'],
-            'orange': ['orange', 'oranges', 'ஆரஞ்சு', 'santra'],
-            'mango': ['mango', 'mangoes', 'மா', 'aam'],
-            'rice': ['rice', 'அரிசி', 'chawal'],
-            'wheat': ['wheat', 'கோதுமை', 'gehun'],
-            'lentil': ['lentil', 'lentils', 'dal', 'பருப்பு'],
-            'cabbage': ['cabbage', 'முட்டைகோஸ்'],
-            'cauliflower': ['cauliflower', 'பூக்கோஸ்', 'gobi'],
-            'spinach': ['spinach', 'கீரை', 'palak'],
-            'grape': ['grape', 'grapes', 'திராட்சை', 'angoor'],
-            'vegetable': ['vegetable', 'vegetables', 'காய்கறி', 'veggies', 'veggie', 'sabzi'],
-            'fruit': ['fruit', 'fruits', 'பழம்', 'phal']
-        }
-        
-        detected_product = None
-        for product, keywords in products.items():
-            if any(k in text_lower for k in keywords):
-                detected_product = product
-                break
-        
-        # If product detected OR order/find keywords present
-        product_keywords = ['order', 'find', 'show', 'search', 'get', 'want', 'need', 'buy', 'purchase', 
-                           'வேண்டும்', 'காட்டு', 'kg', 'of', 'list', 'all', 'available', 'price', 
-                           'cost', 'tell me', 'what', 'any', 'have']
-        has_product_keyword = any(word in text_lower for word in product_keywords)
-        
-        if detected_product or has_product_keyword:
-            command['intent'] = 'order_product'
-            
-            if detected_product:
-                command['entities']['product_name'] = detected_product
-            else:
-                # Extract product name (everything except numbers and common words)
-                stop_words = ['order', 'find', 'show', 'me', 'kg', 'of', 'get', 'i', 'want', 'need', 'less', 'than', 'for', 'rupees', 'a', 'the']
-                words = text_lower.split()
-                product_words = [w for w in words if w not in stop_words and not w.isdigit()]
-                
-                if product_words:
-                    command['entities']['product_name'] = ' '.join(product_words)
-            
-            if numbers:
-                command['entities']['quantity'] = numbers[0]
-            
-            # Detect category
-            if detected_product in ['tomato', 'potato', 'onion', 'carrot']:
-                command['entities']['category'] = 'Vegetables'
-            elif detected_product in ['apple', 'banana', 'orange']:
-                command['entities']['category'] = 'Fruits'
-            elif 'vegetable' in text_lower or 'காய்கறி' in text_lower:
-                command['entities']['category'] = 'Vegetables'
-                if not command['entities'].get('product_name'):
-                    command['intent'] = 'list_products'
-            elif 'fruit' in text_lower or 'பழம்' in text_lower:
-                command['entities']['category'] = 'Fruits'
-                if not command['entities'].get('product_name'):
-                    command['intent'] = 'list_products'
-            
-            command['confidence'] = 'high'
-        
-        # PATTERN 2: Check Orders
-        order_keywords = ['order', 'track', 'status', 'check', 'my order', 'where']
-        if any(word in text_lower for word in order_keywords) and 'order' in text_lower:
-            if numbers:
-                command['intent'] = 'check_order_status'
-                command['entities']['order_id'] = numbers[0]
-            else:
-                command['intent'] = 'list_orders'
-            command['confidence'] = 'high'
-        
-        # PATTERN 3: Help
-        if any(word in text_lower for word in ['help', 'what can you do', 'commands']):
-            command['intent'] = 'help'
-            command['confidence'] = 'high'
-        
         return {
             'success': True,
-            'command': command,
+            'command': IntentEngine.voice_command(text),
             'raw_text': text
         }
     
@@ -242,8 +155,6 @@ class VoiceService:
                     'message': 'Gemini API not configured'
                 }
             
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            
             # Create context-aware prompt
             prompt = f"""
 You are a voice assistant for FreshConnect, a fresh produce marketplace.
@@ -285,14 +196,21 @@ Examples:
 Return ONLY the JSON, no additional text.
 """
             
-            response = model.generate_content(prompt)
-            result_text = response.text.strip()
-            
-            # Clean JSON
-            if result_text.startswith('```'):
-                result_text = result_text.replace('```json', '').replace('```', '').strip()
-            
-            command_data = json.loads(result_text)
+            def generate():
+                response = GeminiRegistry.model(VoiceService.MODEL_NAME).generate_content(prompt)
+                result_text = response.text.strip()
+                
+                # Clean JSON
+                if result_text.startswith('```'):
+                    result_text = result_text.replace('```json', '').replace('```', '').strip()
+                return result_text
+            
+            # "find tomatoes under 50" is parsed once, then served from the cache
+            command_data = LLMCache.fetch(
+                VoiceService.MODEL_NAME, VoiceService.COMMAND_PROMPT_VERSION,
+                {'text': LLMCache.normalize(text), 'user_type': user_type, 'language': language},
+                generate, parse=json.loads, ttl=VoiceService.COMMAND_CACHE_TTL
+            )
             
             return {
                 'success': True,
@@ -304,7 +222,7 @@ Return ONLY the JSON, no additional text.
             return {
                 'success': False,
                 'message': f'Could not parse command: {str(e)}',
-                'raw_response': result_text if 'result_text' in locals() else ''
+                'raw_response': e.doc
             }
         except Exception as e:
             return {
@@ -334,7 +252,8 @@ Return ONLY the JSON, no additional text.
         
         try:
             # Check if Google Cloud is available
-            if not GOOGLE_CLOUD_AVAILABLE:
+            google_cloud = VoiceService.google_cloud()
+            if not google_cloud:
                 return {
                     'success': False,
                     'message': 'Google Cloud TTS not installed. Use Web Speech API instead.',
@@ -351,6 +270,7 @@ Return ONLY the JSON, no additional text.
                     'text': text
                 }
             
+            texttospeech = google_cloud[1]
             client = texttospeech.TextToSpeechClient()
             
             synthesis_input = texttospeech.SynthesisInput(text=text)
@@ -407,6 +327,8 @@ Return ONLY the JSON, no additional text.
             db_session: Database session
         """
         from app.models import Product, Order, User
+        from app.search_service import ProductSearchService
+        from app.fuzzy_index import ProductNameIndex
         
         try:
             intent = command_data.get('intent', '')
@@ -426,15 +348,27 @@ Return ONLY the JSON, no additional text.
                 category = entities.get('category')
                 
                 # Build query
-                query = Product.query.filter(Product.is_active == True)
-                
-                if product_name:
-                    query = query.filter(Product.product_name.ilike(f'%{product_name}%'))
+                def matching(name):
+                    query = Product.query.filter(Product.is_active == True)
+                    
+                    if name:
+                        query = ProductSearchService.apply(query, name)
+                    
+                    if category:
+                        query = query.filter(Product.category.ilike(f'%{category}%'))
+                    
+                    return query.limit(10).all()
                 
-                if category:
-                    query = query.filter(Product.category.ilike(f'%{category}%'))
+                products = matching(product_name)
                 
-                products = query.limit(10).all()
+                # Misheard product name ("tomatos", "onian"): retry with the spelling corrected
+                if not products and product_name:
+                    corrected = ProductNameIndex.correct(product_name)
+                    if corrected != product_name:
+                        products = matching(corrected)
+                        if products:
+                            product_name = corrected
+                            result['data']['corrected_product'] = corrected
                 
                 if not products:
                     result['message'] = f'No products found'
@@ -591,8 +525,6 @@ Return ONLY the JSON, no additional text.
                     'language': language
                 }
             
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            
             prompt = f"""
 Generate a natural, conversational response in {"Tamil (தமிழ்)" if language == 'ta' else "English"}.
 
@@ -613,8 +545,11 @@ Create a friendly, helpful response that:
 Return ONLY the response text, no additional formatting.
 """
             
-            response = model.generate_content(prompt)
-            response_text = response.text.strip()
+            response_text = LLMCache.fetch(
+                VoiceService.MODEL_NAME, VoiceService.RESPONSE_PROMPT_VERSION,
+                {'result': command_result, 'language': language},
+                lambda: GeminiRegistry.model(VoiceService.MODEL_NAME).generate_content(prompt).text.strip()
+            )
             
             return {
                 'success': True,
@@ -1,6 +1,14 @@
 import os
 from datetime import timedelta
 
+
+def _sqlalchemy_url(url):
+    """postgres:// (Railway/Heroku style) -> postgresql://, which SQLAlchemy requires"""
+    if url and url.startswith('postgres://'):
+        return url.replace('postgres://', 'postgresql://', 1)
+    return url
+
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-min-32-characters'
     
@@ -12,6 +20,20 @@ class Config:
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Engine pools (database.py), per worker process: keep pool size x workers under the server's
+    # max_connections. Recycle below the proxy's idle timeout; pre-ping replaces connections it dropped
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 5)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 10)
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT') or 30)
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 1800)
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() != 'false'
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS') or 0)  # 0 = no limit
+    
+    # Read replica: SELECTs from GET / HEAD requests go here; after a write the client reads
+    # from the primary for DB_REPLICA_STICKY_SECONDS (replication lag headroom)
+    DATABASE_REPLICA_URL = _sqlalchemy_url(os.environ.get('DATABASE_REPLICA_URL'))
+    DB_REPLICA_STICKY_SECONDS = float(os.environ.get('DB_REPLICA_STICKY_SECONDS') or 5)
+    
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
     SESSION_COOKIE_SECURE = False  # Changed: Railway proxy handles HTTPS
     SESSION_COOKIE_HTTPONLY = True
@@ -26,8 +48,82 @@ class Config:
     
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
     
+    # Gemini response cache (llm_cache.py): per-worker LRU in front of the llm_response_cache table
+    LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', 'true').lower() != 'false'
+    LLM_CACHE_TTL_SECONDS = int(os.environ.get('LLM_CACHE_TTL_SECONDS') or 86400)
+    LLM_CACHE_MEMORY_ITEMS = int(os.environ.get('LLM_CACHE_MEMORY_ITEMS') or 1024)
+    LLM_CACHE_MAX_ROWS = int(os.environ.get('LLM_CACHE_MAX_ROWS') or 50000)
+
+    # Gemini gateway (llm_gateway.py): thread pool, deadlines, per-model limits, circuit breaker
+    LLM_GATEWAY_WORKERS = int(os.environ.get('LLM_GATEWAY_WORKERS') or 8)
+    LLM_MODEL_CONCURRENCY = int(os.environ.get('LLM_MODEL_CONCURRENCY') or 4)
+    LLM_CALL_TIMEOUT_SECONDS = float(os.environ.get('LLM_CALL_TIMEOUT_SECONDS') or 20)
+    LLM_JOB_TIMEOUT_SECONDS = float(os.environ.get('LLM_JOB_TIMEOUT_SECONDS') or 60)  # Background (job id) calls
+    LLM_BREAKER_FAILURES = int(os.environ.get('LLM_BREAKER_FAILURES') or 5)
+    LLM_BREAKER_RESET_SECONDS = float(os.environ.get('LLM_BREAKER_RESET_SECONDS') or 30)
+    
+    # Vision uploads (image_pipeline.py): downsized and re-encoded on a decode pool before the model sees them
+    VISION_MAX_EDGE_PX = int(os.environ.get('VISION_MAX_EDGE_PX') or 1024)
+    VISION_IMAGE_FORMAT = os.environ.get('VISION_IMAGE_FORMAT') or 'JPEG'  # or WEBP
+    VISION_IMAGE_QUALITY = int(os.environ.get('VISION_IMAGE_QUALITY') or 85)
+    VISION_DECODE_WORKERS = int(os.environ.get('VISION_DECODE_WORKERS') or 2)
+    
     ITEMS_PER_PAGE = 20
     
+    # Spelling-correction index over product names (fuzzy_index.py): seconds between change-feed reads
+    FUZZY_INDEX_REFRESH_SECONDS = int(os.environ.get('FUZZY_INDEX_REFRESH_SECONDS') or 30)
+    
+    # Search-box autocomplete trie (autocomplete.py): change-feed interval and the order-volume window
+    AUTOCOMPLETE_REFRESH_SECONDS = int(os.environ.get('AUTOCOMPLETE_REFRESH_SECONDS') or 15)
+    AUTOCOMPLETE_VOLUME_DAYS = int(os.environ.get('AUTOCOMPLETE_VOLUME_DAYS') or 30)
+    
+    # Both change feeds re-read this many seconds before their watermark: updated_at is stamped at
+    # flush, so a slow transaction can commit a row older than one already seen
+    CHANGE_FEED_LAG_SECONDS = int(os.environ.get('CHANGE_FEED_LAG_SECONDS') or 5)
+    
+    # Optional cart summary cache: unset (DB only), 'memory://' (single worker) or a redis:// URL
+    CART_CACHE_URL = os.environ.get('CART_CACHE_URL')
+    
+    # How long checkout holds stock for an unpaid order
+    STOCK_RESERVATION_MINUTES = int(os.environ.get('STOCK_RESERVATION_MINUTES') or 15)
+    
+    # Deliveries completed within this many minutes of ordering count as on time
+    DELIVERY_ON_TIME_MINUTES = int(os.environ.get('DELIVERY_ON_TIME_MINUTES') or 240)
+    DELIVERY_METRICS_SETTLE_SECONDS = int(os.environ.get('DELIVERY_METRICS_SETTLE_SECONDS') or 600)  # Longest a status change may stay uncommitted
+    
+    # 'immediate': assign a driver when payment succeeds; 'batch': run_batch_assignment.py
+    # assigns all paid orders every DRIVER_BATCH_WINDOW_SECONDS as one global matching
+    DRIVER_ASSIGNMENT_MODE = os.environ.get('DRIVER_ASSIGNMENT_MODE') or 'immediate'
+    DRIVER_BATCH_WINDOW_SECONDS = int(os.environ.get('DRIVER_BATCH_WINDOW_SECONDS') or 60)
+    
+    # Per-request SQL instrumentation (sql_profiler.py): headers are always added in DEBUG
+    SQL_PROFILING_ENABLED = os.environ.get('SQL_PROFILING_ENABLED', 'true').lower() != 'false'
+    SQL_PROFILE_HEADERS = os.environ.get('SQL_PROFILE_HEADERS', 'false').lower() == 'true'
+    SQL_N_PLUS_ONE_THRESHOLD = int(os.environ.get('SQL_N_PLUS_ONE_THRESHOLD') or 10)  # Same statement more often = N+1
+    SQL_SLOW_REQUEST_MS = int(os.environ.get('SQL_SLOW_REQUEST_MS') or 500)
+    
+    # Prometheus metrics at /metrics (metrics.py). Point METRICS_DIR at a directory shared by all
+    # gunicorn workers (emptied on deploy) to report the whole server; unset = the answering worker only
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS') or 5)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # If set, scrapes need "Authorization: Bearer <token>"
+    
+    # Readiness probe (health.py): seconds a `SELECT 1` result is reused by /health/ready and /health
+    HEALTH_DB_PING_TTL_SECONDS = float(os.environ.get('HEALTH_DB_PING_TTL_SECONDS') or 2)
+    
+    # Schema: create_app() runs db.create_all() + the search index only when this is on. Production
+    # creates them once per deploy with `flask --app run init-db` (run by the Procfile before gunicorn)
+    # instead of on every worker boot
+    AUTO_CREATE_TABLES = os.environ.get('AUTO_CREATE_TABLES', 'true').lower() != 'false'
+    
+    # Logging (structured_logging.py): records are queued and written to stdout by a background thread.
+    # LOG_LEVELS overrides single loggers, e.g. "app.routes.retailer=DEBUG,app.credit_system=WARNING"
+    LOG_LEVEL = os.environ.get('LOG_LEVEL') or 'INFO'
+    LOG_LEVELS = os.environ.get('LOG_LEVELS')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT') or 'json'  # or text
+    LOG_DEBUG_SAMPLE_RATE = int(os.environ.get('LOG_DEBUG_SAMPLE_RATE') or 1)  # Keep 1 in N DEBUG lines per call site
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE') or 10000)
+    
     MOCK_PAYMENT_ENABLED = True
     MOCK_SMS_ENABLED = True
     MOCK_DRIVER_TRACKING = True
@@ -44,11 +140,13 @@ class DevelopmentConfig(Config):
     DEBUG = True
     TESTING = False
     SESSION_COOKIE_SECURE = False
+    LOG_FORMAT = os.environ.get('LOG_FORMAT') or 'text'
 
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    LOG_FORMAT = os.environ.get('LOG_FORMAT') or 'text'
 
 class ProductionConfig(Config):
     DEBUG = False
@@ -56,6 +154,7 @@ class ProductionConfig(Config):
     # Railway handles HTTPS but we need to be more permissive with sessions
     SESSION_COOKIE_SECURE = False  # Railway proxy handles HTTPS
     SESSION_COOKIE_SAMESITE = None  # More permissive for Railway
+    AUTO_CREATE_TABLES = os.environ.get('AUTO_CREATE_TABLES', 'false').lower() == 'true'
 
 config_by_name = {
     'development': DevelopmentConfig,
@@ -27,50 +27,50 @@ def init_driver_routes():
         {
             'start': 'Koyambedu Market',
             'end': 'Chromepet',
-            'start_lat': '13.0827',
-            'start_lng': '80.2707',
-            'end_lat': '12.9716',
-            'end_lng': '80.2202',
+            'start_lat': 13.0827,
+            'start_lng': 80.2707,
+            'end_lat': 12.9716,
+            'end_lng': 80.2202,
             'distance_km': 25.0,
             'time_hours': 1.5
         },
         {
             'start': 'Koyambedu Market',
             'end': 'Velachery',
-            'start_lat': '13.0827',
-            'start_lng': '80.2707',
-            'end_lat': '12.9689',
-            'end_lng': '80.2350',
+            'start_lat': 13.0827,
+            'start_lng': 80.2707,
+            'end_lat': 12.9689,
+            'end_lng': 80.2350,
             'distance_km': 22.0,
             'time_hours': 1.2
         },
         {
             'start': 'Koyambedu Market',
             'end': 'Guindy',
-            'start_lat': '13.0827',
-            'start_lng': '80.2707',
-            'end_lat': '13.0012',
-            'end_lng': '80.2175',
+            'start_lat': 13.0827,
+            'start_lng': 80.2707,
+            'end_lat': 13.0012,
+            'end_lng': 80.2175,
             'distance_km': 10.0,
             'time_hours': 0.7
         },
         {
             'start': 'Koyambedu Market',
             'end': 'Adyar',
-            'start_lat': '13.0827',
-            'start_lng': '80.2707',
-            'end_lat': '12.9971',
-            'end_lng': '80.2421',
+            'start_lat': 13.0827,
+            'start_lng': 80.2707,
+            'end_lat': 12.9971,
+            'end_lng': 80.2421,
             'distance_km': 15.0,
             'time_hours': 1.0
         },
         {
             'start': 'Koyambedu Market',
             'end': 'Tambaram',
-            'start_lat': '13.0827',
-            'start_lng': '80.2707',
-            'end_lat': '12.9250',
-            'end_lng': '80.1450',
+            'start_lat': 13.0827,
+            'start_lng': 80.2707,
+            'end_lat': 12.9250,
+            'end_lng': 80.1450,
             'distance_km': 28.0,
             'time_hours': 1.8
         }
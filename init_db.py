@@ -1,17 +1,18 @@
-from app import create_app, db
+from app import create_app, init_schema
 from dotenv import load_dotenv
 
 def init_database():
     """
     Initialize the database
-    Creates all tables defined in models.py
+    Creates all tables defined in models.py and the product search index
+    (same as `flask --app run init-db`, which the Procfile runs before gunicorn)
     """
     load_dotenv()
     
     app = create_app()
     with app.app_context():
         print("Creating database tables...")
-        db.create_all()
+        init_schema()
         print("✅ Database initialized successfully!")
         print(f"Database file: {app.config['SQLALCHEMY_DATABASE_URI']}")
 
@@ -0,0 +1,51 @@
+"""
+Database Migration: Delivery Metrics Pipeline
+
+Adds the running total column used by app/delivery_metrics_service.py, creates
+the pipeline_checkpoints and pipeline_processed_rows tables and backfills metrics from the whole order
+status log. Works on SQLite and PostgreSQL; safe to re-run.
+
+Runs on every deploy (Procfile, after init-db): the backfill only happens when the
+column was just added or the pipeline has never run; pass --rebuild to force it.
+"""
+
+import sys
+from app import create_app, db, init_schema
+from app.delivery_metrics_service import DeliveryMetricsPipeline
+from app.models import PipelineCheckpoint
+from sqlalchemy import inspect, text
+
+
+def run_migration(force_rebuild=False):
+    app = create_app()
+    
+    with app.app_context():
+        init_schema()  # Adds the pipeline tables (production doesn't create tables at boot)
+        
+        print("="*60)
+        print("Database Migration: Delivery Metrics")
+        print("="*60)
+        
+        existing_columns = {column['name'] for column in inspect(db.engine).get_columns('vendor_delivery_metrics')}
+        
+        pipeline_ran = PipelineCheckpoint.query.filter_by(name=DeliveryMetricsPipeline.CHECKPOINT).first() is not None
+        
+        if 'total_delivery_time' in existing_columns:
+            print("  ⏭️  vendor_delivery_metrics.total_delivery_time already exists, skipping...")
+            if pipeline_ran and not force_rebuild:
+                print("\n✅ Delivery metrics already migrated, nothing to do")
+                return
+        else:
+            with db.engine.connect() as conn:
+                conn.execute(text("ALTER TABLE vendor_delivery_metrics ADD COLUMN total_delivery_time INTEGER DEFAULT 0"))
+                conn.commit()
+            print("  ✅ Added vendor_delivery_metrics.total_delivery_time")
+        
+        print("\n📊 Backfilling delivery metrics from order status log...")
+        results = DeliveryMetricsPipeline.rebuild()
+        
+        print(f"\n✅ Migration complete! {results}")
+
+
+if __name__ == "__main__":
+    run_migration(force_rebuild='--rebuild' in sys.argv)
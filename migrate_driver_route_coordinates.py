@@ -0,0 +1,77 @@
+"""
+Database Migration: Numeric Driver Route Coordinates
+
+driver_routes.start_lat / start_lng / end_lat / end_lng were VARCHAR(20);
+driver matching (app/driver_matching_service.py) needs real numbers.
+
+- PostgreSQL: ALTER COLUMN ... TYPE DOUBLE PRECISION
+- SQLite: column types can't be altered, so the table is rebuilt
+  (new table, copy with CAST, drop old, rename) - the usual SQLite recipe
+
+Blank / non-numeric values become NULL (those routes are skipped by matching). Safe to re-run;
+runs on every deploy (Procfile, after init-db) and does nothing once the columns are numeric.
+"""
+
+from app import create_app, db
+from app.models import Driver, DriverRoute
+from sqlalchemy import MetaData, inspect, text
+
+COORDINATE_COLUMNS = ('start_lat', 'start_lng', 'end_lat', 'end_lng')
+
+
+def _is_numeric(column):
+    try:
+        return column['type'].python_type is float
+    except NotImplementedError:
+        return False
+
+
+def run_migration():
+    app = create_app()
+    
+    with app.app_context():
+        print("="*60)
+        print("Database Migration: Numeric Driver Route Coordinates")
+        print("="*60)
+        
+        columns = {column['name']: column for column in inspect(db.engine).get_columns('driver_routes')}
+        if all(_is_numeric(columns[name]) for name in COORDINATE_COLUMNS):
+            print("  ⏭️  driver_routes coordinates are already numeric, skipping...")
+            return
+        
+        dialect = db.engine.dialect.name
+        
+        with db.engine.begin() as conn:
+            if dialect == 'postgresql':
+                for name in COORDINATE_COLUMNS:
+                    conn.execute(text(
+                        f"ALTER TABLE driver_routes ALTER COLUMN {name} TYPE DOUBLE PRECISION "
+                        f"USING CASE WHEN {name} ~ '^\\s*-?[0-9]+(\\.[0-9]+)?\\s*$' "
+                        f"THEN {name}::double precision END"
+                    ))
+                    print(f"  ✅ driver_routes.{name} -> DOUBLE PRECISION")
+            else:
+                metadata = MetaData()
+                Driver.__table__.to_metadata(metadata)  # FK target for the copy
+                new_table = DriverRoute.__table__.to_metadata(metadata, name='driver_routes_new')
+                new_table.create(conn)
+                
+                names = [column.name for column in DriverRoute.__table__.columns]
+                select_list = ', '.join(
+                    f"CASE WHEN trim({name}) GLOB '*[0-9]*' THEN CAST({name} AS REAL) END"
+                    if name in COORDINATE_COLUMNS else name
+                    for name in names
+                )
+                conn.execute(text(
+                    f"INSERT INTO driver_routes_new ({', '.join(names)}) SELECT {select_list} FROM driver_routes"
+                ))
+                conn.execute(text("DROP TABLE driver_routes"))
+                conn.execute(text("ALTER TABLE driver_routes_new RENAME TO driver_routes"))
+                print("  ✅ Rebuilt driver_routes with REAL coordinate columns")
+        
+        count = db.session.execute(text("SELECT COUNT(*) FROM driver_routes WHERE start_lat IS NOT NULL")).scalar()
+        print(f"\n✅ Migration complete! {count} routes with coordinates")
+
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,67 @@
+"""
+Database Migration: Running-Sum Rating Aggregates
+
+Adds the running-sum columns used by app/rating_service.py and fills them
+with one full reconciliation. Works on SQLite and PostgreSQL; safe to re-run.
+
+Runs on every deploy (Procfile, after init-db): once the columns exist it does
+nothing; pass --reconcile to rebuild the aggregates anyway.
+"""
+
+import sys
+from app import create_app, db
+from app.rating_service import RatingAggregateService
+from sqlalchemy import inspect, text
+
+
+NEW_COLUMNS = {
+    'users': [
+        ('rating_sum', 'FLOAT DEFAULT 0'),
+    ],
+    'vendor_ratings_cache': [
+        ('sum_quality_rating', 'INTEGER DEFAULT 0'),
+        ('sum_punctuality_rating', 'INTEGER DEFAULT 0'),
+        ('sum_communication_rating', 'INTEGER DEFAULT 0'),
+        ('total_orders', 'INTEGER DEFAULT 0'),
+        ('successful_orders', 'INTEGER DEFAULT 0'),
+    ],
+}
+
+
+def run_migration(force_reconcile=False):
+    app = create_app()
+    
+    with app.app_context():
+        print("="*60)
+        print("Database Migration: Rating Aggregates")
+        print("="*60)
+        
+        inspector = inspect(db.engine)
+        added = 0
+        
+        with db.engine.connect() as conn:
+            for table, columns in NEW_COLUMNS.items():
+                existing_columns = {column['name'] for column in inspector.get_columns(table)}
+                
+                for column_name, column_type in columns:
+                    if column_name in existing_columns:
+                        print(f"  ⏭️  {table}.{column_name} already exists, skipping...")
+                        continue
+                    
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column_name} {column_type}"))
+                    conn.commit()
+                    print(f"  ✅ Added {table}.{column_name}")
+                    added += 1
+        
+        if not added and not force_reconcile:
+            print("\n✅ Rating aggregates already migrated, nothing to do")
+            return
+        
+        print("\n📊 Rebuilding rating aggregates...")
+        results = RatingAggregateService.reconcile()
+        
+        print(f"\n✅ Migration complete! {results}")
+
+
+if __name__ == "__main__":
+    run_migration(force_reconcile='--reconcile' in sys.argv)
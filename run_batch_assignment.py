@@ -0,0 +1,55 @@
+"""
+Batch Driver Assignment Task
+Assigns all paid orders waiting for a driver as one global min-cost matching
+(detour off each driver's route, within vehicle capacity) and commits the
+assignments in a single transaction.
+
+Set DRIVER_ASSIGNMENT_MODE=batch so payments leave assignment to this task.
+
+With --consolidate, orders are instead packed into multi-stop trips out of
+Koyambedu (weight + volume limits, stops sequenced nearest-neighbour + 2-opt).
+
+Usage:
+    python run_batch_assignment.py                # one assignment window
+    python run_batch_assignment.py --loop         # every DRIVER_BATCH_WINDOW_SECONDS
+    python run_batch_assignment.py --consolidate  # multi-stop truck loads
+
+For production, run with --loop under a process manager, or as a cron job:
+- Linux/Mac: Add to crontab
+  * * * * * /path/to/python /path/to/run_batch_assignment.py
+"""
+
+import sys
+import time
+from app import create_app, db
+from app.batch_assignment_service import BatchAssignmentService
+from app.consolidation_service import ConsolidationService
+from app.metrics import Metrics
+
+app = create_app()
+run = ConsolidationService.run if '--consolidate' in sys.argv else BatchAssignmentService.run
+
+with app.app_context():
+    print("\n🚀 Starting Batch Driver Assignment Task...")
+    print(f"Time: {__import__('datetime').datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    
+    if '--loop' in sys.argv:
+        window = app.config['DRIVER_BATCH_WINDOW_SECONDS']
+        print(f"Assigning every {window}s (Ctrl+C to stop)")
+        try:
+            while True:
+                started = time.monotonic()
+                results = run()
+                if results['pending']:
+                    print(f"Results: {results}")
+                db.session.remove()
+                Metrics.maybe_flush()  # Assignment latency shows up in /metrics (with METRICS_DIR)
+                time.sleep(max(0, window - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            print("\n⏹️  Stopped")
+    else:
+        results = run()
+        Metrics.flush()
+        
+        print(f"\n✅ Batch Driver Assignment Task Complete!")
+        print(f"Results: {results}")
@@ -2,6 +2,11 @@
 Daily Notification Task
 Run this script once per day to check for expiring products and send notifications
 
+Usage:
+    python run_daily_notifications.py                     # hide expired, notify vendors
+    python run_daily_notifications.py --dry-run           # only report counts, no writes / emails
+    python run_daily_notifications.py --chunk-size 2000   # rows per UPDATE batch (default 5000)
+
 For production, set up as a cron job:
 - Linux/Mac: Add to crontab
   0 9 * * * /path/to/python /path/to/run_daily_notifications.py
@@ -10,6 +15,7 @@ For production, set up as a cron job:
   Daily at 9:00 AM
 """
 
+import sys
 from app import create_app
 from app.notification_service import NotificationService
 
@@ -19,8 +25,11 @@ with app.app_context():
     print("\n🚀 Starting Daily Notification Task...")
     print(f"Time: {__import__('datetime').datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     
+    dry_run = '--dry-run' in sys.argv
+    chunk_size = int(sys.argv[sys.argv.index('--chunk-size') + 1]) if '--chunk-size' in sys.argv else None
+    
     # Run the notification check
-    results = NotificationService.send_bulk_expiry_notifications()
+    results = NotificationService.send_bulk_expiry_notifications(dry_run=dry_run, chunk_size=chunk_size)
     
     print(f"\n✅ Daily Notification Task Complete!")
     print(f"Results: {results}")
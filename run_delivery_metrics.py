@@ -0,0 +1,35 @@
+"""
+Delivery Metrics Task
+Folds new delivered orders from the order status log into per-vendor
+delivery metrics (avg/min/max delivery time, on-time/late counts).
+Only rows added since the last run are read, so it is cheap to run often.
+
+Usage:
+    python run_delivery_metrics.py            # process new status log rows
+    python run_delivery_metrics.py --rebuild  # reset and reprocess the whole log
+
+For production, set up as a cron job:
+- Linux/Mac: Add to crontab
+  */15 * * * * /path/to/python /path/to/run_delivery_metrics.py
+
+- Windows: Use Task Scheduler
+  Every 15 minutes
+"""
+
+import sys
+from app import create_app
+from app.delivery_metrics_service import DeliveryMetricsPipeline
+
+app = create_app()
+
+with app.app_context():
+    print("\n🚀 Starting Delivery Metrics Task...")
+    print(f"Time: {__import__('datetime').datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    
+    if '--rebuild' in sys.argv:
+        results = DeliveryMetricsPipeline.rebuild()
+    else:
+        results = DeliveryMetricsPipeline.run()
+    
+    print(f"\n✅ Delivery Metrics Task Complete!")
+    print(f"Results: {results}")
@@ -0,0 +1,47 @@
+"""
+Emergency Marketplace Metrics Task
+Writes the daily EmergencyMarketplaceMetrics rows from grouped SQL queries.
+A whole date range is recomputed in one pass, so backfilling a month costs
+the same handful of queries as a single day.
+
+Usage:
+    python run_emergency_metrics.py                                  # today
+    python run_emergency_metrics.py --from 2025-01-01 --to 2025-01-31  # backfill a range
+
+For production, set up as a cron job:
+- Linux/Mac: Add to crontab
+  55 23 * * * /path/to/python /path/to/run_emergency_metrics.py
+
+- Windows: Use Task Scheduler
+  Daily at 11:55 PM
+"""
+
+import sys
+from datetime import date
+from app import create_app
+from app.emergency_marketplace_service import EmergencyMarketplaceService
+
+
+def _arg(name, default):
+    if name in sys.argv:
+        return date.fromisoformat(sys.argv[sys.argv.index(name) + 1])
+    return default
+
+
+app = create_app()
+
+with app.app_context():
+    print("\n🚀 Starting Emergency Metrics Task...")
+    print(f"Time: {__import__('datetime').datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    
+    end_date = _arg('--to', date.today())
+    start_date = _arg('--from', end_date)
+    
+    rows = EmergencyMarketplaceService.backfill_metrics(start_date, end_date)
+    
+    if rows is None:
+        print("\n❌ Emergency Metrics Task Failed")
+        sys.exit(1)
+    
+    print(f"\n✅ Emergency Metrics Task Complete!")
+    print(f"Results: {len(rows)} day(s) from {start_date} to {end_date}")
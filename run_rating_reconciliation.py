@@ -0,0 +1,27 @@
+"""
+Rating Reconciliation Task
+Rebuilds vendor rating caches and vendor/driver average ratings from the
+reviews and orders tables with grouped queries, correcting any drift in the
+incrementally maintained running sums.
+
+For production, set up as a cron job (nightly is plenty):
+- Linux/Mac: Add to crontab
+  30 2 * * * /path/to/python /path/to/run_rating_reconciliation.py
+
+- Windows: Use Task Scheduler
+  Daily at 2:30 AM
+"""
+
+from app import create_app
+from app.rating_service import RatingAggregateService
+
+app = create_app()
+
+with app.app_context():
+    print("\n🚀 Starting Rating Reconciliation Task...")
+    print(f"Time: {__import__('datetime').datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    
+    results = RatingAggregateService.reconcile()
+    
+    print(f"\n✅ Rating Reconciliation Task Complete!")
+    print(f"Results: {results}")